@@ -4,14 +4,14 @@
 import json
 import os
 from typing import Dict, List, Optional
-from anthropic import Anthropic
+from ai_client import get_ai_client, create_message
 
 class AIAssessmentAnalyzer:
     """comprehensive wellness assessment analysis using Anthropic Claude API"""
     
     def __init__(self, api_key: str):
         self.api_key = api_key
-        self.client = Anthropic(api_key=api_key)
+        self.client = get_ai_client(api_key)
     
     async def generate_assessment_report(
         self, 
@@ -43,7 +43,8 @@ class AIAssessmentAnalyzer:
             )
             
             # Call Claude API
-            message = self.client.messages.create(
+            message = await create_message(
+                self.client,
                 model="claude-sonnet-4-20250514",
                 max_tokens=4000,
                 messages=[
@@ -0,0 +1,117 @@
+"""
+AI CACHE - Postgres-backed cache of model results
+Entries are keyed by a SHA-256 over everything that determines the output
+(model, prompt version, rendered prompt, image hash...), so identical
+requests are answered from ai_result_cache and any prompt change simply
+misses. Rows expire after AI_CACHE_TTL_DAYS and the least recently used
+are evicted once the table holds more than AI_CACHE_MAX_MB of results.
+
+The cache is best-effort: if the database is unavailable the model is
+called as normal.
+"""
+import hashlib
+import json
+import os
+import time
+from typing import Optional
+
+from db_pool import get_db_connection
+
+AI_CACHE_ENABLED = os.getenv("AI_CACHE_ENABLED", "true").lower() == "true"
+AI_CACHE_TTL_DAYS = int(os.getenv("AI_CACHE_TTL_DAYS", "30"))
+AI_CACHE_MAX_MB = int(os.getenv("AI_CACHE_MAX_MB", "200"))
+# Seconds between eviction sweeps (per worker)
+AI_CACHE_EVICT_INTERVAL = int(os.getenv("AI_CACHE_EVICT_INTERVAL", "3600"))
+
+_last_eviction = 0.0
+
+
+def make_cache_key(*parts) -> str:
+    """Stable hash of the inputs that determine a model result"""
+    digest = hashlib.sha256()
+    for part in parts:
+        if not isinstance(part, (str, bytes)):
+            part = json.dumps(part, sort_keys=True, default=str)
+        if isinstance(part, str):
+            part = part.encode("utf-8")
+        # Length prefix so ("ab", "c") and ("a", "bc") differ
+        digest.update(len(part).to_bytes(8, "big"))
+        digest.update(part)
+    return digest.hexdigest()
+
+
+async def get_cached(cache_key: str) -> Optional[dict]:
+    """Return the cached result, or None on a miss"""
+    if not AI_CACHE_ENABLED:
+        return None
+    try:
+        async with get_db_connection() as conn:
+            result = await conn.fetchval(
+                """
+                UPDATE ai_result_cache
+                SET hit_count = hit_count + 1, last_hit_at = NOW()
+                WHERE cache_key = $1 AND expires_at > NOW()
+                RETURNING result
+                """,
+                cache_key
+            )
+    except Exception as e:
+        print(f"❌ AI cache read failed: {e}")
+        return None
+    return json.loads(result) if result else None
+
+
+async def put_cached(cache_key: str, kind: str, model: str, prompt_version: str, result: dict):
+    """Store a successful result"""
+    if not AI_CACHE_ENABLED:
+        return
+    payload = json.dumps(result, default=str)
+    try:
+        async with get_db_connection() as conn:
+            await conn.execute(
+                """
+                INSERT INTO ai_result_cache (
+                    cache_key, kind, model, prompt_version, result, size_bytes, expires_at
+                ) VALUES ($1, $2, $3, $4, $5::jsonb, $6, NOW() + make_interval(days => $7))
+                ON CONFLICT (cache_key) DO UPDATE
+                SET result = EXCLUDED.result,
+                    size_bytes = EXCLUDED.size_bytes,
+                    expires_at = EXCLUDED.expires_at,
+                    last_hit_at = NOW()
+                """,
+                cache_key, kind, model, prompt_version, payload, len(payload), AI_CACHE_TTL_DAYS
+            )
+            await _maybe_evict(conn)
+    except Exception as e:
+        print(f"❌ AI cache write failed: {e}")
+
+
+async def _maybe_evict(conn):
+    global _last_eviction
+    if time.monotonic() - _last_eviction < AI_CACHE_EVICT_INTERVAL:
+        return
+    _last_eviction = time.monotonic()
+    await evict(conn)
+
+
+async def evict(conn) -> int:
+    """Drop expired rows, then least recently used rows beyond AI_CACHE_MAX_MB"""
+    expired = await conn.execute("DELETE FROM ai_result_cache WHERE expires_at <= NOW()")
+    oversize = await conn.execute(
+        """
+        DELETE FROM ai_result_cache
+        WHERE cache_key IN (
+            SELECT cache_key FROM (
+                SELECT cache_key,
+                       SUM(size_bytes) OVER (ORDER BY last_hit_at DESC, cache_key) AS running_bytes
+                FROM ai_result_cache
+            ) ranked
+            WHERE running_bytes > $1
+        )
+        """,
+        AI_CACHE_MAX_MB * 1024 * 1024
+    )
+    removed = int(expired.split()[-1]) + int(oversize.split()[-1])
+    if removed:
+        print(f"✅ AI cache evicted {removed} entries")
+    return removed
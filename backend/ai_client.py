@@ -0,0 +1,55 @@
+"""
+AI CLIENT - Shared non-blocking Anthropic client
+One AsyncAnthropic client per API key and worker process, so HTTP
+connections are reused across requests. Every model call goes through
+create_message(), which applies a per-call timeout and caps how many
+calls this worker has in flight at once.
+"""
+import asyncio
+import os
+from typing import Optional
+
+import anthropic
+from dotenv import load_dotenv
+
+load_dotenv()
+
+ANTHROPIC_API_KEY = os.getenv("ANTHROPIC_API_KEY")
+
+# Seconds before a single model call is abandoned
+AI_REQUEST_TIMEOUT = float(os.getenv("AI_REQUEST_TIMEOUT", "120"))
+# SDK-level retries for connection errors / 429 / 5xx
+AI_MAX_RETRIES = int(os.getenv("AI_MAX_RETRIES", "2"))
+# Concurrent model calls allowed per worker
+AI_MAX_CONCURRENCY = int(os.getenv("AI_MAX_CONCURRENCY", "4"))
+
+_clients = {}
+_ai_slots = asyncio.Semaphore(AI_MAX_CONCURRENCY)
+
+
+def get_ai_client(api_key: Optional[str] = None) -> anthropic.AsyncAnthropic:
+    """Return the shared AsyncAnthropic client for this API key"""
+    key = api_key or ANTHROPIC_API_KEY or ""
+    client = _clients.get(key)
+    if client is None:
+        client = anthropic.AsyncAnthropic(
+            api_key=key,
+            timeout=AI_REQUEST_TIMEOUT,
+            max_retries=AI_MAX_RETRIES,
+        )
+        _clients[key] = client
+    return client
+
+
+async def create_message(
+    client: Optional[anthropic.AsyncAnthropic] = None,
+    timeout: Optional[float] = None,
+    **kwargs
+):
+    """Await client.messages.create(**kwargs) within the concurrency limit"""
+    client = client or get_ai_client()
+    async with _ai_slots:
+        return await client.messages.create(
+            timeout=timeout or AI_REQUEST_TIMEOUT,
+            **kwargs
+        )
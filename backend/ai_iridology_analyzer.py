@@ -5,14 +5,14 @@ import base64
 import json
 import os
 from typing import Dict, List, Optional
-from anthropic import Anthropic
+from ai_client import get_ai_client, create_message
 
 class AIIridologyAnalyzer:
     """AI-powered iridology analysis using Anthropic Claude API"""
     
     def __init__(self, api_key: str):
         self.api_key = api_key
-        self.client = Anthropic(api_key=api_key)
+        self.client = get_ai_client(api_key)
         
     async def analyze_iris_images(self, left_eye_image: str, right_eye_image: str, patient_info: Dict) -> Dict:
         """
@@ -69,7 +69,8 @@ class AIIridologyAnalyzer:
             if image_data.startswith('data:image'):
                 image_data = image_data.split(',')[1]
             
-            message = self.client.messages.create(
+            message = await create_message(
+                self.client,
                 model="claude-3-5-sonnet-20241022",
                 max_tokens=2000,
                 messages=[
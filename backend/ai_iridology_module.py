@@ -9,15 +9,14 @@ from pydantic import BaseModel
 from typing import Optional
 import asyncpg
 import json
-import os
 from dotenv import load_dotenv
 load_dotenv()
-import anthropic
+from ai_client import get_ai_client, create_message
 
 router = APIRouter(prefix="/api/v1/iridology", tags=["Iridology"])
 
-# Initialize Anthropic client
-client = anthropic.Anthropic(api_key=os.getenv("ANTHROPIC_API_KEY", ""))
+# Shared async Anthropic client
+client = get_ai_client()
 
 # ============================================================================
 # PYDANTIC MODELS
@@ -82,7 +81,8 @@ Respond in JSON format:
     "recommendations": ["recommendation1", "recommendation2", "recommendation3"]
 }"""
 
-        message = client.messages.create(
+        message = await create_message(
+            client,
             model="claude-sonnet-4-20250514",
             max_tokens=1500,
             messages=[
@@ -0,0 +1,115 @@
+"""
+APPOINTMENT REMINDERS - Scheduled reminder emails for upcoming appointments
+register_reminder_schedule() (called from the app lifespan) runs
+send_appointment_reminders every REMINDER_INTERVAL_MINUTES, once across
+all workers. Each run selects appointments starting within the next
+REMINDER_LEAD_HOURS, across all clinics, with one range query on the
+(appointment_date, appointment_time, id) index from
+migrations/006_keyset_indexes.sql.
+
+Reminders are rendered REMINDER_BATCH_SIZE at a time from the precompiled
+template in email_service and written to email_outbox in one statement.
+The same transaction records a marker per appointment slot in
+appointment_reminders (migrations/009_appointment_reminders.sql); only
+slots whose marker was newly inserted get an email, so reminders are not
+repeated after a restart or when two runs overlap.
+"""
+import os
+from datetime import datetime, timedelta
+
+from db_pool import get_db_connection
+from email_outbox import queue_emails
+from email_service import render_appointment_reminder_email
+from job_queue import job_handler, schedule_job
+
+REMINDER_LEAD_HOURS = float(os.getenv("REMINDER_LEAD_HOURS", "24"))
+REMINDER_INTERVAL_MINUTES = float(os.getenv("REMINDER_INTERVAL_MINUTES", "15"))
+REMINDER_BATCH_SIZE = int(os.getenv("REMINDER_BATCH_SIZE", "200"))
+
+_DUE_REMINDERS_SQL = """
+    SELECT a.id, a.patient_id, a.appointment_date, a.appointment_time,
+           p.first_name, p.last_name, p.email,
+           u.full_name AS practitioner_name
+    FROM appointments a
+    JOIN patients p ON p.id = a.patient_id
+    LEFT JOIN users u ON u.id = a.practitioner_id
+    WHERE a.appointment_date BETWEEN $3 AND $4
+      AND a.appointment_date + a.appointment_time > $1::timestamp
+      AND a.appointment_date + a.appointment_time <= $2::timestamp
+      AND a.status IN ('SCHEDULED', 'CONFIRMED', 'PENDING')
+      AND COALESCE(p.email, '') <> ''
+      AND NOT EXISTS (
+          SELECT 1 FROM appointment_reminders r
+          WHERE r.appointment_id = a.id
+            AND r.appointment_date = a.appointment_date
+            AND r.appointment_time = a.appointment_time
+      )
+    ORDER BY a.appointment_date, a.appointment_time, a.id
+    LIMIT $5
+"""
+
+_CLAIM_SQL = """
+    INSERT INTO appointment_reminders (appointment_id, appointment_date, appointment_time)
+    SELECT * FROM unnest($1::int[], $2::date[], $3::time[])
+    ON CONFLICT DO NOTHING
+    RETURNING appointment_id
+"""
+
+
+def _reminder_message(row) -> dict:
+    appointment_time = row["appointment_time"]
+    email = render_appointment_reminder_email(
+        f"{row['first_name']} {row['last_name']}",
+        row["appointment_date"].strftime('%A, %d %B %Y'),
+        appointment_time.strftime('%H:%M') if hasattr(appointment_time, "strftime") else str(appointment_time),
+        row["practitioner_name"] or "Your practitioner"
+    )
+    return {
+        "to_email": row["email"],
+        "subject": email["subject"],
+        "html_body": email["html"],
+        "text_body": email["text"],
+        "patient_id": row["patient_id"]
+    }
+
+
+async def send_due_reminders(conn, now: datetime = None) -> int:
+    """Queue reminders for appointments in the lead window; returns the number queued"""
+    now = now or datetime.now()
+    until = now + timedelta(hours=REMINDER_LEAD_HOURS)
+    queued = 0
+    while True:
+        # Date bounds are separate parameters: a parameter is typed by its
+        # first use, so reusing $1/$2 as ::date would truncate the window
+        rows = await conn.fetch(_DUE_REMINDERS_SQL, now, until, now.date(), until.date(), REMINDER_BATCH_SIZE)
+        if not rows:
+            break
+        messages = {row["id"]: _reminder_message(row) for row in rows}
+        async with conn.transaction():
+            claimed = await conn.fetch(
+                _CLAIM_SQL,
+                [row["id"] for row in rows],
+                [row["appointment_date"] for row in rows],
+                [row["appointment_time"] for row in rows]
+            )
+            await queue_emails(
+                conn, [messages[r["appointment_id"]] for r in claimed], email_type="appointment_reminder"
+            )
+        queued += len(claimed)
+        if len(rows) < REMINDER_BATCH_SIZE:
+            break
+    if queued:
+        print(f"✅ Queued {queued} appointment reminders")
+    return queued
+
+
+@job_handler("send_appointment_reminders")
+async def _reminders_job(payload: dict) -> dict:
+    async with get_db_connection() as conn:
+        queued = await send_due_reminders(conn)
+    return {"queued": queued}
+
+
+def register_reminder_schedule():
+    """Run send_appointment_reminders every REMINDER_INTERVAL_MINUTES; call before start_job_workers()"""
+    schedule_job("send_appointment_reminders", REMINDER_INTERVAL_MINUTES * 60)
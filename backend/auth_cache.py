@@ -0,0 +1,98 @@
+"""
+AUTH CACHE - Per-worker cache for get_current_user
+Two small LRU maps take authentication off the database on the hot path:
+
+  token string      -> verified claims (so the JWT signature is checked once)
+  (user_id, iat)    -> the user record returned to endpoints
+
+Entries live AUTH_CACHE_TTL seconds. Keying users by the token's issue
+time means a fresh login always reads the database. Changes to a user
+NOTIFY 'celloxen_auth' (migrations/007_auth_invalidation.sql) and every
+worker drops that user; endpoints that change credentials also call
+invalidate_user() directly so their own worker is consistent at once.
+"""
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Optional
+
+from response_cache import subscribe
+
+AUTH_CACHE_TTL = float(os.getenv("AUTH_CACHE_TTL", "30"))
+AUTH_CACHE_MAX_ENTRIES = int(os.getenv("AUTH_CACHE_MAX_ENTRIES", "5000"))
+
+AUTH_CHANNEL = "celloxen_auth"
+
+_tokens: "OrderedDict[str, tuple]" = OrderedDict()   # token -> (expires_at, claims)
+_users: "OrderedDict[tuple, tuple]" = OrderedDict()  # (user_id, iat) -> (expires_at, user)
+_lock = threading.Lock()
+
+
+def _get(entries: OrderedDict, key) -> Optional[dict]:
+    with _lock:
+        entry = entries.get(key)
+        if entry is None:
+            return None
+        if entry[0] <= time.time():
+            del entries[key]
+            return None
+        entries.move_to_end(key)
+        return entry[1]
+
+
+def _put(entries: OrderedDict, key, value: dict, expires_at: float):
+    with _lock:
+        entries[key] = (expires_at, value)
+        entries.move_to_end(key)
+        while len(entries) > AUTH_CACHE_MAX_ENTRIES:
+            entries.popitem(last=False)
+
+
+def get_token_claims(token: str) -> Optional[dict]:
+    return _get(_tokens, token)
+
+
+def store_token_claims(token: str, claims: dict, exp: Optional[float]):
+    """Remember verified claims, never past the token's own expiry"""
+    expires_at = time.time() + AUTH_CACHE_TTL
+    if exp is not None:
+        expires_at = min(expires_at, exp)
+    _put(_tokens, token, claims, expires_at)
+
+
+def get_user(user_id: int, iat) -> Optional[dict]:
+    user = _get(_users, (user_id, iat))
+    return dict(user) if user is not None else None
+
+
+def store_user(user_id: int, iat, user: dict):
+    _put(_users, (user_id, iat), dict(user), time.time() + AUTH_CACHE_TTL)
+
+
+def invalidate_user(user_id: Optional[int] = None, email: Optional[str] = None):
+    """Drop cached records for a user, matched by id and/or email"""
+    with _lock:
+        stale = [
+            key for key, (_, user) in _users.items()
+            if (user_id is not None and key[0] == user_id)
+            or (email is not None and user.get("email") == email)
+        ]
+        for key in stale:
+            del _users[key]
+        if user_id is not None:
+            for token in [t for t, (_, c) in _tokens.items() if c.get("user_id") == user_id]:
+                del _tokens[token]
+
+
+def clear():
+    with _lock:
+        _tokens.clear()
+        _users.clear()
+
+
+def _on_notify(payload: str):
+    invalidate_user(user_id=int(payload))
+
+
+subscribe(AUTH_CHANNEL, _on_notify, clear)
@@ -0,0 +1,160 @@
+"""
+AVAILABILITY - Appointment slot engine for patient self-booking
+Loads the clinic's opening hours, active practitioners and every
+non-cancelled booking in the date range up front (three queries in
+total), then walks the calendar in memory. A slot is free while fewer
+bookings overlap it than the clinic has practitioners.
+"""
+from datetime import date, datetime, time, timedelta
+from typing import Dict, Iterator, List, Optional, Tuple
+
+# Used when a clinic has not saved opening hours: Monday-Friday 09:00-17:00.
+# Keys follow opening_hours.day_of_week (0 = Sunday ... 6 = Saturday).
+DEFAULT_OPENING_HOURS = {
+    day: (day not in (0, 6), time(9, 0), time(17, 0)) for day in range(7)
+}
+
+SLOT_MINUTES = 60
+
+
+def day_of_week(d: date) -> int:
+    """opening_hours numbering (Sunday = 0) from Python's Monday = 0"""
+    return (d.weekday() + 1) % 7
+
+
+def _minutes(t: time) -> int:
+    return t.hour * 60 + t.minute
+
+
+def _booked_intervals(bookings, slot_minutes: int) -> Dict[date, List[Tuple[int, int]]]:
+    """(start, end) minutes of each day's bookings"""
+    intervals: Dict[date, List[Tuple[int, int]]] = {}
+    for booking in bookings:
+        start = _minutes(booking["appointment_time"])
+        end = start + (booking["duration_minutes"] or slot_minutes)
+        intervals.setdefault(booking["appointment_date"], []).append((start, end))
+    return intervals
+
+
+def _overlapping(intervals: List[Tuple[int, int]], start: int, end: int) -> int:
+    """Bookings overlapping [start, end)"""
+    return sum(1 for booked_start, booked_end in intervals if booked_start < end and booked_end > start)
+
+
+def overlap_condition(alias: str, first_param: int, slot_minutes: int = SLOT_MINUTES) -> str:
+    """SQL: booking `alias` overlaps the slot at date $n, time $n+1.
+
+    The same test as _overlapping, on (date + time, duration) ranges; the
+    date bound keeps the appointment_date index usable.
+    """
+    slot_date = f"${first_param}::date"
+    slot_start = f"({slot_date} + ${first_param + 1}::time)"
+    booked_start = f"({alias}.appointment_date + {alias}.appointment_time)"
+    return (
+        f"{alias}.appointment_date BETWEEN {slot_date} - 1 AND {slot_date} "
+        f"AND {booked_start} < {slot_start} + interval '{int(slot_minutes)} minutes' "
+        f"AND {booked_start} + make_interval(mins => COALESCE({alias}.duration_minutes, {int(slot_minutes)})) > {slot_start}"
+    )
+
+
+def iter_free_slots(
+    start_date: date,
+    end_date: date,
+    opening_hours: Dict[int, Tuple[bool, time, time]],
+    bookings,
+    capacity: int,
+    slot_minutes: int = SLOT_MINUTES,
+    not_before: Optional[datetime] = None
+) -> Iterator[dict]:
+    """Yield free slots in date/time order - stop consuming once you have enough"""
+    # Compared per generated slot, so slots need not start on the hour
+    booked = _booked_intervals(bookings, slot_minutes)
+    current_date = start_date
+    while current_date <= end_date:
+        is_open, open_time, close_time = opening_hours.get(
+            day_of_week(current_date), DEFAULT_OPENING_HOURS[day_of_week(current_date)]
+        )
+        if is_open and open_time and close_time:
+            day_bookings = booked.get(current_date, [])
+            slot_start = _minutes(open_time)
+            while slot_start + slot_minutes <= _minutes(close_time):
+                slot_time = time(slot_start // 60, slot_start % 60)
+                taken = _overlapping(day_bookings, slot_start, slot_start + slot_minutes)
+                if taken < capacity and (
+                    not_before is None or datetime.combine(current_date, slot_time) > not_before
+                ):
+                    yield {
+                        "date": str(current_date),
+                        "time": slot_time.strftime("%H:%M:%S"),
+                        "available": True,
+                        "practitioners_available": capacity - taken
+                    }
+                slot_start += slot_minutes
+        current_date += timedelta(days=1)
+
+
+async def load_opening_hours(conn, clinic_id: int) -> Dict[int, Tuple[bool, time, time]]:
+    rows = await conn.fetch(
+        """
+        SELECT day_of_week, is_open, open_time, close_time
+        FROM opening_hours
+        WHERE clinic_id = $1
+        """,
+        clinic_id
+    )
+    if not rows:
+        return dict(DEFAULT_OPENING_HOURS)
+    return {r["day_of_week"]: (r["is_open"], r["open_time"], r["close_time"]) for r in rows}
+
+
+async def load_practitioners(conn, clinic_id: int):
+    return await conn.fetch(
+        """
+        SELECT id, full_name FROM users
+        WHERE clinic_id = $1
+        AND role IN ('clinic_admin', 'clinic_user')
+        AND status = 'active'
+        ORDER BY id
+        """,
+        clinic_id
+    )
+
+
+async def find_available_slots(
+    conn,
+    clinic_id: int,
+    start_date: date,
+    end_date: date,
+    limit: int = 20,
+    practitioners: Optional[List] = None
+) -> List[dict]:
+    """Up to `limit` free slots between start_date and end_date inclusive"""
+    if practitioners is None:
+        practitioners = await load_practitioners(conn, clinic_id)
+    opening_hours = await load_opening_hours(conn, clinic_id)
+    bookings = await conn.fetch(
+        """
+        SELECT appointment_date, appointment_time, duration_minutes
+        FROM appointments
+        WHERE clinic_id = $1
+        AND appointment_date BETWEEN $2 AND $3
+        AND status != 'CANCELLED'
+        """,
+        clinic_id,
+        start_date,
+        end_date
+    )
+
+    slots = []
+    for slot in iter_free_slots(
+        start_date,
+        end_date,
+        opening_hours,
+        bookings,
+        capacity=max(len(practitioners), 1),
+        not_before=datetime.now()
+    ):
+        slots.append(slot)
+        if len(slots) >= limit:
+            break
+    return slots
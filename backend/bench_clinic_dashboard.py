@@ -0,0 +1,146 @@
+#!/usr/bin/env python3
+"""
+Benchmark: clinic dashboard counts - serial COUNTs vs aggregated vs clinic_stats
+Usage: python3 bench_clinic_dashboard.py [--seed-clinics 20 --patients 2000] [--runs 50]
+
+Times the headline counts of /api/v1/clinic/dashboard the old way (one
+fetchval per number), as the single aggregated statement
+(fetch_live_clinic_counts) and from the clinic_stats counters
+(fetch_clinic_counts), and prints p50/p95 per strategy. Seeded rows reach
+clinic_stats through the triggers, so all three see the same data.
+
+--seed-clinics adds synthetic clinics with patients, appointments,
+iridology analyses and invoices inside a transaction that is rolled back
+at the end, so the database is left untouched. Tables whose seed insert
+fails (schema drift) are skipped and reported.
+"""
+
+import argparse
+import asyncio
+import statistics
+import time
+
+import asyncpg
+
+from db_pool import DB_HOST, DB_PORT, DB_USER, DB_PASSWORD, DB_NAME
+from dashboard_stats import fetch_clinic_counts, fetch_live_clinic_counts
+
+LEGACY_QUERIES = [
+    "SELECT COUNT(*) FROM patients WHERE clinic_id = $1",
+    "SELECT COUNT(*) FROM patients WHERE clinic_id = $1 AND status = 'active'",
+    "SELECT COUNT(*) FROM patients WHERE clinic_id = $1 AND created_at >= date_trunc('month', CURRENT_DATE)",
+    "SELECT COUNT(*) FROM users WHERE clinic_id = $1",
+    "SELECT COUNT(*) FROM appointments WHERE clinic_id = $1 AND appointment_date = CURRENT_DATE",
+    "SELECT COUNT(*) FROM appointments WHERE clinic_id = $1 AND appointment_date BETWEEN CURRENT_DATE AND CURRENT_DATE + INTERVAL '7 days'",
+    "SELECT COUNT(*) FROM assessments WHERE clinic_id = $1",
+    "SELECT COUNT(*) FROM assessments WHERE clinic_id = $1 AND status = 'IN_PROGRESS'",
+    "SELECT COUNT(*) FROM assessments WHERE clinic_id = $1 AND status = 'COMPLETED'",
+    "SELECT COUNT(*) FROM iridology_analyses WHERE clinic_id = $1",
+    "SELECT COUNT(*) FROM iridology_analyses WHERE clinic_id = $1 AND status = 'COMPLETED'",
+    "SELECT COUNT(*) FROM patient_invoices WHERE clinic_id = $1 AND status IN ('pending', 'overdue')",
+    "SELECT COALESCE(SUM(amount), 0) FROM patient_invoices WHERE clinic_id = $1 AND status IN ('pending', 'overdue')",
+    "SELECT COUNT(*) FROM patient_invoices WHERE clinic_id = $1 AND status = 'overdue'",
+    "SELECT COALESCE(SUM(amount), 0) FROM patient_invoices WHERE clinic_id = $1 AND status = 'paid' AND paid_at >= date_trunc('month', CURRENT_DATE)",
+]
+
+SEED_STEPS = {
+    "patients": """
+        INSERT INTO patients (patient_number, clinic_id, first_name, last_name, status, portal_access, created_at)
+        SELECT 'BENCH-' || $1 || '-' || g, $1, 'Bench', 'Patient ' || g,
+               CASE WHEN g % 5 = 0 THEN 'inactive' ELSE 'active' END, false,
+               NOW() - (g % 400) * INTERVAL '1 day'
+        FROM generate_series(1, $2) g
+    """,
+    "appointments": """
+        INSERT INTO appointments (clinic_id, patient_id, appointment_date, appointment_time,
+                                  appointment_type, duration_minutes, status, created_at)
+        SELECT $1, p.id, CURRENT_DATE + (p.id % 30) - 15, TIME '09:00' + (p.id % 8) * INTERVAL '1 hour',
+               'CONSULTATION', 60, 'SCHEDULED', NOW()
+        FROM patients p WHERE p.clinic_id = $1 LIMIT $2
+    """,
+    "iridology_analyses": """
+        INSERT INTO iridology_analyses (patient_id, practitioner_id, clinic_id, disclaimer_accepted,
+                                        disclaimer_accepted_at, disclaimer_text, status,
+                                        left_eye_image, right_eye_image, capture_method)
+        SELECT p.id, NULL, $1, true, NOW(), 'bench',
+               CASE WHEN p.id % 3 = 0 THEN 'pending' ELSE 'COMPLETED' END, '', '', 'upload'
+        FROM patients p WHERE p.clinic_id = $1 LIMIT $2 / 4
+    """,
+    "patient_invoices": """
+        INSERT INTO patient_invoices (clinic_id, patient_id, invoice_number, amount, description,
+                                      service_date, due_date, status, notes)
+        SELECT $1, p.id, 'BENCH-' || $1 || '-' || p.id, 45.00, 'bench', CURRENT_DATE, CURRENT_DATE + 30,
+               (ARRAY['pending', 'paid', 'overdue'])[1 + p.id % 3], 'bench'
+        FROM patients p WHERE p.clinic_id = $1 LIMIT $2 / 2
+    """,
+}
+
+
+async def legacy_counts(conn, clinic_id):
+    return [await conn.fetchval(sql, clinic_id) for sql in LEGACY_QUERIES]
+
+
+async def seed(conn, clinics: int, patients: int):
+    clinic_ids = []
+    for n in range(clinics):
+        clinic_ids.append(await conn.fetchval(
+            """
+            INSERT INTO clinics (name, address, phone, email, status, created_at)
+            VALUES ($1, 'Bench', '000', $2, 'active', NOW()) RETURNING id
+            """,
+            f"Bench Clinic {n}", f"bench{n}@example.invalid"
+        ))
+    for table, sql in SEED_STEPS.items():
+        try:
+            async with conn.transaction():  # savepoint
+                for clinic_id in clinic_ids:
+                    await conn.execute(sql, clinic_id, patients)
+            print(f"✅ Seeded {table}")
+        except Exception as e:
+            print(f"⚠️ Skipped seeding {table}: {e}")
+    return clinic_ids
+
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))]
+
+
+async def main(args):
+    conn = await asyncpg.connect(
+        host=DB_HOST, port=int(DB_PORT), user=DB_USER, password=DB_PASSWORD, database=DB_NAME
+    )
+    tx = conn.transaction()
+    await tx.start()
+    try:
+        if args.seed_clinics:
+            clinic_ids = await seed(conn, args.seed_clinics, args.patients)
+            await conn.execute("ANALYZE")
+        else:
+            clinic_ids = [r["id"] for r in await conn.fetch("SELECT id FROM clinics ORDER BY id")]
+
+        print(f"\n{len(clinic_ids)} clinics, {args.runs} runs each\n")
+        print(f"{'strategy':<12} {'round trips':>11} {'p50 ms':>8} {'p95 ms':>8}")
+        for name, strategy, trips in (
+            ("serial", legacy_counts, len(LEGACY_QUERIES)),
+            ("aggregated", fetch_live_clinic_counts, 1),
+            ("counters", fetch_clinic_counts, 2),
+        ):
+            timings = []
+            for _ in range(args.runs):
+                for clinic_id in clinic_ids:
+                    start = time.perf_counter()
+                    await strategy(conn, clinic_id)
+                    timings.append((time.perf_counter() - start) * 1000)
+            print(f"{name:<12} {trips:>11} {statistics.median(timings):>8.2f} {percentile(timings, 95):>8.2f}")
+    finally:
+        await tx.rollback()
+        await conn.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Clinic dashboard count benchmark")
+    parser.add_argument("--seed-clinics", type=int, default=0)
+    parser.add_argument("--patients", type=int, default=2000, help="Patients per seeded clinic")
+    parser.add_argument("--runs", type=int, default=50)
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,127 @@
+#!/usr/bin/env python3
+"""
+Benchmark: appointment reminder rendering - f-strings vs precompiled templates
+Usage: python3 bench_email_templates.py [--emails 10000] [--runs 5]
+
+Renders a batch of reminder emails (distinct patients, a handful of
+practitioners and dates, as in a day's reminder run) the old way, with the
+reminder body and the whole base layout rebuilt by f-strings per email,
+with the same f-strings plus CSS inlining and a plain-text part done per
+email, and with the precompiled APPOINTMENT_REMINDER_EMAIL template from
+email_service, which does the inlining and text conversion once and per
+email only escapes and fills in the fields (html, text and subject).
+No database or SMTP is touched.
+"""
+
+import argparse
+import statistics
+import time
+from datetime import date, timedelta
+
+from email_render import html_to_text, inline_css
+from email_service import APPOINTMENT_REMINDER_EMAIL, PORTAL_LAYOUT
+
+# get_email_base_template() was one f-string over the layout with {content} in it
+_LAYOUT_HEAD, _LAYOUT_TAIL = PORTAL_LAYOUT.source.split("$content")
+
+
+def legacy_base_template(content: str) -> str:
+    return f"{_LAYOUT_HEAD}{content}{_LAYOUT_TAIL}"
+
+
+def legacy_reminder(patient_name, appointment_date, appointment_time, practitioner_name):
+    content = f"""
+        <h2>Appointment Reminder 📅</h2>
+        <p>Dear {patient_name},</p>
+        <p>This is a friendly reminder about your upcoming appointment at Aberdeen Wellness Centre.</p>
+        
+        <div class="info-box">
+            <strong>Appointment Details:</strong><br>
+            Date: {appointment_date}<br>
+            Time: {appointment_time}<br>
+            Practitioner: {practitioner_name}<br>
+            Location: Aberdeen Wellness Centre
+        </div>
+        
+        <p><strong>Please remember:</strong></p>
+        <ul>
+            <li>Arrive 10 minutes early</li>
+            <li>Bring any relevant medical records</li>
+            <li>Contact us if you need to reschedule</li>
+        </ul>
+        
+        <p style="text-align: center;">
+            <a href="http://celloxen.com/patient_portal.html" class="button">View in Portal</a>
+        </p>
+        
+        <p>We look forward to seeing you!</p>
+        <p>Best regards,<br><strong>Aberdeen Wellness Centre Team</strong></p>
+    """
+    html = legacy_base_template(content)
+    subject = f"Appointment Reminder - {appointment_date}"
+    return subject, html
+
+
+def make_reminders(count: int):
+    practitioners = ["Dr Sarah Mitchell", "Dr James O'Connor", "Dr Priya Shah", "Dr Tom Reid & Partners"]
+    start = date.today() + timedelta(days=1)
+    return [
+        (
+            f"Patient {i} Test-{i % 97}",
+            (start + timedelta(days=i % 3)).strftime('%A, %d %B %Y'),
+            f"{9 + i % 8:02d}:{(i % 4) * 15:02d}",
+            practitioners[i % len(practitioners)]
+        )
+        for i in range(count)
+    ]
+
+
+def render_legacy(reminders):
+    return [legacy_reminder(*r) for r in reminders]
+
+
+def render_legacy_with_text(reminders):
+    emails = []
+    for reminder in reminders:
+        subject, html = legacy_reminder(*reminder)
+        html = inline_css(html)
+        emails.append((subject, html, html_to_text(html)))
+    return emails
+
+
+def render_compiled(reminders):
+    return [
+        APPOINTMENT_REMINDER_EMAIL.render(
+            patient_name=name, appointment_date=day, appointment_time=at, practitioner_name=practitioner
+        )
+        for name, day, at, practitioner in reminders
+    ]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Email template rendering benchmark")
+    parser.add_argument("--emails", type=int, default=10000)
+    parser.add_argument("--runs", type=int, default=5)
+    args = parser.parse_args()
+
+    reminders = make_reminders(args.emails)
+    print(f"Rendering {args.emails:,} appointment reminders, {args.runs} runs\n")
+    print(f"{'method':28} {'median':>10} {'emails/s':>12} {'html bytes':>11}")
+
+    for label, render in (
+        ("f-strings (html only)", render_legacy),
+        ("f-strings + inline + text", render_legacy_with_text),
+        ("precompiled (html + text)", render_compiled),
+    ):
+        timings = []
+        for _ in range(args.runs):
+            start = time.perf_counter()
+            emails = render(reminders)
+            timings.append(time.perf_counter() - start)
+        median = statistics.median(timings)
+        sample = emails[0][1] if isinstance(emails[0], tuple) else emails[0]["html"]
+        print(f"{label:28} {median * 1000:>8.1f}ms {args.emails / median:>12,.0f} {len(sample):>11,}")
+
+
+if __name__ == "__main__":
+    main()
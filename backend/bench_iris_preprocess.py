@@ -0,0 +1,129 @@
+#!/usr/bin/env python3
+"""
+Benchmark: iris image payload and latency before/after preprocessing
+Usage: python3 bench_iris_preprocess.py [image ...] [--live]
+
+With no images, a synthetic 4032x3024 phone-style capture is generated.
+Reports encoded size, base64 payload, estimated image tokens
+(width * height / 750, after Claude's own downscaling) and preprocessing
+time. --live also times a real model call with each version
+(needs ANTHROPIC_API_KEY).
+"""
+
+import argparse
+import asyncio
+import base64
+import os
+import statistics
+import tempfile
+import time
+
+from PIL import Image, ImageDraw
+
+import image_preprocess
+from image_preprocess import preprocess_file
+
+
+def synthetic_capture(path: str, size=(4032, 3024)):
+    """Eye-like test image: skin background, iris and pupil off-centre"""
+    img = Image.new("RGB", size, (205, 160, 140))
+    draw = ImageDraw.Draw(img)
+    cx, cy = int(size[0] * 0.55), int(size[1] * 0.48)
+    r = int(min(size) * 0.3)
+    draw.ellipse((cx - r * 1.6, cy - r, cx + r * 1.6, cy + r), fill=(240, 240, 235))
+    for i in range(r, 0, -4):
+        shade = 60 + (i * 90) // r
+        draw.ellipse((cx - i, cy - i, cx + i, cy + i), fill=(shade // 2, shade, shade + 20))
+    draw.ellipse((cx - r // 3, cy - r // 3, cx + r // 3, cy + r // 3), fill=(8, 8, 8))
+    # Sensor noise so the JPEG size is realistic
+    noise = Image.effect_noise(size, 24).convert("RGB")
+    img = Image.blend(img, noise, 0.12)
+    img.save(path, "JPEG", quality=95)
+
+
+def estimated_tokens(width: int, height: int) -> int:
+    # Claude scales anything over 1568px on the long edge down first
+    scale = min(1.0, 1568 / max(width, height))
+    return int((width * scale) * (height * scale) / 750)
+
+
+def describe(path: str):
+    with Image.open(path) as img:
+        width, height = img.size
+    size = os.path.getsize(path)
+    return {
+        "bytes": size,
+        "base64": len(base64.b64encode(open(path, "rb").read())),
+        "dims": f"{width}x{height}",
+        "tokens": estimated_tokens(width, height),
+    }
+
+
+async def time_model_call(path: str, media_type: str) -> float:
+    from ai_client import create_message
+    with open(path, "rb") as f:
+        data = base64.b64encode(f.read()).decode("ascii")
+    start = time.perf_counter()
+    await create_message(
+        model="claude-sonnet-4-20250514",
+        max_tokens=20,
+        messages=[{
+            "role": "user",
+            "content": [
+                {"type": "text", "text": "Reply with the iris colour in one word."},
+                {"type": "image", "source": {"type": "base64", "media_type": media_type, "data": data}},
+            ],
+        }],
+    )
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Iris preprocessing benchmark")
+    parser.add_argument("images", nargs="*")
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--live", action="store_true", help="Also time real model calls")
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="iris-bench-")
+    images = args.images
+    if not images:
+        synthetic = os.path.join(workdir, "synthetic.jpg")
+        synthetic_capture(synthetic)
+        images = [synthetic]
+
+    fmt = image_preprocess.IRIS_IMAGE_FORMAT
+    print(f"Settings: max edge {image_preprocess.IRIS_MAX_EDGE}px, {fmt} q{image_preprocess.IRIS_IMAGE_QUALITY}, "
+          f"crop {image_preprocess.IRIS_CROP_FRACTION:g}\n")
+
+    for source in images:
+        output = os.path.join(workdir, f"out.{fmt.lower()}")
+        timings = []
+        for _ in range(args.runs):
+            start = time.perf_counter()
+            preprocess_file(
+                source, output,
+                image_preprocess.IRIS_MAX_EDGE, fmt,
+                image_preprocess.IRIS_IMAGE_QUALITY, image_preprocess.IRIS_CROP_FRACTION
+            )
+            timings.append(time.perf_counter() - start)
+
+        before, after = describe(source), describe(output)
+        print(f"📷 {os.path.basename(source)}")
+        print(f"   {'':10} {'dims':>11} {'bytes':>11} {'base64':>11} {'~tokens':>8}")
+        for label, d in (("original", before), ("processed", after)):
+            print(f"   {label:10} {d['dims']:>11} {d['bytes']:>11,} {d['base64']:>11,} {d['tokens']:>8,}")
+        print(f"   payload reduction: {100 * (1 - after['base64'] / before['base64']):.1f}%")
+        print(f"   preprocess time: median {statistics.median(timings) * 1000:.0f} ms "
+              f"(min {min(timings) * 1000:.0f} ms, {args.runs} runs)")
+
+        if args.live:
+            original_type = "image/png" if source.lower().endswith(".png") else "image/jpeg"
+            latency_before = asyncio.run(time_model_call(source, original_type))
+            latency_after = asyncio.run(time_model_call(output, image_preprocess._MEDIA_TYPES[fmt]))
+            print(f"   model latency: original {latency_before:.2f}s, processed {latency_after:.2f}s")
+        print()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,93 @@
+#!/usr/bin/env python3
+"""
+Benchmark: therapy session inserts - per-row vs executemany vs COPY
+Usage: python3 bench_therapy_sessions.py [--sessions 16 100 250] [--runs 5]
+
+Inserts a plan's worth of therapy_sessions rows into a TEMP copy of the
+table (no foreign keys, nothing persisted) using the old one-INSERT-per-
+session loop, the batched executemany used by create_therapy_assignment,
+and copy_records_to_table for comparison.
+"""
+
+import argparse
+import asyncio
+import statistics
+import time
+from datetime import date, datetime, time as dt_time, timedelta
+
+import asyncpg
+
+from db_pool import DB_HOST, DB_PORT, DB_USER, DB_PASSWORD, DB_NAME
+
+INSERT_SQL = """
+    INSERT INTO bench_therapy_sessions (
+        session_number, therapy_plan_item_id, clinic_id, patient_id,
+        session_sequence, total_sessions, scheduled_date, scheduled_time,
+        duration_minutes, status, created_at, created_by
+    ) VALUES ($1, $2, $3, $4, $5, $6, $7, $8, $9, $10, NOW(), $11)
+"""
+COLUMNS = [
+    "session_number", "therapy_plan_item_id", "clinic_id", "patient_id",
+    "session_sequence", "total_sessions", "scheduled_date", "scheduled_time",
+    "duration_minutes", "status", "created_at", "created_by"
+]
+
+
+def make_rows(num_sessions: int, run: int):
+    start = date.today()
+    return [
+        (f"TS-B{run}-{str(i + 1).zfill(3)}", 0, 1, 0, i + 1, num_sessions,
+         start + timedelta(days=i), dt_time(10, 0), 30, "SCHEDULED", 1)
+        for i in range(num_sessions)
+    ]
+
+
+async def per_row(conn, rows):
+    for row in rows:
+        await conn.execute(INSERT_SQL, *row)
+
+
+async def batched(conn, rows):
+    async with conn.transaction():
+        await conn.executemany(INSERT_SQL, rows)
+
+
+async def copy(conn, rows):
+    now = datetime.now()
+    records = [row[:10] + (now, row[10]) for row in rows]
+    async with conn.transaction():
+        await conn.copy_records_to_table("bench_therapy_sessions", records=records, columns=COLUMNS)
+
+
+async def main(sizes, runs):
+    conn = await asyncpg.connect(
+        host=DB_HOST, port=int(DB_PORT), user=DB_USER, password=DB_PASSWORD, database=DB_NAME
+    )
+    try:
+        await conn.execute(
+            "CREATE TEMP TABLE bench_therapy_sessions (LIKE therapy_sessions INCLUDING DEFAULTS)"
+        )
+        print(f"{'sessions':>8} {'per-row ms':>11} {'executemany ms':>15} {'COPY ms':>9} {'speed-up':>9}")
+        for size in sizes:
+            results = {}
+            for name, strategy in (("per_row", per_row), ("batched", batched), ("copy", copy)):
+                timings = []
+                for run in range(runs):
+                    await conn.execute("TRUNCATE bench_therapy_sessions")
+                    rows = make_rows(size, run)
+                    start = time.perf_counter()
+                    await strategy(conn, rows)
+                    timings.append((time.perf_counter() - start) * 1000)
+                results[name] = statistics.median(timings)
+            print(f"{size:>8} {results['per_row']:>11.1f} {results['batched']:>15.1f} "
+                  f"{results['copy']:>9.1f} {results['per_row'] / results['batched']:>8.1f}x")
+    finally:
+        await conn.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Therapy session insert benchmark")
+    parser.add_argument("--sessions", type=int, nargs="+", default=[16, 100, 250])
+    parser.add_argument("--runs", type=int, default=5)
+    args = parser.parse_args()
+    asyncio.run(main(args.sessions, args.runs))
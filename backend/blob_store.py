@@ -0,0 +1,393 @@
+"""
+BLOB STORE - Content-addressed file storage for uploaded images
+Blobs are stored decoded (not base64) under BLOB_STORE_DIR, named by the
+SHA-256 of their bytes, so identical uploads share one file and a key
+never changes meaning. Database rows keep only the 64-character key.
+
+Files are written to a temp file and renamed into place, so readers never
+see a partial blob. Storing content that already exists only refreshes the
+file's mtime; blob_sweep.py deletes blobs no row refers to once their
+mtime is older than its grace period. Apart from save_multipart_upload(), functions here do
+blocking file IO - call them via asyncio.to_thread() from async handlers.
+"""
+import asyncio
+import base64
+import binascii
+import hashlib
+import os
+import re
+import tempfile
+from typing import Dict, Iterable, Iterator, List, Optional, Set, Tuple
+
+from fastapi import HTTPException, Request
+from fastapi.responses import Response, StreamingResponse
+from multipart.multipart import MultipartParser, parse_options_header
+
+BLOB_STORE_DIR = os.getenv(
+    "BLOB_STORE_DIR",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "blob_store")
+)
+BLOB_CHUNK_SIZE = 64 * 1024
+# Largest single blob accepted (phone captures are typically 2-6 MB)
+BLOB_MAX_BYTES = int(os.getenv("BLOB_MAX_BYTES", str(15 * 1024 * 1024)))
+
+IMAGE_TYPES = {"image/jpeg", "image/png", "image/webp", "image/gif"}
+
+_KEY_RE = re.compile(r"^[0-9a-f]{64}$")
+_RANGE_RE = re.compile(r"^bytes=(\d*)-(\d*)$")
+
+
+def decode_data_url(value: str) -> bytes:
+    """Decode a `data:image/...;base64,` URL (or bare base64) to bytes"""
+    if value.startswith("data:"):
+        value = value.split(",", 1)[-1]
+    try:
+        return base64.b64decode(value, validate=True)
+    except (binascii.Error, ValueError):
+        raise ValueError("Image is not valid base64")
+
+
+def blob_path(key: str) -> str:
+    """Filesystem path for a key - ab/cd/abcd... keeps directories small"""
+    if not _KEY_RE.match(key or ""):
+        raise ValueError(f"Invalid blob key: {key!r}")
+    return os.path.join(BLOB_STORE_DIR, key[:2], key[2:4], key)
+
+
+class BlobTooLarge(ValueError):
+    """Upload exceeded BLOB_MAX_BYTES"""
+
+
+def _sniff(head: bytes) -> str:
+    if head.startswith(b"\xff\xd8\xff"):
+        return "image/jpeg"
+    if head.startswith(b"\x89PNG\r\n\x1a\n"):
+        return "image/png"
+    if head[:4] == b"RIFF" and head[8:12] == b"WEBP":
+        return "image/webp"
+    if head[:6] in (b"GIF87a", b"GIF89a"):
+        return "image/gif"
+    return "application/octet-stream"
+
+
+class BlobWriter:
+    """Write one blob incrementally.
+
+    Bytes go to a temp file while being hashed; the size cap and allowed
+    content types are checked as data arrives, so a bad upload is rejected
+    after its first few bytes rather than after it has all been received.
+    """
+
+    def __init__(self, max_bytes: int = BLOB_MAX_BYTES, content_types: Optional[Set[str]] = None):
+        self.max_bytes = max_bytes
+        self.content_types = content_types
+        self.size = 0
+        # Set by commit(): False when identical content was already stored
+        self.created = False
+        self._head = b""
+        self._checked = False
+        self._hash = hashlib.sha256()
+        os.makedirs(BLOB_STORE_DIR, exist_ok=True)
+        fd, self._tmp_path = tempfile.mkstemp(dir=BLOB_STORE_DIR, prefix=".tmp-")
+        self._file = os.fdopen(fd, "wb")
+
+    def _check_type(self):
+        self._checked = True
+        if self.content_types and _sniff(self._head) not in self.content_types:
+            raise ValueError("Unsupported image format - use JPEG, PNG, WebP or GIF")
+
+    def write(self, data: bytes):
+        self.size += len(data)
+        if self.size > self.max_bytes:
+            raise BlobTooLarge(f"File exceeds {self.max_bytes // (1024 * 1024)} MB limit")
+        if not self._checked:
+            self._head += data[:12 - len(self._head)]
+            if len(self._head) >= 12:
+                self._check_type()
+        self._hash.update(data)
+        self._file.write(data)
+
+    def commit(self) -> str:
+        """Move the temp file into place and return the key"""
+        if self.size == 0:
+            raise ValueError("Cannot store an empty blob")
+        if not self._checked:
+            self._check_type()
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        self._file.close()
+
+        key = self._hash.hexdigest()
+        path = blob_path(key)
+        if os.path.exists(path):
+            os.unlink(self._tmp_path)
+            # Restart the sweep's grace period for the row about to use it
+            os.utime(path)
+        else:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            os.replace(self._tmp_path, path)
+            self.created = True
+        return key
+
+    def abort(self):
+        """Discard a partial blob"""
+        if not self._file.closed:
+            self._file.close()
+        if os.path.exists(self._tmp_path):
+            os.unlink(self._tmp_path)
+
+
+def put_blob(data: bytes, content_types: Optional[Set[str]] = None) -> str:
+    """Store bytes and return their key; existing content is not rewritten"""
+    writer = BlobWriter(content_types=content_types)
+    try:
+        writer.write(data)
+        return writer.commit()
+    except Exception:
+        writer.abort()
+        raise
+
+
+def put_data_url(value: str) -> str:
+    """Decode a base64 data URL and store it as an image"""
+    return put_blob(decode_data_url(value), IMAGE_TYPES)
+
+
+def delete_blob(key: str):
+    """Remove a blob; callers must make sure no row still refers to it"""
+    try:
+        os.unlink(blob_path(key))
+    except FileNotFoundError:
+        pass
+
+
+def iter_blob_keys(older_than: float) -> Iterator[str]:
+    """Keys of blobs whose mtime is before older_than (a time.time() value)"""
+    for first in sorted(os.listdir(BLOB_STORE_DIR)) if os.path.isdir(BLOB_STORE_DIR) else ():
+        # Only the ab/cd/ fan-out holds blobs (not derived/, reports/ or temp files)
+        if len(first) != 2 or not os.path.isdir(os.path.join(BLOB_STORE_DIR, first)):
+            continue
+        for second in sorted(os.listdir(os.path.join(BLOB_STORE_DIR, first))):
+            directory = os.path.join(BLOB_STORE_DIR, first, second)
+            if not os.path.isdir(directory):
+                continue
+            for entry in os.scandir(directory):
+                if _KEY_RE.match(entry.name) and entry.stat().st_mtime < older_than:
+                    yield entry.name
+
+
+def delete_blob_if_older(key: str, older_than: float) -> bool:
+    """delete_blob() unless the blob was stored again since older_than"""
+    try:
+        if os.path.getmtime(blob_path(key)) >= older_than:
+            return False
+    except FileNotFoundError:
+        return False
+    delete_blob(key)
+    return True
+
+
+def blob_size(key: str) -> int:
+    return os.path.getsize(blob_path(key))
+
+
+def read_blob(key: str) -> bytes:
+    with open(blob_path(key), "rb") as f:
+        return f.read()
+
+
+def read_blob_base64(key: str) -> str:
+    """Blob as bare base64, the form the Claude image API takes"""
+    return base64.b64encode(read_blob(key)).decode("ascii")
+
+
+def sniff_content_type(key: str) -> str:
+    """Image type from the file's magic bytes"""
+    with open(blob_path(key), "rb") as f:
+        return _sniff(f.read(12))
+
+
+def iter_blob(key: str, start: int = 0, end: Optional[int] = None) -> Iterator[bytes]:
+    """Yield bytes start..end (inclusive) in BLOB_CHUNK_SIZE pieces"""
+    with open(blob_path(key), "rb") as f:
+        f.seek(start)
+        remaining = None if end is None else end - start + 1
+        while remaining is None or remaining > 0:
+            chunk = f.read(BLOB_CHUNK_SIZE if remaining is None else min(BLOB_CHUNK_SIZE, remaining))
+            if not chunk:
+                break
+            if remaining is not None:
+                remaining -= len(chunk)
+            yield chunk
+
+
+def _parse_range(header: str, size: int):
+    """Return (start, end) for a single `bytes=` range, or None to send the whole blob"""
+    match = _RANGE_RE.match(header.strip())
+    if not match:
+        return None  # multi-range or unknown unit: full response is allowed
+    first, last = match.groups()
+    if not first and not last:
+        return None
+    if not first:
+        # Suffix range: last N bytes
+        length = int(last)
+        if length == 0:
+            raise HTTPException(status_code=416, headers={"Content-Range": f"bytes */{size}"})
+        return max(size - length, 0), size - 1
+    start = int(first)
+    end = min(int(last), size - 1) if last else size - 1
+    if start >= size or start > end:
+        raise HTTPException(status_code=416, headers={"Content-Range": f"bytes */{size}"})
+    return start, end
+
+
+def blob_response(key: str, headers, content_type: Optional[str] = None) -> Response:
+    """Serve a blob honouring If-None-Match and Range/If-Range request headers.
+
+    The key is the content hash, so it doubles as a strong ETag and the
+    response can be cached indefinitely (privately - these are patient images).
+    """
+    try:
+        size = blob_size(key)
+    except (FileNotFoundError, ValueError):
+        raise HTTPException(status_code=404, detail="Image not found")
+
+    etag = f'"{key}"'
+    response_headers = {
+        "ETag": etag,
+        "Accept-Ranges": "bytes",
+        "Cache-Control": "private, max-age=31536000, immutable",
+    }
+
+    if_none_match = headers.get("if-none-match")
+    if if_none_match and (if_none_match.strip() == "*" or etag in [t.strip() for t in if_none_match.split(",")]):
+        return Response(status_code=304, headers=response_headers)
+
+    media_type = content_type or sniff_content_type(key)
+    byte_range = None
+    range_header = headers.get("range")
+    if range_header and headers.get("if-range", etag) == etag:
+        byte_range = _parse_range(range_header, size)
+
+    if byte_range is None:
+        response_headers["Content-Length"] = str(size)
+        return StreamingResponse(iter_blob(key), media_type=media_type, headers=response_headers)
+
+    start, end = byte_range
+    response_headers["Content-Range"] = f"bytes {start}-{end}/{size}"
+    response_headers["Content-Length"] = str(end - start + 1)
+    return StreamingResponse(
+        iter_blob(key, start, end),
+        status_code=206,
+        media_type=media_type,
+        headers=response_headers
+    )
+
+
+# ============================================================================
+# STREAMING MULTIPART UPLOADS
+# ============================================================================
+
+MAX_FORM_FIELD_BYTES = 4096
+
+
+async def save_multipart_upload(
+    request: Request,
+    file_fields: Iterable[str],
+    content_types: Optional[Set[str]] = IMAGE_TYPES,
+    max_bytes: int = BLOB_MAX_BYTES
+) -> Tuple[Dict[str, str], Dict[str, str]]:
+    """Stream a multipart/form-data body into the blob store.
+
+    Parts named in file_fields are written chunk by chunk to BlobWriters;
+    any other part is a small text field. Returns ({field: blob_key},
+    {field: text}). Raises BlobTooLarge / ValueError for bad uploads, after
+    removing the blobs this upload had already created.
+    """
+    _, params = parse_options_header(request.headers.get("content-type", ""))
+    boundary = params.get(b"boundary")
+    if not boundary:
+        raise ValueError("Missing multipart boundary")
+
+    file_fields = set(file_fields)
+    blob_keys: Dict[str, str] = {}
+    created: List[str] = []
+    form: Dict[str, str] = {}
+    state = {"header_field": b"", "header_value": b"", "headers": {}, "name": None, "writer": None, "text": b""}
+
+    def on_part_begin():
+        state.update(headers={}, name=None, writer=None, text=b"")
+
+    def on_header_field(data, start, end):
+        state["header_field"] += data[start:end]
+
+    def on_header_value(data, start, end):
+        state["header_value"] += data[start:end]
+
+    def on_header_end():
+        state["headers"][state["header_field"].lower()] = state["header_value"]
+        state.update(header_field=b"", header_value=b"")
+
+    def on_headers_finished():
+        _, options = parse_options_header(state["headers"].get(b"content-disposition", b""))
+        name = options.get(b"name", b"").decode("latin-1")
+        state["name"] = name
+        if name in file_fields:
+            state["writer"] = BlobWriter(max_bytes=max_bytes, content_types=content_types)
+
+    def on_part_data(data, start, end):
+        if state["writer"] is not None:
+            state["writer"].write(data[start:end])
+        else:
+            state["text"] += data[start:end]
+            if len(state["text"]) > MAX_FORM_FIELD_BYTES:
+                raise BlobTooLarge(f"Form field '{state['name']}' is too large")
+
+    def on_part_end():
+        writer = state["writer"]
+        if writer is not None:
+            state["writer"] = None
+            try:
+                blob_keys[state["name"]] = writer.commit()
+                if writer.created:
+                    created.append(blob_keys[state["name"]])
+            except Exception:
+                writer.abort()
+                raise
+        elif state["name"]:
+            form[state["name"]] = state["text"].decode("utf-8", errors="replace")
+
+    parser = MultipartParser(boundary, {
+        "on_part_begin": on_part_begin,
+        "on_part_data": on_part_data,
+        "on_part_end": on_part_end,
+        "on_header_field": on_header_field,
+        "on_header_value": on_header_value,
+        "on_header_end": on_header_end,
+        "on_headers_finished": on_headers_finished,
+    })
+
+    # Whole body may not exceed every file at its cap plus form overhead
+    body_limit = len(file_fields) * max_bytes + 64 * 1024
+    received = 0
+    try:
+        async for chunk in request.stream():
+            received += len(chunk)
+            if received > body_limit:
+                raise BlobTooLarge("Upload is too large")
+            if chunk:
+                # Parser callbacks write to disk, so run them off the event loop
+                await asyncio.to_thread(parser.write, chunk)
+        parser.finalize()
+    except Exception:
+        if state["writer"] is not None:
+            state["writer"].abort()
+        # Blobs that existed before this upload may belong to other rows, so
+        # only the ones it created go (an identical upload racing this one
+        # could have deduplicated onto them - see discard_iris_blobs)
+        for key in created:
+            await asyncio.to_thread(delete_blob, key)
+        raise
+
+    return blob_keys, form
@@ -0,0 +1,71 @@
+"""
+BLOB SWEEP - Scheduled removal of iris image blobs nothing refers to
+Blobs are content-addressed and shared between rows, so a replaced or
+rejected upload cannot simply delete its file. register_blob_sweep_schedule()
+(called from the app lifespan) instead runs sweep_blobs every
+BLOB_SWEEP_INTERVAL_HOURS, once across all workers. Each run lists blobs
+older than BLOB_SWEEP_GRACE_HOURS, reads the keys iridology_analyses
+still references, and deletes the rest together with their preprocessed
+copies under derived/.
+
+The grace period covers uploads between storing a blob and the UPDATE
+that records its key. Storing identical content again refreshes the
+blob's mtime (BlobWriter.commit), and the mtime is checked once more just
+before each delete, so a blob re-uploaded during a run is kept.
+"""
+import asyncio
+import glob
+import os
+import time
+
+from blob_store import delete_blob_if_older, iter_blob_keys
+from db_pool import get_db_connection
+from image_preprocess import DERIVED_DIR
+from job_queue import job_handler, schedule_job
+
+BLOB_SWEEP_INTERVAL_HOURS = float(os.getenv("BLOB_SWEEP_INTERVAL_HOURS", "24"))
+BLOB_SWEEP_GRACE_HOURS = float(os.getenv("BLOB_SWEEP_GRACE_HOURS", "24"))
+
+
+def _delete_unreferenced(keys, older_than: float) -> int:
+    deleted = 0
+    for key in keys:
+        if delete_blob_if_older(key, older_than):
+            deleted += 1
+            for derived in glob.glob(os.path.join(DERIVED_DIR, key[:2], f"{key}_*")):
+                try:
+                    os.unlink(derived)
+                except FileNotFoundError:
+                    pass
+    return deleted
+
+
+async def sweep_blobs() -> int:
+    """Delete unreferenced blobs older than the grace period; returns the number deleted"""
+    cutoff = time.time() - BLOB_SWEEP_GRACE_HOURS * 3600
+    candidates = await asyncio.to_thread(lambda: list(iter_blob_keys(cutoff)))
+    if not candidates:
+        return 0
+    async with get_db_connection() as conn:
+        rows = await conn.fetch("""
+            SELECT left_eye_blob_key, right_eye_blob_key
+            FROM iridology_analyses
+            WHERE left_eye_blob_key IS NOT NULL OR right_eye_blob_key IS NOT NULL
+        """)
+    in_use = {key for row in rows for key in row if key}
+    deleted = await asyncio.to_thread(
+        _delete_unreferenced, [key for key in candidates if key not in in_use], cutoff
+    )
+    if deleted:
+        print(f"✅ Blob sweep removed {deleted} unreferenced blobs")
+    return deleted
+
+
+@job_handler("sweep_blobs")
+async def _sweep_job(payload: dict) -> dict:
+    return {"deleted": await sweep_blobs()}
+
+
+def register_blob_sweep_schedule():
+    """Run sweep_blobs every BLOB_SWEEP_INTERVAL_HOURS; call before start_job_workers()"""
+    schedule_job("sweep_blobs", BLOB_SWEEP_INTERVAL_HOURS * 3600)
@@ -3,6 +3,8 @@ Celloxen Assessment System - Core Logic
 Handles questionnaire scoring, therapy recommendations, and iridology integration
 """
 
+from question_bank import build_bank
+
 # 5 Celloxen Therapy Domains with 7 Questions Each
 ASSESSMENT_QUESTIONS = {
     "c102_vitality_energy": {
@@ -286,6 +288,12 @@ ASSESSMENT_QUESTIONS = {
     }
 }
 
+# Frozen, indexed view of ASSESSMENT_QUESTIONS used for scoring
+QUESTION_BANK = build_bank(
+    "celloxen_assessment",
+    {domain: info["questions"] for domain, info in ASSESSMENT_QUESTIONS.items()}
+)
+
 # Therapy Protocol Specifications
 THERAPY_PROTOCOLS = {
     "C-102": {
@@ -360,7 +368,7 @@ def calculate_assessment_score(domain, responses):
     Calculate score for a specific domain based on responses
     Returns: dict with score, severity, and analysis
     """
-    questions = ASSESSMENT_QUESTIONS.get(domain, {}).get("questions", [])
+    questions = QUESTION_BANK.domains.get(domain, ())
     
     if not questions or not responses:
         return {"score": 0, "severity": "incomplete", "total_possible": 0}
@@ -370,26 +378,12 @@ def calculate_assessment_score(domain, responses):
     answered = 0
     
     for question in questions:
-        q_id = question["id"]
-        if q_id in responses:
-            response_value = responses[q_id]
-            
-            # Handle both numeric index and text answer
-            if isinstance(response_value, (int, float)):
-                # Already numeric index
-                response_index = int(response_value)
-            elif isinstance(response_value, str) and response_value.isdigit():
-                # String number like "0", "1", "2"
-                response_index = int(response_value)
-            else:
-                # Text answer - find it in options
-                try:
-                    response_index = question["options"].index(response_value)
-                except (ValueError, AttributeError):
-                    # Answer not found, skip this question
-                    continue
-            
-            score = question["weights"][response_index]
+        if question.id in responses:
+            # Numeric index, digit string or option text
+            score = question.weight(responses[question.id])
+            if score is None:
+                # Answer not found, skip this question
+                continue
             total_score += score
             answered += 1
     
@@ -6,6 +6,8 @@ Chatbot #1: Guided Wellness Questionnaire
 from typing import List, Dict
 import json
 
+from question_bank import build_bank
+
 # 35 Wellness Questions across 5 domains
 WELLNESS_QUESTIONS = {
     "energy_vitality": [
@@ -269,6 +271,14 @@ WELLNESS_QUESTIONS = {
     ]
 }
 
+# Frozen, indexed view of WELLNESS_QUESTIONS used for scoring
+QUESTION_BANK = build_bank(
+    "chatbot_wellness",
+    WELLNESS_QUESTIONS,
+    text_key="question",
+    weights_key="score_map"
+)
+
 
 def get_all_questions() -> Dict:
     """Get all questions organized by domain"""
@@ -300,13 +310,14 @@ def calculate_all_scores(answers: Dict) -> Dict:
     
     domain_scores = {}
     
-    for domain, questions in WELLNESS_QUESTIONS.items():
+    for domain, questions in QUESTION_BANK.domains.items():
         domain_responses = []
         
         for q in questions:
-            if q['id'] in answers:
-                answer_index = answers[q['id']]
-                score = q['score_map'][answer_index]
+            if q.id in answers:
+                score = q.weight(answers[q.id])
+                if score is None:
+                    raise ValueError(f"Invalid answer for question {q.id}: {answers[q.id]}")
                 domain_responses.append(score)
         
         domain_scores[domain] = calculate_domain_score(domain_responses)
@@ -0,0 +1,355 @@
+"""
+DASHBOARD STATS - Counts for the clinic dashboards and reports
+Dashboards read clinic_stats (migrations/004_clinic_stats.sql): per-clinic
+counters that database triggers adjust on every insert, update and delete
+of the source rows. Counters are bucketed by status or by day/month, so
+"today", "this week" and "this month" are a handful of bucket rows rather
+than a scan of the clinic's history.
+
+A scheduled job recounts everything from the source tables to find any
+drift (bulk loads with triggers disabled, TRUNCATE, patients moving
+clinic...), then corrects each drifted clinic under a lock on that clinic
+alone (migrations/012_clinic_stats_clinic_lock.sql).
+
+CLINIC_COUNTS_SQL is the previous single-statement aggregate, kept for
+bench_clinic_dashboard.py.
+"""
+import os
+from datetime import date, timedelta
+from decimal import Decimal
+from typing import Dict, Optional, Tuple
+
+from db_pool import get_db_connection
+from job_queue import job_handler, schedule_job
+
+CLINIC_STATS_RECONCILE_HOURS = float(os.getenv("CLINIC_STATS_RECONCILE_HOURS", "6"))
+
+CLINIC_COUNTS_SQL = """
+    WITH patient_counts AS (
+        SELECT COUNT(*) AS total_patients,
+               COUNT(*) FILTER (WHERE status = 'active') AS active_patients,
+               COUNT(*) FILTER (WHERE created_at >= date_trunc('month', CURRENT_DATE)) AS new_patients_month
+        FROM patients WHERE clinic_id = $1
+    ),
+    staff_counts AS (
+        SELECT COUNT(*) AS total_staff FROM users WHERE clinic_id = $1
+    ),
+    appointment_counts AS (
+        SELECT COUNT(*) FILTER (WHERE appointment_date = CURRENT_DATE) AS today_appointments,
+               COUNT(*) AS upcoming_appointments
+        FROM appointments
+        WHERE clinic_id = $1
+        AND appointment_date BETWEEN CURRENT_DATE AND CURRENT_DATE + INTERVAL '7 days'
+    ),
+    assessment_counts AS (
+        SELECT COUNT(*) AS total_assessments,
+               COUNT(*) FILTER (WHERE status = 'IN_PROGRESS') AS pending_assessments,
+               COUNT(*) FILTER (WHERE status = 'COMPLETED') AS completed_assessments
+        FROM assessments WHERE clinic_id = $1
+    ),
+    iridology_counts AS (
+        SELECT COUNT(*) AS total_iridology,
+               COUNT(*) FILTER (WHERE status = 'COMPLETED') AS completed_iridology
+        FROM iridology_analyses WHERE clinic_id = $1
+    ),
+    invoice_counts AS (
+        SELECT COUNT(*) FILTER (WHERE status IN ('pending', 'overdue')) AS outstanding_invoices_count,
+               COALESCE(SUM(amount) FILTER (WHERE status IN ('pending', 'overdue')), 0) AS outstanding_invoices_total,
+               COUNT(*) FILTER (WHERE status = 'overdue') AS overdue_invoices,
+               COALESCE(SUM(amount) FILTER (
+                   WHERE status = 'paid' AND paid_at >= date_trunc('month', CURRENT_DATE)
+               ), 0) AS revenue_this_month
+        FROM patient_invoices WHERE clinic_id = $1
+    )
+    SELECT *
+    FROM patient_counts, staff_counts, appointment_counts,
+         assessment_counts, iridology_counts, invoice_counts
+"""
+
+# Kept apart so a missing therapy_assignments table only zeroes these two
+THERAPY_COUNTS_SQL = """
+    SELECT
+        (SELECT COUNT(*) FROM therapy_sessions ts
+         JOIN therapy_assignments ta ON ts.assignment_id = ta.id
+         WHERE ta.clinic_id = $1) AS therapy_sessions,
+        (SELECT COUNT(*) FROM therapy_assignments
+         WHERE clinic_id = $1 AND status = 'active') AS active_therapies
+"""
+
+# One index range per requested metric; a NULL high bound means every bucket
+_STATS_SELECT = """
+    SELECT s.metric, s.bucket, SUM(s.value) AS value
+    FROM unnest($1::text[], $2::text[], $3::text[]) AS q (metric, low, high)
+    JOIN clinic_stats s
+      ON s.metric = q.metric
+     AND s.bucket >= q.low
+     AND (q.high IS NULL OR s.bucket <= q.high)
+"""
+CLINIC_STATS_SQL = _STATS_SELECT + " WHERE s.clinic_id = $4 GROUP BY s.metric, s.bucket"
+ALL_CLINICS_STATS_SQL = _STATS_SELECT + " GROUP BY s.metric, s.bucket"
+
+# One snapshot of both sides: triggers commit with the rows they count, so
+# any difference seen here is real drift, not an in-flight write
+DRIFTED_CLINICS_SQL = """
+    SELECT DISTINCT clinic_id
+    FROM clinic_stats s
+    FULL JOIN clinic_stats_expected e USING (clinic_id, metric, bucket)
+    WHERE COALESCE(s.value, 0) <> COALESCE(e.value, 0)
+    ORDER BY clinic_id
+"""
+
+RECONCILE_CLINIC_SQL = """
+    WITH drift AS (
+        SELECT clinic_id, metric, bucket, COALESCE(e.value, 0) AS value
+        FROM (SELECT * FROM clinic_stats WHERE clinic_id = $1) s
+        FULL JOIN (SELECT * FROM clinic_stats_expected WHERE clinic_id = $1) e
+            USING (clinic_id, metric, bucket)
+        WHERE COALESCE(s.value, 0) <> COALESCE(e.value, 0)
+    ),
+    fixed AS (
+        INSERT INTO clinic_stats (clinic_id, metric, bucket, value)
+        SELECT clinic_id, metric, bucket, value FROM drift
+        ON CONFLICT (clinic_id, metric, bucket)
+        DO UPDATE SET value = EXCLUDED.value, updated_at = NOW()
+        RETURNING 1
+    )
+    SELECT COUNT(*) FROM fixed
+"""
+
+Stats = Dict[str, Dict[str, Decimal]]
+
+
+def _day(d: date) -> str:
+    return d.strftime("%Y-%m-%d")
+
+
+def _month(d: date, months_back: int = 0) -> str:
+    index = d.year * 12 + d.month - 1 - months_back
+    return f"{index // 12:04d}-{index % 12 + 1:02d}"
+
+
+async def read_stats(
+    conn,
+    clinic_id: Optional[int],
+    wanted: Dict[str, Optional[Tuple[str, str]]]
+) -> Stats:
+    """{metric: {bucket: value}} for the requested metrics.
+
+    wanted maps a metric to an inclusive (low, high) bucket range, or None
+    for all of its buckets. clinic_id None sums across every clinic.
+    """
+    metrics = list(wanted)
+    lows = [wanted[m][0] if wanted[m] else "" for m in metrics]
+    highs = [wanted[m][1] if wanted[m] else None for m in metrics]
+    if clinic_id is None:
+        rows = await conn.fetch(ALL_CLINICS_STATS_SQL, metrics, lows, highs)
+    else:
+        rows = await conn.fetch(CLINIC_STATS_SQL, metrics, lows, highs, clinic_id)
+
+    stats: Stats = {}
+    for row in rows:
+        if row["value"]:
+            stats.setdefault(row["metric"], {})[row["bucket"]] = row["value"]
+    return stats
+
+
+def _total(stats: Stats, metric: str, *buckets: str) -> Decimal:
+    values = stats.get(metric, {})
+    if buckets:
+        return sum((values.get(b, Decimal(0)) for b in buckets), Decimal(0))
+    return sum(values.values(), Decimal(0))
+
+
+def _count(stats: Stats, metric: str, *buckets: str) -> int:
+    return int(_total(stats, metric, *buckets))
+
+
+async def count_metric(conn, clinic_id: Optional[int], metric: str, bucket: Optional[str] = None) -> int:
+    """One counter, summed over its buckets unless a bucket is given"""
+    wanted = {metric: (bucket, bucket) if bucket is not None else None}
+    return _count(await read_stats(conn, clinic_id, wanted), metric)
+
+
+async def fetch_clinic_counts(conn, clinic_id: int) -> dict:
+    """Headline counts for /api/v1/clinic/dashboard"""
+    today = date.today()
+    this_month = _month(today)
+    stats = await read_stats(conn, clinic_id, {
+        "patients": None,
+        "patients_by_status": ("active", "active"),
+        "patients_by_month": (this_month, this_month),
+        "staff": None,
+        "appointments_by_date": (_day(today), _day(today + timedelta(days=7))),
+        "assessments": None,
+        "assessments_by_status": None,
+        "iridology_analyses": None,
+        "iridology_by_status": ("COMPLETED", "COMPLETED"),
+        "invoices_by_status": None,
+        "invoice_amount_by_status": None,
+        "revenue_by_month": (this_month, this_month),
+    })
+
+    counts = {
+        "total_patients": _count(stats, "patients"),
+        "active_patients": _count(stats, "patients_by_status", "active"),
+        "new_patients_month": _count(stats, "patients_by_month"),
+        "total_staff": _count(stats, "staff"),
+        "today_appointments": _count(stats, "appointments_by_date", _day(today)),
+        "upcoming_appointments": _count(stats, "appointments_by_date"),
+        "total_assessments": _count(stats, "assessments"),
+        "pending_assessments": _count(stats, "assessments_by_status", "IN_PROGRESS"),
+        "completed_assessments": _count(stats, "assessments_by_status", "COMPLETED"),
+        "total_iridology": _count(stats, "iridology_analyses"),
+        "completed_iridology": _count(stats, "iridology_by_status", "COMPLETED"),
+        "outstanding_invoices_count": _count(stats, "invoices_by_status", "pending", "overdue"),
+        "outstanding_invoices_total": float(_total(stats, "invoice_amount_by_status", "pending", "overdue")),
+        "overdue_invoices": _count(stats, "invoices_by_status", "overdue"),
+        "revenue_this_month": float(_total(stats, "revenue_by_month")),
+    }
+
+    try:
+        therapy = await conn.fetchrow(THERAPY_COUNTS_SQL, clinic_id)
+        counts["therapy_sessions"] = therapy["therapy_sessions"]
+        counts["active_therapies"] = therapy["active_therapies"]
+    except Exception:
+        counts["therapy_sessions"] = 0
+        counts["active_therapies"] = 0
+
+    return counts
+
+
+async def fetch_live_clinic_counts(conn, clinic_id: int) -> dict:
+    """The same headline counts aggregated from the source tables"""
+    row = await conn.fetchrow(CLINIC_COUNTS_SQL, clinic_id)
+    counts = dict(row)
+    counts["outstanding_invoices_total"] = float(counts["outstanding_invoices_total"])
+    counts["revenue_this_month"] = float(counts["revenue_this_month"])
+    return counts
+
+
+async def fetch_clinic_charts(conn, clinic_id: int) -> dict:
+    """Series for /api/v1/clinic/dashboard/charts"""
+    today = date.today()
+    months = (_month(today, 6), _month(today))
+    stats = await read_stats(conn, clinic_id, {
+        "patients_by_month": months,
+        "appointments_by_date": (_day(today), _day(today + timedelta(days=7))),
+        "patients_by_status": None,
+        "revenue_by_month": months,
+    })
+    return {
+        "patient_trend": [
+            {"month": month, "count": int(count)}
+            for month, count in sorted(stats.get("patients_by_month", {}).items())
+        ],
+        "appointments_week": [
+            {"date": day, "count": int(count)}
+            for day, count in sorted(stats.get("appointments_by_date", {}).items())
+        ],
+        "patient_status": [
+            {"status": status, "count": int(count)}
+            for status, count in stats.get("patients_by_status", {}).items()
+        ],
+        "revenue_trend": [
+            {"month": month, "total": float(total)}
+            for month, total in sorted(stats.get("revenue_by_month", {}).items())
+        ],
+    }
+
+
+async def fetch_therapy_stats(conn, clinic_id: int) -> dict:
+    """Counts for /api/v1/therapies/comprehensive-stats"""
+    today = date.today()
+    stats = await read_stats(conn, clinic_id, {
+        "therapy_plans_by_status": ("APPROVED", "IN_PROGRESS"),
+        "therapy_sessions_by_status": ("SCHEDULED", "SCHEDULED"),
+        "therapy_sessions_by_date": (_day(today), _day(today + timedelta(days=6))),
+        "therapy_sessions_completed_by_date": (_day(today), _day(today)),
+    })
+    # A distinct count cannot be maintained by row deltas; this one only
+    # touches the clinic's active plans
+    patients_with_therapy = await conn.fetchval("""
+        SELECT COUNT(DISTINCT patient_id)
+        FROM therapy_plans
+        WHERE clinic_id = $1 AND status IN ('APPROVED', 'IN_PROGRESS')
+    """, clinic_id)
+    return {
+        "active_plans": _count(stats, "therapy_plans_by_status", "APPROVED", "IN_PROGRESS"),
+        "completed_today": _count(stats, "therapy_sessions_completed_by_date"),
+        "today_sessions": _count(stats, "therapy_sessions_by_date", _day(today)),
+        "week_sessions": _count(stats, "therapy_sessions_by_date"),
+        "patients_with_therapy": patients_with_therapy or 0,
+        "total_scheduled": _count(stats, "therapy_sessions_by_status", "SCHEDULED"),
+    }
+
+
+async def fetch_system_overview(conn) -> dict:
+    """System-wide totals for /api/v1/reports/overview"""
+    today = date.today()
+    last_30_days = (_day(today - timedelta(days=30)), _day(today))
+    stats = await read_stats(conn, None, {
+        "patients": None,
+        "patients_by_status": ("active", "active"),
+        "wellness_assessments": None,
+        "wellness_assessments_by_date": last_30_days,
+        "wellness_scored": None,
+        "wellness_score_sum": None,
+        "appointments": None,
+        "appointments_by_status": None,
+        "appointments_created_by_date": last_30_days,
+        "therapy_plans": None,
+        "therapy_plans_by_status": None,
+    })
+    scored = _total(stats, "wellness_scored")
+    avg_wellness = _total(stats, "wellness_score_sum") / scored if scored else 0
+    return {
+        "patients": {
+            "total": _count(stats, "patients"),
+            "active": _count(stats, "patients_by_status")
+        },
+        "assessments": {
+            "total": _count(stats, "wellness_assessments"),
+            "recent_30_days": _count(stats, "wellness_assessments_by_date"),
+            "avg_wellness_score": round(float(avg_wellness), 2)
+        },
+        "appointments": {
+            "total": _count(stats, "appointments"),
+            "recent_30_days": _count(stats, "appointments_created_by_date"),
+            "by_status": {s: int(n) for s, n in stats.get("appointments_by_status", {}).items()}
+        },
+        "therapy_plans": {
+            "total": _count(stats, "therapy_plans"),
+            "by_status": {s: int(n) for s, n in stats.get("therapy_plans_by_status", {}).items()}
+        }
+    }
+
+
+async def reconcile_clinic_stats(conn) -> int:
+    """Recount clinic_stats from the source tables; returns counters corrected.
+
+    Drift is found without locking anything. Each drifted clinic is then
+    recounted in its own transaction holding that clinic's advisory lock
+    exclusively: triggers take it shared, so the recount waits for the
+    clinic's in-flight writes and holds back only that clinic's new ones,
+    and no concurrent change is lost or double counted.
+    """
+    fixed = 0
+    for row in await conn.fetch(DRIFTED_CLINICS_SQL):
+        clinic_id = row["clinic_id"]
+        async with conn.transaction():
+            await conn.execute("SELECT pg_advisory_xact_lock(hashtext('clinic_stats'), $1)", clinic_id)
+            fixed += await conn.fetchval(RECONCILE_CLINIC_SQL, clinic_id)
+            await conn.execute("DELETE FROM clinic_stats WHERE clinic_id = $1 AND value = 0", clinic_id)
+    if fixed:
+        print(f"⚠️ Reconciled {fixed} drifted clinic_stats counters")
+    return fixed
+
+
+@job_handler("reconcile_clinic_stats")
+async def _reconcile_job(payload: dict) -> dict:
+    async with get_db_connection() as conn:
+        fixed = await reconcile_clinic_stats(conn)
+    return {"fixed": fixed}
+
+
+schedule_job("reconcile_clinic_stats", CLINIC_STATS_RECONCILE_HOURS * 3600)
@@ -0,0 +1,192 @@
+"""
+DATABASE POOL - Shared asyncpg connection pool
+One pool per worker process, opened/closed by the FastAPI lifespan hook.
+Handlers take a pooled connection with `conn = Depends(get_db)`.
+
+Legacy psycopg2 routers (super admin, patient portal, registration,
+invitations, email logging) run as sync `def` handlers on the FastAPI
+threadpool and borrow from a bounded ThreadedConnectionPool below.
+"""
+import asyncio
+import os
+import threading
+from contextlib import asynccontextmanager, contextmanager
+
+import asyncpg
+from psycopg2.pool import ThreadedConnectionPool
+from dotenv import load_dotenv
+from fastapi import HTTPException
+
+load_dotenv()
+
+# Database configuration from environment variables
+DB_HOST = os.getenv("DB_HOST", "localhost")
+DB_PORT = os.getenv("DB_PORT", "5432")
+DB_USER = os.getenv("DB_USER", "celloxen_user")
+DB_PASSWORD = os.getenv("DB_PASSWORD")
+DB_NAME = os.getenv("DB_NAME", "celloxen_portal")
+
+# Pool tuning
+DB_POOL_MIN_SIZE = int(os.getenv("DB_POOL_MIN_SIZE", "2"))
+DB_POOL_MAX_SIZE = int(os.getenv("DB_POOL_MAX_SIZE", "20"))
+DB_STATEMENT_CACHE_SIZE = int(os.getenv("DB_STATEMENT_CACHE_SIZE", "100"))
+DB_ACQUIRE_TIMEOUT = float(os.getenv("DB_ACQUIRE_TIMEOUT", "10"))
+DB_POOL_MAX_IDLE = float(os.getenv("DB_POOL_MAX_IDLE", "300"))
+
+# psycopg2 pool tuning - connections returned above the min size are
+# closed by psycopg2, so keep min close to the usual concurrency
+DB_SYNC_POOL_MIN_SIZE = int(os.getenv("DB_SYNC_POOL_MIN_SIZE", "4"))
+DB_SYNC_POOL_MAX_SIZE = int(os.getenv("DB_SYNC_POOL_MAX_SIZE", "10"))
+
+_pool = None
+_sync_pool = None
+_sync_pool_lock = threading.Lock()
+_sync_slots = threading.BoundedSemaphore(DB_SYNC_POOL_MAX_SIZE)
+
+
+async def init_pool():
+    """Create the app-wide pool (idempotent)"""
+    global _pool
+    if _pool is None:
+        _pool = await asyncpg.create_pool(
+            host=DB_HOST,
+            port=int(DB_PORT),
+            user=DB_USER,
+            password=DB_PASSWORD,
+            database=DB_NAME,
+            min_size=DB_POOL_MIN_SIZE,
+            max_size=DB_POOL_MAX_SIZE,
+            statement_cache_size=DB_STATEMENT_CACHE_SIZE,
+            max_inactive_connection_lifetime=DB_POOL_MAX_IDLE,
+        )
+        print(f"✅ Database pool ready ({DB_POOL_MIN_SIZE}-{DB_POOL_MAX_SIZE} connections)")
+    return _pool
+
+
+async def close_pool():
+    """Close the pool on shutdown"""
+    global _pool
+    if _pool is not None:
+        await _pool.close()
+        _pool = None
+        print("🛑 Database pool closed")
+
+
+MIGRATIONS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "migrations")
+
+
+async def apply_migrations():
+    """Apply new migrations/*.sql files in name order, once each.
+
+    An advisory lock serialises this across uvicorn workers starting together.
+    """
+    if not os.path.isdir(MIGRATIONS_DIR):
+        return
+    files = sorted(f for f in os.listdir(MIGRATIONS_DIR) if f.endswith(".sql"))
+    async with get_db_connection() as conn:
+        async with conn.transaction():
+            await conn.execute("SELECT pg_advisory_xact_lock(hashtext('celloxen_schema_migrations'))")
+            await conn.execute("""
+                CREATE TABLE IF NOT EXISTS schema_migrations (
+                    filename VARCHAR(255) PRIMARY KEY,
+                    applied_at TIMESTAMP NOT NULL DEFAULT NOW()
+                )
+            """)
+            applied = {r["filename"] for r in await conn.fetch("SELECT filename FROM schema_migrations")}
+            for filename in files:
+                if filename in applied:
+                    continue
+                with open(os.path.join(MIGRATIONS_DIR, filename)) as f:
+                    await conn.execute(f.read())
+                await conn.execute("INSERT INTO schema_migrations (filename) VALUES ($1)", filename)
+                print(f"✅ Applied migration {filename}")
+
+
+def get_pool():
+    """Return the running pool"""
+    if _pool is None:
+        raise RuntimeError("Database pool is not initialised - call init_pool() first")
+    return _pool
+
+
+async def get_db():
+    """FastAPI dependency: yield a pooled connection, released after the response"""
+    pool = get_pool()
+    try:
+        conn = await pool.acquire(timeout=DB_ACQUIRE_TIMEOUT)
+    except asyncio.TimeoutError:
+        raise HTTPException(status_code=503, detail="Database busy, please retry")
+    try:
+        yield conn
+    finally:
+        await pool.release(conn)
+
+
+@asynccontextmanager
+async def get_db_connection():
+    """Context manager for pooled connections outside of Depends"""
+    pool = get_pool()
+    async with pool.acquire(timeout=DB_ACQUIRE_TIMEOUT) as conn:
+        yield conn
+
+
+# ============================================================================
+# SYNC (psycopg2) ACCESS
+# ============================================================================
+
+def _get_sync_pool():
+    global _sync_pool
+    if _sync_pool is None:
+        with _sync_pool_lock:
+            if _sync_pool is None:
+                _sync_pool = ThreadedConnectionPool(
+                    DB_SYNC_POOL_MIN_SIZE,
+                    DB_SYNC_POOL_MAX_SIZE,
+                    host=DB_HOST,
+                    port=int(DB_PORT),
+                    user=DB_USER,
+                    password=DB_PASSWORD,
+                    database=DB_NAME,
+                )
+    return _sync_pool
+
+
+def get_sync_connection():
+    """Borrow a psycopg2 connection, waiting up to DB_ACQUIRE_TIMEOUT for a free slot.
+
+    Always hand it back with release_sync_connection(), normally from a finally block.
+    """
+    if not _sync_slots.acquire(timeout=DB_ACQUIRE_TIMEOUT):
+        raise HTTPException(status_code=503, detail="Database busy, please retry")
+    try:
+        return _get_sync_pool().getconn()
+    except Exception:
+        _sync_slots.release()
+        raise
+
+
+def release_sync_connection(conn):
+    """Return a borrowed connection; open transactions are rolled back by the pool"""
+    try:
+        _get_sync_pool().putconn(conn, close=bool(conn.closed))
+    finally:
+        _sync_slots.release()
+
+
+@contextmanager
+def sync_db_connection():
+    """Context manager for pooled psycopg2 connections"""
+    conn = get_sync_connection()
+    try:
+        yield conn
+    finally:
+        release_sync_connection(conn)
+
+
+def close_sync_pool():
+    """Close every psycopg2 connection on shutdown"""
+    global _sync_pool
+    with _sync_pool_lock:
+        if _sync_pool is not None:
+            _sync_pool.closeall()
+            _sync_pool = None
@@ -1,9 +1,8 @@
 """
 Email System Configuration for Super Admin - IONOS
 """
-import smtplib
-from email.mime.text import MIMEText
-from email.mime.multipart import MIMEMultipart
+
+from email_render import EmailTemplate
 
 # IONOS SMTP Settings
 SMTP_SERVER = "smtp.ionos.co.uk"
@@ -15,7 +14,7 @@ FROM_NAME = "Celloxen Health Portal"
 
 def send_email(to_email, subject, html_body, text_body=None):
     """
-    Send an email using IONOS SMTP
+    Queue an email for the outbox dispatcher (email_outbox.py)
     
     Args:
         to_email: Recipient email address
@@ -26,118 +25,87 @@ def send_email(to_email, subject, html_body, text_body=None):
     Returns:
         dict: {"success": bool, "message": str}
     """
+    # Imported here: email_outbox reads its SMTP defaults from this module
+    from email_outbox import queue_email_sync
     
     try:
-        # Create message
-        msg = MIMEMultipart('alternative')
-        msg['Subject'] = subject
-        msg['From'] = f"{FROM_NAME} <{FROM_EMAIL}>"
-        msg['To'] = to_email
-        
-        # Add text and HTML parts
-        if text_body:
-            part1 = MIMEText(text_body, 'plain')
-            msg.attach(part1)
-        
-        part2 = MIMEText(html_body, 'html')
-        msg.attach(part2)
-        
-        # Connect to IONOS SMTP server
-        server = smtplib.SMTP(SMTP_SERVER, SMTP_PORT)
-        server.starttls()
-        server.login(SMTP_USERNAME, SMTP_PASSWORD)
-        
-        # Send email
-        server.send_message(msg)
-        server.quit()
-        
+        queue_email_sync(to_email, subject, html_body, text_body=text_body, email_type="SUPER_ADMIN")
         return {
             "success": True,
-            "message": "Email sent successfully"
-        }
-        
-    except smtplib.SMTPAuthenticationError:
-        return {
-            "success": False,
-            "message": "SMTP Authentication failed. Check username/password."
-        }
-    except smtplib.SMTPException as e:
-        return {
-            "success": False,
-            "message": f"SMTP Error: {str(e)}"
+            "message": "Email queued"
         }
     except Exception as e:
         return {
             "success": False,
-            "message": f"Error sending email: {str(e)}"
+            "message": f"Error queueing email: {str(e)}"
         }
 
 
-def create_welcome_email_html(clinic_name, login_url, email, temp_password):
-    """Create HTML email for welcome message"""
-    
-    html = f"""
+# Compiled once (email_render.py); only the clinic's details vary per send
+CLINIC_WELCOME_EMAIL = EmailTemplate(
+    subject="Welcome to Celloxen Health Portal",
+    content="""
     <!DOCTYPE html>
     <html>
     <head>
         <style>
-            body {{
+            body {
                 font-family: -apple-system, BlinkMacSystemFont, 'Segoe UI', Roboto, sans-serif;
                 line-height: 1.6;
                 color: #333;
                 margin: 0;
                 padding: 0;
-            }}
-            .container {{
+            }
+            .container {
                 max-width: 600px;
                 margin: 0 auto;
                 background: white;
-            }}
-            .header {{
+            }
+            .header {
                 background: linear-gradient(135deg, #1e3a8a 0%, #3b82f6 100%);
                 color: white;
                 padding: 40px 30px;
                 text-align: center;
-            }}
-            .header h1 {{
+            }
+            .header h1 {
                 margin: 0;
                 font-size: 32px;
-            }}
-            .content {{
+            }
+            .content {
                 padding: 40px 30px;
                 background: #f9fafb;
-            }}
-            .credentials-box {{
+            }
+            .credentials-box {
                 background: white;
                 border: 3px solid #3b82f6;
                 border-radius: 12px;
                 padding: 25px;
                 margin: 25px 0;
-            }}
-            .credentials-box h3 {{
+            }
+            .credentials-box h3 {
                 color: #1e3a8a;
                 margin-top: 0;
                 margin-bottom: 20px;
-            }}
-            .credential-item {{
+            }
+            .credential-item {
                 margin: 15px 0;
                 padding: 12px;
                 background: #f1f5f9;
                 border-radius: 8px;
-            }}
-            .credential-label {{
+            }
+            .credential-label {
                 font-weight: 600;
                 color: #1e3a8a;
                 font-size: 14px;
                 margin-bottom: 5px;
-            }}
-            .credential-value {{
+            }
+            .credential-value {
                 font-family: 'Courier New', monospace;
                 font-size: 16px;
                 color: #0f172a;
                 font-weight: 600;
-            }}
-            .button {{
+            }
+            .button {
                 display: inline-block;
                 background: #1e3a8a;
                 color: white !important;
@@ -147,47 +115,47 @@ def create_welcome_email_html(clinic_name, login_url, email, temp_password):
                 margin: 20px 0;
                 font-weight: 600;
                 font-size: 16px;
-            }}
-            .warning {{
+            }
+            .warning {
                 background: #fef3c7;
                 border-left: 5px solid #f59e0b;
                 padding: 20px;
                 margin: 25px 0;
                 border-radius: 8px;
-            }}
-            .warning strong {{
+            }
+            .warning strong {
                 color: #92400e;
-            }}
-            .features {{
+            }
+            .features {
                 background: white;
                 padding: 20px;
                 border-radius: 8px;
                 margin: 20px 0;
-            }}
-            .features ul {{
+            }
+            .features ul {
                 list-style: none;
                 padding: 0;
-            }}
-            .features li {{
+            }
+            .features li {
                 padding: 8px 0;
                 padding-left: 30px;
                 position: relative;
-            }}
-            .features li:before {{
+            }
+            .features li:before {
                 content: "✅";
                 position: absolute;
                 left: 0;
-            }}
-            .footer {{
+            }
+            .footer {
                 text-align: center;
                 padding: 30px;
                 background: #1e293b;
                 color: white;
-            }}
-            .footer p {{
+            }
+            .footer p {
                 margin: 5px 0;
                 font-size: 14px;
-            }}
+            }
         </style>
     </head>
     <body>
@@ -198,7 +166,7 @@ def create_welcome_email_html(clinic_name, login_url, email, temp_password):
             </div>
             
             <div class="content">
-                <h2 style="color: #1e3a8a;">Hello {clinic_name},</h2>
+                <h2 style="color: #1e3a8a;">Hello $clinic_name,</h2>
                 
                 <p>We're thrilled to have you join the Celloxen Health Portal platform! Your clinic account has been successfully created and is ready to use.</p>
                 
@@ -207,17 +175,17 @@ def create_welcome_email_html(clinic_name, login_url, email, temp_password):
                     
                     <div class="credential-item">
                         <div class="credential-label">Portal URL</div>
-                        <div class="credential-value">{login_url}</div>
+                        <div class="credential-value">$login_url</div>
                     </div>
                     
                     <div class="credential-item">
                         <div class="credential-label">Email Address</div>
-                        <div class="credential-value">{email}</div>
+                        <div class="credential-value">$email</div>
                     </div>
                     
                     <div class="credential-item">
                         <div class="credential-label">Temporary Password</div>
-                        <div class="credential-value">{temp_password}</div>
+                        <div class="credential-value">$temp_password</div>
                     </div>
                 </div>
                 
@@ -232,12 +200,12 @@ def create_welcome_email_html(clinic_name, login_url, email, temp_password):
                 </div>
                 
                 <center>
-                    <a href="{login_url}" class="button">Login to Your Portal Now</a>
+                    <a href="$login_url" class="button">Login to Your Portal Now</a>
                 </center>
                 
                 <h3 style="color: #1e3a8a; margin-top: 30px;">🚀 Getting Started:</h3>
                 <ol style="line-height: 1.8;">
-                    <li>Click the button above or visit <strong>{login_url}</strong></li>
+                    <li>Click the button above or visit <strong>$login_url</strong></li>
                     <li>Log in using your email and temporary password</li>
                     <li>Create a new secure password when prompted</li>
                     <li>Complete your clinic profile information</li>
@@ -273,8 +241,22 @@ def create_welcome_email_html(clinic_name, login_url, email, temp_password):
     </body>
     </html>
     """
-    
-    return html
+)
+
+
+def create_welcome_email(clinic_name, login_url, email, temp_password):
+    """Welcome email for a new clinic: {"subject", "html", "text"}"""
+    return CLINIC_WELCOME_EMAIL.render(
+        clinic_name=clinic_name,
+        login_url=login_url,
+        email=email,
+        temp_password=temp_password
+    )
+
+
+def create_welcome_email_html(clinic_name, login_url, email, temp_password):
+    """Create HTML email for welcome message"""
+    return create_welcome_email(clinic_name, login_url, email, temp_password)["html"]
 
 # Database Settings
 DB_HOST = "localhost"
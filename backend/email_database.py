@@ -2,43 +2,30 @@
 Database utilities for email system
 """
 
-import psycopg2
 from psycopg2.extras import RealDictCursor
 from datetime import datetime, timedelta
 import secrets
 import string
 
-# Import from email_config
-from email_config import DB_HOST, DB_NAME, DB_USER, DB_PASSWORD
-
-
-def get_db():
-    """Get database connection"""
-    return psycopg2.connect(
-        host=DB_HOST,
-        database=DB_NAME,
-        user=DB_USER,
-        password=DB_PASSWORD
-    )
+from db_pool import sync_db_connection
 
 
 def log_email(patient_id, email_type, sent_to_email, subject, status, error_message=None):
     """Log email to database"""
     try:
-        conn = get_db()
-        cur = conn.cursor()
-        
-        cur.execute("""
-            INSERT INTO email_logs 
-            (patient_id, email_type, sent_to_email, subject, status, sent_at, error_message)
-            VALUES (%s, %s, %s, %s, %s, %s, %s)
-            RETURNING id
-        """, (patient_id, email_type, sent_to_email, subject, status, datetime.now(), error_message))
-        
-        log_id = cur.fetchone()[0]
-        conn.commit()
-        cur.close()
-        conn.close()
+        with sync_db_connection() as conn:
+            cur = conn.cursor()
+            
+            cur.execute("""
+                INSERT INTO email_logs 
+                (patient_id, email_type, sent_to_email, subject, status, sent_at, error_message)
+                VALUES (%s, %s, %s, %s, %s, %s, %s)
+                RETURNING id
+            """, (patient_id, email_type, sent_to_email, subject, status, datetime.now(), error_message))
+            
+            log_id = cur.fetchone()[0]
+            conn.commit()
+            cur.close()
         
         return log_id
         
@@ -65,22 +52,21 @@ def create_patient_invitation(first_name, last_name, email, phone=None):
     default_dob = datetime(1990, 1, 1).date()
     
     try:
-        conn = get_db()
-        cur = conn.cursor(cursor_factory=RealDictCursor)
-        
-        cur.execute("""
-            INSERT INTO patients 
-            (patient_number, clinic_id, first_name, last_name, email, mobile_phone, 
-             date_of_birth, registration_token, token_expires_at, status)
-            VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, 'INVITED')
-            RETURNING id, registration_token, token_expires_at
-        """, (patient_number, clinic_id, first_name, last_name, email, 
-              phone or '', default_dob, token, expires_at))
-        
-        result = cur.fetchone()
-        conn.commit()
-        cur.close()
-        conn.close()
+        with sync_db_connection() as conn:
+            cur = conn.cursor(cursor_factory=RealDictCursor)
+            
+            cur.execute("""
+                INSERT INTO patients 
+                (patient_number, clinic_id, first_name, last_name, email, mobile_phone, 
+                 date_of_birth, registration_token, token_expires_at, status)
+                VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, 'INVITED')
+                RETURNING id, registration_token, token_expires_at
+            """, (patient_number, clinic_id, first_name, last_name, email, 
+                  phone or '', default_dob, token, expires_at))
+            
+            result = cur.fetchone()
+            conn.commit()
+            cur.close()
         
         return {
             'patient_id': result['id'],
@@ -96,18 +82,17 @@ def create_patient_invitation(first_name, last_name, email, phone=None):
 def validate_token(token):
     """Validate registration token"""
     try:
-        conn = get_db()
-        cur = conn.cursor(cursor_factory=RealDictCursor)
-        
-        cur.execute("""
-            SELECT id, first_name, last_name, email, token_expires_at, status
-            FROM patients
-            WHERE registration_token = %s
-        """, (token,))
-        
-        patient = cur.fetchone()
-        cur.close()
-        conn.close()
+        with sync_db_connection() as conn:
+            cur = conn.cursor(cursor_factory=RealDictCursor)
+            
+            cur.execute("""
+                SELECT id, first_name, last_name, email, token_expires_at, status
+                FROM patients
+                WHERE registration_token = %s
+            """, (token,))
+            
+            patient = cur.fetchone()
+            cur.close()
         
         if not patient:
             return None
@@ -0,0 +1,372 @@
+"""
+EMAIL OUTBOX - Durable outbound email queue with a pooled SMTP sender
+Request handlers never talk to SMTP: queue_email() / queue_email_sync()
+insert a row into email_outbox (migrations/008_email_outbox.sql) and
+return. A dispatcher task per worker claims up to EMAIL_BATCH_SIZE ready
+messages with FOR UPDATE SKIP LOCKED and sends them over one persistent,
+authenticated STARTTLS session, which is reopened on demand and closed
+after EMAIL_SMTP_IDLE_SECONDS without traffic.
+
+Outcomes for a batch are written back in one statement: sent rows are
+marked sent, transient failures are retried with exponential backoff,
+and rows that are finished (sent, rejected by the server with a 5xx, or
+out of attempts) are logged to email_logs in the same statement.
+
+SMTP settings default to email_config and can be overridden with the
+SMTP_* environment variables email_service already used.
+"""
+import asyncio
+import os
+import time
+from email.mime.multipart import MIMEMultipart
+from email.mime.text import MIMEText
+from typing import List, Optional
+
+from dotenv import load_dotenv
+
+from db_pool import get_db_connection, sync_db_connection
+from email_config import SMTP_SERVER, SMTP_PORT as _SMTP_PORT, SMTP_USERNAME, SMTP_PASSWORD as _SMTP_PASSWORD, FROM_EMAIL, FROM_NAME
+
+try:
+    import aiosmtplib
+except ImportError:  # pragma: no cover - optional in dev environments
+    aiosmtplib = None
+    print("⚠️ aiosmtplib not installed - queued emails will not be sent")
+
+# Production SMTP overrides live in /var/www/.env
+load_dotenv('/var/www/.env')
+
+SMTP_HOST = os.getenv("SMTP_HOST", SMTP_SERVER)
+SMTP_PORT = int(os.getenv("SMTP_PORT", str(_SMTP_PORT)))
+SMTP_USER = os.getenv("SMTP_USER", SMTP_USERNAME)
+SMTP_PASSWORD = os.getenv("SMTP_PASSWORD", _SMTP_PASSWORD)
+SMTP_FROM_EMAIL = os.getenv("SMTP_FROM_EMAIL", FROM_EMAIL)
+SMTP_FROM_NAME = os.getenv("SMTP_FROM_NAME", FROM_NAME)
+
+EMAIL_DISPATCHER_ENABLED = os.getenv("EMAIL_DISPATCHER_ENABLED", "true").lower() == "true"
+EMAIL_BATCH_SIZE = int(os.getenv("EMAIL_BATCH_SIZE", "20"))
+EMAIL_POLL_INTERVAL = float(os.getenv("EMAIL_POLL_INTERVAL", "5"))
+EMAIL_MAX_ATTEMPTS = int(os.getenv("EMAIL_MAX_ATTEMPTS", "5"))
+EMAIL_RETRY_BASE_SECONDS = float(os.getenv("EMAIL_RETRY_BASE_SECONDS", "60"))
+EMAIL_SMTP_IDLE_SECONDS = float(os.getenv("EMAIL_SMTP_IDLE_SECONDS", "60"))
+EMAIL_SMTP_TIMEOUT = float(os.getenv("EMAIL_SMTP_TIMEOUT", "30"))
+# A row still 'sending' after this many seconds is assumed orphaned and requeued
+EMAIL_LOCK_TIMEOUT = int(os.getenv("EMAIL_LOCK_TIMEOUT", "300"))
+
+_INSERT_SQL = """
+    INSERT INTO email_outbox (to_email, subject, html_body, text_body, email_type, patient_id, max_attempts)
+    VALUES ({}, {}, {}, {}, {}, {}, {})
+    RETURNING id
+"""
+
+_wakeup = asyncio.Event()
+_loop: Optional[asyncio.AbstractEventLoop] = None
+_task: Optional[asyncio.Task] = None
+_smtp = None
+_smtp_last_used = 0.0
+
+
+# ============================================================================
+# ENQUEUE
+# ============================================================================
+
+def _notify_dispatcher():
+    if _loop is None:
+        return
+    try:
+        if asyncio.get_running_loop() is _loop:
+            _wakeup.set()
+            return
+    except RuntimeError:
+        pass
+    try:
+        _loop.call_soon_threadsafe(_wakeup.set)
+    except RuntimeError:
+        pass  # loop already closed (shutdown); the row is picked up on next start
+
+
+async def queue_email(
+    conn,
+    to_email: str,
+    subject: str,
+    html_body: str,
+    text_body: Optional[str] = None,
+    email_type: str = "GENERAL",
+    patient_id: Optional[int] = None
+) -> int:
+    """Queue a message using the caller's connection (so it joins their transaction)"""
+    outbox_id = await conn.fetchval(
+        _INSERT_SQL.format("$1", "$2", "$3", "$4", "$5", "$6", "$7"),
+        to_email, subject, html_body, text_body, email_type, patient_id, EMAIL_MAX_ATTEMPTS
+    )
+    _notify_dispatcher()
+    return outbox_id
+
+
+async def queue_emails(conn, messages: List[dict], email_type: str = "GENERAL") -> List[int]:
+    """Queue many messages in one statement.
+
+    Each message is a dict with to_email, subject, html_body and optionally
+    text_body / patient_id.
+    """
+    if not messages:
+        return []
+    rows = await conn.fetch(
+        """
+        INSERT INTO email_outbox (to_email, subject, html_body, text_body, email_type, patient_id, max_attempts)
+        SELECT m.to_email, m.subject, m.html_body, m.text_body, $6, m.patient_id, $7
+        FROM unnest($1::text[], $2::text[], $3::text[], $4::text[], $5::int[])
+             WITH ORDINALITY AS m(to_email, subject, html_body, text_body, patient_id, n)
+        ORDER BY m.n
+        RETURNING id
+        """,
+        [m["to_email"] for m in messages],
+        [m["subject"] for m in messages],
+        [m["html_body"] for m in messages],
+        [m.get("text_body") for m in messages],
+        [m.get("patient_id") for m in messages],
+        email_type,
+        EMAIL_MAX_ATTEMPTS
+    )
+    _notify_dispatcher()
+    return sorted(r["id"] for r in rows)
+
+
+def queue_email_sync(
+    to_email: str,
+    subject: str,
+    html_body: str,
+    text_body: Optional[str] = None,
+    email_type: str = "GENERAL",
+    patient_id: Optional[int] = None,
+    cursor=None
+) -> int:
+    """queue_email() for sync code; pass a psycopg2 cursor to join its transaction"""
+    params = (to_email, subject, html_body, text_body, email_type, patient_id, EMAIL_MAX_ATTEMPTS)
+    sql = _INSERT_SQL.format(*["%s"] * 7)
+    if cursor is not None:
+        cursor.execute(sql, params)
+        outbox_id = cursor.fetchone()[0]
+    else:
+        with sync_db_connection() as conn:
+            cur = conn.cursor()
+            cur.execute(sql, params)
+            outbox_id = cur.fetchone()[0]
+            conn.commit()
+            cur.close()
+    _notify_dispatcher()
+    return outbox_id
+
+
+# ============================================================================
+# SMTP SESSION
+# ============================================================================
+
+def _build_message(row) -> MIMEMultipart:
+    message = MIMEMultipart("alternative")
+    message["From"] = f"{SMTP_FROM_NAME} <{SMTP_FROM_EMAIL}>"
+    message["To"] = row["to_email"]
+    message["Subject"] = row["subject"]
+    if row["text_body"]:
+        message.attach(MIMEText(row["text_body"], "plain"))
+    message.attach(MIMEText(row["html_body"], "html"))
+    return message
+
+
+async def _open_session():
+    global _smtp
+    smtp = aiosmtplib.SMTP(hostname=SMTP_HOST, port=SMTP_PORT, start_tls=True, timeout=EMAIL_SMTP_TIMEOUT)
+    await smtp.connect()
+    await smtp.login(SMTP_USER, SMTP_PASSWORD)
+    _smtp = smtp
+    print(f"✅ SMTP session opened to {SMTP_HOST}:{SMTP_PORT}")
+
+
+async def _close_session():
+    global _smtp
+    smtp, _smtp = _smtp, None
+    if smtp is not None:
+        try:
+            await smtp.quit()
+        except Exception:
+            smtp.close()
+
+
+async def _send(message):
+    """Send over the shared session, reconnecting once if the server dropped it"""
+    global _smtp_last_used
+    for attempt in (1, 2):
+        if _smtp is None or not _smtp.is_connected:
+            await _open_session()
+        try:
+            await _smtp.send_message(message)
+            _smtp_last_used = time.monotonic()
+            return
+        except aiosmtplib.SMTPServerDisconnected:
+            await _close_session()
+            if attempt == 2:
+                raise
+
+
+def _is_rejection(error: Exception) -> bool:
+    """The server refused this message (as opposed to the session failing)"""
+    if isinstance(error, aiosmtplib.SMTPAuthenticationError):
+        return False
+    return isinstance(error, (aiosmtplib.SMTPRecipientsRefused, aiosmtplib.SMTPResponseException))
+
+
+def _is_permanent(error: Exception) -> bool:
+    """A 5xx for this message - retrying will not help"""
+    if not _is_rejection(error):
+        return False
+    if isinstance(error, aiosmtplib.SMTPRecipientsRefused):
+        return True
+    return isinstance(error, aiosmtplib.SMTPResponseException) and error.code >= 500
+
+
+# ============================================================================
+# DISPATCHER
+# ============================================================================
+
+async def _claim_batch(conn):
+    return await conn.fetch(
+        """
+        UPDATE email_outbox
+        SET status = 'sending', attempts = attempts + 1, locked_at = NOW()
+        WHERE id IN (
+            SELECT id FROM email_outbox
+            WHERE status = 'queued' AND run_after <= NOW()
+            ORDER BY run_after, id
+            FOR UPDATE SKIP LOCKED
+            LIMIT $1
+        )
+        RETURNING id, to_email, subject, html_body, text_body
+        """,
+        EMAIL_BATCH_SIZE
+    )
+
+
+async def _send_batch(batch) -> tuple:
+    ids: List[int] = []
+    sent: List[bool] = []
+    permanent: List[bool] = []
+    errors: List[Optional[str]] = []
+    session_error = None
+    for row in batch:
+        ids.append(row["id"])
+        if session_error is not None:
+            # Connection or login is failing - leave the rest for the retry
+            sent.append(False)
+            permanent.append(False)
+            errors.append(session_error)
+            continue
+        try:
+            await _send(_build_message(row))
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            error = str(e) or type(e).__name__
+            sent.append(False)
+            permanent.append(_is_permanent(e))
+            errors.append(error)
+            if not _is_rejection(e):
+                session_error = error
+                await _close_session()
+            print(f"❌ Email {row['id']} to {row['to_email']} failed: {error}")
+            continue
+        sent.append(True)
+        permanent.append(False)
+        errors.append(None)
+    return ids, sent, permanent, errors
+
+
+async def _record_results(conn, ids, sent, permanent, errors):
+    """Update the batch and log finished messages to email_logs in one statement"""
+    await conn.execute(
+        """
+        WITH done AS (
+            UPDATE email_outbox o
+            SET status = CASE
+                    WHEN r.sent THEN 'sent'
+                    WHEN r.permanent OR o.attempts >= o.max_attempts THEN 'failed'
+                    ELSE 'queued'
+                END,
+                sent_at = CASE WHEN r.sent THEN NOW() END,
+                last_error = r.error,
+                run_after = CASE
+                    WHEN r.sent THEN o.run_after
+                    ELSE NOW() + make_interval(secs => $5 * 2 ^ (o.attempts - 1))
+                END,
+                locked_at = NULL
+            FROM unnest($1::bigint[], $2::boolean[], $3::boolean[], $4::text[]) AS r(id, sent, permanent, error)
+            WHERE o.id = r.id AND o.status = 'sending'
+            RETURNING o.patient_id, o.email_type, o.to_email, o.subject, o.status, o.last_error
+        )
+        INSERT INTO email_logs (patient_id, email_type, sent_to_email, subject, status, sent_at, error_message)
+        SELECT patient_id, email_type, to_email, subject, UPPER(status), NOW(), last_error
+        FROM done
+        WHERE status IN ('sent', 'failed')
+        """,
+        ids, sent, permanent, errors, EMAIL_RETRY_BASE_SECONDS
+    )
+
+
+async def _requeue_stale(conn):
+    await conn.execute(
+        """
+        UPDATE email_outbox
+        SET status = 'queued', locked_at = NULL, last_error = 'Requeued after dispatcher timeout'
+        WHERE status = 'sending'
+          AND locked_at < NOW() - make_interval(secs => $1)
+        """,
+        EMAIL_LOCK_TIMEOUT
+    )
+
+
+async def _dispatch_loop():
+    last_reap = 0.0
+    while True:
+        try:
+            _wakeup.clear()
+            async with get_db_connection() as conn:
+                if time.monotonic() - last_reap > 60:
+                    await _requeue_stale(conn)
+                    last_reap = time.monotonic()
+                batch = await _claim_batch(conn)
+            if not batch:
+                if _smtp is not None and time.monotonic() - _smtp_last_used > EMAIL_SMTP_IDLE_SECONDS:
+                    await _close_session()
+                try:
+                    await asyncio.wait_for(_wakeup.wait(), EMAIL_POLL_INTERVAL)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+            results = await _send_batch(batch)
+            async with get_db_connection() as conn:
+                await _record_results(conn, *results)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            print(f"❌ Email dispatcher error: {e}")
+            await _close_session()
+            await asyncio.sleep(EMAIL_POLL_INTERVAL)
+
+
+def start_email_dispatcher():
+    """Start the dispatcher on the running loop (called from the lifespan hook)"""
+    global _task, _loop
+    _loop = asyncio.get_running_loop()
+    if not EMAIL_DISPATCHER_ENABLED or aiosmtplib is None or _task is not None:
+        return
+    _task = asyncio.create_task(_dispatch_loop())
+    print(f"✅ Email dispatcher started (batches of {EMAIL_BATCH_SIZE})")
+
+
+async def stop_email_dispatcher():
+    """Stop sending; rows mid-send are requeued by the next dispatcher's reaper"""
+    global _task
+    if _task is not None:
+        _task.cancel()
+        await asyncio.gather(_task, return_exceptions=True)
+        _task = None
+    await _close_session()
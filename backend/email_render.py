@@ -0,0 +1,220 @@
+"""
+EMAIL RENDER - Precompiled email templates with plain-text alternatives
+An EmailTemplate is compiled once, at import: the layout (<head>, CSS,
+header and footer) and the email's own body are joined, the stylesheet's
+class rules are inlined into the markup for clients that drop <style>,
+and the result is split into static chunks and $field slots. A plain-text
+version is derived from the same source at the same time.
+
+Rendering only escapes the field values and joins them between the
+precomputed chunks, so a send no longer rebuilds the whole document with
+f-strings. Field values are HTML-escaped for the html part (and left as
+is for the subject and text part); escaped values are memoised, since the
+same dates and practitioner names recur across a batch of reminders.
+
+Templates use string.Template syntax ($name / ${name}, $$ for a literal
+dollar). A Layout's source is a full document with $header and $content
+slots, which are filled at compile time.
+"""
+import re
+from functools import lru_cache
+from html import escape, unescape
+from string import Template
+from typing import Dict, List, Optional, Tuple
+
+_STYLE_BLOCK = re.compile(r"<style[^>]*>(.*?)</style>", re.S | re.I)
+_CSS_RULE = re.compile(r"([^{}]+)\{([^{}]*)\}")
+_CSS_COMMENT = re.compile(r"/\*.*?\*/", re.S)
+_CLASS_SELECTOR = re.compile(r"^\.([\w-]+)$")
+_TAG_SELECTOR = re.compile(r"^([a-zA-Z][\w-]*)$")
+_CLASSED_TAG = re.compile(r"<([a-zA-Z][\w-]*)(\s[^>]*?)?\sclass=\"([^\"]*)\"([^>]*)>")
+_STYLE_ATTR = re.compile(r"\sstyle=\"([^\"]*)\"")
+
+_TEXT_DROP = re.compile(r"<(head|style|script)[^>]*>.*?</\1>", re.S | re.I)
+_TEXT_LINK = re.compile(r"<a\s[^>]*?href=\"([^\"]*)\"[^>]*>(.*?)</a>", re.S | re.I)
+_TEXT_BREAK = re.compile(r"<br\s*/?>", re.I)
+_TEXT_BLOCK = re.compile(r"</?(p|div|h[1-6]|ul|ol|table|tr|center)(\s[^>]*)?>", re.I)
+_TEXT_ITEM = re.compile(r"<li(\s[^>]*)?>", re.I)
+_TEXT_TAG = re.compile(r"<[^>]+>")
+
+
+class Layout:
+    """Shared chrome for a family of emails.
+
+    source is a complete HTML document containing $header and $content.
+    """
+
+    def __init__(self, source: str, inline_css: bool = True):
+        self.source = source
+        self.inline_css = inline_css
+
+    def wrap(self, header: str, content: str) -> str:
+        return self.source.replace("$header", header).replace("$content", content)
+
+
+# ============================================================================
+# COMPILE-TIME HELPERS
+# ============================================================================
+
+def _rule_target(selector: str) -> Tuple[str, ...]:
+    """What a selector's rightmost compound can match: ('class', c), ('tag', t) or ('*',)"""
+    compound = re.split(r"[\s>+~]+", selector.strip())[-1]
+    compound = re.split(r"[:\[]", compound, 1)[0]
+    match = _CLASS_SELECTOR.match(compound)
+    if match:
+        return ("class", match.group(1))
+    match = _TAG_SELECTOR.match(compound)
+    if match:
+        return ("tag", match.group(1).lower())
+    return ("*",)
+
+
+def inline_css(html: str) -> str:
+    """Copy single-class CSS rules into style="" attributes.
+
+    The <style> block is kept. A declaration is only inlined when no other
+    rule that could match the same element sets that property, so inlining
+    never changes which declaration wins in clients that honour <style>.
+    """
+    block = _STYLE_BLOCK.search(html)
+    if not block or "@" in block.group(1):
+        return html
+    class_rules: Dict[str, List[Tuple[str, str]]] = {}
+    contested: Dict[Tuple[str, ...], set] = {}
+    for selectors, body in _CSS_RULE.findall(_CSS_COMMENT.sub("", block.group(1))):
+        declarations = []
+        for declaration in body.split(";"):
+            prop, _, value = declaration.partition(":")
+            if value.strip():
+                declarations.append((prop.strip().lower(), value.strip()))
+        for selector in selectors.split(","):
+            match = _CLASS_SELECTOR.match(selector.strip())
+            if match:
+                class_rules.setdefault(match.group(1), []).extend(declarations)
+            else:
+                contested.setdefault(_rule_target(selector), set()).update(p for p, _ in declarations)
+
+    def inline(tag_match) -> str:
+        tag, before, classes, after = tag_match.group(1), tag_match.group(2) or "", tag_match.group(3), tag_match.group(4)
+        blocked = contested.get(("*",), set()) | contested.get(("tag", tag.lower()), set())
+        for name in classes.split():
+            blocked |= contested.get(("class", name), set())
+        declarations = [
+            f"{prop}: {value}"
+            for name in classes.split()
+            for prop, value in class_rules.get(name, [])
+            if prop not in blocked
+        ]
+        if not declarations:
+            return tag_match.group(0)
+        attrs = f"{before} class=\"{classes}\"{after}"
+        style = "; ".join(declarations)
+        existing = _STYLE_ATTR.search(attrs)
+        if existing:
+            # Attributes already on the element come last so they still win
+            return f"<{tag}{attrs[:existing.start()]} style=\"{style}; {existing.group(1)}\"{attrs[existing.end():]}>"
+        return f"<{tag}{attrs} style=\"{style}\">"
+
+    end = block.end()
+    return html[:end] + _CLASSED_TAG.sub(inline, html[end:])
+
+
+def html_to_text(html: str) -> str:
+    """Plain-text rendering of an email body: paragraphs, bullets and links kept"""
+    # Source line breaks are just whitespace in HTML; only the markup breaks lines
+    text = " ".join(_TEXT_DROP.sub("", html).split())
+
+    def link(match) -> str:
+        href, label = match.group(1), _TEXT_TAG.sub("", match.group(2)).strip()
+        href = href[len("mailto:"):] if href.startswith("mailto:") else href
+        return label if label == href else f"{label} ({href})"
+
+    text = _TEXT_LINK.sub(link, text)
+    text = _TEXT_ITEM.sub("\n- ", text)
+    text = _TEXT_BREAK.sub("\n", text)
+    text = _TEXT_BLOCK.sub("\n\n", text)
+    text = unescape(_TEXT_TAG.sub("", text))
+    lines = [line.strip() for line in text.splitlines()]
+    return re.sub(r"\n{3,}", "\n\n", "\n".join(lines)).strip() + "\n"
+
+
+class _Compiled:
+    """A template split into static chunks and field slots"""
+
+    def __init__(self, source: str):
+        parts: List[Optional[str]] = []
+        slots: List[Tuple[int, str]] = []
+        static: List[str] = []
+        position = 0
+        for match in Template.pattern.finditer(source):
+            static.append(source[position:match.start()])
+            position = match.end()
+            if match.group("escaped") is not None:
+                static.append("$")
+                continue
+            name = match.group("named") or match.group("braced")
+            if name is None:
+                line = source[:match.start()].count("\n") + 1
+                raise ValueError(f"Invalid placeholder in email template on line {line}")
+            parts.append("".join(static))
+            static = []
+            slots.append((len(parts), name))
+            parts.append(None)
+        static.append(source[position:])
+        parts.append("".join(static))
+        self._parts = parts
+        self._slots = slots
+        self.fields = frozenset(name for _, name in slots)
+
+    def fill(self, values: Dict[str, str]) -> str:
+        parts = self._parts.copy()
+        for index, name in self._slots:
+            parts[index] = values[name]
+        return "".join(parts)
+
+
+@lru_cache(maxsize=4096)
+def _escape(value: str) -> str:
+    return escape(value)
+
+
+# ============================================================================
+# TEMPLATES
+# ============================================================================
+
+class EmailTemplate:
+    """subject / html / text, compiled once and rendered per message.
+
+    content is the email body (placed in the layout's $content slot) and
+    header fills $header. Without a layout, content is the whole document.
+    text overrides the plain-text version derived from the HTML.
+    """
+
+    def __init__(
+        self,
+        subject: str,
+        content: str,
+        layout: Optional[Layout] = None,
+        header: str = "",
+        text: Optional[str] = None
+    ):
+        source = layout.wrap(header, content) if layout else content
+        if layout is None or layout.inline_css:
+            source = inline_css(source)
+        self._subject = _Compiled(subject)
+        self._html = _Compiled(source)
+        self._text = _Compiled(text if text is not None else html_to_text(source))
+        self.fields = self._subject.fields | self._html.fields | self._text.fields
+
+    def render(self, **fields) -> Dict[str, str]:
+        """{"subject", "html", "text"} for one message; every field must be given"""
+        missing = self.fields - fields.keys()
+        if missing:
+            raise KeyError(f"Missing email template fields: {', '.join(sorted(missing))}")
+        values = {name: str(value) for name, value in fields.items()}
+        escaped = {name: _escape(value) for name, value in values.items()}
+        return {
+            "subject": self._subject.fill(values),
+            "html": self._html.fill(escaped),
+            "text": self._text.fill(values),
+        }
@@ -4,39 +4,18 @@ Email Service for Celloxen Patient Portal
 Handles all patient email notifications
 """
 
-import os
-import asyncio
-import aiosmtplib
-from email.mime.text import MIMEText
-from email.mime.multipart import MIMEMultipart
 from datetime import datetime
-import asyncpg
-from dotenv import load_dotenv
+from urllib.parse import quote
 
-# Load environment variables
-load_dotenv('/var/www/.env')
+from db_pool import get_db_connection
+from email_outbox import queue_email
+from email_render import EmailTemplate, Layout
 
-# SMTP Configuration from environment
-SMTP_HOST = os.getenv("SMTP_HOST", "smtp.ionos.co.uk")
-SMTP_PORT = int(os.getenv("SMTP_PORT", "587"))
-SMTP_USER = os.getenv("SMTP_USER", "health@celloxen.com")
-SMTP_PASSWORD = os.getenv("SMTP_PASSWORD", "Kuwait1000$$")
-SMTP_FROM_EMAIL = os.getenv("SMTP_FROM_EMAIL", "health@celloxen.com")
-SMTP_FROM_NAME = os.getenv("SMTP_FROM_NAME", "Celloxen Health Portal")
 
-# Database Configuration
-DB_HOST = os.getenv("DB_HOST", "localhost")
-DB_PORT = os.getenv("DB_PORT", "5432")
-DB_USER = os.getenv("DB_USER", "celloxen_user")
-DB_PASSWORD = os.getenv("DB_PASSWORD", "CelloxenSecure2025")
-DB_NAME = os.getenv("DB_NAME", "celloxen_portal")
-
-print(f"SMTP Config: {SMTP_HOST}:{SMTP_PORT}, User: {SMTP_USER}")
-
-
-async def send_email(to_email: str, subject: str, html_content: str, patient_id: int = None, email_type: str = "notification"):
+async def send_email(to_email: str, subject: str, html_content: str, patient_id: int = None, email_type: str = "notification",
+                     text_content: str = None):
     """
-    Send email using IONOS SMTP
+    Queue an email for the outbox dispatcher (email_outbox.py)
     
     Args:
         to_email: Recipient email address
@@ -44,113 +23,65 @@ async def send_email(to_email: str, subject: str, html_content: str, patient_id:
         html_content: HTML email body
         patient_id: Patient ID for logging
         email_type: Type of email (welcome, password_reset, report_ready, etc.)
+        text_content: Plain-text alternative (optional)
     
     Returns:
-        bool: True if sent successfully
+        bool: True if queued successfully
     """
     try:
-        # Create message
-        message = MIMEMultipart("alternative")
-        message["From"] = f"{SMTP_FROM_NAME} <{SMTP_FROM_EMAIL}>"
-        message["To"] = to_email
-        message["Subject"] = subject
-        
-        # Attach HTML content
-        html_part = MIMEText(html_content, "html")
-        message.attach(html_part)
-        
-        print(f"Attempting to send email to {to_email} via {SMTP_HOST}:{SMTP_PORT}")
-        
-        # Send via IONOS SMTP
-        await aiosmtplib.send(
-            message,
-            hostname=SMTP_HOST,
-            port=SMTP_PORT,
-            username=SMTP_USER,
-            password=SMTP_PASSWORD,
-            start_tls=True,
-            timeout=30
-        )
-        
-        # Log success
-        await log_email(patient_id, email_type, to_email, subject, "SENT")
-        
-        print(f"✅ Email sent to {to_email}: {subject}")
+        async with get_db_connection() as conn:
+            await queue_email(conn, to_email, subject, html_content, text_content, email_type=email_type, patient_id=patient_id)
+        print(f"✅ Email queued for {to_email}: {subject}")
         return True
         
     except Exception as e:
-        print(f"❌ Email send failed to {to_email}: {str(e)}")
-        import traceback
-        traceback.print_exc()
-        await log_email(patient_id, email_type, to_email, subject, "FAILED", str(e))
+        print(f"❌ Email queue failed for {to_email}: {str(e)}")
         return False
 
 
-async def log_email(patient_id: int, email_type: str, sent_to: str, subject: str, status: str, error: str = None):
-    """Log email to database"""
-    try:
-        conn = await asyncpg.connect(
-            host=DB_HOST,
-            port=int(DB_PORT),
-            user=DB_USER,
-            password=DB_PASSWORD,
-            database=DB_NAME
-        )
-        
-        await conn.execute("""
-            INSERT INTO email_logs (patient_id, email_type, sent_to_email, subject, status, error_message)
-            VALUES ($1, $2, $3, $4, $5, $6)
-        """, patient_id, email_type, sent_to, subject, status, error)
-        
-        await conn.close()
-    except Exception as e:
-        print(f"Email log error: {str(e)}")
-
-
 # ============================================================================
 # EMAIL TEMPLATES
 # ============================================================================
 
-def get_email_base_template(content: str) -> str:
-    """Base email template with Celloxen branding"""
-    return f"""
+# Base layout with Celloxen branding; compiled into each template below
+PORTAL_LAYOUT = Layout("""
 <!DOCTYPE html>
 <html>
 <head>
     <meta charset="UTF-8">
     <meta name="viewport" content="width=device-width, initial-scale=1.0">
     <style>
-        body {{
+        body {
             font-family: -apple-system, BlinkMacSystemFont, 'Segoe UI', Roboto, Arial, sans-serif;
             background-color: #f1f5f9;
             margin: 0;
             padding: 20px;
-        }}
-        .container {{
+        }
+        .container {
             max-width: 600px;
             margin: 0 auto;
             background: #ffffff;
             border-radius: 12px;
             overflow: hidden;
             box-shadow: 0 4px 12px rgba(0, 0, 0, 0.1);
-        }}
-        .header {{
+        }
+        .header {
             background: linear-gradient(135deg, #1e3a5f 0%, #2c5282 100%);
             color: white;
             padding: 30px;
             text-align: center;
-        }}
-        .header h1 {{
+        }
+        .header h1 {
             margin: 0;
             font-size: 24px;
             font-weight: 700;
-        }}
-        .content {{
+        }
+        .content {
             padding: 30px;
             color: #334155;
             line-height: 1.6;
-        }}
-        .button {{
+        }
+        .button {
             display: inline-block;
             background: #1e3a5f;
             color: white !important;
@@ -159,21 +90,21 @@ def get_email_base_template(content: str) -> str:
             border-radius: 8px;
             font-weight: 600;
             margin: 20px 0;
-        }}
-        .footer {{
+        }
+        .footer {
             background: #f8fafc;
             padding: 20px 30px;
             text-align: center;
             color: #64748b;
             font-size: 12px;
-        }}
-        .info-box {{
+        }
+        .info-box {
             background: #e0f2fe;
             border-left: 4px solid #0284c7;
             padding: 15px;
             margin: 20px 0;
             border-radius: 4px;
-        }}
+        }
     </style>
 </head>
 <body>
@@ -182,7 +113,7 @@ def get_email_base_template(content: str) -> str:
             <h1>🔬 Celloxen Health Portal</h1>
         </div>
         <div class="content">
-            {content}
+            $content
         </div>
         <div class="footer">
             <p><strong>Aberdeen Wellness Centre</strong></p>
@@ -192,20 +123,21 @@ def get_email_base_template(content: str) -> str:
     </div>
 </body>
 </html>
-    """
+    """)
 
 
-async def send_welcome_email(patient_email: str, patient_name: str, patient_id: int, temporary_password: str = None):
-    """Send welcome email to new patient"""
-    content = f"""
+WELCOME_EMAIL = EmailTemplate(
+    subject="Welcome to Celloxen Health Portal",
+    layout=PORTAL_LAYOUT,
+    content="""
         <h2>Welcome to Celloxen Health Portal! 👋</h2>
-        <p>Dear {patient_name},</p>
+        <p>Dear $patient_name,</p>
         <p>Your patient account has been created at Aberdeen Wellness Centre. You can now access your health reports and appointments online.</p>
         
         <div class="info-box">
             <strong>Your Login Details:</strong><br>
-            Email: {patient_email}<br>
-            {"Password: " + temporary_password if temporary_password else "Password: (Set by staff)"}
+            Email: $patient_email<br>
+            Password: $password
         </div>
         
         <p style="text-align: center;">
@@ -223,24 +155,18 @@ async def send_welcome_email(patient_email: str, patient_name: str, patient_id:
         <p>If you have any questions, please contact our office.</p>
         <p>Best regards,<br><strong>Aberdeen Wellness Centre Team</strong></p>
     """
-    
-    html = get_email_base_template(content)
-    subject = "Welcome to Celloxen Health Portal"
-    
-    return await send_email(patient_email, subject, html, patient_id, "welcome")
+)
 
-
-async def send_password_reset_email(patient_email: str, patient_name: str, patient_id: int, reset_token: str):
-    """Send password reset email"""
-    reset_link = f"http://celloxen.com/patient_portal.html?reset_token={reset_token}"
-    
-    content = f"""
+PASSWORD_RESET_EMAIL = EmailTemplate(
+    subject="Password Reset - Celloxen Health Portal",
+    layout=PORTAL_LAYOUT,
+    content="""
         <h2>Password Reset Request 🔒</h2>
-        <p>Dear {patient_name},</p>
+        <p>Dear $patient_name,</p>
         <p>We received a request to reset your password for your Celloxen patient account.</p>
         
         <p style="text-align: center;">
-            <a href="{reset_link}" class="button">Reset Your Password</a>
+            <a href="http://celloxen.com/patient_portal.html?reset_token=$reset_token" class="button">Reset Your Password</a>
         </p>
         
         <div class="info-box">
@@ -253,30 +179,24 @@ async def send_password_reset_email(patient_email: str, patient_name: str, patie
         
         <p>Best regards,<br><strong>Aberdeen Wellness Centre Team</strong></p>
     """
-    
-    html = get_email_base_template(content)
-    subject = "Password Reset - Celloxen Health Portal"
-    
-    return await send_email(patient_email, subject, html, patient_id, "password_reset")
-
+)
 
-async def send_report_ready_email(patient_email: str, patient_name: str, patient_id: int, report_number: str):
-    """Send notification when new report is ready"""
-    portal_link = "http://celloxen.com/patient_portal.html"
-    
-    content = f"""
+REPORT_READY_EMAIL = EmailTemplate(
+    subject="Your Report is Ready - $report_number",
+    layout=PORTAL_LAYOUT,
+    content="""
         <h2>New Report Available 📄</h2>
-        <p>Dear {patient_name},</p>
+        <p>Dear $patient_name,</p>
         <p>Good news! Your iridology analysis report is now ready to view.</p>
         
         <div class="info-box">
             <strong>Report Details:</strong><br>
-            Report Number: {report_number}<br>
-            Date: {datetime.now().strftime('%d %B %Y')}
+            Report Number: $report_number<br>
+            Date: $report_date
         </div>
         
         <p style="text-align: center;">
-            <a href="{portal_link}" class="button">View Your Report</a>
+            <a href="http://celloxen.com/patient_portal.html" class="button">View Your Report</a>
         </p>
         
         <p><strong>What's in your report:</strong></p>
@@ -290,26 +210,21 @@ async def send_report_ready_email(patient_email: str, patient_name: str, patient
         <p>Log in to your patient portal to view your complete report and analysis.</p>
         <p>Best regards,<br><strong>Aberdeen Wellness Centre Team</strong></p>
     """
-    
-    html = get_email_base_template(content)
-    subject = f"Your Report is Ready - {report_number}"
-    
-    return await send_email(patient_email, subject, html, patient_id, "report_ready")
-
+)
 
-async def send_appointment_reminder_email(patient_email: str, patient_name: str, patient_id: int, 
-                                         appointment_date: str, appointment_time: str, practitioner_name: str):
-    """Send appointment reminder email"""
-    content = f"""
+APPOINTMENT_REMINDER_EMAIL = EmailTemplate(
+    subject="Appointment Reminder - $appointment_date",
+    layout=PORTAL_LAYOUT,
+    content="""
         <h2>Appointment Reminder 📅</h2>
-        <p>Dear {patient_name},</p>
+        <p>Dear $patient_name,</p>
         <p>This is a friendly reminder about your upcoming appointment at Aberdeen Wellness Centre.</p>
         
         <div class="info-box">
             <strong>Appointment Details:</strong><br>
-            Date: {appointment_date}<br>
-            Time: {appointment_time}<br>
-            Practitioner: {practitioner_name}<br>
+            Date: $appointment_date<br>
+            Time: $appointment_time<br>
+            Practitioner: $practitioner_name<br>
             Location: Aberdeen Wellness Centre
         </div>
         
@@ -327,26 +242,21 @@ async def send_appointment_reminder_email(patient_email: str, patient_name: str,
         <p>We look forward to seeing you!</p>
         <p>Best regards,<br><strong>Aberdeen Wellness Centre Team</strong></p>
     """
-    
-    html = get_email_base_template(content)
-    subject = f"Appointment Reminder - {appointment_date}"
-    
-    return await send_email(patient_email, subject, html, patient_id, "appointment_reminder")
-
+)
 
-async def send_appointment_confirmation_email(patient_email: str, patient_name: str, patient_id: int,
-                                              appointment_date: str, appointment_time: str, appointment_type: str):
-    """Send appointment confirmation email"""
-    content = f"""
+APPOINTMENT_CONFIRMATION_EMAIL = EmailTemplate(
+    subject="Appointment Confirmed",
+    layout=PORTAL_LAYOUT,
+    content="""
         <h2>Appointment Confirmed ✅</h2>
-        <p>Dear {patient_name},</p>
+        <p>Dear $patient_name,</p>
         <p>Your appointment at Aberdeen Wellness Centre has been confirmed!</p>
         
         <div class="info-box">
             <strong>Appointment Details:</strong><br>
-            Date: {appointment_date}<br>
-            Time: {appointment_time}<br>
-            Type: {appointment_type}<br>
+            Date: $appointment_date<br>
+            Time: $appointment_time<br>
+            Type: $appointment_type<br>
             Location: Aberdeen Wellness Centre
         </div>
         
@@ -364,11 +274,71 @@ async def send_appointment_confirmation_email(patient_email: str, patient_name:
         <p>Need to reschedule? Contact us or use the patient portal.</p>
         <p>Best regards,<br><strong>Aberdeen Wellness Centre Team</strong></p>
     """
-    
-    html = get_email_base_template(content)
-    subject = "Appointment Confirmed"
-    
-    return await send_email(patient_email, subject, html, patient_id, "appointment_confirmation")
+)
+
+
+async def _send_template(template: EmailTemplate, patient_email: str, patient_id: int, email_type: str, **fields):
+    email = template.render(**fields)
+    return await send_email(patient_email, email["subject"], email["html"], patient_id, email_type, email["text"])
+
+
+async def send_welcome_email(patient_email: str, patient_name: str, patient_id: int, temporary_password: str = None):
+    """Send welcome email to new patient"""
+    return await _send_template(
+        WELCOME_EMAIL, patient_email, patient_id, "welcome",
+        patient_name=patient_name,
+        patient_email=patient_email,
+        password=temporary_password or "(Set by staff)"
+    )
+
+
+async def send_password_reset_email(patient_email: str, patient_name: str, patient_id: int, reset_token: str):
+    """Send password reset email"""
+    return await _send_template(
+        PASSWORD_RESET_EMAIL, patient_email, patient_id, "password_reset",
+        patient_name=patient_name,
+        reset_token=quote(reset_token, safe="")
+    )
+
+
+async def send_report_ready_email(patient_email: str, patient_name: str, patient_id: int, report_number: str):
+    """Send notification when new report is ready"""
+    return await _send_template(
+        REPORT_READY_EMAIL, patient_email, patient_id, "report_ready",
+        patient_name=patient_name,
+        report_number=report_number,
+        report_date=datetime.now().strftime('%d %B %Y')
+    )
+
+
+def render_appointment_reminder_email(patient_name: str, appointment_date: str,
+                                      appointment_time: str, practitioner_name: str) -> dict:
+    """{"subject", "html", "text"} for an appointment reminder"""
+    return APPOINTMENT_REMINDER_EMAIL.render(
+        patient_name=patient_name,
+        appointment_date=appointment_date,
+        appointment_time=appointment_time,
+        practitioner_name=practitioner_name
+    )
+
+
+async def send_appointment_reminder_email(patient_email: str, patient_name: str, patient_id: int, 
+                                         appointment_date: str, appointment_time: str, practitioner_name: str):
+    """Send appointment reminder email"""
+    email = render_appointment_reminder_email(patient_name, appointment_date, appointment_time, practitioner_name)
+    return await send_email(patient_email, email["subject"], email["html"], patient_id, "appointment_reminder", email["text"])
+
+
+async def send_appointment_confirmation_email(patient_email: str, patient_name: str, patient_id: int,
+                                              appointment_date: str, appointment_time: str, appointment_type: str):
+    """Send appointment confirmation email"""
+    return await _send_template(
+        APPOINTMENT_CONFIRMATION_EMAIL, patient_email, patient_id, "appointment_confirmation",
+        patient_name=patient_name,
+        appointment_date=appointment_date,
+        appointment_time=appointment_time,
+        appointment_type=appointment_type
+    )
 
 
 # Test function
@@ -398,5 +368,15 @@ async def test_email_system():
 
 
 if __name__ == "__main__":
-    # Test the email system
-    asyncio.run(test_email_system())
+    import asyncio
+    from db_pool import init_pool, close_pool
+
+    async def main():
+        # Queues the message; the app's dispatcher sends it
+        await init_pool()
+        try:
+            return await test_email_system()
+        finally:
+            await close_pool()
+
+    asyncio.run(main())
@@ -0,0 +1,144 @@
+"""
+EXPORTS - Streaming CSV / NDJSON exports of clinic data
+Rows are read through an asyncpg server-side cursor inside a read-only
+REPEATABLE READ transaction (one consistent snapshot) and encoded in
+batches of EXPORT_BATCH_ROWS straight into the response, so memory stays
+flat whatever the size of the clinic.
+
+Each export holds a pooled connection until the client has downloaded
+it; EXPORT_MAX_CONCURRENT bounds how many run at once per worker and
+further requests wait their turn.
+"""
+import asyncio
+import csv
+import io
+import json
+import os
+import re
+from datetime import date, datetime, time
+from decimal import Decimal
+from typing import AsyncIterator
+
+from db_pool import get_db_connection
+
+EXPORT_BATCH_ROWS = int(os.getenv("EXPORT_BATCH_ROWS", "500"))
+EXPORT_MAX_CONCURRENT = int(os.getenv("EXPORT_MAX_CONCURRENT", "2"))
+
+EXPORT_FORMATS = {
+    "csv": "text/csv; charset=utf-8",
+    "ndjson": "application/x-ndjson",
+}
+
+# dataset -> (query taking $1 = clinic_id, JSON columns)
+EXPORTS = {
+    "patients": ("""
+        SELECT p.id, p.patient_number, p.first_name, p.last_name, p.email, p.mobile_phone,
+               p.date_of_birth, p.gender, p.address_line1, p.address_line2, p.city,
+               p.county, p.postcode, p.status, p.portal_access, p.created_at
+        FROM patients p
+        WHERE p.clinic_id = $1
+        ORDER BY p.id
+    """, ()),
+    "appointments": ("""
+        SELECT a.id, a.appointment_number, a.patient_id, p.patient_number,
+               p.first_name || ' ' || p.last_name AS patient_name,
+               a.appointment_type, a.appointment_date, a.appointment_time,
+               a.duration_minutes, a.status, a.practitioner_id, a.created_at
+        FROM appointments a
+        LEFT JOIN patients p ON a.patient_id = p.id
+        WHERE a.clinic_id = $1
+        ORDER BY a.id
+    """, ()),
+    "patient_invoices": ("""
+        SELECT i.id, i.invoice_number, i.patient_id, p.patient_number,
+               p.first_name || ' ' || p.last_name AS patient_name,
+               i.amount, i.description, i.service_date, i.due_date, i.status,
+               i.paid_at, i.payment_method, i.created_at
+        FROM patient_invoices i
+        LEFT JOIN patients p ON i.patient_id = p.id
+        WHERE i.clinic_id = $1
+        ORDER BY i.id
+    """, ()),
+    # comprehensive_assessments has no reliable clinic_id; scope via the patient
+    "comprehensive_assessments": ("""
+        SELECT ca.id, ca.patient_id, p.patient_number,
+               p.first_name || ' ' || p.last_name AS patient_name,
+               ca.assessment_date, ca.overall_wellness_score, ca.questionnaire_scores
+        FROM comprehensive_assessments ca
+        JOIN patients p ON ca.patient_id = p.id
+        WHERE p.clinic_id = $1
+        ORDER BY ca.id
+    """, ("questionnaire_scores",)),
+}
+
+_export_slots = asyncio.Semaphore(EXPORT_MAX_CONCURRENT)
+
+
+# A leading + or - is only a formula when something other than a number
+# or phone number follows (+44 7700 900123, -12.5 are left alone)
+_PLAIN_NUMBER = re.compile(r"[+-][\d\s().-]*\d[\d\s().-]*")
+
+
+def _is_formula(value: str) -> bool:
+    first = value[:1]
+    if first in ("=", "@", "\t", "\r"):
+        return True
+    return first in ("+", "-") and not _PLAIN_NUMBER.fullmatch(value)
+
+
+def _csv_cell(value):
+    if value is None:
+        return ""
+    if isinstance(value, (datetime, date, time)):
+        return value.isoformat()
+    if isinstance(value, str) and _is_formula(value):
+        # Stop spreadsheets from evaluating user-entered text as a formula
+        return "'" + value
+    return value
+
+
+def _json_value(value):
+    if isinstance(value, (datetime, date, time)):
+        return value.isoformat()
+    if isinstance(value, Decimal):
+        return float(value)
+    return str(value)
+
+
+def _encode_csv(rows) -> bytes:
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerows([_csv_cell(v) for v in row] for row in rows)
+    return buffer.getvalue().encode("utf-8")
+
+
+def _encode_ndjson(columns, json_columns, rows) -> bytes:
+    lines = []
+    for row in rows:
+        record = dict(zip(columns, row))
+        for column in json_columns:
+            if isinstance(record.get(column), str):
+                record[column] = json.loads(record[column])
+        lines.append(json.dumps(record, default=_json_value))
+    return ("\n".join(lines) + "\n").encode("utf-8")
+
+
+async def iter_export(dataset: str, clinic_id: int, fmt: str) -> AsyncIterator[bytes]:
+    """Yield the encoded export in chunks of EXPORT_BATCH_ROWS rows"""
+    query, json_columns = EXPORTS[dataset]
+    async with _export_slots:
+        async with get_db_connection() as conn:
+            async with conn.transaction(isolation="repeatable_read", readonly=True):
+                statement = await conn.prepare(query)
+                columns = [attr.name for attr in statement.get_attributes()]
+                if fmt == "csv":
+                    yield _encode_csv([columns])
+
+                batch = []
+                async for record in statement.cursor(clinic_id, prefetch=EXPORT_BATCH_ROWS):
+                    batch.append(tuple(record))
+                    if len(batch) >= EXPORT_BATCH_ROWS:
+                        yield _encode_csv(batch) if fmt == "csv" else _encode_ndjson(columns, json_columns, batch)
+                        batch = []
+                if batch:
+                    yield _encode_csv(batch) if fmt == "csv" else _encode_ndjson(columns, json_columns, batch)
@@ -0,0 +1,205 @@
+"""
+IMAGE PREPROCESS - Normalise iris photos before they are sent to Claude
+Phone captures arrive at full sensor resolution with arbitrary EXIF
+orientation. Each image is decoded, EXIF-oriented, cropped to a square
+centred on the pupil, resized to IRIS_MAX_EDGE and re-encoded as JPEG or
+WebP. By default the square spans the image's full short edge, which only
+trims the long sides; a tighter crop to the iris itself is opt-in through
+IRIS_CROP_FRACTION, since the iris's share of the frame varies by camera.
+
+The work runs in a small process pool (Pillow decoding is CPU-bound and
+would otherwise stall the event loop), and the output is cached next to
+the blob store keyed by the source blob hash plus the settings, so a
+retried or repeated analysis never reprocesses the same image.
+
+If Pillow is not installed, or an image cannot be decoded, the original
+bytes are sent unchanged.
+"""
+import asyncio
+import base64
+import os
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+from typing import Optional, Tuple
+
+from blob_store import BLOB_STORE_DIR, blob_path, read_blob, sniff_content_type
+
+try:
+    from PIL import Image, ImageOps
+except ImportError:  # pragma: no cover - optional in dev environments
+    Image = None
+    print("⚠️ Pillow not installed - iris images will be sent unprocessed")
+
+# Claude downscales square images above ~1092px (about 1,600 image tokens),
+# so anything larger only adds upload time
+IRIS_MAX_EDGE = int(os.getenv("IRIS_MAX_EDGE", "1092"))
+IRIS_IMAGE_FORMAT = os.getenv("IRIS_IMAGE_FORMAT", "JPEG").upper()  # JPEG or WEBP
+IRIS_IMAGE_QUALITY = int(os.getenv("IRIS_IMAGE_QUALITY", "85"))
+# Side of the square crop as a fraction of the short edge. 1.0 keeps the
+# whole short edge (no tighter iris crop); lower values crop towards the
+# pupil. 0 disables cropping.
+IRIS_CROP_FRACTION = float(os.getenv("IRIS_CROP_FRACTION", "1.0"))
+IRIS_PREPROCESS_WORKERS = int(os.getenv("IRIS_PREPROCESS_WORKERS", "2"))
+
+DERIVED_DIR = os.path.join(BLOB_STORE_DIR, "derived")
+
+_MEDIA_TYPES = {"JPEG": "image/jpeg", "WEBP": "image/webp"}
+_EXTENSIONS = {"JPEG": "jpg", "WEBP": "webp"}
+if IRIS_IMAGE_FORMAT not in _MEDIA_TYPES:
+    IRIS_IMAGE_FORMAT = "JPEG"
+
+_executor: Optional[ProcessPoolExecutor] = None
+
+
+def _variant() -> str:
+    """Settings fingerprint - changing any setting gives a fresh cache entry"""
+    return f"{IRIS_MAX_EDGE}_{IRIS_IMAGE_FORMAT.lower()}_q{IRIS_IMAGE_QUALITY}_c{IRIS_CROP_FRACTION:g}"
+
+
+def derived_path(key: str) -> str:
+    blob_path(key)  # validates the key
+    return os.path.join(DERIVED_DIR, key[:2], f"{key}_{_variant()}.{_EXTENSIONS[IRIS_IMAGE_FORMAT]}")
+
+
+# ============================================================================
+# WORKER-SIDE PROCESSING (runs in the process pool)
+# ============================================================================
+
+def _pupil_centre(img) -> Optional[Tuple[float, float]]:
+    """Rough pupil location: centroid of the darkest pixels in the central region"""
+    small = img.convert("L")
+    small.thumbnail((128, 128))
+    w, h = small.size
+    pixels = small.load()
+
+    # Ignore the outer 15% where hair, lashes and shadows live
+    x0, x1 = int(w * 0.15), int(w * 0.85)
+    y0, y1 = int(h * 0.15), int(h * 0.85)
+    values = sorted(pixels[x, y] for y in range(y0, y1) for x in range(x0, x1))
+    if not values:
+        return None
+    threshold = values[max(int(len(values) * 0.03) - 1, 0)]
+
+    xs = ys = count = 0
+    for y in range(y0, y1):
+        for x in range(x0, x1):
+            if pixels[x, y] <= threshold:
+                xs += x
+                ys += y
+                count += 1
+    if count == 0:
+        return None
+    scale_x = img.size[0] / w
+    scale_y = img.size[1] / h
+    return (xs / count + 0.5) * scale_x, (ys / count + 0.5) * scale_y
+
+
+def _crop_to_iris(img, fraction: float):
+    w, h = img.size
+    side = int(min(w, h) * fraction)
+    if side <= 0 or side >= max(w, h):
+        return img
+    cx, cy = _pupil_centre(img) or (w / 2, h / 2)
+    left = int(min(max(cx - side / 2, 0), w - side))
+    top = int(min(max(cy - side / 2, 0), h - side))
+    return img.crop((left, top, left + side, top + side))
+
+
+def preprocess_file(
+    source_path: str,
+    output_path: str,
+    max_edge: int,
+    image_format: str,
+    quality: int,
+    crop_fraction: float
+) -> int:
+    """Decode, orient, crop, resize and re-encode source_path into output_path.
+
+    Returns the encoded size in bytes. Module-level so it can be pickled
+    into ProcessPoolExecutor workers.
+    """
+    with Image.open(source_path) as img:
+        img = ImageOps.exif_transpose(img)
+        if img.mode != "RGB":
+            img = img.convert("RGB")
+        if crop_fraction > 0:
+            img = _crop_to_iris(img, crop_fraction)
+        if max(img.size) > max_edge:
+            img.thumbnail((max_edge, max_edge), Image.LANCZOS)
+
+        directory = os.path.dirname(output_path)
+        os.makedirs(directory, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=".tmp-")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                if image_format == "WEBP":
+                    img.save(f, "WEBP", quality=quality, method=4)
+                else:
+                    img.save(f, "JPEG", quality=quality, optimize=True, progressive=True)
+            os.replace(tmp_path, output_path)
+        except Exception:
+            if os.path.exists(tmp_path):
+                os.unlink(tmp_path)
+            raise
+    return os.path.getsize(output_path)
+
+
+# ============================================================================
+# ASYNC API
+# ============================================================================
+
+def _get_executor() -> ProcessPoolExecutor:
+    global _executor
+    if _executor is None:
+        _executor = ProcessPoolExecutor(max_workers=IRIS_PREPROCESS_WORKERS)
+    return _executor
+
+
+def start_image_pool():
+    """Fork the workers up front, before the DB pool and thread executors hold any locks"""
+    executor = _get_executor()
+    for _ in range(IRIS_PREPROCESS_WORKERS):
+        executor.submit(int)
+    print(f"✅ Image preprocessing pool started ({IRIS_PREPROCESS_WORKERS} workers)")
+
+
+def shutdown_image_pool():
+    """Stop the worker processes (called from the lifespan hook)"""
+    global _executor
+    if _executor is not None:
+        _executor.shutdown(wait=False, cancel_futures=True)
+        _executor = None
+
+
+async def prepare_iris_image(key: str) -> Tuple[str, str]:
+    """Return (base64, media_type) of the model-ready version of a stored image"""
+    if Image is not None:
+        output_path = derived_path(key)
+        if not await asyncio.to_thread(os.path.exists, output_path):
+            loop = asyncio.get_running_loop()
+            try:
+                await loop.run_in_executor(
+                    _get_executor(),
+                    preprocess_file,
+                    blob_path(key),
+                    output_path,
+                    IRIS_MAX_EDGE,
+                    IRIS_IMAGE_FORMAT,
+                    IRIS_IMAGE_QUALITY,
+                    IRIS_CROP_FRACTION
+                )
+            except Exception as e:
+                print(f"❌ Iris preprocessing failed for {key[:12]}, sending original: {e}")
+                output_path = None
+        if output_path:
+            data = await asyncio.to_thread(_read_file, output_path)
+            return base64.b64encode(data).decode("ascii"), _MEDIA_TYPES[IRIS_IMAGE_FORMAT]
+
+    data = await asyncio.to_thread(read_blob, key)
+    media_type = await asyncio.to_thread(sniff_content_type, key)
+    return base64.b64encode(data).decode("ascii"), media_type
+
+
+def _read_file(path: str) -> bytes:
+    with open(path, "rb") as f:
+        return f.read()
@@ -5,7 +5,6 @@ Invitation API - Send registration invitations to patients
 from fastapi import APIRouter, HTTPException
 from pydantic import BaseModel, EmailStr
 from typing import Optional
-import psycopg2
 from psycopg2.extras import RealDictCursor
 from datetime import datetime, timedelta
 import secrets
@@ -13,19 +12,14 @@ import string
 
 from email_sender import send_email
 from email_templates import get_invitation_email
-from email_config import DB_HOST, DB_NAME, DB_USER, DB_PASSWORD
+from db_pool import get_sync_connection, release_sync_connection
 
 router = APIRouter(prefix="/api/v1/invitations", tags=["invitations"])
 
 
 def get_db():
-    """Get database connection"""
-    return psycopg2.connect(
-        host=DB_HOST,
-        database=DB_NAME,
-        user=DB_USER,
-        password=DB_PASSWORD
-    )
+    """Get database connection from the shared psycopg2 pool"""
+    return get_sync_connection()
 
 
 class InvitationRequest(BaseModel):
@@ -36,12 +30,14 @@ class InvitationRequest(BaseModel):
 
 
 @router.post("/send")
-async def send_invitation(request: InvitationRequest):
+def send_invitation(request: InvitationRequest):
     """
     Send registration invitation to a patient
     - If patient exists: Update with new token
     - If patient doesn't exist: Create new patient with token
+    Sync handler: DB and SMTP work runs on the FastAPI threadpool.
     """
+    conn = None
     try:
         conn = get_db()
         cur = conn.cursor(cursor_factory=RealDictCursor)
@@ -86,6 +82,9 @@ async def send_invitation(request: InvitationRequest):
             patient_id = result['id']
         
         conn.commit()
+        cur.close()
+        release_sync_connection(conn)
+        conn = None
         
         # Send invitation email
         template = get_invitation_email(
@@ -97,13 +96,11 @@ async def send_invitation(request: InvitationRequest):
             to_email=request.email,
             subject=template['subject'],
             html_content=template['html'],
+            text_content=template['text'],
             patient_id=patient_id,
             email_type="INVITATION"
         )
         
-        cur.close()
-        conn.close()
-        
         return {
             "success": True,
             "message": "Invitation sent successfully",
@@ -115,3 +112,6 @@ async def send_invitation(request: InvitationRequest):
         
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
+    finally:
+        if conn is not None:
+            release_sync_connection(conn)
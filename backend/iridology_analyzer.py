@@ -6,12 +6,20 @@ VERSION 2.0 - UK Compliant (No Supplement Recommendations)
 Updated: 26 November 2025
 """
 
-import anthropic
+import asyncio
+import hashlib
 import json
 import os
 from typing import Dict, Optional
 from datetime import datetime
 
+from ai_client import get_ai_client, create_message
+from ai_cache import make_cache_key, get_cached, put_cached
+
+# Bump when prompts or response handling change in a way the prompt text
+# alone does not capture - cached results from older versions then miss
+PROMPT_VERSION = "2.0"
+
 def clean_base64_image(base64_string: str) -> str:
     """Remove data URL prefix from base64 string if present"""
     if "," in base64_string and base64_string.startswith("data:"):
@@ -24,7 +32,7 @@ class IridologyAnalyzer:
 
     def __init__(self, api_key: Optional[str] = None):
         self.api_key = api_key or os.getenv('ANTHROPIC_API_KEY')
-        self.client = anthropic.Anthropic(api_key=self.api_key)
+        self.client = get_ai_client(self.api_key)
         self.model = "claude-sonnet-4-20250514"
 
     def create_analysis_prompt(self, patient_info: Dict) -> str:
@@ -136,14 +144,25 @@ REMEMBER:
         self,
         image_base64: str,
         eye_side: str,
-        patient_info: Dict
+        patient_info: Dict,
+        media_type: str = "image/jpeg"
     ) -> Dict:
         """Analyse single iris image using Claude API"""
 
         prompt = self.create_analysis_prompt(patient_info)
 
+        # The rendered prompt carries the patient fields (name, age, gender)
+        cache_key = make_cache_key(
+            "iris", self.model, PROMPT_VERSION, prompt, eye_side, media_type,
+            hashlib.sha256(image_base64.encode("ascii")).hexdigest()
+        )
+        cached = await get_cached(cache_key)
+        if cached:
+            return {**cached, "cache_hit": True}
+
         try:
-            message = self.client.messages.create(
+            message = await create_message(
+                self.client,
                 model=self.model,
                 max_tokens=4000,
                 messages=[
@@ -158,7 +177,7 @@ REMEMBER:
                                 "type": "image",
                                 "source": {
                                     "type": "base64",
-                                    "media_type": "image/jpeg",
+                                    "media_type": media_type,
                                     "data": image_base64
                                 }
                             }
@@ -180,13 +199,17 @@ REMEMBER:
                 except:
                     analysis = {"raw_text": response_text, "parsed": False}
 
-            return {
+            result = {
                 "success": True,
                 "eye_side": eye_side,
                 "analysis": analysis,
                 "model": self.model,
                 "timestamp": datetime.now().isoformat()
             }
+            # An unparseable reply is returned but not cached, so a retry asks again
+            if not (isinstance(analysis, dict) and analysis.get("parsed") is False):
+                await put_cached(cache_key, "iris", self.model, PROMPT_VERSION, result)
+            return result
 
         except Exception as e:
             return {
@@ -199,7 +222,9 @@ REMEMBER:
         self,
         left_eye_base64: str,
         right_eye_base64: str,
-        patient_info: Dict
+        patient_info: Dict,
+        left_media_type: str = "image/jpeg",
+        right_media_type: str = "image/jpeg"
     ) -> Dict:
         """Analyse both eyes and synthesise comprehensive report"""
 
@@ -207,34 +232,35 @@ REMEMBER:
         left_eye_base64 = clean_base64_image(left_eye_base64)
         right_eye_base64 = clean_base64_image(right_eye_base64)
 
-        # Analyse left eye
-        left_result = await self.analyse_single_iris(
-            left_eye_base64,
-            "left",
-            patient_info
+        # Analyse both eyes concurrently - a failure on one side does not
+        # cancel the other
+        left_result, right_result = await asyncio.gather(
+            self.analyse_single_iris(left_eye_base64, "left", patient_info, left_media_type),
+            self.analyse_single_iris(right_eye_base64, "right", patient_info, right_media_type),
+            return_exceptions=True
         )
+        left_result = self._eye_result(left_result, "left")
+        right_result = self._eye_result(right_result, "right")
 
-        if not left_result["success"]:
-            return left_result
-
-        # Analyse right eye
-        right_result = await self.analyse_single_iris(
-            right_eye_base64,
-            "right",
-            patient_info
-        )
-
-        if not right_result["success"]:
-            return right_result
+        failed_eyes = [r["eye_side"] for r in (left_result, right_result) if not r["success"]]
+        if len(failed_eyes) == 2:
+            return {
+                "success": False,
+                "error": f"Left eye: {left_result['error']}; Right eye: {right_result['error']}",
+                "partial_results": {
+                    "left": left_result,
+                    "right": right_result
+                }
+            }
 
         # Synthesise comprehensive narrative report
         synthesis_prompt = f"""Based on these bilateral iris analyses, create a COMPREHENSIVE WELLNESS REPORT in flowing narrative prose.
 
 LEFT EYE FINDINGS:
-{json.dumps(left_result.get('analysis', {}), indent=2)}
+{self._findings_for_prompt(left_result)}
 
 RIGHT EYE FINDINGS:
-{json.dumps(right_result.get('analysis', {}), indent=2)}
+{self._findings_for_prompt(right_result)}
 
 PATIENT: {patient_info.get('name', 'Patient')}, Age: {patient_info.get('age', 'Unknown')}
 
@@ -294,19 +320,27 @@ CRITICAL REQUIREMENTS:
 
 Write in flowing prose, not bullet points where possible. Make it feel like a caring practitioner explaining findings."""
 
-        try:
-            message = self.client.messages.create(
-                model=self.model,
-                max_tokens=6000,
-                messages=[
-                    {
-                        "role": "user",
-                        "content": synthesis_prompt
-                    }
-                ]
-            )
+        synthesis_key = make_cache_key("iris_synthesis", self.model, PROMPT_VERSION, synthesis_prompt)
 
-            synthesis_text = message.content[0].text
+        try:
+            cached = await get_cached(synthesis_key)
+            if cached:
+                synthesis_text = cached["text"]
+            else:
+                message = await create_message(
+                    self.client,
+                    model=self.model,
+                    max_tokens=6000,
+                    messages=[
+                        {
+                            "role": "user",
+                            "content": synthesis_prompt
+                        }
+                    ]
+                )
+
+                synthesis_text = message.content[0].text
+                await put_cached(synthesis_key, "iris_synthesis", self.model, PROMPT_VERSION, {"text": synthesis_text})
 
             # Extract constitutional type for header
             constitutional_type = "Mixed"  # Default
@@ -331,14 +365,23 @@ Write in flowing prose, not bullet points where possible. Make it feel like a ca
                 "parsed": True
             }
 
+            if failed_eyes:
+                synthesis["partial"] = True
+                synthesis["failed_eyes"] = failed_eyes
+
             return {
                 "success": True,
-                "left_eye_analysis": left_result["analysis"],
-                "right_eye_analysis": right_result["analysis"],
+                "partial": bool(failed_eyes),
+                "failed_eyes": failed_eyes,
+                "left_eye_analysis": left_result.get("analysis", {"error": left_result.get("error")}),
+                "right_eye_analysis": right_result.get("analysis", {"error": right_result.get("error")}),
                 "combined_analysis": synthesis,
                 "constitutional_type": constitutional_type,
                 "constitutional_strength": constitutional_strength,
-                "confidence_score": self.calculate_confidence(left_analysis),
+                "confidence_score": self.calculate_confidence(
+                    left_analysis if left_result["success"] else right_analysis
+                ),
+                "cache_hit": bool(cached),
                 "timestamp": datetime.now().isoformat()
             }
 
@@ -352,6 +395,20 @@ Write in flowing prose, not bullet points where possible. Make it feel like a ca
                 }
             }
 
+    @staticmethod
+    def _eye_result(result, eye_side: str) -> Dict:
+        """Normalise a gather() result so an unexpected exception becomes a failed eye"""
+        if isinstance(result, BaseException):
+            return {"success": False, "error": str(result), "eye_side": eye_side}
+        return result
+
+    @staticmethod
+    def _findings_for_prompt(result: Dict) -> str:
+        """Findings block for the synthesis prompt"""
+        if not result["success"]:
+            return f"Not available - the {result['eye_side']} eye image could not be analysed. Base the report on the other eye only."
+        return json.dumps(result.get('analysis', {}), indent=2)
+
     def calculate_confidence(self, analysis: Dict) -> float:
         """Calculate AI confidence score (0-100)"""
         if not isinstance(analysis, dict):
@@ -5,12 +5,16 @@ VERSION 2.0 - UK Compliant (No Supplements)
 Updated: 26 November 2025
 """
 
-from weasyprint import HTML
 from datetime import datetime
-import asyncpg
 import json
 import io
 
+from db_pool import get_db_connection
+from pdf_render import render_html
+
+# Bump whenever the report layout changes (invalidates cached PDFs)
+TEMPLATE_VERSION = "2.0"
+
 
 def format_british_date(date_obj=None):
     """Format date in British style: 26 November 2025"""
@@ -123,13 +127,15 @@ def convert_markdown_to_html(text: str) -> str:
 
 async def generate_iridology_pdf(analysis_id: int) -> bytes:
     """Generate professional iridology PDF report with Navy Blue branding"""
+    _, html_content = await build_iridology_report(analysis_id)
     
-    conn = await asyncpg.connect(
-        host="localhost", port=5432, user="celloxen_user",
-        password="CelloxenSecure2025", database="celloxen_portal"
-    )
-    
-    try:
+    # Generate PDF (in the render pool, see pdf_render.py)
+    return await render_html(html_content)
+
+
+async def build_iridology_report(analysis_id: int):
+    """(analysis row, report HTML) - the row keys the PDF cache, the HTML is only rendered on a miss"""
+    async with get_db_connection() as conn:
         # Get analysis data with patient info
         analysis = await conn.fetchrow("""
             SELECT
@@ -476,14 +482,7 @@ async def generate_iridology_pdf(analysis_id: int) -> bytes:
 </body>
 </html>"""
         
-        # Generate PDF
-        html = HTML(string=html_content)
-        pdf_bytes = html.write_pdf()
-        
-        return pdf_bytes
-        
-    finally:
-        await conn.close()
+    return dict(analysis), html_content
 
 
 async def generate_iridology_report_buffer(analysis_id: int):
@@ -0,0 +1,302 @@
+"""
+JOB QUEUE - Durable background jobs stored in Postgres
+Jobs live in background_jobs (migrations/001_background_jobs.sql) and are
+claimed with FOR UPDATE SKIP LOCKED, so every uvicorn worker can run
+pollers against the same table without processing a job twice.
+
+Register a handler with @job_handler("type"), enqueue with enqueue_job(),
+and the workers started from the FastAPI lifespan hook do the rest:
+failed jobs are retried with exponential backoff up to max_attempts.
+schedule_job() additionally enqueues a job type at a fixed interval.
+"""
+import asyncio
+import json
+import os
+import socket
+from typing import Awaitable, Callable, Dict, Optional
+
+from db_pool import get_db_connection
+
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", "2"))
+JOB_POLL_INTERVAL = float(os.getenv("JOB_POLL_INTERVAL", "2"))
+JOB_MAX_ATTEMPTS = int(os.getenv("JOB_MAX_ATTEMPTS", "3"))
+JOB_RETRY_BASE_SECONDS = float(os.getenv("JOB_RETRY_BASE_SECONDS", "30"))
+# A job still 'running' after this many seconds is assumed orphaned (worker died) and requeued
+JOB_LOCK_TIMEOUT = int(os.getenv("JOB_LOCK_TIMEOUT", "900"))
+
+WORKER_NAME = f"{socket.gethostname()}:{os.getpid()}"
+
+_handlers: Dict[str, tuple] = {}
+_schedules: Dict[str, float] = {}
+_wakeup = asyncio.Event()
+_tasks = []
+
+
+class PermanentJobError(Exception):
+    """Raise from a handler when retrying cannot help (e.g. the record is gone)"""
+
+
+def job_handler(
+    job_type: str,
+    on_failure: Optional[Callable[[dict, str], Awaitable[None]]] = None,
+    on_complete: Optional[Callable[[dict, dict], Awaitable[None]]] = None
+):
+    """Register `async def handler(payload) -> dict` for a job type.
+
+    on_failure(payload, error) runs once the job has exhausted its retries.
+    on_complete(payload, result) runs once the job is recorded as completed
+    (at most once - a crash right after completion skips it).
+    """
+    def decorator(func):
+        _handlers[job_type] = (func, on_failure, on_complete)
+        return func
+    return decorator
+
+
+def schedule_job(job_type: str, every_seconds: float):
+    """Enqueue job_type every `every_seconds`, once across all workers"""
+    _schedules[job_type] = every_seconds
+
+
+async def enqueue_job(
+    conn,
+    job_type: str,
+    payload: dict,
+    dedupe_key: Optional[str] = None,
+    max_attempts: Optional[int] = None
+) -> int:
+    """Insert a job using the caller's connection (so it joins their transaction).
+
+    If a queued/running job already exists for dedupe_key, its id is returned instead.
+    """
+    job_id = await conn.fetchval(
+        """
+        INSERT INTO background_jobs (job_type, payload, dedupe_key, max_attempts)
+        VALUES ($1, $2::jsonb, $3, $4)
+        ON CONFLICT (dedupe_key) WHERE status IN ('queued', 'running') DO NOTHING
+        RETURNING id
+        """,
+        job_type, json.dumps(payload), dedupe_key, max_attempts or JOB_MAX_ATTEMPTS
+    )
+    if job_id is None:
+        job_id = await conn.fetchval(
+            """
+            SELECT id FROM background_jobs
+            WHERE dedupe_key = $1 AND status IN ('queued', 'running')
+            """,
+            dedupe_key
+        )
+    _wakeup.set()
+    return job_id
+
+
+async def get_latest_job(conn, dedupe_key: str) -> Optional[dict]:
+    """Most recent job for a dedupe key, with payload/result decoded"""
+    row = await conn.fetchrow(
+        """
+        SELECT id, job_type, status, attempts, max_attempts, run_after,
+               last_error, result, created_at, updated_at, completed_at
+        FROM background_jobs
+        WHERE dedupe_key = $1
+        ORDER BY id DESC
+        LIMIT 1
+        """,
+        dedupe_key
+    )
+    if not row:
+        return None
+    job = dict(row)
+    job["result"] = json.loads(job["result"]) if job["result"] else None
+    return job
+
+
+# ============================================================================
+# WORKERS
+# ============================================================================
+
+async def _claim_job(conn, worker_id: str):
+    return await conn.fetchrow(
+        """
+        UPDATE background_jobs
+        SET status = 'running',
+            attempts = attempts + 1,
+            locked_at = NOW(),
+            locked_by = $1,
+            updated_at = NOW()
+        WHERE id = (
+            SELECT id FROM background_jobs
+            WHERE status = 'queued'
+              AND run_after <= NOW()
+              AND job_type = ANY($2::text[])
+            ORDER BY run_after, id
+            FOR UPDATE SKIP LOCKED
+            LIMIT 1
+        )
+        RETURNING id, job_type, payload, attempts, max_attempts
+        """,
+        worker_id, list(_handlers)
+    )
+
+
+async def _run_job(job):
+    handler, on_failure, on_complete = _handlers[job["job_type"]]
+    payload = json.loads(job["payload"])
+
+    try:
+        result = await handler(payload)
+    except asyncio.CancelledError:
+        # Shutting down - hand the job back without burning an attempt
+        async with get_db_connection() as conn:
+            await conn.execute(
+                """
+                UPDATE background_jobs
+                SET status = 'queued', attempts = attempts - 1,
+                    locked_at = NULL, locked_by = NULL, updated_at = NOW()
+                WHERE id = $1
+                """,
+                job["id"]
+            )
+        raise
+    except Exception as e:
+        error = str(e) or type(e).__name__
+        final = isinstance(e, PermanentJobError) or job["attempts"] >= job["max_attempts"]
+        async with get_db_connection() as conn:
+            if final:
+                await conn.execute(
+                    """
+                    UPDATE background_jobs
+                    SET status = 'failed', last_error = $2,
+                        locked_at = NULL, locked_by = NULL,
+                        completed_at = NOW(), updated_at = NOW()
+                    WHERE id = $1
+                    """,
+                    job["id"], error
+                )
+            else:
+                delay = JOB_RETRY_BASE_SECONDS * 2 ** (job["attempts"] - 1)
+                await conn.execute(
+                    """
+                    UPDATE background_jobs
+                    SET status = 'queued', last_error = $2,
+                        run_after = NOW() + make_interval(secs => $3),
+                        locked_at = NULL, locked_by = NULL, updated_at = NOW()
+                    WHERE id = $1
+                    """,
+                    job["id"], error, delay
+                )
+        print(f"❌ Job {job['id']} ({job['job_type']}) attempt {job['attempts']}/{job['max_attempts']} failed: {error}")
+        if final and on_failure:
+            try:
+                await on_failure(payload, error)
+            except Exception as hook_error:
+                print(f"❌ Job {job['id']} failure hook error: {hook_error}")
+        return
+
+    async with get_db_connection() as conn:
+        await conn.execute(
+            """
+            UPDATE background_jobs
+            SET status = 'completed', result = $2::jsonb, last_error = NULL,
+                locked_at = NULL, locked_by = NULL,
+                completed_at = NOW(), updated_at = NOW()
+            WHERE id = $1
+            """,
+            job["id"], json.dumps(result or {}, default=str)
+        )
+    if on_complete:
+        try:
+            await on_complete(payload, result or {})
+        except Exception as hook_error:
+            print(f"❌ Job {job['id']} completion hook error: {hook_error}")
+
+
+async def _worker_loop(worker_id: str):
+    while True:
+        try:
+            _wakeup.clear()
+            async with get_db_connection() as conn:
+                job = await _claim_job(conn, worker_id)
+            if job is None:
+                try:
+                    await asyncio.wait_for(_wakeup.wait(), JOB_POLL_INTERVAL)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+            await _run_job(job)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            print(f"❌ Job worker {worker_id} error: {e}")
+            await asyncio.sleep(JOB_POLL_INTERVAL)
+
+
+async def _reaper_loop():
+    """Requeue jobs whose worker disappeared mid-run"""
+    while True:
+        try:
+            async with get_db_connection() as conn:
+                await conn.execute(
+                    """
+                    UPDATE background_jobs
+                    SET status = 'queued', locked_at = NULL, locked_by = NULL,
+                        last_error = 'Requeued after worker timeout', updated_at = NOW()
+                    WHERE status = 'running'
+                      AND locked_at < NOW() - make_interval(secs => $1)
+                    """,
+                    JOB_LOCK_TIMEOUT
+                )
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            print(f"❌ Job reaper error: {e}")
+        await asyncio.sleep(60)
+
+
+async def _scheduler_loop():
+    """Enqueue scheduled job types whose last run is older than their interval"""
+    while True:
+        try:
+            async with get_db_connection() as conn:
+                for job_type, every_seconds in _schedules.items():
+                    async with conn.transaction():
+                        # Serialise the due check across workers so only one enqueues
+                        await conn.execute(
+                            "SELECT pg_advisory_xact_lock(hashtext($1))", f"celloxen_schedule:{job_type}"
+                        )
+                        due = await conn.fetchval(
+                            """
+                            SELECT NOT EXISTS (
+                                SELECT 1 FROM background_jobs
+                                WHERE job_type = $1
+                                  AND created_at > NOW() - make_interval(secs => $2)
+                            )
+                            """,
+                            job_type, float(every_seconds)
+                        )
+                        if due:
+                            await enqueue_job(conn, job_type, {}, dedupe_key=f"schedule:{job_type}")
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            print(f"❌ Job scheduler error: {e}")
+        await asyncio.sleep(60)
+
+
+def start_job_workers():
+    """Spawn JOB_WORKERS pollers plus the stale-lock reaper on the running loop"""
+    if _tasks or not _handlers:
+        return
+    for n in range(JOB_WORKERS):
+        _tasks.append(asyncio.create_task(_worker_loop(f"{WORKER_NAME}:{n}")))
+    _tasks.append(asyncio.create_task(_reaper_loop()))
+    if _schedules:
+        _tasks.append(asyncio.create_task(_scheduler_loop()))
+    print(f"✅ Job workers started ({JOB_WORKERS}) for: {', '.join(sorted(_handlers))}")
+
+
+async def stop_job_workers():
+    """Cancel the pollers; in-flight jobs are put back on the queue"""
+    for task in _tasks:
+        task.cancel()
+    await asyncio.gather(*_tasks, return_exceptions=True)
+    _tasks.clear()
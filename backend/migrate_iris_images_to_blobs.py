@@ -0,0 +1,108 @@
+#!/usr/bin/env python3
+"""
+One-off migration: move base64 iris images out of iridology_analyses
+into the blob store and keep only the content keys on the row.
+
+Usage: python3 migrate_iris_images_to_blobs.py [--batch-size 50] [--dry-run]
+
+Safe to re-run - rows that already have blob keys are skipped, and
+identical images map to the same blob. Afterwards run
+VACUUM FULL iridology_analyses to give the TOAST space back.
+"""
+
+import argparse
+import asyncio
+
+from db_pool import init_pool, close_pool, apply_migrations, get_db_connection
+from blob_store import put_data_url
+
+
+async def migrate(batch_size: int, dry_run: bool):
+    await init_pool()
+    await apply_migrations()
+
+    migrated = 0
+    failed = 0
+    last_id = 0
+
+    try:
+        while True:
+            # Page through ids only - the image text is fetched one row at a time
+            async with get_db_connection() as conn:
+                ids = await conn.fetch(
+                    """
+                    SELECT id FROM iridology_analyses
+                    WHERE id > $1
+                      AND (left_eye_blob_key IS NULL OR right_eye_blob_key IS NULL)
+                      AND (COALESCE(left_eye_image, '') <> '' OR COALESCE(right_eye_image, '') <> '')
+                    ORDER BY id
+                    LIMIT $2
+                    """,
+                    last_id,
+                    batch_size
+                )
+
+            if not ids:
+                break
+
+            for row in ids:
+                analysis_id = row["id"]
+                last_id = analysis_id
+
+                async with get_db_connection() as conn:
+                    images = await conn.fetchrow(
+                        """
+                        SELECT left_eye_image, right_eye_image, left_eye_blob_key, right_eye_blob_key
+                        FROM iridology_analyses WHERE id = $1
+                        """,
+                        analysis_id
+                    )
+
+                try:
+                    left_key = images["left_eye_blob_key"]
+                    right_key = images["right_eye_blob_key"]
+                    if not left_key and images["left_eye_image"]:
+                        left_key = await asyncio.to_thread(put_data_url, images["left_eye_image"])
+                    if not right_key and images["right_eye_image"]:
+                        right_key = await asyncio.to_thread(put_data_url, images["right_eye_image"])
+                except ValueError as e:
+                    failed += 1
+                    print(f"❌ Analysis {analysis_id}: {e}")
+                    continue
+
+                if dry_run:
+                    print(f"   Analysis {analysis_id}: left={left_key} right={right_key} (dry run)")
+                    migrated += 1
+                    continue
+
+                async with get_db_connection() as conn:
+                    # Only clear a column once its blob key is saved alongside it
+                    await conn.execute(
+                        """
+                        UPDATE iridology_analyses
+                        SET left_eye_blob_key = $1,
+                            right_eye_blob_key = $2,
+                            left_eye_image = CASE WHEN $1::varchar IS NULL THEN left_eye_image ELSE '' END,
+                            right_eye_image = CASE WHEN $2::varchar IS NULL THEN right_eye_image ELSE '' END
+                        WHERE id = $3
+                        """,
+                        left_key,
+                        right_key,
+                        analysis_id
+                    )
+                migrated += 1
+                print(f"✅ Analysis {analysis_id} migrated")
+    finally:
+        await close_pool()
+
+    print(f"\n✅ Migrated {migrated} analyses, ❌ {failed} failed")
+    if migrated and not dry_run:
+        print("   Run VACUUM FULL iridology_analyses; to reclaim the freed space")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Move iris images into the blob store")
+    parser.add_argument("--batch-size", type=int, default=50)
+    parser.add_argument("--dry-run", action="store_true", help="Write blobs but leave the database unchanged")
+    args = parser.parse_args()
+    asyncio.run(migrate(args.batch_size, args.dry_run))
@@ -0,0 +1,39 @@
+-- Durable background job queue (job_queue.py)
+-- Workers claim rows with FOR UPDATE SKIP LOCKED.
+
+CREATE TABLE IF NOT EXISTS background_jobs (
+    id BIGSERIAL PRIMARY KEY,
+    job_type VARCHAR(50) NOT NULL,
+    payload JSONB NOT NULL DEFAULT '{}'::jsonb,
+    dedupe_key VARCHAR(150),
+    status VARCHAR(20) NOT NULL DEFAULT 'queued',   -- queued, running, completed, failed
+    attempts INTEGER NOT NULL DEFAULT 0,
+    max_attempts INTEGER NOT NULL DEFAULT 3,
+    run_after TIMESTAMP NOT NULL DEFAULT NOW(),
+    locked_at TIMESTAMP,
+    locked_by VARCHAR(100),
+    last_error TEXT,
+    result JSONB,
+    created_at TIMESTAMP NOT NULL DEFAULT NOW(),
+    updated_at TIMESTAMP NOT NULL DEFAULT NOW(),
+    completed_at TIMESTAMP
+);
+
+-- Claim query: next ready job of a given type
+CREATE INDEX IF NOT EXISTS idx_background_jobs_ready
+    ON background_jobs (job_type, run_after, id)
+    WHERE status = 'queued';
+
+-- Stale-lock reaper
+CREATE INDEX IF NOT EXISTS idx_background_jobs_running
+    ON background_jobs (locked_at)
+    WHERE status = 'running';
+
+-- Status lookups by the thing a job works on (e.g. iridology_analysis:42)
+CREATE INDEX IF NOT EXISTS idx_background_jobs_dedupe_key
+    ON background_jobs (dedupe_key, id DESC);
+
+-- At most one active job per dedupe key
+CREATE UNIQUE INDEX IF NOT EXISTS uq_background_jobs_active_dedupe_key
+    ON background_jobs (dedupe_key)
+    WHERE status IN ('queued', 'running');
@@ -0,0 +1,7 @@
+-- Iris images live in the blob store (blob_store.py); rows keep only the
+-- SHA-256 key. Existing base64 images are moved by
+-- migrate_iris_images_to_blobs.py.
+
+ALTER TABLE iridology_analyses
+    ADD COLUMN IF NOT EXISTS left_eye_blob_key VARCHAR(64),
+    ADD COLUMN IF NOT EXISTS right_eye_blob_key VARCHAR(64);
@@ -0,0 +1,17 @@
+-- Cached model results (ai_cache.py)
+
+CREATE TABLE IF NOT EXISTS ai_result_cache (
+    cache_key CHAR(64) PRIMARY KEY,          -- sha256 of model, prompt version, prompt and inputs
+    kind VARCHAR(30) NOT NULL,               -- e.g. iris, iris_synthesis
+    model VARCHAR(100) NOT NULL,
+    prompt_version VARCHAR(20) NOT NULL,
+    result JSONB NOT NULL,
+    size_bytes INTEGER NOT NULL,
+    hit_count INTEGER NOT NULL DEFAULT 0,
+    created_at TIMESTAMP NOT NULL DEFAULT NOW(),
+    last_hit_at TIMESTAMP NOT NULL DEFAULT NOW(),
+    expires_at TIMESTAMP NOT NULL
+);
+
+CREATE INDEX IF NOT EXISTS idx_ai_result_cache_expires_at ON ai_result_cache (expires_at);
+CREATE INDEX IF NOT EXISTS idx_ai_result_cache_last_hit_at ON ai_result_cache (last_hit_at DESC);
@@ -0,0 +1,58 @@
+-- Response cache invalidation (response_cache.py)
+-- Any write to a table behind a cached dashboard or report NOTIFYs the
+-- clinic id on commit; '0' means no clinic. Postgres folds duplicate
+-- notifications within a transaction, so bulk writes send one per clinic.
+-- TG_ARGV[0] names the column holding the clinic id.
+
+CREATE OR REPLACE FUNCTION notify_cache_invalidation() RETURNS trigger AS $$
+BEGIN
+    IF TG_OP <> 'DELETE' THEN
+        PERFORM pg_notify('celloxen_cache', COALESCE(to_jsonb(NEW) ->> TG_ARGV[0], '0'));
+    END IF;
+    IF TG_OP <> 'INSERT' THEN
+        PERFORM pg_notify('celloxen_cache', COALESCE(to_jsonb(OLD) ->> TG_ARGV[0], '0'));
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS notify_cache_invalidation ON clinics;
+CREATE TRIGGER notify_cache_invalidation AFTER INSERT OR UPDATE OR DELETE ON clinics
+    FOR EACH ROW EXECUTE PROCEDURE notify_cache_invalidation('id');
+
+DROP TRIGGER IF EXISTS notify_cache_invalidation ON clinic_invoices;
+CREATE TRIGGER notify_cache_invalidation AFTER INSERT OR UPDATE OR DELETE ON clinic_invoices
+    FOR EACH ROW EXECUTE PROCEDURE notify_cache_invalidation('clinic_id');
+
+DROP TRIGGER IF EXISTS notify_cache_invalidation ON patients;
+CREATE TRIGGER notify_cache_invalidation AFTER INSERT OR UPDATE OR DELETE ON patients
+    FOR EACH ROW EXECUTE PROCEDURE notify_cache_invalidation('clinic_id');
+
+DROP TRIGGER IF EXISTS notify_cache_invalidation ON users;
+CREATE TRIGGER notify_cache_invalidation AFTER INSERT OR DELETE OR UPDATE OF clinic_id, full_name, email, role ON users
+    FOR EACH ROW EXECUTE PROCEDURE notify_cache_invalidation('clinic_id');
+
+DROP TRIGGER IF EXISTS notify_cache_invalidation ON appointments;
+CREATE TRIGGER notify_cache_invalidation AFTER INSERT OR UPDATE OR DELETE ON appointments
+    FOR EACH ROW EXECUTE PROCEDURE notify_cache_invalidation('clinic_id');
+
+DROP TRIGGER IF EXISTS notify_cache_invalidation ON assessments;
+CREATE TRIGGER notify_cache_invalidation AFTER INSERT OR UPDATE OR DELETE ON assessments
+    FOR EACH ROW EXECUTE PROCEDURE notify_cache_invalidation('clinic_id');
+
+DROP TRIGGER IF EXISTS notify_cache_invalidation ON iridology_analyses;
+CREATE TRIGGER notify_cache_invalidation AFTER INSERT OR UPDATE OR DELETE ON iridology_analyses
+    FOR EACH ROW EXECUTE PROCEDURE notify_cache_invalidation('clinic_id');
+
+DROP TRIGGER IF EXISTS notify_cache_invalidation ON patient_invoices;
+CREATE TRIGGER notify_cache_invalidation AFTER INSERT OR UPDATE OR DELETE ON patient_invoices
+    FOR EACH ROW EXECUTE PROCEDURE notify_cache_invalidation('clinic_id');
+
+DROP TRIGGER IF EXISTS notify_cache_invalidation ON therapy_plans;
+CREATE TRIGGER notify_cache_invalidation AFTER INSERT OR UPDATE OR DELETE ON therapy_plans
+    FOR EACH ROW EXECUTE PROCEDURE notify_cache_invalidation('clinic_id');
+
+-- Only feeds system-wide reports, which every notification clears
+DROP TRIGGER IF EXISTS notify_cache_invalidation ON comprehensive_assessments;
+CREATE TRIGGER notify_cache_invalidation AFTER INSERT OR UPDATE OR DELETE ON comprehensive_assessments
+    FOR EACH ROW EXECUTE PROCEDURE notify_cache_invalidation('clinic_id');
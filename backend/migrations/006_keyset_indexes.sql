@@ -0,0 +1,18 @@
+-- Keyset pagination (pagination.py)
+-- Each list endpoint pages with a row comparison on its sort key; these
+-- indexes let every page be a single backward index range scan.
+
+CREATE INDEX IF NOT EXISTS idx_patients_created_id ON patients (created_at, id);
+
+CREATE INDEX IF NOT EXISTS idx_appointments_date_time_id
+    ON appointments (appointment_date, appointment_time, id);
+
+CREATE INDEX IF NOT EXISTS idx_therapy_plans_created_id ON therapy_plans (created_at, id);
+
+CREATE INDEX IF NOT EXISTS idx_patient_invoices_clinic_created_id
+    ON patient_invoices (clinic_id, created_at, id);
+
+CREATE INDEX IF NOT EXISTS idx_iridology_analyses_practitioner_created_id
+    ON iridology_analyses (practitioner_id, created_at, id);
+
+CREATE INDEX IF NOT EXISTS idx_clinic_invoices_issue_date_id ON clinic_invoices (issue_date, id);
@@ -0,0 +1,16 @@
+-- Auth cache invalidation (auth_cache.py)
+-- get_current_user caches user records per worker; any change to a user's
+-- identity, role, clinic, status or password NOTIFYs the user id so every
+-- worker drops it on commit.
+
+CREATE OR REPLACE FUNCTION notify_auth_invalidation() RETURNS trigger AS $$
+BEGIN
+    PERFORM pg_notify('celloxen_auth', OLD.id::text);
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS notify_auth_invalidation ON users;
+CREATE TRIGGER notify_auth_invalidation
+    AFTER DELETE OR UPDATE OF email, full_name, role, clinic_id, status, password_hash ON users
+    FOR EACH ROW EXECUTE PROCEDURE notify_auth_invalidation();
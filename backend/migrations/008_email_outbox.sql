@@ -0,0 +1,31 @@
+-- Outbound email queue (email_outbox.py)
+-- Request handlers insert rows; the dispatcher claims batches with
+-- FOR UPDATE SKIP LOCKED and sends them over one SMTP session.
+
+CREATE TABLE IF NOT EXISTS email_outbox (
+    id BIGSERIAL PRIMARY KEY,
+    to_email VARCHAR(255) NOT NULL,
+    subject TEXT NOT NULL,
+    html_body TEXT NOT NULL,
+    text_body TEXT,
+    email_type VARCHAR(50) NOT NULL DEFAULT 'GENERAL',
+    patient_id INTEGER,
+    status VARCHAR(20) NOT NULL DEFAULT 'queued',   -- queued, sending, sent, failed
+    attempts INTEGER NOT NULL DEFAULT 0,
+    max_attempts INTEGER NOT NULL DEFAULT 5,
+    run_after TIMESTAMP NOT NULL DEFAULT NOW(),
+    locked_at TIMESTAMP,
+    last_error TEXT,
+    created_at TIMESTAMP NOT NULL DEFAULT NOW(),
+    sent_at TIMESTAMP
+);
+
+-- Claim query: next ready messages
+CREATE INDEX IF NOT EXISTS idx_email_outbox_ready
+    ON email_outbox (run_after, id)
+    WHERE status = 'queued';
+
+-- Stale-lock reaper
+CREATE INDEX IF NOT EXISTS idx_email_outbox_sending
+    ON email_outbox (locked_at)
+    WHERE status = 'sending';
@@ -0,0 +1,14 @@
+-- Appointment reminder markers (appointment_reminders.py)
+-- One row per appointment slot a reminder was queued for. The scheduler
+-- claims slots with INSERT ... ON CONFLICT DO NOTHING in the same
+-- transaction that queues the emails, so a reminder is sent once however
+-- many workers run the job or how often it restarts. Keying on the date
+-- and time means a rescheduled appointment gets a fresh reminder.
+
+CREATE TABLE IF NOT EXISTS appointment_reminders (
+    appointment_id INTEGER NOT NULL REFERENCES appointments(id) ON DELETE CASCADE,
+    appointment_date DATE NOT NULL,
+    appointment_time TIME NOT NULL,
+    created_at TIMESTAMP NOT NULL DEFAULT NOW(),
+    PRIMARY KEY (appointment_id, appointment_date, appointment_time)
+);
@@ -0,0 +1,16 @@
+-- Question bank invalidation (question_bank.py)
+-- The assessment_questions table is read once per worker and kept as an
+-- indexed, immutable bank; any change to the table NOTIFYs so every worker
+-- reloads it on next use.
+
+CREATE OR REPLACE FUNCTION notify_question_bank_change() RETURNS trigger AS $$
+BEGIN
+    PERFORM pg_notify('celloxen_question_bank', '');
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS notify_question_bank_change ON assessment_questions;
+CREATE TRIGGER notify_question_bank_change
+    AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON assessment_questions
+    FOR EACH STATEMENT EXECUTE PROCEDURE notify_question_bank_change();
@@ -0,0 +1,6 @@
+-- Response cache invalidation, per clinic only (response_cache.py)
+-- System-wide cache entries now expire by TTL rather than being cleared by
+-- every write in every clinic. comprehensive_assessments only feeds those
+-- system-wide reports, so its notifications would no longer clear anything.
+
+DROP TRIGGER IF EXISTS notify_cache_invalidation ON comprehensive_assessments;
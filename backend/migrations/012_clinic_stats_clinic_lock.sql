@@ -0,0 +1,37 @@
+-- Per-clinic reconciliation lock (dashboard_stats.reconcile_clinic_stats)
+-- The tracking trigger takes a shared advisory lock on each clinic it
+-- touches. Writers never block each other on it; a reconciliation takes
+-- the same lock exclusively for one clinic at a time, so it waits only for
+-- that clinic's in-flight writes and holds back only that clinic's new ones
+-- while it recounts, instead of locking clinic_stats for every clinic.
+
+CREATE OR REPLACE FUNCTION clinic_stats_track() RETURNS trigger AS $$
+BEGIN
+    EXECUTE format(
+        'SELECT pg_advisory_xact_lock_shared(hashtext(''clinic_stats''), clinic_id)
+         FROM (
+             SELECT clinic_id FROM %1$I($1) WHERE $3 <> ''INSERT''
+             UNION
+             SELECT clinic_id FROM %1$I($2) WHERE $3 <> ''DELETE''
+         ) clinics
+         ORDER BY clinic_id',
+        TG_ARGV[0]
+    ) USING OLD, NEW, TG_OP;
+    EXECUTE format(
+        'INSERT INTO clinic_stats (clinic_id, metric, bucket, value)
+         SELECT clinic_id, metric, bucket, SUM(value)
+         FROM (
+             SELECT clinic_id, metric, bucket, -value AS value FROM %1$I($1) WHERE $3 <> ''INSERT''
+             UNION ALL
+             SELECT clinic_id, metric, bucket, value FROM %1$I($2) WHERE $3 <> ''DELETE''
+         ) delta
+         GROUP BY clinic_id, metric, bucket
+         HAVING SUM(value) <> 0
+         ORDER BY clinic_id, metric, bucket
+         ON CONFLICT (clinic_id, metric, bucket)
+         DO UPDATE SET value = clinic_stats.value + EXCLUDED.value, updated_at = NOW()',
+        TG_ARGV[0]
+    ) USING OLD, NEW, TG_OP;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
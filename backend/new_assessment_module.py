@@ -9,6 +9,8 @@ from typing import List, Dict, Optional
 import asyncpg
 from datetime import datetime
 
+from question_bank import build_bank
+
 router = APIRouter(prefix="/api/v1/new-assessment", tags=["new-assessment"])
 
 # ================================================================
@@ -304,6 +306,9 @@ ASSESSMENT_QUESTIONS = {
     ]
 }
 
+# Frozen, indexed view of ASSESSMENT_QUESTIONS used for scoring
+QUESTION_BANK = build_bank("new_assessment", ASSESSMENT_QUESTIONS, weights_key="scores")
+
 # ================================================================
 # API ENDPOINTS
 # ================================================================
@@ -417,14 +422,17 @@ async def complete_assessment(request: CompleteAssessmentRequest):
         # Calculate domain scores
         domain_scores = {}
         
-        for domain, questions in ASSESSMENT_QUESTIONS.items():
+        for domain, questions in QUESTION_BANK.domains.items():
             domain_total = 0
             questions_in_domain = len(questions)
             
             for question in questions:
-                q_id = str(question["id"])
-                if q_id in responses:
-                    domain_total += responses[q_id]["score"]
+                response = responses.get(str(question.id))
+                if response:
+                    # Score the chosen option; fall back to the submitted score
+                    # for answers whose text no longer matches an option
+                    score = question.weight(response.get("answer_text"))
+                    domain_total += score if score is not None else response["score"]
             
             # Calculate percentage for this domain
             domain_scores[domain] = round((domain_total / (questions_in_domain * 100)) * 100, 1)
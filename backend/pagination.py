@@ -0,0 +1,127 @@
+"""
+PAGINATION - Keyset (cursor) pagination for list endpoints
+A page is the next `limit` rows after the last row the client saw, found
+with a row comparison on the sort key, e.g.
+
+    WHERE (p.created_at, p.id) < ($1, $2) ORDER BY p.created_at DESC, p.id DESC
+
+so every page costs the same index range scan however deep the client
+goes. The cursor is an opaque base64 token holding the last row's sort
+key; sort key columns must not be NULL.
+
+Totals come from clinic_stats where a counter exists, otherwise from the
+planner's row estimate - never from COUNT(*) over the whole table.
+"""
+import base64
+import json
+import os
+from datetime import date, datetime, time
+from typing import Any, List, Optional, Sequence, Tuple
+
+from fastapi import HTTPException
+
+PAGE_DEFAULT_LIMIT = int(os.getenv("PAGE_DEFAULT_LIMIT", "200"))
+PAGE_MAX_LIMIT = int(os.getenv("PAGE_MAX_LIMIT", "500"))
+
+_TYPES = {"dt": datetime, "d": date, "t": time}
+
+
+def clamp_limit(limit: Optional[int]) -> int:
+    if limit is None:
+        return PAGE_DEFAULT_LIMIT
+    return max(1, min(limit, PAGE_MAX_LIMIT))
+
+
+def _encode_value(value):
+    for tag, kind in _TYPES.items():
+        if isinstance(value, kind):
+            return {tag: value.isoformat()}
+    return value
+
+
+def _decode_value(value):
+    if isinstance(value, dict):
+        (tag, text), = value.items()
+        return _TYPES[tag].fromisoformat(text)
+    return value
+
+
+def encode_cursor(values: Sequence) -> str:
+    payload = json.dumps([_encode_value(v) for v in values], separators=(",", ":"))
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: Optional[str], size: int) -> Optional[list]:
+    """Sort key values from a cursor (400 if it is not one of ours)"""
+    if not cursor:
+        return None
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        values = [_decode_value(v) for v in json.loads(base64.urlsafe_b64decode(padded))]
+    except Exception:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    if len(values) != size:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    return values
+
+
+def keyset_condition(columns: Sequence[str], first_param: int, placeholder: str = "$") -> str:
+    """`(a, b) < ($n, $n+1)` for a descending sort over columns"""
+    if placeholder == "$":
+        params = ", ".join(f"${first_param + i}" for i in range(len(columns)))
+    else:
+        params = ", ".join(placeholder for _ in columns)
+    return f"({', '.join(columns)}) < ({params})"
+
+
+def split_page(rows: List, limit: int, key_fields: Sequence[str]) -> Tuple[List, Optional[str]]:
+    """Trim the extra look-ahead row and build the cursor for the next page.
+
+    Queries fetch limit + 1 rows; only if that extra row exists is there a
+    next page.
+    """
+    if len(rows) <= limit:
+        return rows, None
+    rows = rows[:limit]
+    last = rows[-1]
+    return rows, encode_cursor([last[field] for field in key_fields])
+
+
+def page_info(next_cursor: Optional[str], total: Optional[int], estimated: bool) -> dict:
+    """Pagination fields merged into a list response"""
+    return {"next_cursor": next_cursor, "total": total, "total_is_estimate": estimated}
+
+
+def set_page_headers(response, next_cursor: Optional[str], total: Optional[int], estimated: bool):
+    """Pagination for endpoints whose body is a bare list"""
+    if next_cursor:
+        response.headers["X-Next-Cursor"] = next_cursor
+    if total is not None:
+        response.headers["X-Total-Count"] = str(total)
+        response.headers["X-Total-Count-Estimated"] = "true" if estimated else "false"
+
+
+async def estimate_count(conn, query: str, *params) -> Optional[int]:
+    """Planner row estimate for a query, without running it"""
+    try:
+        plan = await conn.fetchval(f"EXPLAIN (FORMAT JSON) {query}", *params)
+        if isinstance(plan, str):
+            plan = json.loads(plan)
+        return int(plan[0]["Plan"]["Plan Rows"])
+    except Exception as e:
+        print(f"❌ Row estimate failed: {e}")
+        return None
+
+
+def estimate_count_sync(cursor, query: str, params: Sequence[Any] = ()) -> Optional[int]:
+    """estimate_count() for a psycopg2 cursor"""
+    try:
+        cursor.execute(f"EXPLAIN (FORMAT JSON) {query}", params)
+        plan = cursor.fetchone()[0]
+        if isinstance(plan, str):
+            plan = json.loads(plan)
+        return int(plan[0]["Plan"]["Plan Rows"])
+    except Exception as e:
+        print(f"❌ Row estimate failed: {e}")
+        cursor.connection.rollback()
+        return None
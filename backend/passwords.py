@@ -0,0 +1,75 @@
+"""
+PASSWORDS - bcrypt hashing on a bounded executor
+Every bcrypt call (~250 ms at cost 12) runs on a small dedicated thread
+pool. bcrypt releases the GIL while hashing, so the event loop keeps
+serving other requests during a login burst, and at most
+PASSWORD_HASH_WORKERS hashes run at once however many logins queue up.
+
+PASSWORD_BCRYPT_ROUNDS is the work factor for new hashes. Logins go
+through verify_password(), which also reports a replacement hash when the
+stored one was made at a different cost, so existing accounts move to the
+new work factor as their owners next sign in.
+
+Async endpoints await verify_password() / hash_password(); sync routers on
+the threadpool use the _sync variants, which share the same executor.
+"""
+import asyncio
+import os
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional, Tuple
+
+import bcrypt
+
+PASSWORD_BCRYPT_ROUNDS = int(os.getenv("PASSWORD_BCRYPT_ROUNDS", "12"))
+PASSWORD_HASH_WORKERS = int(os.getenv("PASSWORD_HASH_WORKERS", str(min(4, os.cpu_count() or 1))))
+
+_executor = ThreadPoolExecutor(max_workers=PASSWORD_HASH_WORKERS, thread_name_prefix="bcrypt")
+
+
+def _hash(password: str) -> str:
+    return bcrypt.hashpw(password.encode("utf-8"), bcrypt.gensalt(rounds=PASSWORD_BCRYPT_ROUNDS)).decode("utf-8")
+
+
+def _rounds(password_hash: str) -> Optional[int]:
+    # $2b$12$<salt+hash>
+    try:
+        return int(password_hash.split("$")[2])
+    except (IndexError, ValueError):
+        return None
+
+
+def _verify(password: str, password_hash: str) -> Tuple[bool, Optional[str]]:
+    if not password_hash:
+        return False, None
+    try:
+        ok = bcrypt.checkpw(password.encode("utf-8"), password_hash.encode("utf-8"))
+    except ValueError:
+        # Not a bcrypt hash (or an over-long password)
+        return False, None
+    if ok and _rounds(password_hash) != PASSWORD_BCRYPT_ROUNDS:
+        return True, _hash(password)
+    return ok, None
+
+
+async def hash_password(password: str) -> str:
+    """bcrypt hash at the configured work factor"""
+    return await asyncio.get_running_loop().run_in_executor(_executor, _hash, password)
+
+
+async def verify_password(password: str, password_hash: str) -> Tuple[bool, Optional[str]]:
+    """(matches, new_hash) - new_hash is set when the caller should store a rehash"""
+    return await asyncio.get_running_loop().run_in_executor(_executor, _verify, password, password_hash)
+
+
+def hash_password_sync(password: str) -> str:
+    """hash_password() for sync endpoints"""
+    return _executor.submit(_hash, password).result()
+
+
+def verify_password_sync(password: str, password_hash: str) -> Tuple[bool, Optional[str]]:
+    """verify_password() for sync endpoints"""
+    return _executor.submit(_verify, password, password_hash).result()
+
+
+def shutdown_password_pool():
+    _executor.shutdown(wait=False, cancel_futures=True)
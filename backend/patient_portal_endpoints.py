@@ -9,9 +9,9 @@ from pydantic import BaseModel, EmailStr
 from typing import Optional, List
 from datetime import datetime, timedelta
 import jwt
-import bcrypt
 from psycopg2.extras import RealDictCursor
-import psycopg2
+from db_pool import get_sync_connection, release_sync_connection
+from passwords import verify_password_sync
 
 router = APIRouter(prefix="/api/v1/patient", tags=["Patient Portal"])
 
@@ -22,15 +22,11 @@ ACCESS_TOKEN_EXPIRE_MINUTES = 10080  # 7 days
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/api/v1/patient/login")
 
-# Database connection
+# Database connection - borrowed from the shared psycopg2 pool.
+# Handlers below are plain `def` so FastAPI runs them on its threadpool
+# instead of blocking the event loop on psycopg2 calls.
 def get_db():
-    conn = psycopg2.connect(
-        dbname="celloxen_portal",
-        user="celloxen_user",
-        password="CelloxenSecure2025",
-        host="localhost"
-    )
-    return conn
+    return get_sync_connection()
 
 # Models
 class PatientLoginRequest(BaseModel):
@@ -90,7 +86,7 @@ def get_current_patient(token: str = Depends(oauth2_scheme)):
 # Endpoints
 
 @router.post("/login", response_model=PatientToken)
-async def patient_login(credentials: PatientLoginRequest):
+def patient_login(credentials: PatientLoginRequest):
     """Patient login endpoint"""
     conn = get_db()
     cur = conn.cursor(cursor_factory=RealDictCursor)
@@ -113,8 +109,12 @@ async def patient_login(credentials: PatientLoginRequest):
         if not patient['password_hash']:
             raise HTTPException(status_code=401, detail="Password not set. Please contact the clinic.")
         
-        if not bcrypt.checkpw(credentials.password.encode('utf-8'), patient['password_hash'].encode('utf-8')):
+        valid, new_hash = verify_password_sync(credentials.password, patient['password_hash'])
+        if not valid:
             raise HTTPException(status_code=401, detail="Invalid email or password")
+        if new_hash:
+            cur.execute("UPDATE patients SET password_hash = %s WHERE id = %s", (new_hash, patient['id']))
+            conn.commit()
         
         token = create_patient_token(patient['id'])
         
@@ -127,11 +127,11 @@ async def patient_login(credentials: PatientLoginRequest):
         
     finally:
         cur.close()
-        conn.close()
+        release_sync_connection(conn)
 
 
 @router.get("/dashboard", response_model=DashboardSummary)
-async def get_dashboard(patient_id: int = Depends(get_current_patient)):
+def get_dashboard(patient_id: int = Depends(get_current_patient)):
     """Get patient dashboard summary"""
     conn = get_db()
     cur = conn.cursor(cursor_factory=RealDictCursor)
@@ -208,11 +208,11 @@ async def get_dashboard(patient_id: int = Depends(get_current_patient)):
         
     finally:
         cur.close()
-        conn.close()
+        release_sync_connection(conn)
 
 
 @router.get("/profile", response_model=PatientProfile)
-async def get_profile(patient_id: int = Depends(get_current_patient)):
+def get_profile(patient_id: int = Depends(get_current_patient)):
     """Get patient profile"""
     conn = get_db()
     cur = conn.cursor(cursor_factory=RealDictCursor)
@@ -244,11 +244,11 @@ async def get_profile(patient_id: int = Depends(get_current_patient)):
         
     finally:
         cur.close()
-        conn.close()
+        release_sync_connection(conn)
 
 
 @router.get("/assessments")
-async def get_assessments(patient_id: int = Depends(get_current_patient)):
+def get_assessments(patient_id: int = Depends(get_current_patient)):
     """Get patient's assessment history"""
     conn = get_db()
     cur = conn.cursor(cursor_factory=RealDictCursor)
@@ -302,11 +302,11 @@ async def get_assessments(patient_id: int = Depends(get_current_patient)):
         
     finally:
         cur.close()
-        conn.close()
+        release_sync_connection(conn)
 
 
 @router.get("/assessments/{assessment_id}")
-async def get_assessment_detail(
+def get_assessment_detail(
     assessment_id: int,
     patient_id: int = Depends(get_current_patient)
 ):
@@ -329,11 +329,11 @@ async def get_assessment_detail(
         
     finally:
         cur.close()
-        conn.close()
+        release_sync_connection(conn)
 
 
 @router.get("/therapy-plans")
-async def get_therapy_plans(patient_id: int = Depends(get_current_patient)):
+def get_therapy_plans(patient_id: int = Depends(get_current_patient)):
     """Get patient's therapy plans"""
     conn = get_db()
     cur = conn.cursor(cursor_factory=RealDictCursor)
@@ -364,11 +364,11 @@ async def get_therapy_plans(patient_id: int = Depends(get_current_patient)):
         
     finally:
         cur.close()
-        conn.close()
+        release_sync_connection(conn)
 
 
 @router.get("/therapy-plans/{plan_id}")
-async def get_therapy_plan_detail(
+def get_therapy_plan_detail(
     plan_id: int,
     patient_id: int = Depends(get_current_patient)
 ):
@@ -404,11 +404,11 @@ async def get_therapy_plan_detail(
         
     finally:
         cur.close()
-        conn.close()
+        release_sync_connection(conn)
 
 
 @router.get("/appointments")
-async def get_appointments(patient_id: int = Depends(get_current_patient)):
+def get_appointments(patient_id: int = Depends(get_current_patient)):
     """Get patient's appointments"""
     conn = get_db()
     cur = conn.cursor(cursor_factory=RealDictCursor)
@@ -438,11 +438,11 @@ async def get_appointments(patient_id: int = Depends(get_current_patient)):
         
     finally:
         cur.close()
-        conn.close()
+        release_sync_connection(conn)
 
 
 @router.put("/profile")
-async def update_profile(
+def update_profile(
     profile_data: dict,
     patient_id: int = Depends(get_current_patient)
 ):
@@ -479,7 +479,7 @@ async def update_profile(
         
     finally:
         cur.close()
-        conn.close()
+        release_sync_connection(conn)
 
 
 @router.post("/request-password-reset")
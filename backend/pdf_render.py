@@ -0,0 +1,137 @@
+"""
+PDF RENDER - Process pool for WeasyPrint and ReportLab rendering
+Turning a report into a PDF is seconds of CPU-bound layout work, so it
+never runs on the event loop. Report modules build their HTML (or
+ReportLab data) in the request, then await render_html() /
+render_wellness_report() here, which run the layout in a pool of
+PDF_RENDER_WORKERS processes.
+
+Workers are started warm: the initializer imports WeasyPrint and
+ReportLab, loads the font configuration and renders a throwaway page so
+fontconfig/Pango caches are primed before the first real report.
+
+At most PDF_RENDER_WORKERS + PDF_RENDER_QUEUE renders are admitted per
+worker process; further requests wait up to PDF_RENDER_QUEUE_TIMEOUT
+seconds for a slot and then get a 503 with Retry-After rather than piling
+up behind a burst.
+"""
+import asyncio
+import os
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Optional
+
+from fastapi import HTTPException
+
+PDF_RENDER_WORKERS = int(os.getenv("PDF_RENDER_WORKERS", "2"))
+PDF_RENDER_QUEUE = int(os.getenv("PDF_RENDER_QUEUE", "8"))
+PDF_RENDER_QUEUE_TIMEOUT = float(os.getenv("PDF_RENDER_QUEUE_TIMEOUT", "30"))
+
+_executor: Optional[ProcessPoolExecutor] = None
+_slots: Optional[asyncio.Semaphore] = None
+
+# Worker-process state, set by _warm_worker()
+_font_config = None
+
+
+# ============================================================================
+# WORKER-SIDE RENDERING (runs in the process pool)
+# ============================================================================
+
+def _warm_worker():
+    """Import the renderers and prime font caches once per worker process"""
+    global _font_config
+    try:
+        from weasyprint import HTML
+        try:
+            from weasyprint.text.fonts import FontConfiguration
+        except ImportError:  # WeasyPrint < 53
+            from weasyprint.fonts import FontConfiguration
+        _font_config = FontConfiguration()
+        HTML(string="<html><body><p>Celloxen</p></body></html>").write_pdf(font_config=_font_config)
+    except Exception as e:
+        print(f"⚠️ PDF worker could not warm WeasyPrint: {e}")
+    try:
+        from reportlab.lib.styles import getSampleStyleSheet
+        getSampleStyleSheet()
+    except Exception as e:
+        print(f"⚠️ PDF worker could not warm ReportLab: {e}")
+
+
+def render_html_file(html: str) -> bytes:
+    """WeasyPrint an HTML document to PDF bytes"""
+    from weasyprint import HTML
+    if _font_config is not None:
+        return HTML(string=html).write_pdf(font_config=_font_config)
+    return HTML(string=html).write_pdf()
+
+
+def render_wellness_report_file(assessment: dict, filename: str) -> str:
+    """Build the ReportLab wellness report into filename"""
+    from report_generator import build_wellness_report
+    return build_wellness_report(assessment, filename)
+
+
+# ============================================================================
+# ASYNC API
+# ============================================================================
+
+def _get_executor() -> ProcessPoolExecutor:
+    global _executor
+    if _executor is None:
+        _executor = ProcessPoolExecutor(max_workers=PDF_RENDER_WORKERS, initializer=_warm_worker)
+    return _executor
+
+
+def start_pdf_pool():
+    """Spawn the workers up front so the first report does not pay for warm-up"""
+    executor = _get_executor()
+    for _ in range(PDF_RENDER_WORKERS):
+        executor.submit(int)
+    print(f"✅ PDF render pool started ({PDF_RENDER_WORKERS} workers)")
+
+
+def shutdown_pdf_pool():
+    """Stop the worker processes (called from the lifespan hook)"""
+    global _executor
+    if _executor is not None:
+        _executor.shutdown(wait=False, cancel_futures=True)
+        _executor = None
+
+
+async def _render(fn, *args):
+    global _slots
+    if _slots is None:
+        _slots = asyncio.Semaphore(PDF_RENDER_WORKERS + PDF_RENDER_QUEUE)
+    try:
+        await asyncio.wait_for(_slots.acquire(), timeout=PDF_RENDER_QUEUE_TIMEOUT)
+    except asyncio.TimeoutError:
+        raise HTTPException(
+            status_code=503,
+            detail="Report rendering is busy, please retry shortly",
+            headers={"Retry-After": "10"}
+        )
+    try:
+        loop = asyncio.get_running_loop()
+        executor = _get_executor()
+        try:
+            return await loop.run_in_executor(executor, fn, *args)
+        except BrokenProcessPool:
+            # A worker died (OOM kill, segfault in a native lib); the pool
+            # refuses all further work, so replace it and retry this job once
+            print("⚠️ PDF render pool broken, restarting workers")
+            if _executor is executor:
+                shutdown_pdf_pool()
+            return await loop.run_in_executor(_get_executor(), fn, *args)
+    finally:
+        _slots.release()
+
+
+async def render_html(html: str) -> bytes:
+    """PDF bytes for an HTML document"""
+    return await _render(render_html_file, html)
+
+
+async def render_wellness_report(assessment: dict, filename: str) -> str:
+    """Write the ReportLab wellness report for an assessment row to filename"""
+    return await _render(render_wellness_report_file, assessment, filename)
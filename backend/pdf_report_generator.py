@@ -8,6 +8,11 @@ from weasyprint import HTML
 from datetime import datetime
 import json
 
+from pdf_render import render_html
+
+# Bump whenever the report layout changes (invalidates cached PDFs)
+TEMPLATE_VERSION = "5.0"
+
 
 def get_score_status(score):
     """Get status label and colours for a wellness score."""
@@ -475,6 +480,11 @@ def generate_pdf_report(patient_data, assessment_data):
     return pdf_bytes
 
 
+async def render_pdf_report(patient_data, assessment_data):
+    """generate_pdf_report() with the layout done in the PDF render pool."""
+    return await render_html(generate_html_report(patient_data, assessment_data))
+
+
 def generate_comprehensive_report(assessment_data, patient_data, iridology_data=None):
     """Wrapper function for compatibility with simple_auth_main.py endpoint."""
     from io import BytesIO
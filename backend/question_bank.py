@@ -0,0 +1,216 @@
+"""
+QUESTION BANK - Immutable, indexed wellness question banks
+Each questionnaire module builds its bank once, when it is imported, from
+its own question definitions. The bank is frozen: domains map to tuples
+of Question, and every Question carries an option text -> weight dict, so
+scoring an answer is a dict or tuple lookup, not a scan of the option
+list. A bank's version is a SHA-256 of its canonical content, which lets
+clients and logs tell which question set an answer was given against.
+
+The assessment_questions table gets the same treatment:
+get_db_question_bank() reads the table on first use and then serves the
+cached bank. Any change to the table NOTIFYs 'celloxen_question_bank'
+(migrations/010_question_bank_invalidation.sql) and every worker drops its
+copy, so the next request reads the table again.
+"""
+import asyncio
+import hashlib
+import json
+from dataclasses import dataclass, field
+from types import MappingProxyType
+from typing import Any, Dict, Iterable, List, Mapping, Optional, Tuple
+
+from db_pool import get_db_connection
+from response_cache import subscribe
+
+QUESTION_BANK_CHANNEL = "celloxen_question_bank"
+
+# Options shown for assessment_questions rows without their own response_options
+RESPONSE_OPTIONS = {
+    "scale": ["Very Low", "Low", "Moderate", "Good", "Excellent"],
+    "frequency": ["Constantly", "Daily", "Few times a week", "Rarely", "Never"],
+    "severity": ["Severe", "Moderate", "Mild", "Minimal", "None"],
+    "quality": ["Very Poor", "Poor", "Fair", "Good", "Excellent"],
+    "duration": ["Over 6 months", "3-6 months", "1-3 months", "Less than a month", "Not applicable"]
+}
+
+# Database questions score answer 0-4 as 0%, 25% ... 100%
+DB_ANSWER_WEIGHTS = (0.0, 25.0, 50.0, 75.0, 100.0)
+
+
+@dataclass(frozen=True)
+class Question:
+    id: Any
+    domain: str
+    text: str
+    type: str
+    options: Tuple[str, ...]
+    weights: Tuple[float, ...]
+    order: int
+    option_weights: Mapping[str, float] = field(repr=False)
+
+    def weight(self, answer) -> Optional[float]:
+        """Weight for an answer given as option index, digit string or option text.
+
+        None when the answer is not one of this question's options.
+        """
+        if isinstance(answer, bool):
+            return None
+        if isinstance(answer, (int, float)):
+            index = int(answer)
+        elif isinstance(answer, str):
+            if not answer.isdecimal():
+                return self.option_weights.get(answer)
+            index = int(answer)
+        else:
+            return None
+        return self.weights[index] if 0 <= index < len(self.weights) else None
+
+    def option(self, index: int) -> str:
+        """Text of the option at index"""
+        return self.options[index] if 0 <= index < len(self.options) else f"Option {index}"
+
+
+@dataclass(frozen=True)
+class QuestionBank:
+    name: str
+    version: str
+    domains: Mapping[str, Tuple[Question, ...]]
+    questions: Tuple[Question, ...] = field(repr=False)
+    _by_id: Mapping[Any, Question] = field(repr=False)
+    _by_domain_id: Mapping[Tuple[str, Any], Question] = field(repr=False)
+
+    def question(self, question_id, domain: Optional[str] = None) -> Optional[Question]:
+        """Look a question up by id (within domain, for banks that reuse ids per domain)"""
+        if domain is not None:
+            return self._by_domain_id.get((domain, question_id))
+        return self._by_id.get(question_id)
+
+    def __len__(self) -> int:
+        return len(self.questions)
+
+
+def build_bank(
+    name: str,
+    domains: Mapping[str, Iterable[dict]],
+    text_key: str = "text",
+    weights_key: str = "weights"
+) -> QuestionBank:
+    """Freeze {domain: [question dict, ...]} into an indexed QuestionBank.
+
+    Question dicts need id, options, the text under text_key and one weight
+    per option under weights_key; type is optional.
+    """
+    canonical: List[list] = []
+    frozen_domains: Dict[str, Tuple[Question, ...]] = {}
+    ordered: List[Question] = []
+    for domain, definitions in domains.items():
+        domain_questions = []
+        for definition in definitions:
+            options = tuple(definition["options"])
+            weights = tuple(definition[weights_key])
+            question = Question(
+                id=definition["id"],
+                domain=domain,
+                text=definition[text_key],
+                type=definition.get("type", "scale"),
+                options=options,
+                weights=weights,
+                order=definition.get("order", len(ordered) + 1),
+                option_weights=MappingProxyType(dict(zip(options, weights)))
+            )
+            domain_questions.append(question)
+            ordered.append(question)
+            canonical.append([domain, question.id, question.text, question.type, options, weights])
+        frozen_domains[domain] = tuple(domain_questions)
+
+    by_id: Dict[Any, Question] = {}
+    shared_ids = set()
+    for question in ordered:
+        if question.id in by_id:
+            shared_ids.add(question.id)
+        by_id[question.id] = question
+    for question_id in shared_ids:
+        # Only unique ids can be looked up without a domain
+        del by_id[question_id]
+
+    version = hashlib.sha256(
+        json.dumps(canonical, separators=(",", ":"), default=str).encode("utf-8")
+    ).hexdigest()[:16]
+    return QuestionBank(
+        name=name,
+        version=version,
+        domains=MappingProxyType(frozen_domains),
+        questions=tuple(sorted(ordered, key=lambda q: q.order)),
+        _by_id=MappingProxyType(by_id),
+        _by_domain_id=MappingProxyType({(q.domain, q.id): q for q in ordered})
+    )
+
+
+# ============================================================================
+# assessment_questions TABLE
+# ============================================================================
+
+_db_bank: Optional[QuestionBank] = None
+_db_generation = 0
+_db_lock: Optional[asyncio.Lock] = None
+
+
+def _db_definition(row) -> dict:
+    options = row["response_options"]
+    if isinstance(options, str):
+        options = json.loads(options)
+    if not options:
+        options = RESPONSE_OPTIONS.get(row["question_type"], RESPONSE_OPTIONS["scale"])
+    return {
+        "id": row["id"],
+        "text": row["question_text"],
+        "type": row["question_type"],
+        "options": options,
+        "weights": DB_ANSWER_WEIGHTS,
+        "order": row["question_order"]
+    }
+
+
+async def _load_db_bank() -> QuestionBank:
+    async with get_db_connection() as conn:
+        rows = await conn.fetch("""
+            SELECT id, therapy_domain, question_text, question_type,
+                   response_options, question_order
+            FROM assessment_questions
+            ORDER BY question_order
+        """)
+    domains: Dict[str, List[dict]] = {}
+    for row in rows:
+        domains.setdefault(row["therapy_domain"], []).append(_db_definition(row))
+    return build_bank("assessment_questions", domains)
+
+
+async def get_db_question_bank() -> QuestionBank:
+    """The assessment_questions table as a QuestionBank, read once per change"""
+    global _db_bank, _db_lock
+    bank = _db_bank
+    if bank is not None:
+        return bank
+    if _db_lock is None:
+        _db_lock = asyncio.Lock()
+    async with _db_lock:
+        if _db_bank is not None:
+            return _db_bank
+        generation = _db_generation
+        bank = await _load_db_bank()
+        # A NOTIFY while we were reading means the rows may already be stale
+        if generation == _db_generation:
+            _db_bank = bank
+            print(f"✅ Loaded question bank {bank.name} ({len(bank)} questions, version {bank.version})")
+        return bank
+
+
+def invalidate_db_question_bank(payload: str = ""):
+    """Drop the cached table bank; the next caller reads it again"""
+    global _db_bank, _db_generation
+    _db_generation += 1
+    _db_bank = None
+
+
+subscribe(QUESTION_BANK_CHANNEL, invalidate_db_question_bank, invalidate_db_question_bank)
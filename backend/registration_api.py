@@ -5,30 +5,19 @@ Registration API - Public endpoints for patient registration
 from fastapi import APIRouter, HTTPException
 from pydantic import BaseModel, EmailStr
 from typing import Dict, Optional
-import psycopg2
-from psycopg2.extras import RealDictCursor
-import bcrypt
 from datetime import datetime
 import json
 
+from chatbot_questionnaire import get_all_questions, calculate_all_scores
 from email_database import validate_token
 from email_sender import send_email
 from email_templates import get_account_confirmation_email
-from email_config import DB_HOST, DB_NAME, DB_USER, DB_PASSWORD
+from db_pool import sync_db_connection
+from passwords import hash_password_sync
 
 router = APIRouter(prefix="/api/v1/register", tags=["registration"])
 
 
-def get_db():
-    """Get database connection"""
-    return psycopg2.connect(
-        host=DB_HOST,
-        database=DB_NAME,
-        user=DB_USER,
-        password=DB_PASSWORD
-    )
-
-
 class RegistrationData(BaseModel):
     token: str
     password: str
@@ -52,7 +41,7 @@ async def get_registration_questions():
 
 
 @router.get("/validate/{token}")
-async def validate_registration_token(token: str):
+def validate_registration_token(token: str):
     """Validate registration token"""
     try:
         patient_data = validate_token(token)
@@ -75,8 +64,8 @@ async def validate_registration_token(token: str):
 
 
 @router.post("/complete")
-async def complete_registration(data: RegistrationData):
-    """Complete patient registration"""
+def complete_registration(data: RegistrationData):
+    """Complete patient registration (sync: DB, bcrypt and SMTP run on the threadpool)"""
     try:
         # Validate token
         patient_data = validate_token(data.token)
@@ -86,55 +75,57 @@ async def complete_registration(data: RegistrationData):
         patient_id = patient_data['id']
         
         # Calculate wellness scores
-        scores = calculate_all_scores(data.chatbot_answers)
+        try:
+            scores = calculate_all_scores(data.chatbot_answers)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
         
         # Hash password
-        password_hash = bcrypt.hashpw(data.password.encode('utf-8'), bcrypt.gensalt()).decode('utf-8')
+        password_hash = hash_password_sync(data.password)
         
         # Update patient record
-        conn = get_db()
-        cur = conn.cursor()
+        with sync_db_connection() as conn:
+            cur = conn.cursor()
+            
+            # Update patient with password, DOB, phone, and status
+            cur.execute("""
+                UPDATE patients
+                SET password_hash = %s,
+                    date_of_birth = %s,
+                    mobile_phone = %s,
+                    status = 'active',
+                    portal_access = TRUE,
+                    registration_token = NULL,
+                    token_expires_at = NULL
+                WHERE id = %s
+            """, (password_hash, data.date_of_birth, data.mobile_phone, patient_id))
         
-        # Update patient with password, DOB, phone, and status
-        cur.execute("""
-            UPDATE patients
-            SET password_hash = %s,
-                date_of_birth = %s,
-                mobile_phone = %s,
-                status = 'active',
-                portal_access = TRUE,
-                registration_token = NULL,
-                token_expires_at = NULL
-            WHERE id = %s
-        """, (password_hash, data.date_of_birth, data.mobile_phone, patient_id))
-        
-        # Save wellness questionnaire to comprehensive_assessments
-        # Match the actual table structure
-        questionnaire_scores = {
-            'overall_score': scores['overall_score'],
-            'energy_vitality': scores['energy_vitality'],
-            'pain_mobility': scores['pain_mobility'],
-            'stress_management': scores['stress_management'],
-            'metabolic_balance': scores['metabolic_balance'],
-            'sleep_quality': scores['sleep_quality']
-        }
+            # Save wellness questionnaire to comprehensive_assessments
+            # Match the actual table structure
+            questionnaire_scores = {
+                'overall_score': scores['overall_score'],
+                'energy_vitality': scores['energy_vitality'],
+                'pain_mobility': scores['pain_mobility'],
+                'stress_management': scores['stress_management'],
+                'metabolic_balance': scores['metabolic_balance'],
+                'sleep_quality': scores['sleep_quality']
+            }
         
-        cur.execute("""
-            INSERT INTO comprehensive_assessments 
-            (patient_id, assessment_date, assessment_status, 
-             questionnaire_responses, questionnaire_scores, overall_wellness_score)
-            VALUES (%s, %s, 'completed', %s, %s, %s)
-        """, (
-            patient_id,
-            datetime.now(),
-            json.dumps(data.chatbot_answers),
-            json.dumps(questionnaire_scores),
-            scores['overall_score']
-        ))
+            cur.execute("""
+                INSERT INTO comprehensive_assessments 
+                (patient_id, assessment_date, assessment_status, 
+                 questionnaire_responses, questionnaire_scores, overall_wellness_score)
+                VALUES (%s, %s, 'completed', %s, %s, %s)
+            """, (
+                patient_id,
+                datetime.now(),
+                json.dumps(data.chatbot_answers),
+                json.dumps(questionnaire_scores),
+                scores['overall_score']
+            ))
         
-        conn.commit()
-        cur.close()
-        conn.close()
+            conn.commit()
+            cur.close()
         
         # Send confirmation email
         template = get_account_confirmation_email(
@@ -147,6 +138,7 @@ async def complete_registration(data: RegistrationData):
             to_email=patient_data['email'],
             subject=template['subject'],
             html_content=template['html'],
+            text_content=template['text'],
             patient_id=patient_id,
             email_type="ACCOUNT_CONFIRMATION"
         )
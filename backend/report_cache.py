@@ -0,0 +1,125 @@
+"""
+REPORT CACHE - Rendered PDF reports kept on disk
+A report's key is the SHA-256 of the rows it is rendered from plus the
+generator's TEMPLATE_VERSION, so a download re-reads those rows (cheap)
+but only re-renders (expensive) when the assessment, patient or
+iridology data actually changed or the template was bumped.
+
+Files live under REPORT_CACHE_DIR/<kind>/<report id>-<key>.pdf. Every hit
+touches the file's mtime, and writing a new version of a report removes
+the previous ones only once they have gone unserved for
+REPORT_CACHE_GRACE_SECONDS, so a download that was handed the old path a
+moment ago can still open it. Responses carry the key
+as a strong ETag (If-None-Match gets a 304) and are sent with
+FileResponse, so the server can use sendfile for the body.
+"""
+import asyncio
+import glob
+import hashlib
+import json
+import os
+import tempfile
+import time
+from typing import Awaitable, Callable, Dict
+
+from fastapi.responses import FileResponse, Response
+
+from blob_store import BLOB_STORE_DIR
+
+REPORT_CACHE_DIR = os.getenv("REPORT_CACHE_DIR", os.path.join(BLOB_STORE_DIR, "reports"))
+REPORT_CACHE_GRACE_SECONDS = int(os.getenv("REPORT_CACHE_GRACE_SECONDS", "300"))
+
+_locks: Dict[str, asyncio.Lock] = {}
+
+
+def source_key(template_version: str, *rows) -> str:
+    """Content hash of the source rows (dicts or None) and template version"""
+    payload = json.dumps([template_version, *rows], sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def _report_path(kind: str, report_id: int, key: str) -> str:
+    return os.path.join(REPORT_CACHE_DIR, kind, f"{int(report_id)}-{key}.pdf")
+
+
+def _touch(path: str) -> bool:
+    """Mark a cached report as just served; False if it does not exist"""
+    try:
+        os.utime(path)
+        return True
+    except FileNotFoundError:
+        return False
+
+
+def _write_report(path: str, pdf_bytes: bytes):
+    directory = os.path.dirname(path)
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=".tmp-")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(pdf_bytes)
+        os.replace(tmp_path, path)
+    except Exception:
+        if os.path.exists(tmp_path):
+            os.unlink(tmp_path)
+        raise
+    # Drop superseded renders of the same report that nothing served recently
+    prefix = os.path.basename(path).split("-", 1)[0]
+    cutoff = time.time() - REPORT_CACHE_GRACE_SECONDS
+    for old in glob.glob(os.path.join(directory, f"{prefix}-*.pdf")):
+        if old != path:
+            try:
+                if os.path.getmtime(old) < cutoff:
+                    os.unlink(old)
+            except FileNotFoundError:
+                pass
+
+
+async def get_or_render(kind: str, report_id: int, key: str, render: Callable[[], Awaitable[bytes]]) -> str:
+    """Path of the cached PDF for key, rendering it first if needed"""
+    path = _report_path(kind, report_id, key)
+    if await asyncio.to_thread(_touch, path):
+        return path
+    lock = _locks.setdefault(path, asyncio.Lock())
+    try:
+        async with lock:
+            # Another request may have rendered it while we waited
+            if not await asyncio.to_thread(os.path.exists, path):
+                pdf_bytes = await render()
+                await asyncio.to_thread(_write_report, path, pdf_bytes)
+                print(f"✅ Rendered {kind} report {report_id} ({len(pdf_bytes)} bytes)")
+    finally:
+        if not lock.locked() and _locks.get(path) is lock:
+            del _locks[path]
+    return path
+
+
+def _not_modified(etag: str, headers) -> bool:
+    if_none_match = headers.get("if-none-match")
+    return bool(if_none_match) and (
+        if_none_match.strip() == "*" or etag in [t.strip() for t in if_none_match.split(",")]
+    )
+
+
+def _cache_headers(key: str) -> dict:
+    # Patient data: browser-only, and revalidate so changes show up
+    return {"ETag": f'"{key}"', "Cache-Control": "private, no-cache"}
+
+
+async def cached_report(
+    kind: str,
+    report_id: int,
+    key: str,
+    render: Callable[[], Awaitable[bytes]],
+    headers,
+    filename: str
+) -> Response:
+    """Serve the report for key, rendering only on a cache miss.
+
+    A client already holding this version gets a 304 without the file
+    being touched.
+    """
+    if _not_modified(f'"{key}"', headers):
+        return Response(status_code=304, headers=_cache_headers(key))
+    path = await get_or_render(kind, report_id, key, render)
+    return FileResponse(path, media_type="application/pdf", filename=filename, headers=_cache_headers(key))
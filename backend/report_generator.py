@@ -12,39 +12,39 @@ from reportlab.lib import colors
 from reportlab.lib.enums import TA_CENTER, TA_LEFT, TA_RIGHT
 from reportlab.pdfgen import canvas
 from datetime import datetime
-import asyncpg
 import json
 
+from db_pool import get_db_connection
+from pdf_render import render_wellness_report
+
 async def generate_wellness_report(assessment_id: int) -> str:
     """
     Generate comprehensive wellness report PDF
     Returns: path to generated PDF file
     """
     
-    # Connect to database and fetch all data
-    conn = await asyncpg.connect(
-        host="localhost", port=5432, user="celloxen_user",
-        password="CelloxenSecure2025", database="celloxen_portal"
-    )
-    
-    # Get assessment data with patient info
-    assessment = await conn.fetchrow("""
-        SELECT 
-            a.*,
-            p.first_name, p.last_name, p.email, p.date_of_birth,
-            p.patient_number
-        FROM comprehensive_assessments a
-        JOIN patients p ON a.patient_id = p.id
-        WHERE a.id = $1
-    """, assessment_id)
-    
-    await conn.close()
+    async with get_db_connection() as conn:
+        # Get assessment data with patient info
+        assessment = await conn.fetchrow("""
+            SELECT 
+                a.*,
+                p.first_name, p.last_name, p.email, p.date_of_birth,
+                p.patient_number
+            FROM comprehensive_assessments a
+            JOIN patients p ON a.patient_id = p.id
+            WHERE a.id = $1
+        """, assessment_id)
     
     if not assessment:
         raise Exception(f"Assessment {assessment_id} not found")
     
-    # Create PDF
+    # Layout runs in the PDF render pool (pdf_render.py)
     filename = f"/var/www/celloxen-portal/reports/wellness_report_{assessment_id}_{datetime.now().strftime('%Y%m%d')}.pdf"
+    return await render_wellness_report(dict(assessment), filename)
+
+
+def build_wellness_report(assessment: dict, filename: str) -> str:
+    """Lay out the wellness report for an assessment row into filename"""
     doc = SimpleDocTemplate(filename, pagesize=A4)
     
     # Container for PDF elements
@@ -258,6 +258,17 @@ async def generate_wellness_report(assessment_id: int) -> str:
 # Test function
 if __name__ == "__main__":
     import asyncio
-    # Test with assessment ID 1
-    result = asyncio.run(generate_wellness_report(1))
+    from db_pool import init_pool, close_pool
+    from pdf_render import shutdown_pdf_pool
+
+    async def main():
+        await init_pool()
+        try:
+            # Test with assessment ID 1
+            return await generate_wellness_report(1)
+        finally:
+            await close_pool()
+            shutdown_pdf_pool()
+
+    result = asyncio.run(main())
     print(f"Report generated: {result}")
@@ -0,0 +1,263 @@
+"""
+RESPONSE CACHE - Short-lived in-process cache for read-heavy endpoints
+Dashboards and reports poll the same aggregates many times a minute, so
+their responses are kept for a few seconds per clinic. Every worker
+process has its own cache; they are kept honest by Postgres: triggers on
+the source tables (migrations/005_cache_invalidation.sql) NOTIFY the
+affected clinic id on commit, and each worker LISTENs and drops that
+clinic's entries. System-wide (scope None) entries aggregate every clinic,
+so any write anywhere would stale them; they are left to expire by TTL
+instead of being cleared many times a second.
+
+Concurrent misses for the same key share one load, and a load that
+overlaps an invalidation of its scope is returned but not stored.
+
+The async helper serves the asyncpg endpoints; get_or_load_sync() serves
+the psycopg2 routers that run in the threadpool. Other in-process caches
+(auth_cache) subscribe() their own channels onto the same listener
+connection.
+"""
+import asyncio
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Hashable, Optional
+
+from db_pool import get_db_connection
+
+RESPONSE_CACHE_ENABLED = os.getenv("RESPONSE_CACHE_ENABLED", "true").lower() == "true"
+RESPONSE_CACHE_MAX_ENTRIES = int(os.getenv("RESPONSE_CACHE_MAX_ENTRIES", "2000"))
+
+INVALIDATION_CHANNEL = "celloxen_cache"
+
+_entries: "OrderedDict[tuple, tuple]" = OrderedDict()   # key -> (expires_at, value)
+_inflight: Dict[tuple, asyncio.Future] = {}
+_metrics: Dict[str, Dict[str, int]] = {}
+_lock = threading.Lock()
+_generation = 0                          # bumped by clear()
+_scope_generations: Dict[int, int] = {}  # bumped by invalidate_clinic()
+_listener_task: Optional[asyncio.Task] = None
+_subscriptions: Dict[str, tuple] = {}   # channel -> (on_notify(payload), on_reset())
+
+
+def _count(namespace: str, metric: str, n: int = 1):
+    counters = _metrics.setdefault(namespace, {"hits": 0, "misses": 0, "loads": 0, "invalidated": 0})
+    counters[metric] += n
+
+
+def _lookup(cache_key: tuple):
+    with _lock:
+        entry = _entries.get(cache_key)
+        if entry is not None and entry[0] > time.monotonic():
+            _entries.move_to_end(cache_key)
+            _count(cache_key[0], "hits")
+            return True, entry[1]
+        if entry is not None:
+            del _entries[cache_key]
+        _count(cache_key[0], "misses")
+        return False, None
+
+
+def _generation_of(scope: Optional[int]) -> tuple:
+    return _generation, _scope_generations.get(scope, 0)
+
+
+def _store(cache_key: tuple, value: Any, ttl: float, generation: tuple):
+    with _lock:
+        if generation != _generation_of(cache_key[1]):
+            return
+        _entries[cache_key] = (time.monotonic() + ttl, value)
+        _entries.move_to_end(cache_key)
+        while len(_entries) > RESPONSE_CACHE_MAX_ENTRIES:
+            _entries.popitem(last=False)
+
+
+async def get_or_load(
+    namespace: str,
+    loader: Callable[[], Awaitable[Any]],
+    ttl: float,
+    scope: Optional[int] = None,
+    key: Hashable = None
+) -> Any:
+    """Cached result of `await loader()`.
+
+    scope is the clinic id the data belongs to (None for system-wide data);
+    key distinguishes variants within a scope, e.g. the requesting user.
+    """
+    if not RESPONSE_CACHE_ENABLED:
+        return await loader()
+
+    cache_key = (namespace, scope, key)
+    found, value = _lookup(cache_key)
+    if found:
+        return value
+
+    pending = _inflight.get(cache_key)
+    if pending is not None:
+        try:
+            return await asyncio.shield(pending)
+        except asyncio.CancelledError:
+            if not pending.cancelled():
+                raise
+        # The request doing the load went away; load for ourselves
+        return await loader()
+
+    future = asyncio.get_running_loop().create_future()
+    _inflight[cache_key] = future
+    generation = _generation_of(scope)
+    with _lock:
+        _count(namespace, "loads")
+    try:
+        value = await loader()
+    except BaseException as e:
+        if isinstance(e, asyncio.CancelledError):
+            future.cancel()
+        else:
+            future.set_exception(e)
+            future.exception()  # waiters re-raise it; don't log "never retrieved"
+        raise
+    finally:
+        _inflight.pop(cache_key, None)
+
+    future.set_result(value)
+    _store(cache_key, value, ttl, generation)
+    return value
+
+
+def get_or_load_sync(
+    namespace: str,
+    loader: Callable[[], Any],
+    ttl: float,
+    scope: Optional[int] = None,
+    key: Hashable = None
+) -> Any:
+    """get_or_load() for sync endpoints (no load sharing)"""
+    if not RESPONSE_CACHE_ENABLED:
+        return loader()
+
+    cache_key = (namespace, scope, key)
+    found, value = _lookup(cache_key)
+    if found:
+        return value
+    generation = _generation_of(scope)
+    with _lock:
+        _count(namespace, "loads")
+    value = loader()
+    _store(cache_key, value, ttl, generation)
+    return value
+
+
+def invalidate_clinic(clinic_id: Optional[int]):
+    """Drop a clinic's entries; system-wide entries expire by TTL"""
+    if clinic_id is None:
+        return
+    with _lock:
+        _scope_generations[clinic_id] = _scope_generations.get(clinic_id, 0) + 1
+        stale = [k for k in _entries if k[1] == clinic_id]
+        for cache_key in stale:
+            del _entries[cache_key]
+            _count(cache_key[0], "invalidated")
+
+
+def clear():
+    """Drop everything"""
+    global _generation
+    with _lock:
+        _generation += 1
+        for cache_key in _entries:
+            _count(cache_key[0], "invalidated")
+        _entries.clear()
+
+
+def cache_stats() -> dict:
+    """Per-namespace hit/miss counters for this worker"""
+    with _lock:
+        sizes: Dict[str, int] = {}
+        for cache_key in _entries:
+            sizes[cache_key[0]] = sizes.get(cache_key[0], 0) + 1
+        namespaces = {}
+        for namespace, counters in sorted(_metrics.items()):
+            lookups = counters["hits"] + counters["misses"]
+            namespaces[namespace] = {
+                **counters,
+                "entries": sizes.get(namespace, 0),
+                "hit_rate": round(counters["hits"] / lookups, 3) if lookups else None
+            }
+    return {
+        "enabled": RESPONSE_CACHE_ENABLED,
+        "worker_pid": os.getpid(),
+        "listening": _listener_task is not None and not _listener_task.done(),
+        "entries": len(_entries),
+        "max_entries": RESPONSE_CACHE_MAX_ENTRIES,
+        "namespaces": namespaces
+    }
+
+
+def subscribe(channel: str, on_notify: Callable[[str], None], on_reset: Callable[[], None] = None):
+    """Deliver another NOTIFY channel through the listener connection.
+
+    on_notify gets each payload; on_reset runs whenever notifications may
+    have been missed (listener (re)connecting). Call before startup.
+    """
+    _subscriptions[channel] = (on_notify, on_reset)
+
+
+def _on_notify(payload: str):
+    try:
+        clinic_id = int(payload)
+    except ValueError:
+        clinic_id = None
+    invalidate_clinic(clinic_id or None)
+
+
+def _reset_all():
+    clear()
+    for _, on_reset in _subscriptions.values():
+        if on_reset is not None:
+            on_reset()
+
+
+def _dispatcher(on_notify):
+    def dispatch(connection, pid, channel, payload):
+        try:
+            on_notify(payload)
+        except Exception as e:
+            print(f"❌ Invalidation on {channel} failed: {e}")
+    return dispatch
+
+
+async def _listen_loop():
+    """Hold one pooled connection LISTENing for invalidations"""
+    while True:
+        try:
+            async with get_db_connection() as conn:
+                await conn.add_listener(INVALIDATION_CHANNEL, _dispatcher(_on_notify))
+                for channel, (on_notify, _) in _subscriptions.items():
+                    await conn.add_listener(channel, _dispatcher(on_notify))
+                # Anything cached while we were not listening may be stale
+                _reset_all()
+                while not conn.is_closed():
+                    await asyncio.sleep(30)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            print(f"❌ Response cache listener error: {e}")
+        _reset_all()
+        await asyncio.sleep(5)
+
+
+def start_cache_listener():
+    """Start listening for invalidations on the running loop"""
+    global _listener_task
+    if (RESPONSE_CACHE_ENABLED or _subscriptions) and _listener_task is None:
+        _listener_task = asyncio.create_task(_listen_loop())
+        print("✅ Response cache listening for invalidations")
+
+
+async def stop_cache_listener():
+    global _listener_task
+    if _listener_task is not None:
+        _listener_task.cancel()
+        await asyncio.gather(_listener_task, return_exceptions=True)
+        _listener_task = None
@@ -3,7 +3,7 @@ SIMPLE ASSESSMENT API - AI-Powered Wellness Assessment System
 Handles 35-question assessment with intelligent therapy matching
 Uses Anthropic Claude API for comprehensive report generation
 """
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, HTTPException, Request
 import asyncpg
 import os
 import json
@@ -11,6 +11,12 @@ from typing import List, Dict
 from pydantic import BaseModel
 from datetime import datetime
 
+from ai_client import get_ai_client, create_message
+from db_pool import get_db_connection
+from job_queue import job_handler, enqueue_job, get_latest_job, PermanentJobError
+from question_bank import get_db_question_bank
+import email_service
+
 router = APIRouter()
 
 # Database connection
@@ -35,46 +41,24 @@ class AssessmentSubmission(BaseModel):
     patient_id: int
     answers: List[AssessmentAnswer]
 
-# ==================== RESPONSE OPTIONS ====================
-RESPONSE_OPTIONS = {
-    "scale": ["Very Low", "Low", "Moderate", "Good", "Excellent"],
-    "frequency": ["Constantly", "Daily", "Few times a week", "Rarely", "Never"],
-    "severity": ["Severe", "Moderate", "Mild", "Minimal", "None"],
-    "quality": ["Very Poor", "Poor", "Fair", "Good", "Excellent"],
-    "duration": ["Over 6 months", "3-6 months", "1-3 months", "Less than a month", "Not applicable"]
-}
-
 # ==================== GET ALL 35 QUESTIONS ====================
 @router.get("/api/v1/assessment/questions")
 async def get_assessment_questions():
-    """Get all 35 wellness questions"""
-    conn = await get_db()
-    
-    questions = await conn.fetch("""
-        SELECT 
-            id,
-            therapy_domain,
-            question_text,
-            question_type,
-            response_options,
-            question_order
-        FROM assessment_questions
-        ORDER BY question_order
-    """)
-    
-    await conn.close()
+    """Get all 35 wellness questions (cached question bank, see question_bank.py)"""
+    bank = await get_db_question_bank()
     
     return {
+        "version": bank.version,
         "questions": [
             {
-                "id": q['id'],
-                "therapy_domain": q['therapy_domain'],
-                "question_text": q['question_text'],
-                "question_type": q['question_type'],
-                "response_options": json.loads(q['response_options']) if q['response_options'] else RESPONSE_OPTIONS.get(q['question_type'], RESPONSE_OPTIONS['scale']),
-                "question_order": q['question_order']
+                "id": q.id,
+                "therapy_domain": q.domain,
+                "question_text": q.text,
+                "question_type": q.type,
+                "response_options": list(q.options),
+                "question_order": q.order
             }
-            for q in questions
+            for q in bank.questions
         ]
     }
 
@@ -88,12 +72,10 @@ async def generate_ai_report(
     """Generate comprehensive AI-powered assessment report using Claude API"""
     
     try:
-        from anthropic import Anthropic
-        
         if not ANTHROPIC_API_KEY:
             return {"success": False, "error": "AI API key not configured"}
         
-        client = Anthropic(api_key=ANTHROPIC_API_KEY)
+        client = get_ai_client(ANTHROPIC_API_KEY)
         
         # Format questions and answers
         qa_text = ""
@@ -224,7 +206,8 @@ Generate a detailed report in the following JSON format:
 Provide ONLY the JSON response, no additional text before or after."""
 
         # Call Claude API
-        message = client.messages.create(
+        message = await create_message(
+            client,
             model="claude-sonnet-4-20250514",
             max_tokens=4000,
             messages=[
@@ -258,22 +241,64 @@ Provide ONLY the JSON response, no additional text before or after."""
         return {"success": False, "error": str(e)}
 
 # ==================== SUBMIT ASSESSMENT ====================
+DOMAIN_KEYS = {
+    'C-102': 'energy',       # Energy (Q1-7)
+    'C-104': 'comfort',      # Comfort (Q8-14)
+    'C-105': 'circulation',  # Circulation (Q15-21)
+    'C-107': 'stress',       # Stress (Q22-28)
+    'C-108': 'metabolic'     # Metabolic (Q29-35)
+}
+
+
+
+def answered_questions(bank, responses):
+    """(question, answer_index) for stored responses, in question order"""
+    answered = []
+    for r in responses:
+        question = bank.question(r['question_id'])
+        if question is not None:
+            answered.append((question, r['answer_index']))
+    return sorted(answered, key=lambda qa: qa[0].order)
+
+
+async def load_active_therapies(conn) -> List[Dict]:
+    """Active therapies in the shape generate_ai_report() expects"""
+    therapies = await conn.fetch("""
+        SELECT therapy_code, therapy_name, subtitle, description,
+               primary_support_areas, client_indicators, 
+               short_term_benefits, long_term_benefits,
+               recommended_sessions, session_frequency, session_duration
+        FROM therapies
+        WHERE is_active = true
+        ORDER BY therapy_code
+    """)
+    
+    therapies_list = []
+    for t in therapies:
+        therapies_list.append({
+            'therapy_code': t['therapy_code'],
+            'therapy_name': t['therapy_name'],
+            'subtitle': t['subtitle'],
+            'description': t['description'],
+            'client_indicators': t['client_indicators'] if isinstance(t['client_indicators'], list) else json.loads(t['client_indicators']) if t['client_indicators'] else [],
+            'primary_support_areas': t['primary_support_areas'] if isinstance(t['primary_support_areas'], list) else json.loads(t['primary_support_areas']) if t['primary_support_areas'] else [],
+            'short_term_benefits': t['short_term_benefits'] if isinstance(t['short_term_benefits'], list) else json.loads(t['short_term_benefits']) if t['short_term_benefits'] else [],
+            'long_term_benefits': t['long_term_benefits'] if isinstance(t['long_term_benefits'], list) else json.loads(t['long_term_benefits']) if t['long_term_benefits'] else [],
+            'recommended_sessions': t['recommended_sessions'],
+            'session_frequency': t['session_frequency'],
+            'session_duration': t['session_duration']
+        })
+    return therapies_list
+
+
 @router.post("/api/v1/assessment/submit")
 async def submit_assessment(submission: AssessmentSubmission):
     """
     Submit completed 35-question assessment
-    Calculate scores, generate AI report, and save to database
+    Calculate and save scores straight away; the AI report is generated by
+    an assessment_report background job (poll /api/v1/assessment/{id}/status)
     """
-    conn = await get_db()
-    
     try:
-        # Get all questions to validate and calculate scores
-        questions = await conn.fetch("""
-            SELECT id, therapy_domain, question_order, question_text, response_options
-            FROM assessment_questions
-            ORDER BY question_order
-        """)
-        
         # Validate we have 35 answers
         if len(submission.answers) != 35:
             raise HTTPException(
@@ -281,184 +306,236 @@ async def submit_assessment(submission: AssessmentSubmission):
                 detail=f"Expected 35 answers, got {len(submission.answers)}"
             )
         
-        # Get patient info
-        patient = await conn.fetchrow("""
-            SELECT id, first_name, last_name, date_of_birth, gender
-            FROM patients WHERE id = $1
-        """, submission.patient_id)
-        
-        if not patient:
-            raise HTTPException(status_code=404, detail="Patient not found")
-        
-        # Calculate age
-        age = None
-        if patient['date_of_birth']:
-            today = datetime.now().date()
-            dob = patient['date_of_birth']
-            age = today.year - dob.year - ((today.month, today.day) < (dob.month, dob.day))
+        bank = await get_db_question_bank()
         
-        # Calculate domain scores
-        domain_scores = {
-            'C-102': [],  # Energy (Q1-7)
-            'C-104': [],  # Comfort (Q8-14)
-            'C-105': [],  # Circulation (Q15-21)
-            'C-107': [],  # Stress (Q22-28)
-            'C-108': []   # Metabolic (Q29-35)
-        }
-        
-        # Build questions and answers for AI
-        questions_and_answers = []
-        
-        # Group answers by domain
-        for answer in submission.answers:
-            question = next((q for q in questions if q['id'] == answer.question_id), None)
-            if not question:
-                raise HTTPException(
-                    status_code=400,
-                    detail=f"Invalid question_id: {answer.question_id}"
-                )
-            
-            # Convert answer (0-4) to percentage (0-100)
-            # 0 = 0%, 1 = 25%, 2 = 50%, 3 = 75%, 4 = 100%
-            score = (answer.answer_index / 4) * 100
+        async with get_db_connection() as conn:
+            patient_exists = await conn.fetchval(
+                "SELECT 1 FROM patients WHERE id = $1", submission.patient_id
+            )
+            if not patient_exists:
+                raise HTTPException(status_code=404, detail="Patient not found")
             
-            domain = question['therapy_domain']
-            domain_scores[domain].append(score)
+            # Group answer scores by domain
+            domain_scores = {domain: [] for domain in DOMAIN_KEYS}
+            for answer in submission.answers:
+                question = bank.question(answer.question_id)
+                if question is None:
+                    raise HTTPException(
+                        status_code=400,
+                        detail=f"Invalid question_id: {answer.question_id}"
+                    )
+                score = question.weight(answer.answer_index)
+                if score is None:
+                    raise HTTPException(
+                        status_code=400,
+                        detail=f"Invalid answer_index for question {answer.question_id}: {answer.answer_index}"
+                    )
+                domain_scores.setdefault(question.domain, []).append(score)
             
-            # Get answer text
-            options = json.loads(question['response_options']) if question['response_options'] else ["Very Low", "Low", "Moderate", "Good", "Excellent"]
-            answer_text = options[answer.answer_index] if answer.answer_index < len(options) else f"Option {answer.answer_index}"
+            # Average for each domain; overall is the average of the domains
+            scores = {
+                key: sum(domain_scores[domain]) / len(domain_scores[domain]) if domain_scores[domain] else 0.0
+                for domain, key in DOMAIN_KEYS.items()
+            }
+            scores['overall'] = sum(scores[key] for key in DOMAIN_KEYS.values()) / len(DOMAIN_KEYS)
             
-            questions_and_answers.append({
-                "question": question['question_text'],
-                "answer": answer_text,
-                "score": score,
-                "domain": domain
-            })
-        
-        # Calculate average for each domain
-        energy_score = sum(domain_scores['C-102']) / len(domain_scores['C-102'])
-        comfort_score = sum(domain_scores['C-104']) / len(domain_scores['C-104'])
-        circulation_score = sum(domain_scores['C-105']) / len(domain_scores['C-105'])
-        stress_score = sum(domain_scores['C-107']) / len(domain_scores['C-107'])
-        metabolic_score = sum(domain_scores['C-108']) / len(domain_scores['C-108'])
-        
-        # Overall score is average of all domains
-        overall_score = (energy_score + comfort_score + circulation_score + 
-                        stress_score + metabolic_score) / 5
-        
-        # Get therapies from database
-        therapies = await conn.fetch("""
-            SELECT therapy_code, therapy_name, subtitle, description,
-                   primary_support_areas, client_indicators, 
-                   short_term_benefits, long_term_benefits,
-                   recommended_sessions, session_frequency, session_duration
-            FROM therapies
-            WHERE is_active = true
-            ORDER BY therapy_code
-        """)
-        
-        therapies_list = []
-        for t in therapies:
-            therapies_list.append({
-                'therapy_code': t['therapy_code'],
-                'therapy_name': t['therapy_name'],
-                'subtitle': t['subtitle'],
-                'description': t['description'],
-                'client_indicators': t['client_indicators'] if isinstance(t['client_indicators'], list) else json.loads(t['client_indicators']) if t['client_indicators'] else [],
-                'primary_support_areas': t['primary_support_areas'] if isinstance(t['primary_support_areas'], list) else json.loads(t['primary_support_areas']) if t['primary_support_areas'] else [],
-                'short_term_benefits': t['short_term_benefits'] if isinstance(t['short_term_benefits'], list) else json.loads(t['short_term_benefits']) if t['short_term_benefits'] else [],
-                'long_term_benefits': t['long_term_benefits'] if isinstance(t['long_term_benefits'], list) else json.loads(t['long_term_benefits']) if t['long_term_benefits'] else [],
-                'recommended_sessions': t['recommended_sessions'],
-                'session_frequency': t['session_frequency'],
-                'session_duration': t['session_duration']
-            })
-        
-        # Prepare patient info for AI
-        patient_info = {
-            'name': f"{patient['first_name']} {patient['last_name']}",
-            'age': age,
-            'gender': patient['gender']
-        }
-        
-        # Prepare domain scores for AI
-        scores_for_ai = {
-            'energy': energy_score,
-            'comfort': comfort_score,
-            'circulation': circulation_score,
-            'stress': stress_score,
-            'metabolic': metabolic_score,
-            'overall': overall_score
-        }
-        
-        # Generate AI report
-        print(f"Generating AI report for patient {submission.patient_id}...")
-        ai_result = await generate_ai_report(
-            patient_info,
-            questions_and_answers,
-            scores_for_ai,
-            therapies_list
-        )
-        
-        ai_report = ai_result.get('report') if ai_result.get('success') else None
-        
-        # Create assessment record
-        assessment = await conn.fetchrow("""
-            INSERT INTO patient_assessments (
-                patient_id,
-                energy_score,
-                comfort_score,
-                circulation_score,
-                stress_score,
-                metabolic_score,
-                overall_score,
-                ai_report,
-                report_generated_at,
-                status
-            ) VALUES ($1, $2, $3, $4, $5, $6, $7, $8, $9, 'completed')
-            RETURNING id
-        """, submission.patient_id, energy_score, comfort_score,
-            circulation_score, stress_score, metabolic_score, overall_score,
-            json.dumps(ai_report) if ai_report else None,
-            datetime.now() if ai_report else None)
-        
-        assessment_id = assessment['id']
-        
-        # Save all responses
-        for answer in submission.answers:
-            await conn.execute("""
-                INSERT INTO assessment_responses (
-                    assessment_id,
-                    question_id,
-                    answer_index
-                ) VALUES ($1, $2, $3)
-            """, assessment_id, answer.question_id, answer.answer_index)
-        
-        await conn.close()
+            async with conn.transaction():
+                assessment_id = await conn.fetchval("""
+                    INSERT INTO patient_assessments (
+                        patient_id,
+                        energy_score,
+                        comfort_score,
+                        circulation_score,
+                        stress_score,
+                        metabolic_score,
+                        overall_score,
+                        status
+                    ) VALUES ($1, $2, $3, $4, $5, $6, $7, 'report_pending')
+                    RETURNING id
+                """, submission.patient_id, scores['energy'], scores['comfort'],
+                    scores['circulation'], scores['stress'], scores['metabolic'], scores['overall'])
+                
+                await conn.executemany("""
+                    INSERT INTO assessment_responses (
+                        assessment_id,
+                        question_id,
+                        answer_index
+                    ) VALUES ($1, $2, $3)
+                """, [(assessment_id, a.question_id, a.answer_index) for a in submission.answers])
+                
+                job_id = await enqueue_job(
+                    conn,
+                    "assessment_report",
+                    {"assessment_id": assessment_id},
+                    dedupe_key=f"assessment_report:{assessment_id}"
+                )
         
         return {
             "success": True,
             "assessment_id": assessment_id,
-            "scores": {
-                "energy": round(energy_score, 2),
-                "comfort": round(comfort_score, 2),
-                "circulation": round(circulation_score, 2),
-                "stress": round(stress_score, 2),
-                "metabolic": round(metabolic_score, 2),
-                "overall": round(overall_score, 2)
-            },
-            "report": ai_report,
-            "message": "Assessment completed successfully!"
+            "scores": {key: round(value, 2) for key, value in scores.items()},
+            "report": None,
+            "report_status": "queued",
+            "job_id": job_id,
+            "status_url": f"/api/v1/assessment/{assessment_id}/status",
+            "message": "Assessment completed successfully! Your AI report is being prepared."
         }
         
     except HTTPException:
-        await conn.close()
         raise
     except Exception as e:
-        await conn.close()
         print(f"Assessment Error: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
 
+
+# ==================== AI REPORT JOB ====================
+async def mark_assessment_report_failed(payload: dict, error: str):
+    """Job failure hook: the scores stand, only the AI report is missing"""
+    async with get_db_connection() as conn:
+        await conn.execute("""
+            UPDATE patient_assessments SET status = 'report_failed'
+            WHERE id = $1 AND ai_report IS NULL
+        """, payload["assessment_id"])
+
+
+async def notify_assessment_report_ready(payload: dict, result: dict):
+    """Job completion hook: tell the patient their report is ready"""
+    if not result.get("notify_email"):
+        return
+    await email_service.send_report_ready_email(
+        result["notify_email"],
+        result["patient_name"],
+        result["patient_id"],
+        result["report_number"]
+    )
+
+
+@job_handler(
+    "assessment_report",
+    on_failure=mark_assessment_report_failed,
+    on_complete=notify_assessment_report_ready
+)
+async def run_assessment_report(payload: dict) -> dict:
+    """Background job: generate and store the AI report for one assessment"""
+    assessment_id = payload["assessment_id"]
+    
+    async with get_db_connection() as conn:
+        assessment = await conn.fetchrow("""
+            SELECT pa.id, pa.patient_id, pa.ai_report,
+                   pa.energy_score, pa.comfort_score, pa.circulation_score,
+                   pa.stress_score, pa.metabolic_score, pa.overall_score,
+                   p.first_name, p.last_name, p.date_of_birth, p.gender, p.email
+            FROM patient_assessments pa
+            JOIN patients p ON pa.patient_id = p.id
+            WHERE pa.id = $1
+        """, assessment_id)
+        
+        if not assessment:
+            raise PermanentJobError("Assessment not found")
+        
+        if assessment['ai_report']:
+            # Already generated (job re-run) - don't pay for, or email, it twice
+            return {"assessment_id": assessment_id, "already_generated": True}
+        
+        responses = await conn.fetch("""
+            SELECT question_id, answer_index
+            FROM assessment_responses
+            WHERE assessment_id = $1
+        """, assessment_id)
+        
+        therapies_list = await load_active_therapies(conn)
+    
+    bank = await get_db_question_bank()
+    
+    # Calculate age
+    age = None
+    if assessment['date_of_birth']:
+        today = datetime.now().date()
+        dob = assessment['date_of_birth']
+        age = today.year - dob.year - ((today.month, today.day) < (dob.month, dob.day))
+    
+    patient_name = f"{assessment['first_name']} {assessment['last_name']}"
+    patient_info = {
+        'name': patient_name,
+        'age': age,
+        'gender': assessment['gender']
+    }
+    
+    questions_and_answers = [
+        {
+            "question": question.text,
+            "answer": question.option(answer_index),
+            "score": question.weight(answer_index),
+            "domain": question.domain
+        }
+        for question, answer_index in answered_questions(bank, responses)
+    ]
+    
+    scores_for_ai = {
+        key: float(assessment[f"{key}_score"])
+        for key in ('energy', 'comfort', 'circulation', 'stress', 'metabolic', 'overall')
+    }
+    
+    # No pooled connection is held during the model call
+    print(f"Generating AI report for assessment {assessment_id}...")
+    ai_result = await generate_ai_report(
+        patient_info,
+        questions_and_answers,
+        scores_for_ai,
+        therapies_list
+    )
+    
+    if not ai_result.get('success'):
+        if not ANTHROPIC_API_KEY:
+            raise PermanentJobError(ai_result.get('error', 'AI API key not configured'))
+        raise RuntimeError(ai_result.get('error', 'AI report generation failed'))
+    
+    async with get_db_connection() as conn:
+        await conn.execute("""
+            UPDATE patient_assessments
+            SET ai_report = $2, report_generated_at = NOW(), status = 'completed'
+            WHERE id = $1
+        """, assessment_id, json.dumps(ai_result['report']))
+    
+    return {
+        "assessment_id": assessment_id,
+        "patient_id": assessment['patient_id'],
+        "patient_name": patient_name,
+        "notify_email": assessment['email'],
+        "report_number": f"WR-{assessment_id}"
+    }
+
+
+@router.get("/api/v1/assessment/{assessment_id}/status")
+async def get_assessment_report_status(assessment_id: int):
+    """Lightweight progress check for the AI report of an assessment"""
+    async with get_db_connection() as conn:
+        assessment = await conn.fetchrow("""
+            SELECT status, report_generated_at
+            FROM patient_assessments
+            WHERE id = $1
+        """, assessment_id)
+        
+        if not assessment:
+            raise HTTPException(status_code=404, detail="Assessment not found")
+        
+        job = await get_latest_job(conn, f"assessment_report:{assessment_id}")
+    
+    return {
+        "success": True,
+        "assessment_id": assessment_id,
+        "status": assessment['status'],
+        "report_generated_at": str(assessment['report_generated_at']) if assessment['report_generated_at'] else None,
+        "job": {
+            "id": job["id"],
+            "status": job["status"],
+            "attempts": job["attempts"],
+            "max_attempts": job["max_attempts"],
+            "next_attempt_at": job["run_after"].isoformat() if job["status"] == "queued" else None,
+            "last_error": job["last_error"]
+        } if job else None
+    }
+
 # ==================== GET PATIENT'S LATEST ASSESSMENT ====================
 @router.get("/api/v1/assessment/patient/{patient_id}/latest")
 async def get_patient_latest_assessment(patient_id: int):
@@ -518,27 +595,25 @@ async def get_assessment_by_id(assessment_id: int):
         await conn.close()
         raise HTTPException(status_code=404, detail="Assessment not found")
     
-    # Get all responses with questions
+    # Get all responses; question details come from the cached question bank
     responses = await conn.fetch("""
-        SELECT ar.*, aq.question_text, aq.therapy_domain, aq.response_options
-        FROM assessment_responses ar
-        JOIN assessment_questions aq ON ar.question_id = aq.id
-        WHERE ar.assessment_id = $1
-        ORDER BY aq.question_order
+        SELECT question_id, answer_index
+        FROM assessment_responses
+        WHERE assessment_id = $1
     """, assessment_id)
     
     await conn.close()
     
+    bank = await get_db_question_bank()
+    
     # Format responses
     formatted_responses = []
-    for r in responses:
-        options = json.loads(r['response_options']) if r['response_options'] else ["Very Low", "Low", "Moderate", "Good", "Excellent"]
-        answer_text = options[r['answer_index']] if r['answer_index'] < len(options) else f"Option {r['answer_index']}"
+    for question, answer_index in answered_questions(bank, responses):
         formatted_responses.append({
-            "question": r['question_text'],
-            "domain": r['therapy_domain'],
-            "answer": answer_text,
-            "answer_index": r['answer_index']
+            "question": question.text,
+            "domain": question.domain,
+            "answer": question.option(answer_index),
+            "answer_index": answer_index
         })
     
     return {
@@ -567,11 +642,10 @@ async def get_assessment_by_id(assessment_id: int):
     }
 
 # ==================== PDF REPORT GENERATION ====================
-from fastapi.responses import Response
 
 @router.get("/api/v1/assessment/{assessment_id}/report/pdf")
-async def download_assessment_pdf_report(assessment_id: int):
-    """Generate and download PDF wellness report"""
+async def download_assessment_pdf_report(assessment_id: int, request: Request):
+    """Generate and download PDF wellness report (cached on disk, see report_cache.py)"""
     conn = await get_db()
     
     try:
@@ -592,20 +666,23 @@ async def download_assessment_pdf_report(assessment_id: int):
         
         # Try to use pdf_report_generator if available
         try:
-            from pdf_report_generator import generate_pdf_report
-            pdf_bytes = generate_pdf_report(dict(patient), dict(assessment))
+            from pdf_report_generator import render_pdf_report, TEMPLATE_VERSION
+            from report_cache import cached_report, source_key
+            
+            patient_data, assessment_data = dict(patient), dict(assessment)
+            key = source_key(TEMPLATE_VERSION, assessment_data, patient_data)
             
             filename = f"wellness_report_{patient['patient_number']}_{assessment_id}.pdf"
-            return Response(
-                content=pdf_bytes,
-                media_type="application/pdf",
-                headers={
-                    "Content-Disposition": f"attachment; filename={filename}"
-                }
+            return await cached_report(
+                "wellness", assessment_id, key,
+                lambda: render_pdf_report(patient_data, assessment_data),
+                request.headers, filename
             )
         except ImportError:
             raise HTTPException(status_code=500, detail="PDF generator not available")
             
+    except HTTPException:
+        raise
     except Exception as e:
         print(f"PDF Generation Error: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Failed to generate report: {str(e)}")
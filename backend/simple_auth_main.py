@@ -1,5 +1,4 @@
-import bcrypt
-from fastapi import FastAPI, HTTPException, Depends, Request, Header
+from fastapi import FastAPI, HTTPException, Depends, Request, Header, Response
 from models import AppointmentCreate, PatientCreate, PatientUpdate, AssessmentCreate, AssessmentUpdate, TherapyPlanCreate, TherapyPlanUpdate
 from enhanced_chatbot import router as chatbot_router
 from patient_portal_endpoints import router as patient_router
@@ -28,29 +27,50 @@ from celloxen_assessment_system import (
 
 # Initialize AI analyzer and report generator
 ANTHROPIC_API_KEY = os.getenv("ANTHROPIC_API_KEY")
-# Database configuration from environment variables
-DB_HOST = os.getenv("DB_HOST", "localhost")
-DB_PORT = os.getenv("DB_PORT", "5432")
-DB_USER = os.getenv("DB_USER", "celloxen_user")
-DB_PASSWORD = os.getenv("DB_PASSWORD")
-DB_NAME = os.getenv("DB_NAME", "celloxen_portal")
 
 ai_analyzer = AIIridologyAnalyzer(ANTHROPIC_API_KEY) if ANTHROPIC_API_KEY else None
 
-# Database connection context manager
-@asynccontextmanager
-async def get_db_connection():
-    """Context manager for database connections"""
-    conn = await asyncpg.connect(
-        host=DB_HOST, port=int(DB_PORT), user=DB_USER, password=DB_PASSWORD, database=DB_NAME
-    )
-    try:
-        yield conn
-    finally:
-        await conn.close()
+# Database access - shared asyncpg pool (DB_* settings live in db_pool)
+from db_pool import init_pool, close_pool, close_sync_pool, apply_migrations, get_db, get_db_connection
+from job_queue import start_job_workers, stop_job_workers
+from image_preprocess import start_image_pool, shutdown_image_pool
+from passwords import hash_password, verify_password, shutdown_password_pool
+from pdf_render import start_pdf_pool, shutdown_pdf_pool, render_html
+from email_outbox import start_email_dispatcher, stop_email_dispatcher
+import email_service
+from response_cache import get_or_load, start_cache_listener, stop_cache_listener
+from dashboard_stats import count_metric
+from appointment_reminders import register_reminder_schedule
+from blob_sweep import register_blob_sweep_schedule
+import auth_cache
+from pagination import (
+    clamp_limit, decode_cursor, keyset_condition, split_page, page_info, set_page_headers, estimate_count
+)
+from exports import EXPORTS, EXPORT_FORMATS, iter_export
 
 
-# Database connection context manager
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Open the shared connection pool and background workers on startup"""
+    start_pdf_pool()  # fork render workers before any connections are open
+    start_image_pool()
+    await init_pool()
+    await apply_migrations()
+    register_reminder_schedule()
+    register_blob_sweep_schedule()
+    start_job_workers()
+    start_cache_listener()
+    start_email_dispatcher()
+    yield
+    await stop_email_dispatcher()
+    await stop_cache_listener()
+    await stop_job_workers()
+    shutdown_image_pool()
+    shutdown_password_pool()
+    shutdown_pdf_pool()
+    await close_pool()
+    close_sync_pool()
+
 
 def convert_date_string(date_str):
     """Convert date string to date object"""
@@ -70,7 +90,7 @@ def convert_date_string(date_str):
             return None
     return None
 
-app = FastAPI()
+app = FastAPI(lifespan=lifespan)
 
 # Include patient portal router
 app.include_router(patient_router)
@@ -85,18 +105,6 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# Initialize AI analyzer and report generator
-ANTHROPIC_API_KEY = os.getenv("ANTHROPIC_API_KEY")
-# Database configuration from environment variables
-DB_HOST = os.getenv("DB_HOST", "localhost")
-DB_PORT = os.getenv("DB_PORT", "5432")
-DB_USER = os.getenv("DB_USER", "celloxen_user")
-DB_PASSWORD = os.getenv("DB_PASSWORD")
-DB_NAME = os.getenv("DB_NAME", "celloxen_portal")
-
-ai_analyzer = AIIridologyAnalyzer(ANTHROPIC_API_KEY) if ANTHROPIC_API_KEY else None
-
-# Database connection context manager
 
 # Token verification helper function
 
@@ -111,8 +119,9 @@ ACCESS_TOKEN_EXPIRE_MINUTES = 480  # 8 hours
 def create_access_token(data: dict):
     """Create JWT access token"""
     to_encode = data.copy()
-    expire = datetime.utcnow() + timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
-    to_encode.update({"exp": expire})
+    issued = datetime.utcnow()
+    expire = issued + timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
+    to_encode.update({"exp": expire, "iat": issued})
     print(f"🔑 Creating token with SECRET_KEY: {SECRET_KEY[:20]}... | expires: {expire}")
     encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
     return encoded_jwt
@@ -132,7 +141,9 @@ def verify_token(token: str):
 
         return {
             "user_id": int(user_id),
-            "clinic_id": int(clinic_id) if clinic_id else None
+            "clinic_id": int(clinic_id) if clinic_id else None,
+            "iat": payload.get("iat"),
+            "exp": payload.get("exp")
         }
     except jwt.ExpiredSignatureError:
         print("❌ Token expired")
@@ -145,7 +156,7 @@ def verify_token(token: str):
         return None
 
 @app.post("/api/v1/auth/login")
-async def login(user_credentials: dict):
+async def login(user_credentials: dict, conn: asyncpg.Connection = Depends(get_db)):
     try:
         email = user_credentials.get("email")
         password = user_credentials.get("password")
@@ -153,16 +164,14 @@ async def login(user_credentials: dict):
         if not email or not password:
             raise HTTPException(status_code=400, detail="Email and password required")
         
-        conn = await asyncpg.connect(
-            host=DB_HOST, port=int(DB_PORT), user=DB_USER, password=DB_PASSWORD, database=DB_NAME
-        )
-        
         user = await conn.fetchrow("SELECT * FROM users WHERE email = $1", email)
-        if not user or not bcrypt.checkpw(password.encode("utf-8"), user["password_hash"].encode("utf-8")):
-            await conn.close()
+        if not user:
             raise HTTPException(status_code=401, detail="Invalid credentials")
-        
-        await conn.close()
+        valid, new_hash = await verify_password(password, user["password_hash"])
+        if not valid:
+            raise HTTPException(status_code=401, detail="Invalid credentials")
+        if new_hash:
+            await conn.execute("UPDATE users SET password_hash = $1 WHERE id = $2", new_hash, user['id'])
         
         return {
             "access_token": create_access_token({
@@ -196,11 +205,8 @@ async def get_current_user():
     return {"id": 1, "email": "admin@celloxen.com", "role": "super_admin"}
 
 @app.get("/api/v1/patients/stats/overview")
-async def get_patient_stats():
+async def get_patient_stats(conn: asyncpg.Connection = Depends(get_db)):
     try:
-        conn = await asyncpg.connect(
-            host=DB_HOST, port=int(DB_PORT), user=DB_USER, password=DB_PASSWORD, database=DB_NAME
-        )
         total_patients = await conn.fetchval("SELECT COUNT(*) FROM patients")
         new_this_month = await conn.fetchval(
             """
@@ -214,7 +220,6 @@ async def get_patient_stats():
             WHERE DATE_TRUNC('month', created_at) = DATE_TRUNC('month', CURRENT_DATE)
             """
         )
-        await conn.close()
         return {
             "total_patients": total_patients,
             "active_patients": total_patients,
@@ -228,32 +233,75 @@ async def get_patient_stats():
     except Exception as e:
         return {"total_patients": 1, "active_patients": 1, "new_this_month": 0, "assessments_completed": 0}
 
+PATIENT_LIST_COLUMNS = """
+    p.id, p.patient_number, p.clinic_id, c.name as clinic_name,
+    p.first_name, p.last_name, p.email, p.mobile_phone, p.date_of_birth,
+    p.gender, p.city, p.postcode, p.status, p.portal_access, p.created_at
+"""
+
+
 @app.get("/api/v1/clinic/patients")
-async def get_clinic_patients():
+async def get_clinic_patients(
+    response: Response,
+    limit: int = None,
+    cursor: str = None,
+    search: str = None,
+    status: str = None,
+    conn: asyncpg.Connection = Depends(get_db)
+):
+    """Patients, newest first, one page at a time, optionally searched or filtered by status.
+
+    The body stays a plain list; the X-Next-Cursor header holds the cursor
+    for the next page and X-Total-Count the total.
+    """
+    limit = clamp_limit(limit)
+    after = decode_cursor(cursor, 2)
     try:
-        conn = await asyncpg.connect(
-            host=DB_HOST, port=int(DB_PORT), user=DB_USER, password=DB_PASSWORD, database=DB_NAME
-        )
-        patients = await conn.fetch("""
-            SELECT p.*, c.name as clinic_name 
+        conditions, params = [], []
+        if search:
+            params.append(f"%{search.strip()}%")
+            conditions.append(f"""(
+                p.first_name || ' ' || p.last_name ILIKE ${len(params)}
+                OR p.patient_number ILIKE ${len(params)}
+                OR p.email ILIKE ${len(params)}
+            )""")
+        if status:
+            params.append(status)
+            conditions.append(f"p.status = ${len(params)}")
+        filters, filter_params = list(conditions), list(params)
+        if after:
+            conditions.append(keyset_condition(["p.created_at", "p.id"], len(params) + 1))
+            params.extend(after)
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+
+        patients = await conn.fetch(f"""
+            SELECT {PATIENT_LIST_COLUMNS}
             FROM patients p 
             LEFT JOIN clinics c ON p.clinic_id = c.id
-            ORDER BY p.created_at DESC
-        """)
-        await conn.close()
+            {where}
+            ORDER BY p.created_at DESC, p.id DESC
+            LIMIT ${len(params) + 1}
+        """, *params, limit + 1)
+        patients, next_cursor = split_page(patients, limit, ("created_at", "id"))
+
+        if search:
+            total = await estimate_count(
+                conn, f"SELECT 1 FROM patients p WHERE {' AND '.join(filters)}", *filter_params
+            )
+        elif status:
+            total = await count_metric(conn, None, "patients_by_status", status)
+        else:
+            total = await count_metric(conn, None, "patients")
+        set_page_headers(response, next_cursor, total, estimated=bool(search))
         return [dict(patient) for patient in patients]
     except Exception as e:
         return []
 
 
 @app.get("/api/v1/clinic/patients/{patient_id}")
-async def get_patient(patient_id: int):
+async def get_patient(patient_id: int, conn: asyncpg.Connection = Depends(get_db)):
     """Get a single patient with all details"""
     try:
-        conn = await asyncpg.connect(
-            host=DB_HOST, port=int(DB_PORT), user=DB_USER, password=DB_PASSWORD, database=DB_NAME
-        )
-        
         # Get patient data
         patient = await conn.fetchrow("""
             SELECT p.*, c.name as clinic_name 
@@ -263,7 +311,6 @@ async def get_patient(patient_id: int):
         """, patient_id)
         
         if not patient:
-            await conn.close()
             raise HTTPException(status_code=404, detail="Patient not found")
         
         # Get assessment count
@@ -299,8 +346,6 @@ async def get_patient(patient_id: int):
             LIMIT 1
         """, patient_id)
         
-        await conn.close()
-        
         return {
             "patient": dict(patient),
             "stats": {
@@ -321,13 +366,9 @@ async def get_patient(patient_id: int):
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.put("/api/v1/clinic/patients/{patient_id}")
-async def update_patient(patient_id: int, patient_data: dict):
+async def update_patient(patient_id: int, patient_data: dict, conn: asyncpg.Connection = Depends(get_db)):
     """Update a patient's information"""
     try:
-        conn = await asyncpg.connect(
-            host=DB_HOST, port=int(DB_PORT), user=DB_USER, password=DB_PASSWORD, database=DB_NAME
-        )
-        
         # Parse date of birth if provided
         dob = None
         if patient_data.get('date_of_birth'):
@@ -382,8 +423,6 @@ async def update_patient(patient_id: int, patient_data: dict):
             patient_id
         )
         
-        await conn.close()
-        
         return {
             "success": True,
             "message": "Patient updated successfully",
@@ -398,17 +437,12 @@ async def update_patient(patient_id: int, patient_data: dict):
 
 
 @app.delete("/api/v1/clinic/patients/{patient_id}")
-async def delete_patient(patient_id: int):
+async def delete_patient(patient_id: int, conn: asyncpg.Connection = Depends(get_db)):
     """Delete a patient (soft delete by setting status to deleted)"""
     try:
-        conn = await asyncpg.connect(
-            host=DB_HOST, port=int(DB_PORT), user=DB_USER, password=DB_PASSWORD, database=DB_NAME
-        )
-        
         # Check if patient exists
         patient = await conn.fetchrow("SELECT * FROM patients WHERE id = $1", patient_id)
         if not patient:
-            await conn.close()
             raise HTTPException(status_code=404, detail="Patient not found")
         
         # Soft delete - set status to 'deleted'
@@ -417,8 +451,6 @@ async def delete_patient(patient_id: int):
             patient_id
         )
         
-        await conn.close()
-        
         return {
             "success": True,
             "message": "Patient deleted successfully",
@@ -434,14 +466,10 @@ async def delete_patient(patient_id: int):
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.post("/api/v1/clinic/patients")
-async def create_patient(patient_data: dict):
+async def create_patient(patient_data: dict, conn: asyncpg.Connection = Depends(get_db)):
     """Create a new patient with UK address fields"""
     print("🔍 DEBUG: Received patient_data:", patient_data)
     try:
-        conn = await asyncpg.connect(
-            host=DB_HOST, port=int(DB_PORT), user=DB_USER, password=DB_PASSWORD, database=DB_NAME
-        )
-        
         # Get clinic_id (default to 1 if not provided)
         clinic_id = patient_data.get('clinic_id', 1)
         
@@ -488,8 +516,6 @@ async def create_patient(patient_data: dict):
             patient_data.get('notes', '')
         )
         
-        await conn.close()
-        
         return {
             "success": True,
             "message": "Patient created successfully",
@@ -504,12 +530,8 @@ async def create_patient(patient_data: dict):
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.put("/api/v1/clinic/patients/{patient_id}")
-async def update_patient(patient_id: int, patient_data: dict):
+async def update_patient(patient_id: int, patient_data: dict, conn: asyncpg.Connection = Depends(get_db)):
     try:
-        conn = await asyncpg.connect(
-            host=DB_HOST, port=int(DB_PORT), user=DB_USER, password=DB_PASSWORD, database=DB_NAME
-        )
-        
         # Convert date if provided
         birth_date = None
         if 'date_of_birth' in patient_data and patient_data['date_of_birth']:
@@ -533,7 +555,6 @@ async def update_patient(patient_id: int, patient_data: dict):
         patient_data.get('notes'), patient_id
         )
         
-        await conn.close()
         return {"success": True}
         
     except Exception as e:
@@ -544,14 +565,9 @@ async def update_patient(patient_id: int, patient_data: dict):
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.delete("/api/v1/clinic/patients/{patient_id}")
-async def delete_patient(patient_id: int):
+async def delete_patient(patient_id: int, conn: asyncpg.Connection = Depends(get_db)):
     try:
-        conn = await asyncpg.connect(
-            host=DB_HOST, port=int(DB_PORT), user=DB_USER, password=DB_PASSWORD, database=DB_NAME
-        )
-        
         await conn.execute("DELETE FROM patients WHERE id = $1", patient_id)
-        await conn.close()
         return {"success": True}
         
     except Exception as e:
@@ -568,7 +584,7 @@ async def delete_patient(patient_id: int):
 # ============================================================================
 
 @app.get("/api/v1/clinic/invoices")
-async def get_clinic_invoices(authorization: str = Header(None)):
+async def get_clinic_invoices(authorization: str = Header(None), conn: asyncpg.Connection = Depends(get_db)):
     """Get all subscription invoices for logged-in clinic"""
     if not authorization or not authorization.startswith("Bearer "):
         raise HTTPException(status_code=401, detail="Unauthorized")
@@ -579,11 +595,6 @@ async def get_clinic_invoices(authorization: str = Header(None)):
         raise HTTPException(status_code=401, detail="Invalid token")
     
     try:
-        conn = await asyncpg.connect(
-            host=DB_HOST, port=int(DB_PORT), user=DB_USER,
-            password=DB_PASSWORD, database=DB_NAME
-        )
-        
         invoices = await conn.fetch("""
             SELECT id, invoice_number, amount, description,
                    due_date, payment_status as status, created_at
@@ -592,15 +603,13 @@ async def get_clinic_invoices(authorization: str = Header(None)):
             ORDER BY created_at DESC
         """, user['clinic_id'])
         
-        await conn.close()
-        
         return {"success": True, "invoices": [dict(inv) for inv in invoices]}
     except Exception as e:
         print(f"Error fetching invoices: {str(e)}")
         raise HTTPException(status_code=500, detail="Failed to fetch invoices")
 
 @app.get("/api/v1/clinic/invoices/{invoice_id}")
-async def get_clinic_invoice(invoice_id: int, authorization: str = Header(None)):
+async def get_clinic_invoice(invoice_id: int, authorization: str = Header(None), conn: asyncpg.Connection = Depends(get_db)):
     """Get single invoice detail for logged-in clinic"""
     if not authorization or not authorization.startswith("Bearer "):
         raise HTTPException(status_code=401, detail="Unauthorized")
@@ -611,11 +620,6 @@ async def get_clinic_invoice(invoice_id: int, authorization: str = Header(None))
         raise HTTPException(status_code=401, detail="Invalid token")
     
     try:
-        conn = await asyncpg.connect(
-            host=DB_HOST, port=int(DB_PORT), user=DB_USER,
-            password=DB_PASSWORD, database=DB_NAME
-        )
-        
         invoice = await conn.fetchrow("""
             SELECT ci.*, c.clinic_name, c.address_line1, c.city, 
                    c.postcode, c.email, c.phone
@@ -624,8 +628,6 @@ async def get_clinic_invoice(invoice_id: int, authorization: str = Header(None))
             WHERE ci.id = $1 AND ci.clinic_id = $2
         """, invoice_id, user['clinic_id'])
         
-        await conn.close()
-        
         if not invoice:
             raise HTTPException(status_code=404, detail="Invoice not found")
         
@@ -656,7 +658,7 @@ async def get_clinic_invoice(invoice_id: int, authorization: str = Header(None))
         print(f"Error: {str(e)}")
 
 @app.put("/api/v1/clinic/invoices/{invoice_id}/mark-paid")
-async def mark_invoice_paid(invoice_id: int, authorization: str = Header(None)):
+async def mark_invoice_paid(invoice_id: int, authorization: str = Header(None), conn: asyncpg.Connection = Depends(get_db)):
     """Mark invoice as paid - Clinic staff only"""
     if not authorization or not authorization.startswith("Bearer "):
         raise HTTPException(status_code=401, detail="Unauthorized")
@@ -667,11 +669,6 @@ async def mark_invoice_paid(invoice_id: int, authorization: str = Header(None)):
         raise HTTPException(status_code=401, detail="Invalid token")
     
     try:
-        conn = await asyncpg.connect(
-            host=DB_HOST, port=int(DB_PORT), user=DB_USER,
-            password=DB_PASSWORD, database=DB_NAME
-        )
-        
         # Verify invoice belongs to user's clinic
         invoice = await conn.fetchrow("""
             SELECT id, payment_status FROM clinic_invoices
@@ -679,7 +676,6 @@ async def mark_invoice_paid(invoice_id: int, authorization: str = Header(None)):
         """, invoice_id, user['clinic_id'])
         
         if not invoice:
-            await conn.close()
             raise HTTPException(status_code=404, detail="Invoice not found")
         
         # Update invoice to paid
@@ -692,8 +688,6 @@ async def mark_invoice_paid(invoice_id: int, authorization: str = Header(None)):
             WHERE id = $3
         """, datetime.now().date(), datetime.now(), invoice_id)
         
-        await conn.close()
-        
         return {
             "success": True,
             "message": "Invoice marked as paid"
@@ -712,7 +706,8 @@ async def mark_invoice_paid(invoice_id: int, authorization: str = Header(None)):
 async def get_patient_invoices(
     patient_id: int = None, 
     status: str = None,
-    authorization: str = Header(None)
+    authorization: str = Header(None),
+    conn: asyncpg.Connection = Depends(get_db)
 ):
     """Get all patient invoices for clinic, optionally filtered by patient_id or status"""
     if not authorization or not authorization.startswith("Bearer "):
@@ -724,11 +719,6 @@ async def get_patient_invoices(
         raise HTTPException(status_code=401, detail="Invalid token")
     
     try:
-        conn = await asyncpg.connect(
-            host=DB_HOST, port=int(DB_PORT), user=DB_USER,
-            password=DB_PASSWORD, database=DB_NAME
-        )
-        
         # Build query based on filters
         query = """
             SELECT pi.*, p.first_name, p.last_name, p.email
@@ -749,7 +739,6 @@ async def get_patient_invoices(
         query += " ORDER BY pi.created_at DESC"
         
         invoices = await conn.fetch(query, *params)
-        await conn.close()
         
         return {
             "success": True,
@@ -760,7 +749,7 @@ async def get_patient_invoices(
         raise HTTPException(status_code=500, detail="Failed to fetch invoices")
 
 @app.get("/api/v1/patient-invoices/{invoice_id}")
-async def get_patient_invoice(invoice_id: int, authorization: str = Header(None)):
+async def get_patient_invoice(invoice_id: int, authorization: str = Header(None), conn: asyncpg.Connection = Depends(get_db)):
     """Get specific patient invoice details"""
     if not authorization or not authorization.startswith("Bearer "):
         raise HTTPException(status_code=401, detail="Unauthorized")
@@ -771,11 +760,6 @@ async def get_patient_invoice(invoice_id: int, authorization: str = Header(None)
         raise HTTPException(status_code=401, detail="Invalid token")
     
     try:
-        conn = await asyncpg.connect(
-            host=DB_HOST, port=int(DB_PORT), user=DB_USER,
-            password=DB_PASSWORD, database=DB_NAME
-        )
-        
         invoice = await conn.fetchrow("""
             SELECT pi.*, p.first_name, p.last_name, p.email, p.mobile_phone,
                    c.name as clinic_name, c.address_line1, c.city, c.postcode
@@ -785,8 +769,6 @@ async def get_patient_invoice(invoice_id: int, authorization: str = Header(None)
             WHERE pi.id = $1 AND pi.clinic_id = $2
         """, invoice_id, user['clinic_id'])
         
-        await conn.close()
-        
         if not invoice:
             raise HTTPException(status_code=404, detail="Invoice not found")
         
@@ -801,7 +783,7 @@ async def get_patient_invoice(invoice_id: int, authorization: str = Header(None)
         raise HTTPException(status_code=500, detail="Failed to fetch invoice")
 
 @app.post("/api/v1/patient-invoices")
-async def create_patient_invoice(invoice_data: dict, authorization: str = Header(None)):
+async def create_patient_invoice(invoice_data: dict, authorization: str = Header(None), conn: asyncpg.Connection = Depends(get_db)):
     """Create new patient invoice"""
     if not authorization or not authorization.startswith("Bearer "):
         raise HTTPException(status_code=401, detail="Unauthorized")
@@ -812,11 +794,6 @@ async def create_patient_invoice(invoice_data: dict, authorization: str = Header
         raise HTTPException(status_code=401, detail="Invalid token")
     
     try:
-        conn = await asyncpg.connect(
-            host=DB_HOST, port=int(DB_PORT), user=DB_USER,
-            password=DB_PASSWORD, database=DB_NAME
-        )
-        
         # Generate invoice number
         last_invoice = await conn.fetchval("""
             SELECT invoice_number FROM patient_invoices 
@@ -850,8 +827,6 @@ async def create_patient_invoice(invoice_data: dict, authorization: str = Header
             invoice_data.get('notes')
         )
         
-        await conn.close()
-        
         return {
             "success": True,
             "invoice_id": invoice_id,
@@ -866,7 +841,8 @@ async def create_patient_invoice(invoice_data: dict, authorization: str = Header
 async def update_patient_invoice(
     invoice_id: int, 
     invoice_data: dict, 
-    authorization: str = Header(None)
+    authorization: str = Header(None),
+    conn: asyncpg.Connection = Depends(get_db)
 ):
     """Update patient invoice"""
     if not authorization or not authorization.startswith("Bearer "):
@@ -878,11 +854,6 @@ async def update_patient_invoice(
         raise HTTPException(status_code=401, detail="Invalid token")
     
     try:
-        conn = await asyncpg.connect(
-            host=DB_HOST, port=int(DB_PORT), user=DB_USER,
-            password=DB_PASSWORD, database=DB_NAME
-        )
-        
         # Verify invoice belongs to clinic
         exists = await conn.fetchval("""
             SELECT id FROM patient_invoices 
@@ -890,7 +861,6 @@ async def update_patient_invoice(
         """, invoice_id, user['clinic_id'])
         
         if not exists:
-            await conn.close()
             raise HTTPException(status_code=404, detail="Invoice not found")
         
         # Update invoice
@@ -910,8 +880,6 @@ async def update_patient_invoice(
             invoice_id
         )
         
-        await conn.close()
-        
         return {
             "success": True,
             "message": "Invoice updated successfully"
@@ -923,7 +891,7 @@ async def update_patient_invoice(
         raise HTTPException(status_code=500, detail="Failed to update invoice")
 
 @app.put("/api/v1/patient-invoices/{invoice_id}/mark-paid")
-async def mark_patient_invoice_paid(invoice_id: int, authorization: str = Header(None)):
+async def mark_patient_invoice_paid(invoice_id: int, authorization: str = Header(None), conn: asyncpg.Connection = Depends(get_db)):
     """Mark patient invoice as paid"""
     if not authorization or not authorization.startswith("Bearer "):
         raise HTTPException(status_code=401, detail="Unauthorized")
@@ -934,11 +902,6 @@ async def mark_patient_invoice_paid(invoice_id: int, authorization: str = Header
         raise HTTPException(status_code=401, detail="Invalid token")
     
     try:
-        conn = await asyncpg.connect(
-            host=DB_HOST, port=int(DB_PORT), user=DB_USER,
-            password=DB_PASSWORD, database=DB_NAME
-        )
-        
         # Verify invoice belongs to clinic
         invoice = await conn.fetchrow("""
             SELECT id, status FROM patient_invoices
@@ -946,7 +909,6 @@ async def mark_patient_invoice_paid(invoice_id: int, authorization: str = Header
         """, invoice_id, user['clinic_id'])
         
         if not invoice:
-            await conn.close()
             raise HTTPException(status_code=404, detail="Invoice not found")
         
         # Update invoice to paid
@@ -961,8 +923,6 @@ async def mark_patient_invoice_paid(invoice_id: int, authorization: str = Header
             WHERE id = $3
         """, datetime.now().date(), datetime.now(), invoice_id)
         
-        await conn.close()
-        
         return {
             "success": True,
             "message": "Invoice marked as paid"
@@ -974,7 +934,7 @@ async def mark_patient_invoice_paid(invoice_id: int, authorization: str = Header
         raise HTTPException(status_code=500, detail="Failed to update invoice")
 
 @app.delete("/api/v1/patient-invoices/{invoice_id}")
-async def delete_patient_invoice(invoice_id: int, authorization: str = Header(None)):
+async def delete_patient_invoice(invoice_id: int, authorization: str = Header(None), conn: asyncpg.Connection = Depends(get_db)):
     """Delete/cancel patient invoice"""
     if not authorization or not authorization.startswith("Bearer "):
         raise HTTPException(status_code=401, detail="Unauthorized")
@@ -985,11 +945,6 @@ async def delete_patient_invoice(invoice_id: int, authorization: str = Header(No
         raise HTTPException(status_code=401, detail="Invalid token")
     
     try:
-        conn = await asyncpg.connect(
-            host=DB_HOST, port=int(DB_PORT), user=DB_USER,
-            password=DB_PASSWORD, database=DB_NAME
-        )
-        
         # Mark as cancelled instead of deleting
         from datetime import datetime
         result = await conn.execute("""
@@ -998,8 +953,6 @@ async def delete_patient_invoice(invoice_id: int, authorization: str = Header(No
             WHERE id = $2 AND clinic_id = $3
         """, datetime.now(), invoice_id, user['clinic_id'])
         
-        await conn.close()
-        
         if result == "UPDATE 0":
             raise HTTPException(status_code=404, detail="Invoice not found")
         
@@ -1018,18 +971,14 @@ async def delete_patient_invoice(invoice_id: int, authorization: str = Header(No
 
 async def get_patient(patient_id: int):
     try:
-        conn = await asyncpg.connect(
-            host=DB_HOST, port=int(DB_PORT), user=DB_USER, password=DB_PASSWORD, database=DB_NAME
-        )
-        
-        patient = await conn.fetchrow("""
-            SELECT p.*, c.name as clinic_name 
-            FROM patients p 
-            LEFT JOIN clinics c ON p.clinic_id = c.id
-            WHERE p.id = $1
-        """, patient_id)
+        async with get_db_connection() as conn:
+            patient = await conn.fetchrow("""
+                SELECT p.*, c.name as clinic_name 
+                FROM patients p 
+                LEFT JOIN clinics c ON p.clinic_id = c.id
+                WHERE p.id = $1
+            """, patient_id)
         
-        await conn.close()
         if patient:
             return dict(patient)
         else:
@@ -1074,7 +1023,7 @@ async def get_domain_questions(domain: str):
     }
 
 @app.post("/api/v1/assessments/comprehensive")
-async def create_comprehensive_assessment(assessment_data: dict):  # TODO: Convert to AssessmentCreate model
+async def create_comprehensive_assessment(assessment_data: dict, conn: asyncpg.Connection = Depends(get_db)):  # TODO: Convert to AssessmentCreate model
     """Create a comprehensive assessment with questionnaire and optional iridology"""
     try:
         # Convert patient_id to int (Pydantic will handle this automatically in future)
@@ -1085,15 +1034,9 @@ async def create_comprehensive_assessment(assessment_data: dict):  # TODO: Conve
         if not patient_id:
             raise HTTPException(status_code=400, detail="patient_id is required")
         
-        # Connect to database
-        conn = await asyncpg.connect(
-            host=DB_HOST, port=int(DB_PORT), user=DB_USER, password=DB_PASSWORD, database=DB_NAME
-        )
-        
         # Verify patient exists
         patient = await conn.fetchrow("SELECT * FROM patients WHERE id = $1", patient_id)
         if not patient:
-            await conn.close()
             raise HTTPException(status_code=404, detail="Patient not found")
         
         # Calculate questionnaire scores for each domain
@@ -1160,8 +1103,6 @@ async def create_comprehensive_assessment(assessment_data: dict):  # TODO: Conve
                 recommendation["rationale"]
             )
         
-        await conn.close()
-        
         return {
             "success": True,
             "assessment_id": assessment_id,
@@ -1179,17 +1120,12 @@ async def create_comprehensive_assessment(assessment_data: dict):  # TODO: Conve
         raise HTTPException(status_code=500, detail=f"Failed to create assessment: {str(e)}")
 
 @app.get("/api/v1/assessments/patient/{patient_id}")
-async def get_patient_assessments(patient_id: int):
+async def get_patient_assessments(patient_id: int, conn: asyncpg.Connection = Depends(get_db)):
     """Get all assessments for a specific patient"""
     try:
-        conn = await asyncpg.connect(
-            host=DB_HOST, port=int(DB_PORT), user=DB_USER, password=DB_PASSWORD, database=DB_NAME
-        )
-        
         # Verify patient exists
         patient = await conn.fetchrow("SELECT * FROM patients WHERE id = $1", patient_id)
         if not patient:
-            await conn.close()
             raise HTTPException(status_code=404, detail="Patient not found")
         
         # Get all assessments
@@ -1202,8 +1138,6 @@ async def get_patient_assessments(patient_id: int):
             patient_id
         )
         
-        await conn.close()
-        
         return {
             "success": True,
             "patient_id": patient_id,
@@ -1223,13 +1157,10 @@ async def get_patient_assessments(patient_id: int):
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.get("/api/v1/assessments/{assessment_id}")
-async def get_assessment_details(assessment_id: int):
+async def get_assessment_details(assessment_id: int, conn: asyncpg.Connection = Depends(get_db)):
     """Get detailed assessment results"""
     try:
         import json
-        conn = await asyncpg.connect(
-            host=DB_HOST, port=int(DB_PORT), user=DB_USER, password=DB_PASSWORD, database=DB_NAME
-        )
         
         # Get assessment with patient info
         assessment = await conn.fetchrow(
@@ -1242,7 +1173,6 @@ async def get_assessment_details(assessment_id: int):
         )
         
         if not assessment:
-            await conn.close()
             raise HTTPException(status_code=404, detail="Assessment not found")
         
         # Get therapy correlations
@@ -1258,8 +1188,6 @@ async def get_assessment_details(assessment_id: int):
             assessment_id
         )
         
-        await conn.close()
-        
         assessment_dict = dict(assessment)
         
         # Parse JSON fields
@@ -1296,12 +1224,9 @@ async def get_assessment_details(assessment_id: int):
 # ============================================================================
 
 @app.get("/api/v1/appointments/stats")
-async def get_appointments_stats():
+async def get_appointments_stats(conn: asyncpg.Connection = Depends(get_db)):
     """Get appointment statistics for the clinic"""
     try:
-        conn = await asyncpg.connect(
-            host=DB_HOST, port=int(DB_PORT), user=DB_USER, password=DB_PASSWORD, database=DB_NAME
-        )
         total = await conn.fetchval("SELECT COUNT(*) FROM appointments")
         today = await conn.fetchval(
             "SELECT COUNT(*) FROM appointments WHERE appointment_date = CURRENT_DATE"
@@ -1316,7 +1241,6 @@ async def get_appointments_stats():
             AND appointment_date < date_trunc('week', CURRENT_DATE) + interval '7 days'
             """
         )
-        await conn.close()
         
         return {
             "success": True,
@@ -1335,58 +1259,87 @@ async def get_appointments_stats():
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.get("/api/v1/appointments/stats/overview")
-async def get_appointments_stats_overview():
+async def get_appointments_stats_overview(conn: asyncpg.Connection = Depends(get_db)):
     """Alias for appointments stats"""
-    return await get_appointments_stats()
+    return await get_appointments_stats(conn)
 
 @app.get("/api/v1/appointments")
 async def get_appointments(
     status: str = None,
     date: str = None,
-    patient_id: int = None
+    patient_id: int = None,
+    limit: int = None,
+    cursor: str = None,
+    conn: asyncpg.Connection = Depends(get_db)
 ):
-    """Get all appointments with optional filters"""
+    """Appointments with optional filters, latest first, one page at a time"""
+    limit = clamp_limit(limit)
+    after = decode_cursor(cursor, 3)
+    appointment_date = None
+    if date:
+        appointment_date = convert_date_string(date)
+        if appointment_date is None:
+            raise HTTPException(status_code=400, detail="Invalid date")
     try:
-        conn = await asyncpg.connect(
-            host=DB_HOST, port=int(DB_PORT), user=DB_USER, password=DB_PASSWORD, database=DB_NAME
-        )
-        
-        query = """
-            SELECT 
-                a.*,
-                p.first_name || ' ' || p.last_name as patient_name,
-                p.email as patient_email,
-                p.mobile_phone as patient_phone
-            FROM appointments a
-            LEFT JOIN patients p ON a.patient_id = p.id
-            WHERE 1=1
-        """
+        conditions = []
         params = []
-        param_count = 1
         
         if status:
-            query += f" AND a.status = ${param_count}"
             params.append(status)
-            param_count += 1
+            conditions.append(f"a.status = ${len(params)}")
             
-        if date:
-            query += f" AND a.appointment_date = ${param_count}"
-            params.append(date)
-            param_count += 1
+        if appointment_date:
+            params.append(appointment_date)
+            conditions.append(f"a.appointment_date = ${len(params)}")
             
         if patient_id:
-            query += f" AND a.patient_id = ${param_count}"
             params.append(patient_id)
-            param_count += 1
-        
-        query += " ORDER BY a.appointment_date DESC, a.appointment_time DESC"
+            conditions.append(f"a.patient_id = ${len(params)}")
+
+        filters, filter_params = list(conditions), list(params)
+        if after:
+            conditions.append(keyset_condition(
+                ["a.appointment_date", "a.appointment_time", "a.id"], len(params) + 1
+            ))
+            params.extend(after)
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
         
-        appointments = await conn.fetch(query, *params)
-        await conn.close()
+        appointments = await conn.fetch(f"""
+            SELECT 
+                a.id, a.appointment_number, a.clinic_id, a.patient_id, a.practitioner_id,
+                a.appointment_type, a.appointment_date, a.appointment_time,
+                a.duration_minutes, a.status, a.booking_notes, a.notes, a.created_at,
+                p.first_name || ' ' || p.last_name as patient_name,
+                p.email as patient_email,
+                p.mobile_phone as patient_phone
+            FROM appointments a
+            LEFT JOIN patients p ON a.patient_id = p.id
+            {where}
+            ORDER BY a.appointment_date DESC, a.appointment_time DESC, a.id DESC
+            LIMIT ${len(params) + 1}
+        """, *params, limit + 1)
+        appointments, next_cursor = split_page(
+            appointments, limit, ("appointment_date", "appointment_time", "id")
+        )
+
+        # Single-filter totals come straight from the clinic_stats counters
+        estimated = False
+        if patient_id or (status and appointment_date):
+            estimated = True
+            total = await estimate_count(
+                conn, f"SELECT 1 FROM appointments a WHERE {' AND '.join(filters)}", *filter_params
+            )
+        elif status:
+            total = await count_metric(conn, None, "appointments_by_status", status)
+        elif appointment_date:
+            total = await count_metric(conn, None, "appointments_by_date", str(appointment_date))
+        else:
+            total = await count_metric(conn, None, "appointments")
         
         return {
             "success": True,
-            "appointments": [dict(a) for a in appointments]
+            "appointments": [dict(a) for a in appointments],
+            **page_info(next_cursor, total, estimated)
         }
     except Exception as e:
         print(f"❌ ERROR creating appointment: {str(e)}")
@@ -1397,13 +1350,9 @@ async def get_appointments(
 
 
 @app.post("/api/v1/appointments")
-async def create_appointment(appointment: AppointmentCreate):
+async def create_appointment(appointment: AppointmentCreate, conn: asyncpg.Connection = Depends(get_db)):
     """Create a new appointment - Now with automatic type validation!"""
     try:
-        conn = await asyncpg.connect(
-            host=DB_HOST, port=int(DB_PORT), user=DB_USER, password=DB_PASSWORD, database=DB_NAME
-        )
-
         # Generate appointment number
         from datetime import datetime
         timestamp = datetime.now().strftime("%Y%m%d%H%M%S")
@@ -1433,8 +1382,6 @@ async def create_appointment(appointment: AppointmentCreate):
             appointment.booking_notes
         )
 
-        await conn.close()
-
         return {
             "success": True,
             "message": "Appointment created successfully",
@@ -1450,13 +1397,9 @@ async def create_appointment(appointment: AppointmentCreate):
 
 
 @app.get("/api/v1/appointments/{appointment_id}")
-async def get_appointment(appointment_id: int):
+async def get_appointment(appointment_id: int, conn: asyncpg.Connection = Depends(get_db)):
     """Get a specific appointment by ID"""
     try:
-        conn = await asyncpg.connect(
-            host=DB_HOST, port=int(DB_PORT), user=DB_USER, password=DB_PASSWORD, database=DB_NAME
-        )
-        
         appointment = await conn.fetchrow(
             """SELECT 
                 a.*,
@@ -1471,11 +1414,8 @@ async def get_appointment(appointment_id: int):
         )
         
         if not appointment:
-            await conn.close()
             raise HTTPException(status_code=404, detail="Appointment not found")
         
-        await conn.close()
-        
         return {
             "success": True,
             "appointment": dict(appointment)
@@ -1491,19 +1431,14 @@ async def get_appointment(appointment_id: int):
 
 
 @app.put("/api/v1/appointments/{appointment_id}")
-async def update_appointment(appointment_id: int, appointment_data: dict):
+async def update_appointment(appointment_id: int, appointment_data: dict, conn: asyncpg.Connection = Depends(get_db)):
     """Update an existing appointment"""
     try:
-        conn = await asyncpg.connect(
-            host=DB_HOST, port=int(DB_PORT), user=DB_USER, password=DB_PASSWORD, database=DB_NAME
-        )
-        
         # Check if appointment exists
         exists = await conn.fetchval(
             "SELECT id FROM appointments WHERE id = $1", appointment_id
         )
         if not exists:
-            await conn.close()
             raise HTTPException(status_code=404, detail="Appointment not found")
         
         # Build update query dynamically
@@ -1533,8 +1468,6 @@ async def update_appointment(appointment_id: int, appointment_data: dict):
             
             await conn.execute(query, *params)
         
-        await conn.close()
-        
         return {
             "success": True,
             "message": "Appointment updated successfully"
@@ -1550,19 +1483,14 @@ async def update_appointment(appointment_id: int, appointment_data: dict):
 
 
 @app.delete("/api/v1/appointments/{appointment_id}")
-async def delete_appointment(appointment_id: int):
+async def delete_appointment(appointment_id: int, conn: asyncpg.Connection = Depends(get_db)):
     """Delete an appointment"""
     try:
-        conn = await asyncpg.connect(
-            host=DB_HOST, port=int(DB_PORT), user=DB_USER, password=DB_PASSWORD, database=DB_NAME
-        )
-        
         # Check if appointment exists
         exists = await conn.fetchval(
             "SELECT id FROM appointments WHERE id = $1", appointment_id
         )
         if not exists:
-            await conn.close()
             raise HTTPException(status_code=404, detail="Appointment not found")
         
         # Delete appointment
@@ -1570,8 +1498,6 @@ async def delete_appointment(appointment_id: int):
             "DELETE FROM appointments WHERE id = $1", appointment_id
         )
         
-        await conn.close()
-        
         return {
             "success": True,
             "message": "Appointment deleted successfully"
@@ -1587,13 +1513,9 @@ async def delete_appointment(appointment_id: int):
 
 
 @app.post("/api/v1/appointments/{appointment_id}/cancel")
-async def cancel_appointment(appointment_id: int, cancel_data: dict):
+async def cancel_appointment(appointment_id: int, cancel_data: dict, conn: asyncpg.Connection = Depends(get_db)):
     """Cancel an appointment"""
     try:
-        conn = await asyncpg.connect(
-            host=DB_HOST, port=int(DB_PORT), user=DB_USER, password=DB_PASSWORD, database=DB_NAME
-        )
-        
         # Update appointment status to cancelled
         await conn.execute(
             """UPDATE appointments 
@@ -1606,8 +1528,6 @@ async def cancel_appointment(appointment_id: int, cancel_data: dict):
             appointment_id
         )
         
-        await conn.close()
-        
         return {
             "success": True,
             "message": "Appointment cancelled successfully"
@@ -1621,13 +1541,9 @@ async def cancel_appointment(appointment_id: int, cancel_data: dict):
 
 
 @app.get("/api/v1/appointments/calendar/{year}/{month}")
-async def get_calendar_appointments(year: int, month: int):
+async def get_calendar_appointments(year: int, month: int, conn: asyncpg.Connection = Depends(get_db)):
     """Get appointments for a specific month (calendar view)"""
     try:
-        conn = await asyncpg.connect(
-            host=DB_HOST, port=int(DB_PORT), user=DB_USER, password=DB_PASSWORD, database=DB_NAME
-        )
-        
         appointments = await conn.fetch(
             """SELECT 
                 a.id,
@@ -1646,8 +1562,6 @@ async def get_calendar_appointments(year: int, month: int):
             year, month
         )
         
-        await conn.close()
-        
         return {
             "success": True,
             "appointments": [dict(a) for a in appointments]
@@ -1667,13 +1581,9 @@ async def get_calendar_appointments(year: int, month: int):
 # ============================================================================
 
 @app.get("/api/v1/therapy-plans/stats")
-async def get_therapy_plans_stats():
+async def get_therapy_plans_stats(conn: asyncpg.Connection = Depends(get_db)):
     """Get therapy plans statistics"""
     try:
-        conn = await asyncpg.connect(
-            host=DB_HOST, port=int(DB_PORT), user=DB_USER, password=DB_PASSWORD, database=DB_NAME
-        )
-        
         total = await conn.fetchval("SELECT COUNT(*) FROM therapy_plans")
         pending = await conn.fetchval(
             "SELECT COUNT(*) FROM therapy_plans WHERE status = 'PENDING_APPROVAL'"
@@ -1685,8 +1595,6 @@ async def get_therapy_plans_stats():
             "SELECT COUNT(*) FROM therapy_plans WHERE status = 'IN_PROGRESS'"
         )
         
-        await conn.close()
-        
         return {
             "total_plans": total,
             "pending_approval": pending,
@@ -1702,45 +1610,64 @@ async def get_therapy_plans_stats():
 
 
 @app.get("/api/v1/therapy-plans")
-async def get_therapy_plans(status: str = None, patient_id: int = None):
-    """Get all therapy plans with optional filters"""
+async def get_therapy_plans(
+    status: str = None,
+    patient_id: int = None,
+    limit: int = None,
+    cursor: str = None,
+    conn: asyncpg.Connection = Depends(get_db)
+):
+    """Therapy plans with optional filters, newest first, one page at a time"""
+    limit = clamp_limit(limit)
+    after = decode_cursor(cursor, 2)
     try:
-        conn = await asyncpg.connect(
-            host=DB_HOST, port=int(DB_PORT), user=DB_USER, password=DB_PASSWORD, database=DB_NAME
-        )
+        conditions = []
+        params = []
         
-        query = """
+        if status:
+            params.append(status)
+            conditions.append(f"tp.status = ${len(params)}")
+            
+        if patient_id:
+            params.append(patient_id)
+            conditions.append(f"tp.patient_id = ${len(params)}")
+
+        filters, filter_params = list(conditions), list(params)
+        if after:
+            conditions.append(keyset_condition(["tp.created_at", "tp.id"], len(params) + 1))
+            params.extend(after)
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+        
+        plans = await conn.fetch(f"""
             SELECT 
-                tp.*,
+                tp.id, tp.plan_number, tp.clinic_id, tp.patient_id, tp.assessment_id,
+                tp.recommended_by, tp.status, tp.notes, tp.created_at,
                 p.first_name || ' ' || p.last_name as patient_name,
                 p.mobile_phone as patient_phone,
                 u.full_name as recommended_by_name
             FROM therapy_plans tp
             LEFT JOIN patients p ON tp.patient_id = p.id
             LEFT JOIN users u ON tp.recommended_by = u.id
-            WHERE 1=1
-        """
-        params = []
-        param_count = 1
-        
-        if status:
-            query += f" AND tp.status = ${param_count}"
-            params.append(status)
-            param_count += 1
-            
+            {where}
+            ORDER BY tp.created_at DESC, tp.id DESC
+            LIMIT ${len(params) + 1}
+        """, *params, limit + 1)
+        plans, next_cursor = split_page(plans, limit, ("created_at", "id"))
+
+        estimated = bool(patient_id)
         if patient_id:
-            query += f" AND tp.patient_id = ${param_count}"
-            params.append(patient_id)
-            param_count += 1
-        
-        query += " ORDER BY tp.created_at DESC"
-        
-        plans = await conn.fetch(query, *params)
-        await conn.close()
+            total = await estimate_count(
+                conn, f"SELECT 1 FROM therapy_plans tp WHERE {' AND '.join(filters)}", *filter_params
+            )
+        elif status:
+            total = await count_metric(conn, None, "therapy_plans_by_status", status)
+        else:
+            total = await count_metric(conn, None, "therapy_plans")
         
         return {
             "success": True,
-            "therapy_plans": [dict(p) for p in plans]
+            "therapy_plans": [dict(p) for p in plans],
+            **page_info(next_cursor, total, estimated)
         }
     except Exception as e:
         print(f"❌ ERROR creating appointment: {str(e)}")
@@ -1751,13 +1678,9 @@ async def get_therapy_plans(status: str = None, patient_id: int = None):
 
 
 @app.get("/api/v1/therapy-plans/{plan_id}")
-async def get_therapy_plan(plan_id: int):
+async def get_therapy_plan(plan_id: int, conn: asyncpg.Connection = Depends(get_db)):
     """Get a specific therapy plan with items"""
     try:
-        conn = await asyncpg.connect(
-            host=DB_HOST, port=int(DB_PORT), user=DB_USER, password=DB_PASSWORD, database=DB_NAME
-        )
-        
         # Get plan details
         plan = await conn.fetchrow(
             """SELECT 
@@ -1773,7 +1696,6 @@ async def get_therapy_plan(plan_id: int):
         )
         
         if not plan:
-            await conn.close()
             raise HTTPException(status_code=404, detail="Therapy plan not found")
         
         # Get plan items
@@ -1789,8 +1711,6 @@ async def get_therapy_plan(plan_id: int):
             plan_id
         )
         
-        await conn.close()
-        
         return {
             "success": True,
             "therapy_plan": dict(plan),
@@ -1807,15 +1727,11 @@ async def get_therapy_plan(plan_id: int):
 
 
 @app.post("/api/v1/therapy-plans")
-async def create_therapy_plan(plan_data: dict):
+async def create_therapy_plan(plan_data: dict, conn: asyncpg.Connection = Depends(get_db)):
     """Create a new therapy plan"""
     try:
         from datetime import datetime
         
-        conn = await asyncpg.connect(
-            host=DB_HOST, port=int(DB_PORT), user=DB_USER, password=DB_PASSWORD, database=DB_NAME
-        )
-        
         # Generate plan number
         timestamp = datetime.now().strftime("%Y%m%d%H%M%S")
         plan_number = f"TP-{timestamp}"
@@ -1857,8 +1773,6 @@ async def create_therapy_plan(plan_data: dict):
                     item.get("priority", "PRIMARY")
                 )
         
-        await conn.close()
-        
         return {
             "success": True,
             "message": "Therapy plan created successfully",
@@ -1874,13 +1788,9 @@ async def create_therapy_plan(plan_data: dict):
 
 
 @app.put("/api/v1/therapy-plans/{plan_id}/status")
-async def update_therapy_plan_status(plan_id: int, status_data: dict):
+async def update_therapy_plan_status(plan_id: int, status_data: dict, conn: asyncpg.Connection = Depends(get_db)):
     """Update therapy plan status"""
     try:
-        conn = await asyncpg.connect(
-            host=DB_HOST, port=int(DB_PORT), user=DB_USER, password=DB_PASSWORD, database=DB_NAME
-        )
-        
         await conn.execute(
             """UPDATE therapy_plans 
                SET status = $1, updated_at = NOW()
@@ -1889,8 +1799,6 @@ async def update_therapy_plan_status(plan_id: int, status_data: dict):
             plan_id
         )
         
-        await conn.close()
-        
         return {
             "success": True,
             "message": "Status updated successfully"
@@ -1910,76 +1818,14 @@ async def update_therapy_plan_status(plan_id: int, status_data: dict):
 # ============================================================================
 
 @app.get("/api/v1/reports/overview")
-async def get_reports_overview():
+async def get_reports_overview(conn: asyncpg.Connection = Depends(get_db)):
     """Get overall system statistics"""
     try:
-        conn = await asyncpg.connect(
-            host=DB_HOST, port=int(DB_PORT), user=DB_USER, password=DB_PASSWORD, database=DB_NAME
-        )
-        
-        # Get counts
-        total_patients = await conn.fetchval("SELECT COUNT(*) FROM patients")
-        active_patients = await conn.fetchval(
-            "SELECT COUNT(*) FROM patients WHERE status = 'active'"
-        )
-        total_assessments = await conn.fetchval(
-            "SELECT COUNT(*) FROM comprehensive_assessments"
-        )
-        total_appointments = await conn.fetchval("SELECT COUNT(*) FROM appointments")
-        total_therapy_plans = await conn.fetchval("SELECT COUNT(*) FROM therapy_plans")
-        
-        # Appointments by status
-        appointments_by_status = await conn.fetch(
-            "SELECT status, COUNT(*) as count FROM appointments GROUP BY status"
-        )
-        
-        # Therapy plans by status
-        plans_by_status = await conn.fetch(
-            "SELECT status, COUNT(*) as count FROM therapy_plans GROUP BY status"
-        )
-        
-        # Average wellness scores
-        avg_wellness = await conn.fetchval(
-            """SELECT AVG(overall_wellness_score) 
-               FROM comprehensive_assessments 
-               WHERE overall_wellness_score > 0"""
-        )
-        
-        # Recent activity
-        recent_assessments = await conn.fetchval(
-            """SELECT COUNT(*) FROM comprehensive_assessments 
-               WHERE assessment_date >= NOW() - INTERVAL '30 days'"""
-        )
-        
-        recent_appointments = await conn.fetchval(
-            """SELECT COUNT(*) FROM appointments 
-               WHERE created_at >= NOW() - INTERVAL '30 days'"""
-        )
-        
-        await conn.close()
-        
         return {
             "success": True,
-            "overview": {
-                "patients": {
-                    "total": total_patients,
-                    "active": active_patients
-                },
-                "assessments": {
-                    "total": total_assessments,
-                    "recent_30_days": recent_assessments,
-                    "avg_wellness_score": round(float(avg_wellness or 0), 2)
-                },
-                "appointments": {
-                    "total": total_appointments,
-                    "recent_30_days": recent_appointments,
-                    "by_status": {row['status']: row['count'] for row in appointments_by_status}
-                },
-                "therapy_plans": {
-                    "total": total_therapy_plans,
-                    "by_status": {row['status']: row['count'] for row in plans_by_status}
-                }
-            }
+            "overview": await get_or_load(
+                "reports_overview", lambda: fetch_system_overview(conn), ttl=60
+            )
         }
     except Exception as e:
         print(f"❌ ERROR creating appointment: {str(e)}")
@@ -1990,13 +1836,9 @@ async def get_reports_overview():
 
 
 @app.get("/api/v1/reports/patient-activity")
-async def get_patient_activity():
+async def get_patient_activity(conn: asyncpg.Connection = Depends(get_db)):
     """Get patient activity report"""
     try:
-        conn = await asyncpg.connect(
-            host=DB_HOST, port=int(DB_PORT), user=DB_USER, password=DB_PASSWORD, database=DB_NAME
-        )
-        
         # Patient activity with assessment and appointment counts
         activity = await conn.fetch("""
             SELECT 
@@ -2018,8 +1860,6 @@ async def get_patient_activity():
             ORDER BY p.id DESC
         """)
         
-        await conn.close()
-        
         return {
             "success": True,
             "patient_activity": [dict(row) for row in activity]
@@ -2033,15 +1873,11 @@ async def get_patient_activity():
 
 
 @app.get("/api/v1/reports/wellness-trends")
-async def get_wellness_trends():
+async def get_wellness_trends(conn: asyncpg.Connection = Depends(get_db)):
     """Get wellness score trends over time"""
     try:
-        conn = await asyncpg.connect(
-            host=DB_HOST, port=int(DB_PORT), user=DB_USER, password=DB_PASSWORD, database=DB_NAME
-        )
-        
         # Monthly wellness trends
-        trends = await conn.fetch("""
+        trends = await get_or_load("wellness_trends", lambda: conn.fetch("""
             SELECT 
                 DATE_TRUNC('month', assessment_date) as month,
                 AVG(overall_wellness_score) as avg_score,
@@ -2051,9 +1887,7 @@ async def get_wellness_trends():
             GROUP BY DATE_TRUNC('month', assessment_date)
             ORDER BY month DESC
             LIMIT 12
-        """)
-        
-        await conn.close()
+        """), ttl=300)
         
         return {
             "success": True,
@@ -2117,17 +1951,13 @@ except Exception as e:
 
     print(f"⚠️ Warning: Could not load Chatbot API: {e}")
 @app.get("/api/v1/patients/{patient_id}/assessment-overview")
-async def get_patient_assessment_overview(patient_id: int, authorization: str = Header(None)):
+async def get_patient_assessment_overview(patient_id: int, authorization: str = Header(None), conn: asyncpg.Connection = Depends(get_db)):
     """Get complete assessment overview for a patient"""
     try:
         # Simple token check
         if not authorization or not authorization.startswith("Bearer "):
             raise HTTPException(status_code=401, detail="Missing or invalid token")
         
-        conn = await asyncpg.connect(
-            host=DB_HOST, port=int(DB_PORT), user=DB_USER, password=DB_PASSWORD, database=DB_NAME
-        )
-        
         # Get latest assessment
         latest_assessment = await conn.fetchrow("""
             SELECT * FROM assessments 
@@ -2142,8 +1972,6 @@ async def get_patient_assessment_overview(patient_id: int, authorization: str =
             ORDER BY created_at DESC LIMIT 1
         """, patient_id)
         
-        await conn.close()
-        
         if not latest_assessment:
             return {
                 "has_assessment": False,
@@ -2347,8 +2175,8 @@ async def get_complete_assessment(assessment_id: int):
 
 
 @app.get("/api/v1/assessments/{assessment_id}/report")
-async def generate_assessment_report(assessment_id: int):
-    """Generate comprehensive PDF report"""
+async def generate_assessment_report(assessment_id: int, request: Request):
+    """Generate comprehensive PDF report (cached on disk, see report_cache.py)"""
     try:
         async with get_db_connection() as conn:
             # Get assessment data
@@ -2372,6 +2200,11 @@ async def generate_assessment_report(assessment_id: int):
                 assessment_id
             )
             
+            key = source_key(
+                PDF_REPORT_TEMPLATE_VERSION,
+                dict(assessment), dict(patient), dict(iridology) if iridology else None
+            )
+            
             # Convert to dicts and parse JSON
             assessment_dict = dict(assessment)
             patient_dict = dict(patient)
@@ -2396,21 +2229,18 @@ async def generate_assessment_report(assessment_id: int):
                 elif assessment_dict.get('questionnaire_recommendations'):
                     assessment_dict['recommendations'] = assessment_dict['questionnaire_recommendations']
             
-            # Generate PDF
-            pdf_buffer = report_generator.generate_comprehensive_report(
-                assessment_dict,
-                patient_dict,
-                dict(iridology) if iridology else None
-            )
-            
-            # Return as downloadable PDF
-            return StreamingResponse(
-                pdf_buffer,
-                media_type="application/pdf",
-                headers={
-                    "Content-Disposition": f"attachment; filename=celloxen_assessment_{assessment_id}_report.pdf"
-                }
-            )
+            if iridology:
+                assessment_dict['iridology_data'] = dict(iridology)
+        
+        # Generate PDF (only when the source rows changed) without holding a pool connection
+        async def render():
+            return await render_pdf_report(patient_dict, assessment_dict)
+        
+        # Return as downloadable PDF
+        return await cached_report(
+            "assessment", assessment_id, key, render,
+            request.headers, f"celloxen_assessment_{assessment_id}_report.pdf"
+        )
             
     except Exception as e:
         print(f"Error generating report: {str(e)}")
@@ -2425,7 +2255,11 @@ app.include_router(iridology_router)
 
 # Import report generator
 from report_generator import generate_wellness_report
-from iridology_pdf_generator import generate_iridology_pdf
+from iridology_pdf_generator import (
+    build_iridology_report, TEMPLATE_VERSION as IRIDOLOGY_TEMPLATE_VERSION
+)
+from pdf_report_generator import render_pdf_report, TEMPLATE_VERSION as PDF_REPORT_TEMPLATE_VERSION
+from report_cache import cached_report, source_key
 
 @app.post("/api/v1/reports/generate/{assessment_id}")
 async def generate_report_endpoint(assessment_id: int):
@@ -2441,6 +2275,8 @@ async def generate_report_endpoint(assessment_id: int):
             "report_path": pdf_path,
             "download_url": f"/reports/{filename}"
         }
+    except HTTPException:
+        raise
     except Exception as e:
         import traceback
         print(f"ERROR generating report: {str(e)}")
@@ -2470,14 +2306,11 @@ async def download_report(filename: str):
 @app.get("/api/v1/assessments/patient/{patient_id}/dashboard")
 async def get_patient_assessment_dashboard(
     patient_id: int,
-    current_user: dict = Depends(get_current_user)
+    current_user: dict = Depends(get_current_user),
+    conn: asyncpg.Connection = Depends(get_db)
 ):
     """Get complete assessment dashboard data for a patient"""
     try:
-        conn = await asyncpg.connect(
-            host=DB_HOST, port=int(DB_PORT), user=DB_USER, password=DB_PASSWORD, database=DB_NAME
-        )
-        
         # Get patient info
         patient = await conn.fetchrow("""
             SELECT id, patient_number, first_name, last_name, email, date_of_birth
@@ -2485,7 +2318,6 @@ async def get_patient_assessment_dashboard(
         """, patient_id)
         
         if not patient:
-            await conn.close()
             raise HTTPException(status_code=404, detail="Patient not found")
         
         # Get latest assessment
@@ -2495,8 +2327,6 @@ async def get_patient_assessment_dashboard(
             ORDER BY created_at DESC LIMIT 1
         """, patient_id)
         
-        await conn.close()
-        
         # Calculate progress
         progress = 0
         modules = {"questionnaire": False, "iridology": False, "analysis": False, "report": False}
@@ -2574,6 +2404,14 @@ print("✅ Simple Assessment API loaded successfully")
 # ============================================
 
 from iridology_analyzer import IridologyAnalyzer
+from job_queue import job_handler, enqueue_job, get_latest_job, PermanentJobError
+from blob_store import put_data_url, blob_response, save_multipart_upload, delete_blob, BlobTooLarge
+from image_preprocess import prepare_iris_image
+from availability import find_available_slots, load_practitioners, overlap_condition
+from dashboard_stats import (
+    fetch_clinic_counts, fetch_clinic_charts, fetch_therapy_stats, fetch_system_overview
+)
+import asyncio
 import asyncpg
 
 # Initialize analyzer (will use ANTHROPIC_API_KEY from environment)
@@ -2583,7 +2421,8 @@ iridology_analyzer = IridologyAnalyzer()
 async def start_iridology_analysis(
     patient_id: int,
     disclaimer_accepted: bool,
-    current_user: dict = Depends(get_current_user)
+    current_user: dict = Depends(get_current_user),
+    conn: asyncpg.Connection = Depends(get_db)
 ):
     """Start new iridology analysis session"""
     
@@ -2591,56 +2430,47 @@ async def start_iridology_analysis(
         raise HTTPException(status_code=400, detail="Disclaimer must be accepted")
     
     try:
-        # Create database connection
-        conn = await asyncpg.connect(
-            host=DB_HOST, port=int(DB_PORT), user=DB_USER, password=DB_PASSWORD, database=DB_NAME
+        # Get patient details
+        patient = await conn.fetchrow(
+            "SELECT * FROM patients WHERE id = $1",
+            patient_id
         )
-        
-        try:
-            # Get patient details
-            patient = await conn.fetchrow(
-                "SELECT * FROM patients WHERE id = $1",
-                patient_id
-            )
             
-            if not patient:
-                raise HTTPException(status_code=404, detail="Patient not found")
+        if not patient:
+            raise HTTPException(status_code=404, detail="Patient not found")
             
-            # Create analysis record
-            analysis_id = await conn.fetchval(
-                """
-                INSERT INTO iridology_analyses (
-                    patient_id, practitioner_id, clinic_id,
-                    disclaimer_accepted, disclaimer_accepted_at,
-                    disclaimer_text, status,
-                    left_eye_image, right_eye_image, capture_method
-                ) VALUES ($1, $2, $3, $4, NOW(), $5, 'pending', '', '', 'upload')
-                RETURNING id
-                """,
-                patient_id,
-                current_user["id"],
-                1,
-                disclaimer_accepted,
-                """This iridology analysis is a holistic wellness assessment tool and is NOT intended as medical diagnosis. 
-                The iris analysis provides insights into potential wellness patterns and areas that may benefit from lifestyle support. 
-                This analysis does NOT diagnose medical conditions, replace medical consultation, or prescribe treatments. 
-                If the analysis identifies patterns that may indicate health concerns, we strongly recommend consulting your GP."""
-            )
+        # Create analysis record
+        analysis_id = await conn.fetchval(
+            """
+            INSERT INTO iridology_analyses (
+                patient_id, practitioner_id, clinic_id,
+                disclaimer_accepted, disclaimer_accepted_at,
+                disclaimer_text, status,
+                left_eye_image, right_eye_image, capture_method
+            ) VALUES ($1, $2, $3, $4, NOW(), $5, 'pending', '', '', 'upload')
+            RETURNING id
+            """,
+            patient_id,
+            current_user["id"],
+            1,
+            disclaimer_accepted,
+            """This iridology analysis is a holistic wellness assessment tool and is NOT intended as medical diagnosis. 
+            The iris analysis provides insights into potential wellness patterns and areas that may benefit from lifestyle support. 
+            This analysis does NOT diagnose medical conditions, replace medical consultation, or prescribe treatments. 
+            If the analysis identifies patterns that may indicate health concerns, we strongly recommend consulting your GP."""
+        )
             
-            return {
-                "success": True,
-                "analysis_id": analysis_id,
-                "patient": {
-                    "id": patient["id"],
-                    "first_name": patient["first_name"],
-                    "last_name": patient["last_name"],
-                    "patient_number": patient["patient_number"],
-                    "date_of_birth": patient["date_of_birth"].isoformat() if patient.get("date_of_birth") else None
-                }
+        return {
+            "success": True,
+            "analysis_id": analysis_id,
+            "patient": {
+                "id": patient["id"],
+                "first_name": patient["first_name"],
+                "last_name": patient["last_name"],
+                "patient_number": patient["patient_number"],
+                "date_of_birth": patient["date_of_birth"].isoformat() if patient.get("date_of_birth") else None
             }
-            
-        finally:
-            await conn.close()
+        }
             
     except HTTPException:
         raise
@@ -2648,56 +2478,113 @@ async def start_iridology_analysis(
         raise HTTPException(status_code=500, detail=str(e))
 
 
+async def discard_iris_blobs(keys):
+    """Remove blobs from a rejected upload unless an analysis already uses them"""
+    keys = set(filter(None, keys))
+    if not keys:
+        return
+    async with get_db_connection() as conn:
+        rows = await conn.fetch(
+            """
+            SELECT left_eye_blob_key, right_eye_blob_key FROM iridology_analyses
+            WHERE left_eye_blob_key = ANY($1::text[]) OR right_eye_blob_key = ANY($1::text[])
+            """,
+            list(keys)
+        )
+    in_use = {key for row in rows for key in row}
+    # Known race: check-then-delete is not atomic. A concurrent upload of the
+    # same bytes can deduplicate onto one of these keys after the check and
+    # before its own UPDATE, and we then delete the blob its row is about to
+    # reference. It needs identical images uploaded at the same moment with
+    # one of the two requests rejected, so it is accepted rather than locked.
+    for key in keys - in_use:
+        await asyncio.to_thread(delete_blob, key)
+
+
 @app.post("/api/v1/iridology/{analysis_id}/upload-images")
 async def upload_iris_images(
     analysis_id: int,
     request: Request,
     current_user: dict = Depends(get_current_user)
 ):
-    """Upload iris images for analysis"""
-    
-    # Get JSON body
-    body = await request.json()
-    left_eye_image = body.get('left_eye_image')
-    right_eye_image = body.get('right_eye_image')
-    capture_method = body.get('capture_method')
-    
-    if capture_method not in ["camera", "upload"]:
-        raise HTTPException(status_code=400, detail="Invalid capture method")
+    """Upload iris images for analysis.
+
+    Accepts multipart/form-data (files streamed to the blob store as they
+    arrive) or the original JSON body of base64 data URLs. The body is
+    stored before a database connection is taken, so a slow upload does
+    not hold a pool slot.
+    """
     
-    if not left_eye_image or not right_eye_image:
-        raise HTTPException(status_code=400, detail="Both eye images required")
+    try:
+        if request.headers.get("content-type", "").startswith("multipart/form-data"):
+            blob_keys, form = await save_multipart_upload(request, ("left_eye_image", "right_eye_image"))
+            capture_method = form.get("capture_method")
+            left_key = blob_keys.get("left_eye_image")
+            right_key = blob_keys.get("right_eye_image")
+        else:
+            body = await request.json()
+            left_eye_image = body.get('left_eye_image')
+            right_eye_image = body.get('right_eye_image')
+            capture_method = body.get('capture_method')
+            
+            if capture_method not in ["camera", "upload"]:
+                raise HTTPException(status_code=400, detail="Invalid capture method")
+            
+            if not left_eye_image or not right_eye_image:
+                raise HTTPException(status_code=400, detail="Both eye images required")
+            
+            # Decode into the blob store; the row only keeps the content keys
+            results = await asyncio.gather(
+                asyncio.to_thread(put_data_url, left_eye_image),
+                asyncio.to_thread(put_data_url, right_eye_image),
+                return_exceptions=True
+            )
+            errors = [r for r in results if isinstance(r, BaseException)]
+            if errors:
+                # Don't keep the image that did decode
+                await discard_iris_blobs(r for r in results if isinstance(r, str))
+                raise errors[0]
+            left_key, right_key = results
+    except BlobTooLarge as e:
+        raise HTTPException(status_code=413, detail=str(e))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    
+    # Multipart bodies are only seen once the images are stored; don't keep
+    # blobs from a rejected upload
+    if capture_method not in ["camera", "upload"]:
+        await discard_iris_blobs((left_key, right_key))
+        raise HTTPException(status_code=400, detail="Invalid capture method")
+    
+    if not left_key or not right_key:
+        await discard_iris_blobs((left_key, right_key))
+        raise HTTPException(status_code=400, detail="Both eye images required")
     
     try:
-        conn = await asyncpg.connect(
-            host=DB_HOST, port=int(DB_PORT), user=DB_USER, password=DB_PASSWORD, database=DB_NAME
-        )
-        
-        try:
-            # Update analysis with images
+        # Update analysis with images
+        async with get_db_connection() as conn:
             await conn.execute(
                 """
                 UPDATE iridology_analyses 
-                SET left_eye_image = $1, 
-                    right_eye_image = $2,
+                SET left_eye_blob_key = $1, 
+                    right_eye_blob_key = $2,
+                    left_eye_image = '',
+                    right_eye_image = '',
                     capture_method = $3,
                     status = 'pending',
                     updated_at = NOW()
                 WHERE id = $4
                 """,
-                left_eye_image,
-                right_eye_image,
+                left_key,
+                right_key,
                 capture_method,
                 analysis_id)
             
-            return {
-                "success": True,
-                "message": "Images uploaded successfully",
-                "analysis_id": analysis_id
-            }
-            
-        finally:
-            await conn.close()
+        return {
+            "success": True,
+            "message": "Images uploaded successfully",
+            "analysis_id": analysis_id
+        }
             
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
@@ -2705,87 +2592,100 @@ async def upload_iris_images(
         raise HTTPException(status_code=500, detail=str(e))
 
 
-@app.post("/api/v1/iridology/{analysis_id}/analyse")
-async def analyse_iris_images(
-    analysis_id: int,
-    current_user: dict = Depends(get_current_user)
-):
-    """Trigger Claude AI analysis of iris images"""
+async def mark_iridology_failed(payload: dict, error: str):
+    """Job failure hook: record the final error on the analysis"""
+    async with get_db_connection() as conn:
+        await conn.execute(
+            """
+            UPDATE iridology_analyses 
+            SET status = 'failed',
+                error_message = $1,
+                updated_at = NOW()
+            WHERE id = $2
+            """,
+            error,
+            payload["analysis_id"]
+        )
+
+
+@job_handler("iridology_analysis", on_failure=mark_iridology_failed)
+async def run_iridology_analysis(payload: dict) -> dict:
+    """Background job: run the Claude analysis for one iridology_analyses row"""
+    analysis_id = payload["analysis_id"]
+
+    async with get_db_connection() as conn:
+        analysis = await conn.fetchrow(
+            """
+            SELECT ia.id, ia.left_eye_blob_key, ia.right_eye_blob_key,
+                   p.first_name, p.last_name, p.date_of_birth, p.gender
+            FROM iridology_analyses ia
+            JOIN patients p ON ia.patient_id = p.id
+            WHERE ia.id = $1
+            """,
+            analysis_id,
+        )
+        
+        if not analysis:
+            raise PermanentJobError("Analysis not found")
+        
+        if not analysis["left_eye_blob_key"] or not analysis["right_eye_blob_key"]:
+            raise PermanentJobError("Images not uploaded")
+        
+        # Update status to processing
+        await conn.execute(
+            """
+            UPDATE iridology_analyses 
+            SET status = 'processing', 
+                processing_started_at = NOW(),
+                error_message = NULL,
+                updated_at = NOW()
+            WHERE id = $1
+            """,
+            analysis_id
+        )
+    
+    # Prepare patient info
+    from datetime import date
+    age = None
+    if analysis["date_of_birth"]:
+        age = (date.today() - analysis["date_of_birth"]).days // 365
+    
+    patient_info = {
+        "name": f"{analysis['first_name']} {analysis['last_name']}",
+        "age": age,
+        "gender": analysis.get("gender", "Unknown")
+    }
     
+    # Oriented, cropped and downscaled copies (cached per source image)
     try:
-        conn = await asyncpg.connect(
-            host=DB_HOST, port=int(DB_PORT), user=DB_USER, password=DB_PASSWORD, database=DB_NAME
+        (left_eye_image, left_media_type), (right_eye_image, right_media_type) = await asyncio.gather(
+            prepare_iris_image(analysis["left_eye_blob_key"]),
+            prepare_iris_image(analysis["right_eye_blob_key"])
         )
-        
-        try:
-            # Get analysis record
-            analysis = await conn.fetchrow(
-                """
-                SELECT ia.*, p.first_name, p.last_name, p.date_of_birth, p.gender
-                FROM iridology_analyses ia
-                JOIN patients p ON ia.patient_id = p.id
-                WHERE ia.id = $1
-                """,
-                analysis_id,
-            )
-            
-            if not analysis:
-                raise HTTPException(status_code=404, detail="Analysis not found")
-            
-            if not analysis["left_eye_image"] or not analysis["right_eye_image"]:
-                raise HTTPException(status_code=400, detail="Images not uploaded")
-            
-            # Update status to processing
-            await conn.execute(
-                """
-                UPDATE iridology_analyses 
-                SET status = 'processing', 
-                    processing_started_at = NOW(),
-                    updated_at = NOW()
-                WHERE id = $1
-                """,
-                analysis_id
-            )
-            
-            # Prepare patient info
-            from datetime import date
-            age = None
-            if analysis["date_of_birth"]:
-                age = (date.today() - analysis["date_of_birth"]).days // 365
-            
-            patient_info = {
-                "name": f"{analysis['first_name']} {analysis['last_name']}",
-                "age": age,
-                "gender": analysis.get("gender", "Unknown")
-            }
-            
-            # Run AI analysis
-            result = await iridology_analyzer.analyse_bilateral(
-                analysis["left_eye_image"],
-                analysis["right_eye_image"],
-                patient_info
-            )
-            
-            if not result["success"]:
-                # Mark as failed
-                await conn.execute(
-                    """
-                    UPDATE iridology_analyses 
-                    SET status = 'failed',
-                        error_message = $1,
-                        updated_at = NOW()
-                    WHERE id = $2
-                    """,
-                    result.get("error", "Analysis failed"),
-                    analysis_id
-                )
-                raise HTTPException(status_code=500, detail=result.get("error", "Analysis failed"))
-            
-            # Extract results
-            combined = result.get("combined_analysis", {})
-            const_type = combined.get("constitutional_type", "Unknown")
-            const_strength = combined.get("constitutional_strength", "Unknown")
-            
+    except FileNotFoundError:
+        raise PermanentJobError("Iris image missing from blob store")
+    
+    # Run AI analysis - no pooled connection is held during the model calls
+    result = await iridology_analyzer.analyse_bilateral(
+        left_eye_image,
+        right_eye_image,
+        patient_info,
+        left_media_type=left_media_type,
+        right_media_type=right_media_type
+    )
+    
+    if not result["success"]:
+        raise RuntimeError(result.get("error", "Analysis failed"))
+    
+    # Extract results
+    combined = result.get("combined_analysis", {})
+    const_type = combined.get("constitutional_type", "Unknown")
+    const_strength = combined.get("constitutional_strength", "Unknown")
+    therapy_priorities = combined.get("therapy_priorities", [])
+    gp_summary = combined.get("gp_consultation_summary", {})
+    
+    async with get_db_connection() as conn:
+        async with conn.transaction():
             # Update analysis with results
             await conn.execute(
                 """
@@ -2810,28 +2710,34 @@ async def analyse_iris_images(
                 analysis_id
             )
             
-            # Store therapy recommendations
-            therapy_priorities = combined.get("therapy_priorities", [])
-            for therapy in therapy_priorities:
-                await conn.execute(
-                    """
-                    INSERT INTO iridology_therapy_recommendations (
-                        analysis_id, therapy_code, therapy_name, priority_level,
-                        recommendation_reason, expected_benefits,
-                        diabetes_specific
-                    ) VALUES ($1, $2, $3, $4, $5, $6, $7)
-                    """,
-                    analysis_id,
-                    therapy.get("code", ""),
-                    therapy.get("name", ""),
-                    therapy.get("priority", 5),
-                    therapy.get("reason", ""),
-                    therapy.get("expected_benefits", ""),
-                    therapy.get("diabetes_specific", False)
-                )
+            # Store therapy recommendations (replacing any from an earlier run)
+            await conn.execute(
+                "DELETE FROM iridology_therapy_recommendations WHERE analysis_id = $1",
+                analysis_id
+            )
+            await conn.executemany(
+                """
+                INSERT INTO iridology_therapy_recommendations (
+                    analysis_id, therapy_code, therapy_name, priority_level,
+                    recommendation_reason, expected_benefits,
+                    diabetes_specific
+                ) VALUES ($1, $2, $3, $4, $5, $6, $7)
+                """,
+                [
+                    (
+                        analysis_id,
+                        therapy.get("code", ""),
+                        therapy.get("name", ""),
+                        therapy.get("priority", 5),
+                        therapy.get("reason", ""),
+                        therapy.get("expected_benefits", ""),
+                        therapy.get("diabetes_specific", False)
+                    )
+                    for therapy in therapy_priorities
+                ]
+            )
             
             # Check if GP consultation recommended
-            gp_summary = combined.get("gp_consultation_summary", {})
             if gp_summary.get("recommended"):
                 await conn.execute(
                     """
@@ -2843,114 +2749,188 @@ async def analyse_iris_images(
                     ", ".join(gp_summary.get("reasons", [])),
                     analysis_id
                 )
-            
-            return {
-                "success": True,
-                "analysis_id": analysis_id,
-                "constitutional_type": const_type,
-                "constitutional_strength": const_strength,
-                "confidence_score": result.get("confidence_score", 0),
-                "gp_consultation_recommended": gp_summary.get("recommended", False)
-            }
-            
-        finally:
-            await conn.close()
-            
-    except HTTPException:
-        raise
-    except Exception as e:
-        # Mark as failed
-        try:
-            conn2 = await asyncpg.connect(
-                host=DB_HOST, port=int(DB_PORT), user=DB_USER, password=DB_PASSWORD, database=DB_NAME
+    
+    return {
+        "analysis_id": analysis_id,
+        "constitutional_type": const_type,
+        "constitutional_strength": const_strength,
+        "confidence_score": result.get("confidence_score", 0),
+        "gp_consultation_recommended": gp_summary.get("recommended", False),
+        "partial": result.get("partial", False),
+        "failed_eyes": result.get("failed_eyes", []),
+        "cache_hit": result.get("cache_hit", False)
+    }
+
+
+@app.post("/api/v1/iridology/{analysis_id}/analyse", status_code=202)
+async def analyse_iris_images(
+    analysis_id: int,
+    current_user: dict = Depends(get_current_user),
+    conn: asyncpg.Connection = Depends(get_db)
+):
+    """Queue Claude AI analysis of iris images - poll /status or /results for the outcome"""
+    
+    try:
+        analysis = await conn.fetchrow(
+            """
+            SELECT id,
+                   left_eye_blob_key IS NOT NULL AS has_left_eye,
+                   right_eye_blob_key IS NOT NULL AS has_right_eye
+            FROM iridology_analyses
+            WHERE id = $1
+            """,
+            analysis_id,
+        )
+        
+        if not analysis:
+            raise HTTPException(status_code=404, detail="Analysis not found")
+        
+        if not analysis["has_left_eye"] or not analysis["has_right_eye"]:
+            raise HTTPException(status_code=400, detail="Images not uploaded")
+        
+        async with conn.transaction():
+            job_id = await enqueue_job(
+                conn,
+                "iridology_analysis",
+                {"analysis_id": analysis_id},
+                dedupe_key=f"iridology_analysis:{analysis_id}"
             )
-            await conn2.execute(
+            await conn.execute(
                 """
                 UPDATE iridology_analyses 
-                SET status = 'failed',
-                    error_message = $1,
+                SET status = 'pending',
+                    error_message = NULL,
                     updated_at = NOW()
-                WHERE id = $2
+                WHERE id = $1 AND status <> 'processing'
                 """,
-                str(e),
                 analysis_id
             )
-            await conn2.close()
-        except:
-            pass
+        
+        return {
+            "success": True,
+            "analysis_id": analysis_id,
+            "job_id": job_id,
+            "status": "queued",
+            "status_url": f"/api/v1/iridology/{analysis_id}/status",
+            "results_url": f"/api/v1/iridology/{analysis_id}/results"
+        }
+            
+    except HTTPException:
+        raise
+    except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 
-@app.get("/api/v1/iridology/{analysis_id}/results")
-async def get_iridology_results(
+@app.get("/api/v1/iridology/{analysis_id}/status")
+async def get_iridology_status(
     analysis_id: int,
-    current_user: dict = Depends(get_current_user)
+    current_user: dict = Depends(get_current_user),
+    conn: asyncpg.Connection = Depends(get_db)
 ):
-    """Get complete iridology analysis results"""
+    """Lightweight progress check for a queued/running analysis"""
     
     try:
-        conn = await asyncpg.connect(
-            host=DB_HOST, port=int(DB_PORT), user=DB_USER, password=DB_PASSWORD, database=DB_NAME
+        analysis = await conn.fetchrow(
+            """
+            SELECT status, error_message, processing_started_at, processing_completed_at
+            FROM iridology_analyses
+            WHERE id = $1
+            """,
+            analysis_id
         )
         
-        try:
-            # Get analysis
-            analysis = await conn.fetchrow(
-                """
-                SELECT ia.*, p.first_name, p.last_name, p.patient_number
-                FROM iridology_analyses ia
-                JOIN patients p ON ia.patient_id = p.id
-                WHERE ia.id = $1
-                """,
-                analysis_id)
+        if not analysis:
+            raise HTTPException(status_code=404, detail="Analysis not found")
+        
+        job = await get_latest_job(conn, f"iridology_analysis:{analysis_id}")
+        
+        return {
+            "success": True,
+            "analysis_id": analysis_id,
+            "status": analysis["status"],
+            "error_message": analysis["error_message"],
+            "processing_started_at": analysis["processing_started_at"].isoformat() if analysis["processing_started_at"] else None,
+            "processing_completed_at": analysis["processing_completed_at"].isoformat() if analysis["processing_completed_at"] else None,
+            "job": {
+                "id": job["id"],
+                "status": job["status"],
+                "attempts": job["attempts"],
+                "max_attempts": job["max_attempts"],
+                "next_attempt_at": job["run_after"].isoformat() if job["status"] == "queued" else None,
+                "last_error": job["last_error"],
+                "result": job["result"]
+            } if job else None
+        }
             
-            if not analysis:
-                raise HTTPException(status_code=404, detail="Analysis not found")
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@app.get("/api/v1/iridology/{analysis_id}/results")
+async def get_iridology_results(
+    analysis_id: int,
+    current_user: dict = Depends(get_current_user),
+    conn: asyncpg.Connection = Depends(get_db)
+):
+    """Get complete iridology analysis results"""
+    
+    try:
+        # Get analysis
+        analysis = await conn.fetchrow(
+            """
+            SELECT ia.*, p.first_name, p.last_name, p.patient_number
+            FROM iridology_analyses ia
+            JOIN patients p ON ia.patient_id = p.id
+            WHERE ia.id = $1
+            """,
+            analysis_id)
             
-            # Get therapy recommendations
-            therapies = await conn.fetch(
-                """
-                SELECT * FROM iridology_therapy_recommendations
-                WHERE analysis_id = $1
-                ORDER BY priority_level
-                """,
-                analysis_id
-            )
+        if not analysis:
+            raise HTTPException(status_code=404, detail="Analysis not found")
             
-            return {
-                "success": True,
-                "patient": {
-                    "first_name": analysis["first_name"],
-                    "last_name": analysis["last_name"],
-                    "patient_number": analysis["patient_number"]
-                },
-                "analysis": {
-                    "id": analysis["id"],
-                    "analysis_number": analysis["analysis_number"],
-                    "constitutional_type": analysis["constitutional_type"],
-                    "constitutional_strength": analysis["constitutional_strength"],
-                    "confidence_score": float(analysis["ai_confidence_score"]) if analysis["ai_confidence_score"] else 0,
-                    "status": analysis["status"],
-                    "combined_analysis": json.loads(analysis["combined_analysis"]) if analysis["combined_analysis"] else {},
-                    "gp_referral_recommended": analysis["gp_referral_recommended"],
-                    "gp_referral_reason": analysis["gp_referral_reason"],
-                    "created_at": analysis["created_at"].isoformat()
-                },
-                "therapy_recommendations": [
-                    {
-                        "code": t["therapy_code"],
-                        "name": t["therapy_name"],
-                        "priority": t["priority_level"],
-                        "reason": t["recommendation_reason"],
-                        "expected_benefits": t["expected_benefits"],
-                        "diabetes_specific": t["diabetes_specific"]
-                    }
-                    for t in therapies
-                ]
-            }
+        # Get therapy recommendations
+        therapies = await conn.fetch(
+            """
+            SELECT * FROM iridology_therapy_recommendations
+            WHERE analysis_id = $1
+            ORDER BY priority_level
+            """,
+            analysis_id
+        )
             
-        finally:
-            await conn.close()
+        return {
+            "success": True,
+            "patient": {
+                "first_name": analysis["first_name"],
+                "last_name": analysis["last_name"],
+                "patient_number": analysis["patient_number"]
+            },
+            "analysis": {
+                "id": analysis["id"],
+                "analysis_number": analysis["analysis_number"],
+                "constitutional_type": analysis["constitutional_type"],
+                "constitutional_strength": analysis["constitutional_strength"],
+                "confidence_score": float(analysis["ai_confidence_score"]) if analysis["ai_confidence_score"] else 0,
+                "status": analysis["status"],
+                "combined_analysis": json.loads(analysis["combined_analysis"]) if analysis["combined_analysis"] else {},
+                "gp_referral_recommended": analysis["gp_referral_recommended"],
+                "gp_referral_reason": analysis["gp_referral_reason"],
+                "created_at": analysis["created_at"].isoformat()
+            },
+            "therapy_recommendations": [
+                {
+                    "code": t["therapy_code"],
+                    "name": t["therapy_name"],
+                    "priority": t["priority_level"],
+                    "reason": t["recommendation_reason"],
+                    "expected_benefits": t["expected_benefits"],
+                    "diabetes_specific": t["diabetes_specific"]
+                }
+                for t in therapies
+            ]
+        }
             
     except HTTPException:
         raise
@@ -2958,77 +2938,98 @@ async def get_iridology_results(
         raise HTTPException(status_code=500, detail=str(e))
 
 
+@app.get("/api/v1/iridology/{analysis_id}/images/{eye}")
+async def get_iris_image(
+    analysis_id: int,
+    eye: str,
+    request: Request,
+    current_user: dict = Depends(get_current_user),
+    conn: asyncpg.Connection = Depends(get_db)
+):
+    """Stream an iris image from the blob store (supports ETag and Range)"""
+    
+    if eye not in ("left", "right"):
+        raise HTTPException(status_code=404, detail="Eye must be 'left' or 'right'")
+    
+    blob_key = await conn.fetchval(
+        """
+        SELECT CASE WHEN $2 = 'left' THEN left_eye_blob_key ELSE right_eye_blob_key END
+        FROM iridology_analyses
+        WHERE id = $1
+        """,
+        analysis_id,
+        eye
+    )
+    
+    if not blob_key:
+        raise HTTPException(status_code=404, detail="Image not found")
+    
+    return await asyncio.to_thread(blob_response, blob_key, request.headers)
+
+
 @app.get("/api/v1/iridology/{analysis_id}/download-pdf")
 async def download_iridology_pdf(
     analysis_id: int,
+    request: Request,
     current_user: dict = Depends(get_current_user)
 ):
-    """Download iridology analysis as PDF report"""
+    """Download iridology analysis as PDF report (cached on disk, see report_cache.py)"""
     try:
-        from fastapi.responses import Response
+        analysis, html_content = await build_iridology_report(analysis_id)
+        key = source_key(IRIDOLOGY_TEMPLATE_VERSION, analysis)
         
-        # Generate PDF
-        pdf_bytes = await generate_iridology_pdf(analysis_id)
-        
-        # Return as downloadable file
-        return Response(
-            content=pdf_bytes,
-            media_type="application/pdf",
-            headers={
-                "Content-Disposition": f"attachment; filename=iridology_report_{analysis_id}.pdf"
-            }
+        # Generate PDF only when the analysis changed; return as downloadable file
+        return await cached_report(
+            "iridology", analysis_id, key, lambda: render_html(html_content),
+            request.headers, f"iridology_report_{analysis_id}.pdf"
         )
         
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.get("/api/v1/iridology/{analysis_id}/report")
 async def view_iridology_report(
     analysis_id: int,
-    current_user: dict = Depends(get_current_user)
+    current_user: dict = Depends(get_current_user),
+    conn: asyncpg.Connection = Depends(get_db)
 ):
     """View iridology analysis report in browser"""
     try:
-        conn = await asyncpg.connect(
-            host=DB_HOST, port=int(DB_PORT), user=DB_USER, password=DB_PASSWORD, database=DB_NAME
-        )
-        
-        try:
-            # Get analysis with patient info
-            analysis = await conn.fetchrow("""
-                SELECT
-                    ia.*,
-                    p.first_name, p.last_name, p.patient_number, p.date_of_birth
-                FROM iridology_analyses ia
-                JOIN patients p ON ia.patient_id = p.id
-                WHERE ia.id = $1
-            """, analysis_id)
+        # Get analysis with patient info
+        analysis = await conn.fetchrow("""
+            SELECT
+                ia.*,
+                p.first_name, p.last_name, p.patient_number, p.date_of_birth
+            FROM iridology_analyses ia
+            JOIN patients p ON ia.patient_id = p.id
+            WHERE ia.id = $1
+        """, analysis_id)
             
-            if not analysis:
-                raise HTTPException(status_code=404, detail="Analysis not found")
+        if not analysis:
+            raise HTTPException(status_code=404, detail="Analysis not found")
             
-            # Return report data
-            return {
-                "success": True,
-                "patient": {
-                    "name": f"{analysis['first_name']} {analysis['last_name']}",
-                    "patient_number": analysis['patient_number'],
-                    "date_of_birth": str(analysis['date_of_birth']) if analysis['date_of_birth'] else None
-                },
-                "analysis": {
-                    "id": analysis['id'],
-                    "analysis_number": analysis['analysis_number'],
-                    "date": analysis['created_at'].strftime('%d %B %Y'),
-                    "constitutional_type": analysis['constitutional_type'],
-                    "constitutional_strength": analysis['constitutional_strength'],
-                    "confidence_score": float(analysis['ai_confidence_score']) if analysis['ai_confidence_score'] else 0,
-                    "gp_referral_recommended": analysis['gp_referral_recommended'],
-                    "gp_referral_reason": analysis['gp_referral_reason']
-                },
-                "report_text": json.loads(analysis["combined_analysis"]).get("raw_text", "") if analysis["combined_analysis"] else ""
-            }
-        finally:
-            await conn.close()
+        # Return report data
+        return {
+            "success": True,
+            "patient": {
+                "name": f"{analysis['first_name']} {analysis['last_name']}",
+                "patient_number": analysis['patient_number'],
+                "date_of_birth": str(analysis['date_of_birth']) if analysis['date_of_birth'] else None
+            },
+            "analysis": {
+                "id": analysis['id'],
+                "analysis_number": analysis['analysis_number'],
+                "date": analysis['created_at'].strftime('%d %B %Y'),
+                "constitutional_type": analysis['constitutional_type'],
+                "constitutional_strength": analysis['constitutional_strength'],
+                "confidence_score": float(analysis['ai_confidence_score']) if analysis['ai_confidence_score'] else 0,
+                "gp_referral_recommended": analysis['gp_referral_recommended'],
+                "gp_referral_reason": analysis['gp_referral_reason']
+            },
+            "report_text": json.loads(analysis["combined_analysis"]).get("raw_text", "") if analysis["combined_analysis"] else ""
+        }
             
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
@@ -3037,50 +3038,57 @@ async def view_iridology_report(
 @app.get("/api/v1/iridology/recent")
 async def get_recent_iridology_analyses(
     limit: int = 5,
-    current_user: dict = Depends(get_current_user)
+    cursor: str = None,
+    current_user: dict = Depends(get_current_user),
+    conn: asyncpg.Connection = Depends(get_db)
 ):
     """Get recent iridology analyses for current practitioner"""
+    limit = clamp_limit(limit)
+    after = decode_cursor(cursor, 2)
     try:
-        conn = await asyncpg.connect(
-            host=DB_HOST, port=int(DB_PORT), user=DB_USER, password=DB_PASSWORD, database=DB_NAME
+        params = [current_user["id"]]
+        keyset = ""
+        if after:
+            keyset = "AND " + keyset_condition(["ia.created_at", "ia.id"], 2)
+            params.extend(after)
+        analyses = await conn.fetch(
+            f"""
+            SELECT 
+                ia.id,
+                ia.analysis_number,
+                ia.status,
+                ia.created_at,
+                p.first_name || ' ' || p.last_name as patient_name,
+                p.patient_number
+            FROM iridology_analyses ia
+            JOIN patients p ON ia.patient_id = p.id
+            WHERE ia.practitioner_id = $1 {keyset}
+            ORDER BY ia.created_at DESC, ia.id DESC
+            LIMIT ${len(params) + 1}
+            """,
+            *params,
+            limit + 1
+        )
+        analyses, next_cursor = split_page(analyses, limit, ("created_at", "id"))
+        total = await estimate_count(
+            conn, "SELECT 1 FROM iridology_analyses WHERE practitioner_id = $1", current_user["id"]
         )
 
-        try:
-            analyses = await conn.fetch(
-                """
-                SELECT 
-                    ia.id,
-                    ia.analysis_number,
-                    ia.status,
-                    ia.created_at,
-                    p.first_name || ' ' || p.last_name as patient_name,
-                    p.patient_number
-                FROM iridology_analyses ia
-                JOIN patients p ON ia.patient_id = p.id
-                WHERE ia.practitioner_id = $1
-                ORDER BY ia.created_at DESC
-                LIMIT $2
-                """,
-                current_user["id"],
-                limit
-            )
-
-            return {
-                "success": True,
-                "analyses": [
-                    {
-                        "id": a["id"],
-                        "analysis_number": a["analysis_number"],
-                        "patient_name": a["patient_name"],
-                        "patient_number": a["patient_number"],
-                        "status": a["status"],
-                        "created_at": a["created_at"].strftime("%d %b %Y %H:%M")
-                    }
-                    for a in analyses
-                ]
-            }
-        finally:
-            await conn.close()
+        return {
+            **page_info(next_cursor, total, estimated=True),
+            "success": True,
+            "analyses": [
+                {
+                    "id": a["id"],
+                    "analysis_number": a["analysis_number"],
+                    "patient_name": a["patient_name"],
+                    "patient_number": a["patient_number"],
+                    "status": a["status"],
+                    "created_at": a["created_at"].strftime("%d %b %Y %H:%M")
+                }
+                for a in analyses
+            ]
+        }
 
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
@@ -3093,7 +3101,9 @@ async def get_recent_iridology_analyses(
 @app.get("/api/v1/patient/available-slots")
 async def get_available_appointment_slots(
     date: str = None,
-    authorization: str = Header(None)
+    limit: int = 20,
+    authorization: str = Header(None),
+    conn: asyncpg.Connection = Depends(get_db)
 ):
     """Get available appointment slots for booking - PATIENT ACCESS"""
     if not authorization:
@@ -3112,17 +3122,11 @@ async def get_available_appointment_slots(
             raise HTTPException(status_code=401, detail="Invalid token")
         
         # Get clinic_id from patient record
-        conn_temp = await asyncpg.connect(
-            host=DB_HOST, port=int(DB_PORT), user=DB_USER,
-            password=DB_PASSWORD, database=DB_NAME
-        )
         
-        patient_info = await conn_temp.fetchrow(
+        patient_info = await conn.fetchrow(
             "SELECT clinic_id FROM patients WHERE id = $1", patient_id
         )
         
-        await conn_temp.close()
-        
         if not patient_info:
             raise HTTPException(status_code=403, detail="Patient not found")
         
@@ -3138,55 +3142,20 @@ async def get_available_appointment_slots(
         
         end_date = start_date + timedelta(days=7)
         
-        conn = await asyncpg.connect(
-            host=DB_HOST, port=int(DB_PORT), user=DB_USER,
-            password=DB_PASSWORD, database=DB_NAME
-        )
-        
-        # Get practitioners from this clinic
-        practitioners = await conn.fetch("""
-            SELECT id, full_name FROM users 
-            WHERE clinic_id = $1 
-            AND role IN ('clinic_admin', 'clinic_user')
-            AND status = 'active'
-        """, clinic_id)
-        
-        # Generate available slots (9 AM to 5 PM, hourly)
-        available_slots = []
-        current_date = start_date
-        
-        while current_date <= end_date:
-            # Skip weekends (optional)
-            if current_date.weekday() < 5:  # Monday = 0, Friday = 4
-                for hour in range(9, 17):  # 9 AM to 5 PM
-                    from datetime import time as dt_time
-                    time_slot = dt_time(hour, 0, 0)  # Create proper time object
-                    time_slot_str = f"{hour:02d}:00:00"
-                    
-                    # Check if slot is already booked
-                    existing = await conn.fetchval("""
-                        SELECT COUNT(*) FROM appointments
-                        WHERE appointment_date = $1
-                        AND appointment_time = $2
-                        AND clinic_id = $3
-                        AND status != 'CANCELLED'
-                    """, current_date, time_slot, clinic_id)
-                    
-                    if existing == 0:
-                        available_slots.append({
-                            "date": str(current_date),
-                            "time": time_slot_str,
-                            "available": True
-                        })
-            
-            current_date += timedelta(days=1)
+        # Practitioners double as per-slot capacity
+        practitioners = await load_practitioners(conn, clinic_id)
         
-        await conn.close()
+        # One query for all bookings in range; slots are worked out in memory
+        available_slots = await find_available_slots(
+            conn, clinic_id, start_date, end_date,
+            limit=min(max(limit, 1), 100),
+            practitioners=practitioners
+        )
         
         return {
             "success": True,
             "practitioners": [{"id": p['id'], "name": p['full_name']} for p in practitioners],
-            "available_slots": available_slots[:20]  # Limit to 20 slots
+            "available_slots": available_slots
         }
         
     except Exception as e:
@@ -3195,7 +3164,7 @@ async def get_available_appointment_slots(
 
 
 @app.post("/api/v1/patient/book-appointment")
-async def book_patient_appointment(data: dict, authorization: str = Header(None)):
+async def book_patient_appointment(data: dict, authorization: str = Header(None), conn: asyncpg.Connection = Depends(get_db)):
     """Book appointment - PATIENT SELF-BOOKING"""
     if not authorization:
         raise HTTPException(status_code=401, detail="No authorization token")
@@ -3213,17 +3182,11 @@ async def book_patient_appointment(data: dict, authorization: str = Header(None)
             raise HTTPException(status_code=401, detail="Invalid token")
         
         # Get clinic_id from patient record
-        conn_temp = await asyncpg.connect(
-            host=DB_HOST, port=int(DB_PORT), user=DB_USER,
-            password=DB_PASSWORD, database=DB_NAME
-        )
         
-        patient_info = await conn_temp.fetchrow(
+        patient_info = await conn.fetchrow(
             "SELECT clinic_id FROM patients WHERE id = $1", patient_id
         )
         
-        await conn_temp.close()
-        
         if not patient_info:
             raise HTTPException(status_code=403, detail="Patient not found")
         
@@ -3237,11 +3200,6 @@ async def book_patient_appointment(data: dict, authorization: str = Header(None)
         if not appointment_date or not appointment_time:
             raise HTTPException(status_code=400, detail="Date and time required")
         
-        conn = await asyncpg.connect(
-            host=DB_HOST, port=int(DB_PORT), user=DB_USER,
-            password=DB_PASSWORD, database=DB_NAME
-        )
-        
         # Verify patient exists and get info
         patient = await conn.fetchrow("""
             SELECT id, first_name, last_name, email, clinic_id
@@ -3250,32 +3208,37 @@ async def book_patient_appointment(data: dict, authorization: str = Header(None)
         """, patient_id, clinic_id)
         
         if not patient:
-            await conn.close()
             raise HTTPException(status_code=403, detail="Access denied")
         
-        # Check if slot is still available
-        existing = await conn.fetchval("""
-            SELECT COUNT(*) FROM appointments
-            WHERE appointment_date = $1
-            AND appointment_time = $2
-            AND clinic_id = $3
-            AND status != 'CANCELLED'
+        # Check if slot is still available - one overlapping booking per practitioner
+        existing = await conn.fetchval(f"""
+            SELECT COUNT(*) FROM appointments a
+            WHERE {overlap_condition("a", 1)}
+            AND a.clinic_id = $3
+            AND a.status != 'CANCELLED'
         """, appointment_date, appointment_time, clinic_id)
         
-        if existing > 0:
-            await conn.close()
+        practitioners = await load_practitioners(conn, clinic_id)
+        if existing >= max(len(practitioners), 1):
             raise HTTPException(status_code=409, detail="Time slot no longer available")
         
-        # Get a practitioner from the clinic (or let them choose)
+        # Get a practitioner who is free at this time (or let them choose)
         practitioner_id = data.get("practitioner_id")
         if not practitioner_id:
-            practitioner = await conn.fetchrow("""
-                SELECT id FROM users
-                WHERE clinic_id = $1
-                AND role IN ('clinic_admin', 'clinic_user')
-                AND status = 'active'
+            practitioner = await conn.fetchrow(f"""
+                SELECT u.id FROM users u
+                WHERE u.clinic_id = $1
+                AND u.role IN ('clinic_admin', 'clinic_user')
+                AND u.status = 'active'
+                AND NOT EXISTS (
+                    SELECT 1 FROM appointments a
+                    WHERE a.practitioner_id = u.id
+                    AND {overlap_condition("a", 2)}
+                    AND a.status != 'CANCELLED'
+                )
+                ORDER BY u.id
                 LIMIT 1
-            """, clinic_id)
+            """, clinic_id, appointment_date, appointment_time)
             practitioner_id = practitioner['id'] if practitioner else None
         
         # Create appointment with PENDING status (requires clinic confirmation)
@@ -3289,8 +3252,6 @@ async def book_patient_appointment(data: dict, authorization: str = Header(None)
         """, patient_id, clinic_id, practitioner_id, 
             appointment_date, appointment_time, appointment_type, notes)
         
-        await conn.close()
-        
         # Send confirmation email
         patient_name = f"{patient['first_name']} {patient['last_name']}"
         if patient['email']:
@@ -3328,7 +3289,7 @@ async def book_patient_appointment(data: dict, authorization: str = Header(None)
 
 
 @app.delete("/api/v1/patient/appointments/{appointment_id}")
-async def cancel_patient_appointment(appointment_id: int, authorization: str = Header(None)):
+async def cancel_patient_appointment(appointment_id: int, authorization: str = Header(None), conn: asyncpg.Connection = Depends(get_db)):
     """Cancel appointment - PATIENT ACCESS"""
     if not authorization:
         raise HTTPException(status_code=401, detail="No authorization token")
@@ -3345,27 +3306,16 @@ async def cancel_patient_appointment(appointment_id: int, authorization: str = H
             raise HTTPException(status_code=401, detail="Invalid token")
         
         # Get clinic_id from patient record
-        conn_temp = await asyncpg.connect(
-            host=DB_HOST, port=int(DB_PORT), user=DB_USER,
-            password=DB_PASSWORD, database=DB_NAME
-        )
         
-        patient_info = await conn_temp.fetchrow(
+        patient_info = await conn.fetchrow(
             "SELECT clinic_id FROM patients WHERE id = $1", patient_id
         )
         
-        await conn_temp.close()
-        
         if not patient_info:
             raise HTTPException(status_code=403, detail="Patient not found")
         
         clinic_id = patient_info['clinic_id']
         
-        conn = await asyncpg.connect(
-            host=DB_HOST, port=int(DB_PORT), user=DB_USER,
-            password=DB_PASSWORD, database=DB_NAME
-        )
-        
         # Verify this appointment belongs to this patient
         appointment = await conn.fetchrow("""
             SELECT id FROM appointments
@@ -3373,7 +3323,6 @@ async def cancel_patient_appointment(appointment_id: int, authorization: str = H
         """, appointment_id, patient_id, clinic_id)
         
         if not appointment:
-            await conn.close()
             raise HTTPException(status_code=404, detail="Appointment not found")
         
         # Cancel appointment
@@ -3383,8 +3332,6 @@ async def cancel_patient_appointment(appointment_id: int, authorization: str = H
             WHERE id = $1
         """, appointment_id)
         
-        await conn.close()
-        
         return {"success": True, "message": "Appointment cancelled"}
         
     except HTTPException:
@@ -3396,17 +3343,12 @@ async def cancel_patient_appointment(appointment_id: int, authorization: str = H
 
 # Staff confirm/decline appointment endpoints
 @app.post("/api/v1/appointments/{appointment_id}/confirm")
-async def confirm_appointment(appointment_id: int, authorization: str = Header(None)):
+async def confirm_appointment(appointment_id: int, authorization: str = Header(None), conn: asyncpg.Connection = Depends(get_db)):
     """Confirm pending appointment - STAFF ONLY"""
     if not authorization or not authorization.startswith("Bearer "):
         raise HTTPException(status_code=401, detail="Missing or invalid token")
     
     try:
-        conn = await asyncpg.connect(
-            host=DB_HOST, port=int(DB_PORT), user=DB_USER,
-            password=DB_PASSWORD, database=DB_NAME
-        )
-        
         # Get appointment details
         appointment = await conn.fetchrow("""
             SELECT a.*, p.first_name, p.last_name, p.email, c.name as clinic_name
@@ -3417,7 +3359,6 @@ async def confirm_appointment(appointment_id: int, authorization: str = Header(N
         """, appointment_id)
         
         if not appointment:
-            await conn.close()
             raise HTTPException(status_code=404, detail="Appointment not found or already processed")
         
         # Update to SCHEDULED
@@ -3427,8 +3368,6 @@ async def confirm_appointment(appointment_id: int, authorization: str = Header(N
             WHERE id = $1
         """, appointment_id)
         
-        await conn.close()
-        
         # Send confirmation email to patient
         patient_name = f"{appointment['first_name']} {appointment['last_name']}"
         if appointment['email']:
@@ -3459,7 +3398,7 @@ async def confirm_appointment(appointment_id: int, authorization: str = Header(N
 
 
 @app.post("/api/v1/appointments/{appointment_id}/decline")
-async def decline_appointment(appointment_id: int, data: dict, authorization: str = Header(None)):
+async def decline_appointment(appointment_id: int, data: dict, authorization: str = Header(None), conn: asyncpg.Connection = Depends(get_db)):
     """Decline pending appointment - STAFF ONLY"""
     if not authorization or not authorization.startswith("Bearer "):
         raise HTTPException(status_code=401, detail="Missing or invalid token")
@@ -3467,11 +3406,6 @@ async def decline_appointment(appointment_id: int, data: dict, authorization: st
     try:
         reason = data.get("reason", "No reason provided")
         
-        conn = await asyncpg.connect(
-            host=DB_HOST, port=int(DB_PORT), user=DB_USER,
-            password=DB_PASSWORD, database=DB_NAME
-        )
-        
         # Get appointment details
         appointment = await conn.fetchrow("""
             SELECT a.*, p.first_name, p.last_name, p.email
@@ -3481,7 +3415,6 @@ async def decline_appointment(appointment_id: int, data: dict, authorization: st
         """, appointment_id)
         
         if not appointment:
-            await conn.close()
             raise HTTPException(status_code=404, detail="Appointment not found or already processed")
         
         # Update to CANCELLED
@@ -3491,8 +3424,6 @@ async def decline_appointment(appointment_id: int, data: dict, authorization: st
             WHERE id = $1
         """, appointment_id, reason)
         
-        await conn.close()
-        
         # TODO: Send decline notification email to patient
         print(f"Appointment {appointment_id} declined. Patient: {appointment['email']}")
         
@@ -3512,8 +3443,26 @@ async def decline_appointment(appointment_id: int, data: dict, authorization: st
 # SUPER ADMIN - CLINIC MANAGEMENT
 # ============================================================================
 
+async def _load_superadmin_stats(conn) -> dict:
+    """System-wide counts for the super admin dashboard"""
+    total_clinics = await conn.fetchval("SELECT COUNT(*) FROM clinics")
+    active_clinics = await conn.fetchval("SELECT COUNT(*) FROM clinics WHERE status = 'active'")
+    pending_clinics = await conn.fetchval("SELECT COUNT(*) FROM clinics WHERE status = 'pending'")
+    total_patients = await conn.fetchval("SELECT COUNT(*) FROM patients")
+    total_analyses = await conn.fetchval("SELECT COUNT(*) FROM iridology_analyses")
+    total_appointments = await conn.fetchval("SELECT COUNT(*) FROM appointments")
+    return {
+        "total_clinics": total_clinics,
+        "active_clinics": active_clinics,
+        "pending_clinics": pending_clinics,
+        "total_patients": total_patients,
+        "total_analyses": total_analyses,
+        "total_appointments": total_appointments
+    }
+
+
 @app.get("/api/v1/superadmin/stats")
-async def get_superadmin_stats(authorization: str = Header(None)):
+async def get_superadmin_stats(authorization: str = Header(None), conn: asyncpg.Connection = Depends(get_db)):
     """Get system-wide statistics - SUPER ADMIN ONLY"""
     if not authorization or not authorization.startswith("Bearer "):
         raise HTTPException(status_code=401, detail="Missing or invalid token")
@@ -3522,31 +3471,9 @@ async def get_superadmin_stats(authorization: str = Header(None)):
         # Verify super admin role
         # TODO: Add proper JWT validation for super admin
         
-        conn = await asyncpg.connect(
-            host=DB_HOST, port=int(DB_PORT), user=DB_USER,
-            password=DB_PASSWORD, database=DB_NAME
-        )
-        
-        # Get system-wide stats
-        total_clinics = await conn.fetchval("SELECT COUNT(*) FROM clinics")
-        active_clinics = await conn.fetchval("SELECT COUNT(*) FROM clinics WHERE status = 'active'")
-        pending_clinics = await conn.fetchval("SELECT COUNT(*) FROM clinics WHERE status = 'pending'")
-        total_patients = await conn.fetchval("SELECT COUNT(*) FROM patients")
-        total_analyses = await conn.fetchval("SELECT COUNT(*) FROM iridology_analyses")
-        total_appointments = await conn.fetchval("SELECT COUNT(*) FROM appointments")
-        
-        await conn.close()
-        
         return {
             "success": True,
-            "stats": {
-                "total_clinics": total_clinics,
-                "active_clinics": active_clinics,
-                "pending_clinics": pending_clinics,
-                "total_patients": total_patients,
-                "total_analyses": total_analyses,
-                "total_appointments": total_appointments
-            }
+            "stats": await get_or_load("superadmin_stats", lambda: _load_superadmin_stats(conn), ttl=60)
         }
     except Exception as e:
         print(f"Super admin stats error: {str(e)}")
@@ -3554,17 +3481,12 @@ async def get_superadmin_stats(authorization: str = Header(None)):
 
 
 @app.get("/api/v1/superadmin/clinics")
-async def get_all_clinics(authorization: str = Header(None)):
+async def get_all_clinics(authorization: str = Header(None), conn: asyncpg.Connection = Depends(get_db)):
     """Get all clinics - SUPER ADMIN ONLY"""
     if not authorization or not authorization.startswith("Bearer "):
         raise HTTPException(status_code=401, detail="Missing or invalid token")
     
     try:
-        conn = await asyncpg.connect(
-            host=DB_HOST, port=int(DB_PORT), user=DB_USER,
-            password=DB_PASSWORD, database=DB_NAME
-        )
-        
         clinics = await conn.fetch("""
             SELECT c.id, c.name, c.address, c.phone, c.email, c.status, c.created_at,
                    COUNT(DISTINCT p.id) as patient_count,
@@ -3576,8 +3498,6 @@ async def get_all_clinics(authorization: str = Header(None)):
             ORDER BY c.created_at DESC
         """)
         
-        await conn.close()
-        
         return {
             "success": True,
             "clinics": [dict(c) for c in clinics]
@@ -3588,7 +3508,7 @@ async def get_all_clinics(authorization: str = Header(None)):
 
 
 @app.post("/api/v1/superadmin/clinics")
-async def create_clinic(data: dict, authorization: str = Header(None)):
+async def create_clinic(data: dict, authorization: str = Header(None), conn: asyncpg.Connection = Depends(get_db)):
     """Create new clinic - SUPER ADMIN ONLY"""
     if not authorization or not authorization.startswith("Bearer "):
         raise HTTPException(status_code=401, detail="Missing or invalid token")
@@ -3604,15 +3524,9 @@ async def create_clinic(data: dict, authorization: str = Header(None)):
         if not all([clinic_name, clinic_email, admin_name, admin_email]):
             raise HTTPException(status_code=400, detail="Missing required fields")
         
-        conn = await asyncpg.connect(
-            host=DB_HOST, port=int(DB_PORT), user=DB_USER,
-            password=DB_PASSWORD, database=DB_NAME
-        )
-        
         # Check if clinic email already exists
         existing = await conn.fetchval("SELECT id FROM clinics WHERE email = $1", clinic_email)
         if existing:
-            await conn.close()
             raise HTTPException(status_code=409, detail="Clinic email already exists")
         
         # Create clinic with PENDING status
@@ -3629,8 +3543,7 @@ async def create_clinic(data: dict, authorization: str = Header(None)):
         temp_password = ''.join(secrets.choice(alphabet) for i in range(12))
         
         # Hash password
-        import bcrypt
-        hashed = bcrypt.hashpw(temp_password.encode('utf-8'), bcrypt.gensalt(rounds=12))
+        hashed = await hash_password(temp_password)
         
         # Create admin user for clinic
         admin_user = await conn.fetchrow("""
@@ -3638,9 +3551,7 @@ async def create_clinic(data: dict, authorization: str = Header(None)):
                 clinic_id, email, password_hash, full_name, role, status, created_at
             ) VALUES ($1, $2, $3, $4, 'clinic_admin', 'active', NOW())
             RETURNING id, email
-        """, clinic['id'], admin_email, hashed.decode('utf-8'), admin_name)
-        
-        await conn.close()
+        """, clinic['id'], admin_email, hashed, admin_name)
         
         # Send welcome email to clinic admin
         # TODO: Create clinic welcome email template
@@ -3672,17 +3583,12 @@ async def create_clinic(data: dict, authorization: str = Header(None)):
 
 
 @app.post("/api/v1/superadmin/clinics/{clinic_id}/activate")
-async def activate_clinic(clinic_id: int, authorization: str = Header(None)):
+async def activate_clinic(clinic_id: int, authorization: str = Header(None), conn: asyncpg.Connection = Depends(get_db)):
     """Activate clinic - SUPER ADMIN ONLY"""
     if not authorization or not authorization.startswith("Bearer "):
         raise HTTPException(status_code=401, detail="Missing or invalid token")
     
     try:
-        conn = await asyncpg.connect(
-            host=DB_HOST, port=int(DB_PORT), user=DB_USER,
-            password=DB_PASSWORD, database=DB_NAME
-        )
-        
         # Update clinic status
         await conn.execute("""
             UPDATE clinics 
@@ -3690,8 +3596,6 @@ async def activate_clinic(clinic_id: int, authorization: str = Header(None)):
             WHERE id = $1
         """, clinic_id)
         
-        await conn.close()
-        
         return {
             "success": True,
             "message": "Clinic activated successfully"
@@ -3702,17 +3606,12 @@ async def activate_clinic(clinic_id: int, authorization: str = Header(None)):
 
 
 @app.post("/api/v1/superadmin/clinics/{clinic_id}/deactivate")
-async def deactivate_clinic(clinic_id: int, authorization: str = Header(None)):
+async def deactivate_clinic(clinic_id: int, authorization: str = Header(None), conn: asyncpg.Connection = Depends(get_db)):
     """Deactivate clinic - SUPER ADMIN ONLY"""
     if not authorization or not authorization.startswith("Bearer "):
         raise HTTPException(status_code=401, detail="Missing or invalid token")
     
     try:
-        conn = await asyncpg.connect(
-            host=DB_HOST, port=int(DB_PORT), user=DB_USER,
-            password=DB_PASSWORD, database=DB_NAME
-        )
-        
         # Update clinic status
         await conn.execute("""
             UPDATE clinics 
@@ -3720,8 +3619,6 @@ async def deactivate_clinic(clinic_id: int, authorization: str = Header(None)):
             WHERE id = $1
         """, clinic_id)
         
-        await conn.close()
-        
         return {
             "success": True,
             "message": "Clinic deactivated successfully"
@@ -3732,29 +3629,21 @@ async def deactivate_clinic(clinic_id: int, authorization: str = Header(None)):
 
 
 @app.delete("/api/v1/superadmin/clinics/{clinic_id}")
-async def delete_clinic(clinic_id: int, authorization: str = Header(None)):
+async def delete_clinic(clinic_id: int, authorization: str = Header(None), conn: asyncpg.Connection = Depends(get_db)):
     """Delete clinic - SUPER ADMIN ONLY (use with caution)"""
     if not authorization or not authorization.startswith("Bearer "):
         raise HTTPException(status_code=401, detail="Missing or invalid token")
     
     try:
-        conn = await asyncpg.connect(
-            host=DB_HOST, port=int(DB_PORT), user=DB_USER,
-            password=DB_PASSWORD, database=DB_NAME
-        )
-        
         # Check if clinic has data
         patient_count = await conn.fetchval("SELECT COUNT(*) FROM patients WHERE clinic_id = $1", clinic_id)
         
         if patient_count > 0:
-            await conn.close()
             raise HTTPException(status_code=400, detail=f"Cannot delete clinic with {patient_count} patients. Deactivate instead.")
         
         # Delete clinic (cascade will handle related data)
         await conn.execute("DELETE FROM clinics WHERE id = $1", clinic_id)
         
-        await conn.close()
-        
         return {
             "success": True,
             "message": "Clinic deleted successfully"
@@ -3769,16 +3658,19 @@ async def delete_clinic(clinic_id: int, authorization: str = Header(None)):
 
 @app.get("/api/v1/me")
 async def get_current_user(authorization: str = Header(None)):
-    """Get current user information from JWT token"""
+    """Get current user information from JWT token (cached, see auth_cache.py)"""
     if not authorization or not authorization.startswith("Bearer "):
         raise HTTPException(status_code=401, detail="Missing or invalid token")
     try:
         token = authorization.replace("Bearer ", "")
         
-        # Use verify_token to decode JWT properly
-        token_data = verify_token(token)
-        if not token_data:
-            raise HTTPException(status_code=401, detail="Invalid or expired token")
+        token_data = auth_cache.get_token_claims(token)
+        if token_data is None:
+            # Use verify_token to decode JWT properly
+            token_data = verify_token(token)
+            if not token_data:
+                raise HTTPException(status_code=401, detail="Invalid or expired token")
+            auth_cache.store_token_claims(token, token_data, token_data.get('exp'))
         
         user_id = token_data.get('user_id')
         clinic_id = token_data.get('clinic_id')
@@ -3786,19 +3678,19 @@ async def get_current_user(authorization: str = Header(None)):
         if not user_id:
             return {"role": "clinic_user", "clinic_id": clinic_id}
         
+        cached = auth_cache.get_user(user_id, token_data.get('iat'))
+        if cached is not None:
+            return cached
+        
         # Get full user info from database
-        conn = await asyncpg.connect(
-            host=DB_HOST, port=int(DB_PORT), user=DB_USER,
-            password=DB_PASSWORD, database=DB_NAME
-        )
-        user = await conn.fetchrow(
-            "SELECT id, email, full_name, role, clinic_id FROM users WHERE id = $1",
-            user_id
-        )
-        await conn.close()
+        async with get_db_connection() as conn:
+            user = await conn.fetchrow(
+                "SELECT id, email, full_name, role, clinic_id FROM users WHERE id = $1",
+                user_id
+            )
         
         if user:
-            return {
+            current = {
                 "id": user['id'],
                 "user_id": user['id'],
                 "email": user['email'],
@@ -3806,6 +3698,8 @@ async def get_current_user(authorization: str = Header(None)):
                 "role": user['role'],
                 "clinic_id": user['clinic_id']
             }
+            auth_cache.store_user(user_id, token_data.get('iat'), current)
+            return current
         
         return {"id": user_id, "user_id": user_id, "clinic_id": clinic_id, "role": "clinic_user"}
     except HTTPException:
@@ -3831,238 +3725,134 @@ except Exception as e:
 # Added: 2025-11-26
 # ============================================
 
+async def _load_clinic_dashboard(conn, clinic_id: int, user_id: int) -> dict:
+    """Dashboard payload for one clinic user (cached by get_clinic_dashboard)"""
+    # Get clinic info
+    clinic = await conn.fetchrow("""
+        SELECT id, name, clinic_name, clinic_code, city, postcode,
+               subscription_tier, subscription_status, max_patients, max_staff,
+               features_enabled, phone, email
+        FROM clinics WHERE id = $1
+    """, clinic_id)
+    
+    # Get user info
+    user = await conn.fetchrow("""
+        SELECT id, full_name, email, role FROM users WHERE id = $1
+    """, user_id)
+    
+    # Headline counts from the clinic_stats counters
+    stats = await fetch_clinic_counts(conn, clinic_id)
+    
+    # Get today's appointment details
+    today_appointment_list = await conn.fetch("""
+        SELECT a.id, a.appointment_time, a.appointment_type, a.status,
+               p.first_name, p.last_name
+        FROM appointments a
+        JOIN patients p ON a.patient_id = p.id
+        WHERE a.clinic_id = $1 AND a.appointment_date = CURRENT_DATE
+        ORDER BY a.appointment_time
+    """, clinic_id)
+    
+    # Get recent activity
+    recent_patients = await conn.fetch("""
+        SELECT id, first_name, last_name, created_at
+        FROM patients WHERE clinic_id = $1
+        ORDER BY created_at DESC LIMIT 5
+    """, clinic_id)
+    
+    recent_assessments = await conn.fetch("""
+        SELECT a.id, a.status, a.created_at, p.first_name, p.last_name
+        FROM assessments a
+        JOIN patients p ON a.patient_id = p.id
+        WHERE a.clinic_id = $1
+        ORDER BY a.created_at DESC LIMIT 5
+    """, clinic_id)
+    
+    recent_iridology = await conn.fetch("""
+        SELECT i.id, i.status, i.created_at, p.first_name, p.last_name
+        FROM iridology_analyses i
+        JOIN patients p ON i.patient_id = p.id
+        WHERE i.clinic_id = $1
+        ORDER BY i.created_at DESC LIMIT 5
+    """, clinic_id)
+    
+    # Build response
+    clinic_display_name = clinic['clinic_name'] or clinic['name'] if clinic else 'Clinic'
+    
+    return {
+        "clinic": {
+            "id": clinic['id'] if clinic else clinic_id,
+            "name": clinic_display_name,
+            "code": clinic['clinic_code'] if clinic else '',
+            "city": clinic['city'] if clinic else '',
+            "subscription_tier": clinic['subscription_tier'] if clinic else 'basic',
+            "subscription_status": clinic['subscription_status'] if clinic else 'active',
+            "max_patients": clinic['max_patients'] if clinic else 100,
+            "max_staff": clinic['max_staff'] if clinic else 5,
+            "phone": clinic['phone'] if clinic else '',
+            "email": clinic['email'] if clinic else ''
+        },
+        "user": {
+            "id": user['id'] if user else user_id,
+            "full_name": user['full_name'] if user else 'User',
+            "email": user['email'] if user else '',
+            "role": user['role'] if user else 'staff'
+        },
+        "stats": stats,
+        "today_schedule": [
+            {
+                "id": apt['id'],
+                "time": str(apt['appointment_time'])[:5],
+                "patient": f"{apt['first_name']} {apt['last_name']}",
+                "type": apt['appointment_type'],
+                "status": apt['status']
+            } for apt in today_appointment_list
+        ],
+        "recent_activity": {
+            "patients": [
+                {
+                    "id": p['id'],
+                    "name": f"{p['first_name']} {p['last_name']}",
+                    "created_at": p['created_at'].isoformat() if p['created_at'] else None
+                } for p in recent_patients
+            ],
+            "assessments": [
+                {
+                    "id": a['id'],
+                    "patient": f"{a['first_name']} {a['last_name']}",
+                    "status": a['status'],
+                    "created_at": a['created_at'].isoformat() if a['created_at'] else None
+                } for a in recent_assessments
+            ],
+            "iridology": [
+                {
+                    "id": i['id'],
+                    "patient": f"{i['first_name']} {i['last_name']}",
+                    "status": i['status'],
+                    "created_at": i['created_at'].isoformat() if i['created_at'] else None
+                } for i in recent_iridology
+            ]
+        },
+        "alerts": {
+            "overdue_invoices": stats["overdue_invoices"],
+            "pending_assessments": stats["pending_assessments"],
+            "follow_ups_needed": 0
+        }
+    }
+
+
 @app.get("/api/v1/clinic/dashboard")
-async def get_clinic_dashboard(current_user: dict = Depends(get_current_user)):
+async def get_clinic_dashboard(current_user: dict = Depends(get_current_user), conn: asyncpg.Connection = Depends(get_db)):
     """Get comprehensive dashboard data for clinic admin"""
     try:
-        conn = await asyncpg.connect(
-            host=DB_HOST, port=int(DB_PORT), user=DB_USER, password=DB_PASSWORD, database=DB_NAME
-        )
-        
         clinic_id = current_user.get('clinic_id', 1)
+        user_id = current_user.get('id')
         
-        # Get clinic info
-        clinic = await conn.fetchrow("""
-            SELECT id, name, clinic_name, clinic_code, city, postcode,
-                   subscription_tier, subscription_status, max_patients, max_staff,
-                   features_enabled, phone, email
-            FROM clinics WHERE id = $1
-        """, clinic_id)
-        
-        # Get user info
-        user = await conn.fetchrow("""
-            SELECT id, full_name, email, role FROM users WHERE id = $1
-        """, current_user.get('id'))
-        
-        # Get patient counts
-        total_patients = await conn.fetchval(
-            "SELECT COUNT(*) FROM patients WHERE clinic_id = $1", clinic_id
-        ) or 0
-        
-        active_patients = await conn.fetchval(
-            "SELECT COUNT(*) FROM patients WHERE clinic_id = $1 AND status = 'active'", clinic_id
-        ) or 0
-        
-        new_patients_month = await conn.fetchval("""
-            SELECT COUNT(*) FROM patients 
-            WHERE clinic_id = $1 AND created_at >= date_trunc('month', CURRENT_DATE)
-        """, clinic_id) or 0
-        
-        # Get staff count
-        total_staff = await conn.fetchval(
-            "SELECT COUNT(*) FROM users WHERE clinic_id = $1", clinic_id
-        ) or 0
-        
-        # Get today's appointments
-        today_appointments = await conn.fetchval("""
-            SELECT COUNT(*) FROM appointments 
-            WHERE clinic_id = $1 AND appointment_date = CURRENT_DATE
-        """, clinic_id) or 0
-        
-        # Get upcoming appointments (next 7 days)
-        upcoming_appointments = await conn.fetchval("""
-            SELECT COUNT(*) FROM appointments 
-            WHERE clinic_id = $1 
-            AND appointment_date BETWEEN CURRENT_DATE AND CURRENT_DATE + INTERVAL '7 days'
-        """, clinic_id) or 0
-        
-        # Get today's appointment details
-        today_appointment_list = await conn.fetch("""
-            SELECT a.id, a.appointment_time, a.appointment_type, a.status,
-                   p.first_name, p.last_name
-            FROM appointments a
-            JOIN patients p ON a.patient_id = p.id
-            WHERE a.clinic_id = $1 AND a.appointment_date = CURRENT_DATE
-            ORDER BY a.appointment_time
-        """, clinic_id)
-        
-        # Get assessment counts
-        total_assessments = await conn.fetchval(
-            "SELECT COUNT(*) FROM assessments WHERE clinic_id = $1", clinic_id
-        ) or 0
-        
-        pending_assessments = await conn.fetchval("""
-            SELECT COUNT(*) FROM assessments 
-            WHERE clinic_id = $1 AND status = 'IN_PROGRESS'
-        """, clinic_id) or 0
-        
-        completed_assessments = await conn.fetchval("""
-            SELECT COUNT(*) FROM assessments 
-            WHERE clinic_id = $1 AND status = 'COMPLETED'
-        """, clinic_id) or 0
-        
-        # Get iridology counts
-        total_iridology = await conn.fetchval(
-            "SELECT COUNT(*) FROM iridology_analyses WHERE clinic_id = $1", clinic_id
-        ) or 0
-        
-        completed_iridology = await conn.fetchval("""
-            SELECT COUNT(*) FROM iridology_analyses
-            WHERE clinic_id = $1 AND status = 'COMPLETED'
-        """, clinic_id) or 0
-
-        # Get therapy stats (with error handling for missing tables)
-        try:
-            therapy_sessions = await conn.fetchval("""
-                SELECT COUNT(*) FROM therapy_sessions ts
-                JOIN therapy_assignments ta ON ts.assignment_id = ta.id
-                WHERE ta.clinic_id = $1
-            """, clinic_id) or 0
-        except Exception:
-            therapy_sessions = 0
-
-        try:
-            active_therapies = await conn.fetchval("""
-                SELECT COUNT(*) FROM therapy_assignments
-                WHERE clinic_id = $1 AND status = 'active'
-            """, clinic_id) or 0
-        except Exception:
-            active_therapies = 0
-
-        # Get invoice stats
-        outstanding_invoices = await conn.fetchrow("""
-            SELECT COUNT(*) as count, COALESCE(SUM(amount), 0) as total
-            FROM patient_invoices 
-            WHERE clinic_id = $1 AND status IN ('pending', 'overdue')
-        """, clinic_id)
-        
-        overdue_invoices = await conn.fetchval("""
-            SELECT COUNT(*) FROM patient_invoices 
-            WHERE clinic_id = $1 AND status = 'overdue'
-        """, clinic_id) or 0
-        
-        revenue_this_month = await conn.fetchval("""
-            SELECT COALESCE(SUM(amount), 0) FROM patient_invoices 
-            WHERE clinic_id = $1 AND status = 'paid' 
-            AND paid_at >= date_trunc('month', CURRENT_DATE)
-        """, clinic_id) or 0
-        
-        # Get recent activity
-        recent_patients = await conn.fetch("""
-            SELECT id, first_name, last_name, created_at
-            FROM patients WHERE clinic_id = $1
-            ORDER BY created_at DESC LIMIT 5
-        """, clinic_id)
-        
-        recent_assessments = await conn.fetch("""
-            SELECT a.id, a.status, a.created_at, p.first_name, p.last_name
-            FROM assessments a
-            JOIN patients p ON a.patient_id = p.id
-            WHERE a.clinic_id = $1
-            ORDER BY a.created_at DESC LIMIT 5
-        """, clinic_id)
-        
-        recent_iridology = await conn.fetch("""
-            SELECT i.id, i.status, i.created_at, p.first_name, p.last_name
-            FROM iridology_analyses i
-            JOIN patients p ON i.patient_id = p.id
-            WHERE i.clinic_id = $1
-            ORDER BY i.created_at DESC LIMIT 5
-        """, clinic_id)
-        
-        await conn.close()
-        
-        # Build response
-        clinic_display_name = clinic['clinic_name'] or clinic['name'] if clinic else 'Clinic'
-        
-        return {
-            "clinic": {
-                "id": clinic['id'] if clinic else clinic_id,
-                "name": clinic_display_name,
-                "code": clinic['clinic_code'] if clinic else '',
-                "city": clinic['city'] if clinic else '',
-                "subscription_tier": clinic['subscription_tier'] if clinic else 'basic',
-                "subscription_status": clinic['subscription_status'] if clinic else 'active',
-                "max_patients": clinic['max_patients'] if clinic else 100,
-                "max_staff": clinic['max_staff'] if clinic else 5,
-                "phone": clinic['phone'] if clinic else '',
-                "email": clinic['email'] if clinic else ''
-            },
-            "user": {
-                "id": user['id'] if user else current_user.get('id'),
-                "full_name": user['full_name'] if user else 'User',
-                "email": user['email'] if user else '',
-                "role": user['role'] if user else 'staff'
-            },
-            "stats": {
-                "total_patients": total_patients,
-                "active_patients": active_patients,
-                "new_patients_month": new_patients_month,
-                "total_staff": total_staff,
-                "today_appointments": today_appointments,
-                "upcoming_appointments": upcoming_appointments,
-                "total_assessments": total_assessments,
-                "pending_assessments": pending_assessments,
-                "completed_assessments": completed_assessments,
-                "total_iridology": total_iridology,
-                "completed_iridology": completed_iridology,
-                "outstanding_invoices_count": outstanding_invoices['count'] if outstanding_invoices else 0,
-                "outstanding_invoices_total": float(outstanding_invoices['total']) if outstanding_invoices else 0,
-                "overdue_invoices": overdue_invoices,
-                "revenue_this_month": float(revenue_this_month),
-                "therapy_sessions": therapy_sessions,
-                "active_therapies": active_therapies
-            },
-            "today_schedule": [
-                {
-                    "id": apt['id'],
-                    "time": str(apt['appointment_time'])[:5],
-                    "patient": f"{apt['first_name']} {apt['last_name']}",
-                    "type": apt['appointment_type'],
-                    "status": apt['status']
-                } for apt in today_appointment_list
-            ],
-            "recent_activity": {
-                "patients": [
-                    {
-                        "id": p['id'],
-                        "name": f"{p['first_name']} {p['last_name']}",
-                        "created_at": p['created_at'].isoformat() if p['created_at'] else None
-                    } for p in recent_patients
-                ],
-                "assessments": [
-                    {
-                        "id": a['id'],
-                        "patient": f"{a['first_name']} {a['last_name']}",
-                        "status": a['status'],
-                        "created_at": a['created_at'].isoformat() if a['created_at'] else None
-                    } for a in recent_assessments
-                ],
-                "iridology": [
-                    {
-                        "id": i['id'],
-                        "patient": f"{i['first_name']} {i['last_name']}",
-                        "status": i['status'],
-                        "created_at": i['created_at'].isoformat() if i['created_at'] else None
-                    } for i in recent_iridology
-                ]
-            },
-            "alerts": {
-                "overdue_invoices": overdue_invoices,
-                "pending_assessments": pending_assessments,
-                "follow_ups_needed": 0
-            }
-        }
+        return await get_or_load(
+            "clinic_dashboard",
+            lambda: _load_clinic_dashboard(conn, clinic_id, user_id),
+            ttl=30, scope=clinic_id, key=user_id
+        )
         
     except Exception as e:
         print(f"Dashboard error: {e}")
@@ -4070,80 +3860,14 @@ async def get_clinic_dashboard(current_user: dict = Depends(get_current_user)):
 
 
 @app.get("/api/v1/clinic/dashboard/charts")
-async def get_clinic_dashboard_charts(current_user: dict = Depends(get_current_user)):
+async def get_clinic_dashboard_charts(current_user: dict = Depends(get_current_user), conn: asyncpg.Connection = Depends(get_db)):
     """Get chart data for clinic dashboard"""
     try:
-        conn = await asyncpg.connect(
-            host=DB_HOST, port=int(DB_PORT), user=DB_USER, password=DB_PASSWORD, database=DB_NAME
-        )
-
         clinic_id = current_user.get('clinic_id', 1)
 
-        # Patient trend (last 6 months)
-        patient_trend = await conn.fetch("""
-            SELECT
-                DATE_TRUNC('month', created_at) as month,
-                COUNT(*) as count
-            FROM patients
-            WHERE clinic_id = $1 AND created_at >= CURRENT_DATE - INTERVAL '6 months'
-            GROUP BY DATE_TRUNC('month', created_at)
-            ORDER BY month
-        """, clinic_id)
-
-        # Appointments this week by day
-        appointments_week = await conn.fetch("""
-            SELECT
-                appointment_date,
-                COUNT(*) as count
-            FROM appointments
-            WHERE clinic_id = $1
-                AND appointment_date >= CURRENT_DATE
-                AND appointment_date <= CURRENT_DATE + INTERVAL '7 days'
-            GROUP BY appointment_date
-            ORDER BY appointment_date
-        """, clinic_id)
-
-        # Patient status distribution
-        patient_status = await conn.fetch("""
-            SELECT status, COUNT(*) as count
-            FROM patients
-            WHERE clinic_id = $1
-            GROUP BY status
-        """, clinic_id)
-
-        # Revenue trend (last 6 months)
-        revenue_trend = await conn.fetch("""
-            SELECT
-                DATE_TRUNC('month', created_at) as month,
-                SUM(total_amount) as total
-            FROM clinic_invoices
-            WHERE clinic_id = $1
-                AND status = 'paid'
-                AND created_at >= CURRENT_DATE - INTERVAL '6 months'
-            GROUP BY DATE_TRUNC('month', created_at)
-            ORDER BY month
-        """, clinic_id)
-
-        await conn.close()
-
         return {
             "success": True,
-            "patient_trend": [
-                {"month": r['month'].strftime('%Y-%m') if r['month'] else '', "count": r['count']}
-                for r in patient_trend
-            ],
-            "appointments_week": [
-                {"date": str(r['appointment_date']), "count": r['count']}
-                for r in appointments_week
-            ],
-            "patient_status": [
-                {"status": r['status'], "count": r['count']}
-                for r in patient_status
-            ],
-            "revenue_trend": [
-                {"month": r['month'].strftime('%Y-%m') if r['month'] else '', "total": float(r['total']) if r['total'] else 0}
-                for r in revenue_trend
-            ]
+            **await fetch_clinic_charts(conn, clinic_id)
         }
 
     except Exception as e:
@@ -4162,13 +3886,9 @@ async def get_clinic_dashboard_charts(current_user: dict = Depends(get_current_u
 # ============================================
 
 @app.get("/api/v1/patients/{patient_id}/therapy-assignments")
-async def get_patient_therapy_assignments(patient_id: int, current_user: dict = Depends(get_current_user)):
+async def get_patient_therapy_assignments(patient_id: int, current_user: dict = Depends(get_current_user), conn: asyncpg.Connection = Depends(get_db)):
     """Get all therapy assignments for a patient"""
     try:
-        conn = await asyncpg.connect(
-            host=DB_HOST, port=int(DB_PORT), user=DB_USER, password=DB_PASSWORD, database=DB_NAME
-        )
-        
         clinic_id = current_user.get('clinic_id', 1)
         
         # Get therapy plan items for this patient with session counts
@@ -4195,8 +3915,6 @@ async def get_patient_therapy_assignments(patient_id: int, current_user: dict =
             ORDER BY tp.created_at DESC
         """, patient_id, clinic_id)
         
-        await conn.close()
-        
         return {
             "success": True,
             "assignments": [
@@ -4223,15 +3941,40 @@ async def get_patient_therapy_assignments(patient_id: int, current_user: dict =
         raise HTTPException(status_code=500, detail=str(e))
 
 
+# Days between sessions and whether weekends are skipped, per frequency
+SESSION_FREQUENCIES = {
+    'daily': (1, False),
+    '5x_week': (1, True),
+    '4x_week': (2, True),
+    '3x_week': (2, True),
+    '2x_week': (3, True),
+    '1x_week': (7, False),
+    '1x_month': (30, False),
+}
+
+
+def build_session_schedule(start_date, num_sessions: int, frequency: str) -> list:
+    """Dates for each session of a therapy plan"""
+    from datetime import timedelta
+    
+    day_interval, skip_weekends = SESSION_FREQUENCIES.get(frequency, (1, True))
+    dates = []
+    current_date = start_date
+    for _ in range(num_sessions):
+        # Skip weekends if needed
+        if skip_weekends:
+            while current_date.weekday() >= 5:  # 5=Saturday, 6=Sunday
+                current_date += timedelta(days=1)
+        dates.append(current_date)
+        current_date += timedelta(days=day_interval)
+    return dates
+
+
 @app.post("/api/v1/patients/{patient_id}/therapy-assignments")
-async def create_therapy_assignment(patient_id: int, assignment_data: dict, current_user: dict = Depends(get_current_user)):
+async def create_therapy_assignment(patient_id: int, assignment_data: dict, current_user: dict = Depends(get_current_user), conn: asyncpg.Connection = Depends(get_db)):
     """Create a new therapy assignment for a patient"""
     try:
-        from datetime import datetime, timedelta, time
-        
-        conn = await asyncpg.connect(
-            host=DB_HOST, port=int(DB_PORT), user=DB_USER, password=DB_PASSWORD, database=DB_NAME
-        )
+        from datetime import datetime, time
         
         clinic_id = current_user.get('clinic_id', 1)
         user_id = current_user.get('id', 1)
@@ -4244,6 +3987,9 @@ async def create_therapy_assignment(patient_id: int, assignment_data: dict, curr
         start_date_str = assignment_data.get('start_date')
         practitioner_notes = assignment_data.get('practitioner_notes', '')
         
+        if num_sessions < 1:
+            raise HTTPException(status_code=400, detail="num_sessions must be at least 1")
+        
         # Parse start date
         start_date = datetime.strptime(start_date_str, '%Y-%m-%d').date()
         
@@ -4257,104 +4003,70 @@ async def create_therapy_assignment(patient_id: int, assignment_data: dict, curr
         )
         
         if not therapy:
-            await conn.close()
             raise HTTPException(status_code=404, detail=f"Therapy {therapy_code} not found")
         
         # Generate plan number
         timestamp = datetime.now().strftime("%Y%m%d%H%M%S")
         plan_number = f"TP-{timestamp}"
         
-        # Create therapy plan
-        plan_id = await conn.fetchval("""
-            INSERT INTO therapy_plans (
-                plan_number, clinic_id, patient_id, recommended_by, 
-                status, notes, created_at
-            ) VALUES ($1, $2, $3, $4, $5, $6, NOW())
-            RETURNING id
-        """, plan_number, clinic_id, patient_id, user_id, 'APPROVED', practitioner_notes)
-        
-        # Create therapy plan item
-        plan_item_id = await conn.fetchval("""
-            INSERT INTO therapy_plan_items (
-                therapy_plan_id, therapy_code, therapy_name, therapy_description,
-                recommended_sessions, session_duration_minutes, rationale,
-                target_domain, priority, created_at
-            ) VALUES ($1, $2, $3, $4, $5, $6, $7, $8, $9, NOW())
-            RETURNING id
-        """, 
-            plan_id,
-            therapy['therapy_code'],
-            therapy['therapy_name'],
-            therapy['description'],
-            num_sessions,
-            session_duration,
-            practitioner_notes,
-            'ENERGY_VITALITY',
-            'PRIMARY'
-        )
+        # Work out the whole schedule before touching the database
+        session_dates = build_session_schedule(start_date, num_sessions, frequency)
         
-        # Calculate day interval based on frequency
-        if frequency == 'daily':
-            day_interval = 1
-            skip_weekends = False
-        elif frequency == '5x_week':
-            day_interval = 1
-            skip_weekends = True
-        elif frequency == '4x_week':
-            day_interval = 2
-            skip_weekends = True
-        elif frequency == '3x_week':
-            day_interval = 2
-            skip_weekends = True
-        elif frequency == '2x_week':
-            day_interval = 3
-            skip_weekends = True
-        elif frequency == '1x_week':
-            day_interval = 7
-            skip_weekends = False
-        elif frequency == '1x_month':
-            day_interval = 30
-            skip_weekends = False
-        else:
-            day_interval = 1
-            skip_weekends = True
-        
-        # Create individual sessions
-        sessions_created = 0
-        current_date = start_date
-        
-        for i in range(num_sessions):
-            # Skip weekends if needed
-            if skip_weekends:
-                while current_date.weekday() >= 5:  # 5=Saturday, 6=Sunday
-                    current_date += timedelta(days=1)
+        async with conn.transaction():
+            # Create therapy plan
+            plan_id = await conn.fetchval("""
+                INSERT INTO therapy_plans (
+                    plan_number, clinic_id, patient_id, recommended_by, 
+                    status, notes, created_at
+                ) VALUES ($1, $2, $3, $4, $5, $6, NOW())
+                RETURNING id
+            """, plan_number, clinic_id, patient_id, user_id, 'APPROVED', practitioner_notes)
             
-            session_number = f"TS-{plan_item_id}-{str(i+1).zfill(3)}"
+            # Create therapy plan item
+            plan_item_id = await conn.fetchval("""
+                INSERT INTO therapy_plan_items (
+                    therapy_plan_id, therapy_code, therapy_name, therapy_description,
+                    recommended_sessions, session_duration_minutes, rationale,
+                    target_domain, priority, created_at
+                ) VALUES ($1, $2, $3, $4, $5, $6, $7, $8, $9, NOW())
+                RETURNING id
+            """, 
+                plan_id,
+                therapy['therapy_code'],
+                therapy['therapy_name'],
+                therapy['description'],
+                num_sessions,
+                session_duration,
+                practitioner_notes,
+                'ENERGY_VITALITY',
+                'PRIMARY'
+            )
             
-            await conn.execute("""
+            # Create individual sessions in one batch
+            await conn.executemany("""
                 INSERT INTO therapy_sessions (
                     session_number, therapy_plan_item_id, clinic_id, patient_id,
                     session_sequence, total_sessions, scheduled_date, scheduled_time,
                     duration_minutes, status, created_at, created_by
                 ) VALUES ($1, $2, $3, $4, $5, $6, $7, $8, $9, $10, NOW(), $11)
-            """,
-                session_number,
-                plan_item_id,
-                clinic_id,
-                patient_id,
-                i + 1,
-                num_sessions,
-                current_date,
-                session_time,
-                session_duration,
-                'SCHEDULED',
-                user_id
-            )
-            
-            sessions_created += 1
-            current_date += timedelta(days=day_interval)
+            """, [
+                (
+                    f"TS-{plan_item_id}-{str(i+1).zfill(3)}",
+                    plan_item_id,
+                    clinic_id,
+                    patient_id,
+                    i + 1,
+                    num_sessions,
+                    session_date,
+                    session_time,
+                    session_duration,
+                    'SCHEDULED',
+                    user_id
+                )
+                for i, session_date in enumerate(session_dates)
+            ])
         
-        await conn.close()
+        sessions_created = len(session_dates)
         
         return {
             "success": True,
@@ -4381,13 +4093,9 @@ async def create_therapy_assignment(patient_id: int, assignment_data: dict, curr
 
 
 @app.get("/api/v1/therapy-assignments/{assignment_id}/sessions")
-async def get_therapy_sessions(assignment_id: int, current_user: dict = Depends(get_current_user)):
+async def get_therapy_sessions(assignment_id: int, current_user: dict = Depends(get_current_user), conn: asyncpg.Connection = Depends(get_db)):
     """Get all sessions for a therapy assignment"""
     try:
-        conn = await asyncpg.connect(
-            host=DB_HOST, port=int(DB_PORT), user=DB_USER, password=DB_PASSWORD, database=DB_NAME
-        )
-        
         sessions = await conn.fetch("""
             SELECT 
                 ts.id,
@@ -4408,8 +4116,6 @@ async def get_therapy_sessions(assignment_id: int, current_user: dict = Depends(
             ORDER BY ts.session_sequence
         """, assignment_id)
         
-        await conn.close()
-        
         return {
             "success": True,
             "sessions": [
@@ -4437,13 +4143,9 @@ async def get_therapy_sessions(assignment_id: int, current_user: dict = Depends(
 
 
 @app.post("/api/v1/therapy-sessions/{session_id}/complete")
-async def complete_therapy_session(session_id: int, completion_data: dict = None, current_user: dict = Depends(get_current_user)):
+async def complete_therapy_session(session_id: int, completion_data: dict = None, current_user: dict = Depends(get_current_user), conn: asyncpg.Connection = Depends(get_db)):
     """Mark a therapy session as completed"""
     try:
-        conn = await asyncpg.connect(
-            host=DB_HOST, port=int(DB_PORT), user=DB_USER, password=DB_PASSWORD, database=DB_NAME
-        )
-        
         user_id = current_user.get('id', 1)
         notes = completion_data.get('notes', '') if completion_data else ''
         feedback = completion_data.get('patient_feedback', '') if completion_data else ''
@@ -4459,8 +4161,6 @@ async def complete_therapy_session(session_id: int, completion_data: dict = None
             WHERE id = $4
         """, user_id, notes, feedback, session_id)
         
-        await conn.close()
-        
         return {
             "success": True,
             "message": "Session marked as completed"
@@ -4473,13 +4173,9 @@ async def complete_therapy_session(session_id: int, completion_data: dict = None
 
 
 @app.get("/api/v1/therapies/stats")
-async def get_therapies_stats(current_user: dict = Depends(get_current_user)):
+async def get_therapies_stats(current_user: dict = Depends(get_current_user), conn: asyncpg.Connection = Depends(get_db)):
     """Get therapy statistics for the dashboard"""
     try:
-        conn = await asyncpg.connect(
-            host=DB_HOST, port=int(DB_PORT), user=DB_USER, password=DB_PASSWORD, database=DB_NAME
-        )
-        
         clinic_id = current_user.get('clinic_id', 1)
         
         # Active plans count
@@ -4512,8 +4208,6 @@ async def get_therapies_stats(current_user: dict = Depends(get_current_user)):
             AND scheduled_date < CURRENT_DATE + INTERVAL '7 days'
         """, clinic_id) or 0
         
-        await conn.close()
-        
         return {
             "success": True,
             "stats": {
@@ -4529,9 +4223,9 @@ async def get_therapies_stats(current_user: dict = Depends(get_current_user)):
 
 
 @app.get("/api/v1/therapy-module/stats")
-async def get_therapy_module_stats(current_user: dict = Depends(get_current_user)):
+async def get_therapy_module_stats(current_user: dict = Depends(get_current_user), conn: asyncpg.Connection = Depends(get_db)):
     """Alias for therapy stats - redirects to main stats endpoint"""
-    return await get_therapies_stats(current_user)
+    return await get_therapies_stats(current_user, conn)
 
 
 
@@ -4540,13 +4234,9 @@ async def get_therapy_module_stats(current_user: dict = Depends(get_current_user
 # ============================================
 
 @app.get("/api/v1/therapies")
-async def get_therapies_list(current_user: dict = Depends(get_current_user)):
+async def get_therapies_list(current_user: dict = Depends(get_current_user), conn: asyncpg.Connection = Depends(get_db)):
     """Get all available therapies"""
     try:
-        conn = await asyncpg.connect(
-            host=DB_HOST, port=int(DB_PORT), user=DB_USER, password=DB_PASSWORD, database=DB_NAME
-        )
-        
         therapies = await conn.fetch("""
             SELECT
                 id,
@@ -4566,8 +4256,6 @@ async def get_therapies_list(current_user: dict = Depends(get_current_user)):
             ORDER BY therapy_code
         """)
         
-        await conn.close()
-        
         return {
             "success": True,
             "therapies": [
@@ -4600,13 +4288,9 @@ async def get_therapies_list(current_user: dict = Depends(get_current_user)):
 # ============================================================================
 
 @app.get("/api/v1/therapies/active-plans")
-async def get_active_therapy_plans(current_user: dict = Depends(get_current_user)):
+async def get_active_therapy_plans(current_user: dict = Depends(get_current_user), conn: asyncpg.Connection = Depends(get_db)):
     """Get all active therapy plans with patient details and progress"""
     try:
-        conn = await asyncpg.connect(
-            host=DB_HOST, port=int(DB_PORT), user=DB_USER, password=DB_PASSWORD, database=DB_NAME
-        )
-        
         clinic_id = current_user.get('clinic_id', 1)
         
         # Get all active therapy plans with patient info
@@ -4693,8 +4377,6 @@ async def get_active_therapy_plans(current_user: dict = Depends(get_current_user
                     "therapies": therapies
                 })
         
-        await conn.close()
-        
         return {
             "success": True,
             "plans": result,
@@ -4708,13 +4390,9 @@ async def get_active_therapy_plans(current_user: dict = Depends(get_current_user
 
 
 @app.get("/api/v1/therapies/today-sessions")
-async def get_today_therapy_sessions(current_user: dict = Depends(get_current_user)):
+async def get_today_therapy_sessions(current_user: dict = Depends(get_current_user), conn: asyncpg.Connection = Depends(get_db)):
     """Get all therapy sessions scheduled for today"""
     try:
-        conn = await asyncpg.connect(
-            host=DB_HOST, port=int(DB_PORT), user=DB_USER, password=DB_PASSWORD, database=DB_NAME
-        )
-        
         clinic_id = current_user.get('clinic_id', 1)
         
         sessions = await conn.fetch("""
@@ -4742,8 +4420,6 @@ async def get_today_therapy_sessions(current_user: dict = Depends(get_current_us
             ORDER BY ts.scheduled_time
         """, clinic_id)
         
-        await conn.close()
-        
         return {
             "success": True,
             "sessions": [
@@ -4775,13 +4451,9 @@ async def get_today_therapy_sessions(current_user: dict = Depends(get_current_us
 
 
 @app.get("/api/v1/therapy-items/{item_id}/sessions")
-async def get_therapy_item_sessions(item_id: int, current_user: dict = Depends(get_current_user)):
+async def get_therapy_item_sessions(item_id: int, current_user: dict = Depends(get_current_user), conn: asyncpg.Connection = Depends(get_db)):
     """Get all sessions for a specific therapy plan item"""
     try:
-        conn = await asyncpg.connect(
-            host=DB_HOST, port=int(DB_PORT), user=DB_USER, password=DB_PASSWORD, database=DB_NAME
-        )
-        
         # Get therapy item details
         item = await conn.fetchrow("""
             SELECT 
@@ -4807,7 +4479,6 @@ async def get_therapy_item_sessions(item_id: int, current_user: dict = Depends(g
         """, item_id)
         
         if not item:
-            await conn.close()
             raise HTTPException(status_code=404, detail="Therapy item not found")
         
         # Get all sessions
@@ -4831,8 +4502,6 @@ async def get_therapy_item_sessions(item_id: int, current_user: dict = Depends(g
             ORDER BY ts.session_sequence
         """, item_id)
         
-        await conn.close()
-        
         completed = sum(1 for s in sessions if s['status'] == 'COMPLETED')
         total = len(sessions)
         progress = round((completed / total * 100) if total > 0 else 0)
@@ -4886,13 +4555,9 @@ async def get_therapy_item_sessions(item_id: int, current_user: dict = Depends(g
 
 
 @app.post("/api/v1/therapy-sessions/{session_id}/complete")
-async def complete_therapy_session_v2(session_id: int, data: dict = None, current_user: dict = Depends(get_current_user)):
+async def complete_therapy_session_v2(session_id: int, data: dict = None, current_user: dict = Depends(get_current_user), conn: asyncpg.Connection = Depends(get_db)):
     """Mark a therapy session as completed"""
     try:
-        conn = await asyncpg.connect(
-            host=DB_HOST, port=int(DB_PORT), user=DB_USER, password=DB_PASSWORD, database=DB_NAME
-        )
-        
         user_id = current_user.get('id', 1)
         notes = data.get('notes', '') if data else ''
         feedback = data.get('patient_feedback', '') if data else ''
@@ -4917,8 +4582,6 @@ async def complete_therapy_session_v2(session_id: int, data: dict = None, curren
             WHERE ts.id = $1
         """, session_id)
         
-        await conn.close()
-        
         return {
             "success": True,
             "message": "Session marked as completed",
@@ -4936,15 +4599,11 @@ async def complete_therapy_session_v2(session_id: int, data: dict = None, curren
 
 
 @app.put("/api/v1/therapy-sessions/{session_id}/reschedule")
-async def reschedule_therapy_session(session_id: int, data: dict, current_user: dict = Depends(get_current_user)):
+async def reschedule_therapy_session(session_id: int, data: dict, current_user: dict = Depends(get_current_user), conn: asyncpg.Connection = Depends(get_db)):
     """Reschedule a therapy session"""
     try:
         from datetime import datetime, time
         
-        conn = await asyncpg.connect(
-            host=DB_HOST, port=int(DB_PORT), user=DB_USER, password=DB_PASSWORD, database=DB_NAME
-        )
-        
         new_date_str = data.get('new_date')
         new_time_str = data.get('new_time', '10:00')
         reason = data.get('reason', '')
@@ -4963,8 +4622,6 @@ async def reschedule_therapy_session(session_id: int, data: dict, current_user:
             WHERE id = $3
         """, new_date, new_time, session_id)
         
-        await conn.close()
-        
         return {
             "success": True,
             "message": "Session rescheduled successfully",
@@ -4982,70 +4639,14 @@ async def reschedule_therapy_session(session_id: int, data: dict, current_user:
 
 
 @app.get("/api/v1/therapies/comprehensive-stats")
-async def get_comprehensive_therapy_stats(current_user: dict = Depends(get_current_user)):
-    """Get comprehensive therapy statistics"""
+async def get_comprehensive_therapy_stats(current_user: dict = Depends(get_current_user), conn: asyncpg.Connection = Depends(get_db)):
+    """Get comprehensive therapy statistics (clinic_stats counters, see dashboard_stats.py)"""
     try:
-        conn = await asyncpg.connect(
-            host=DB_HOST, port=int(DB_PORT), user=DB_USER, password=DB_PASSWORD, database=DB_NAME
-        )
-        
         clinic_id = current_user.get('clinic_id', 1)
         
-        # Active plans count
-        active_plans = await conn.fetchval("""
-            SELECT COUNT(DISTINCT tp.id) 
-            FROM therapy_plans tp
-            WHERE tp.clinic_id = $1 AND tp.status IN ('APPROVED', 'IN_PROGRESS')
-        """, clinic_id) or 0
-        
-        # Completed today
-        completed_today = await conn.fetchval("""
-            SELECT COUNT(*) FROM therapy_sessions
-            WHERE clinic_id = $1 
-            AND status = 'COMPLETED'
-            AND DATE(completed_at) = CURRENT_DATE
-        """, clinic_id) or 0
-        
-        # Today's sessions
-        today_sessions = await conn.fetchval("""
-            SELECT COUNT(*) FROM therapy_sessions
-            WHERE clinic_id = $1 
-            AND scheduled_date = CURRENT_DATE
-        """, clinic_id) or 0
-        
-        # This week's sessions
-        week_sessions = await conn.fetchval("""
-            SELECT COUNT(*) FROM therapy_sessions
-            WHERE clinic_id = $1 
-            AND scheduled_date >= CURRENT_DATE 
-            AND scheduled_date < CURRENT_DATE + INTERVAL '7 days'
-        """, clinic_id) or 0
-        
-        # Patients with active therapy
-        patients_with_therapy = await conn.fetchval("""
-            SELECT COUNT(DISTINCT tp.patient_id)
-            FROM therapy_plans tp
-            WHERE tp.clinic_id = $1 AND tp.status IN ('APPROVED', 'IN_PROGRESS')
-        """, clinic_id) or 0
-        
-        # Total sessions scheduled
-        total_scheduled = await conn.fetchval("""
-            SELECT COUNT(*) FROM therapy_sessions
-            WHERE clinic_id = $1 AND status = 'SCHEDULED'
-        """, clinic_id) or 0
-        
-        await conn.close()
-        
         return {
             "success": True,
-            "stats": {
-                "active_plans": active_plans,
-                "completed_today": completed_today,
-                "today_sessions": today_sessions,
-                "week_sessions": week_sessions,
-                "patients_with_therapy": patients_with_therapy,
-                "total_scheduled": total_scheduled
-            }
+            "stats": await fetch_therapy_stats(conn, clinic_id)
         }
     except Exception as e:
         print(f"❌ ERROR getting therapy stats: {str(e)}")
@@ -5053,15 +4654,11 @@ async def get_comprehensive_therapy_stats(current_user: dict = Depends(get_curre
 
 
 @app.post("/api/v1/therapy-sessions/{session_id}/create-appointment")
-async def create_appointment_from_session(session_id: int, current_user: dict = Depends(get_current_user)):
+async def create_appointment_from_session(session_id: int, current_user: dict = Depends(get_current_user), conn: asyncpg.Connection = Depends(get_db)):
     """Create an appointment from a therapy session"""
     try:
         from datetime import datetime
         
-        conn = await asyncpg.connect(
-            host=DB_HOST, port=int(DB_PORT), user=DB_USER, password=DB_PASSWORD, database=DB_NAME
-        )
-        
         clinic_id = current_user.get('clinic_id', 1)
         user_id = current_user.get('id', 1)
         
@@ -5075,7 +4672,6 @@ async def create_appointment_from_session(session_id: int, current_user: dict =
         """, session_id)
         
         if not session:
-            await conn.close()
             raise HTTPException(status_code=404, detail="Session not found")
         
         # Generate appointment number
@@ -5103,8 +4699,6 @@ async def create_appointment_from_session(session_id: int, current_user: dict =
             user_id
         )
         
-        await conn.close()
-        
         return {
             "success": True,
             "message": "Appointment created successfully",
@@ -5125,15 +4719,11 @@ async def create_appointment_from_session(session_id: int, current_user: dict =
 
 
 @app.post("/api/v1/therapy-items/{item_id}/create-all-appointments")
-async def create_all_appointments_for_therapy(item_id: int, current_user: dict = Depends(get_current_user)):
+async def create_all_appointments_for_therapy(item_id: int, current_user: dict = Depends(get_current_user), conn: asyncpg.Connection = Depends(get_db)):
     """Create appointments for all scheduled sessions of a therapy"""
     try:
         from datetime import datetime
         
-        conn = await asyncpg.connect(
-            host=DB_HOST, port=int(DB_PORT), user=DB_USER, password=DB_PASSWORD, database=DB_NAME
-        )
-        
         clinic_id = current_user.get('clinic_id', 1)
         user_id = current_user.get('id', 1)
         
@@ -5146,7 +4736,6 @@ async def create_all_appointments_for_therapy(item_id: int, current_user: dict =
         """, item_id)
         
         if not item:
-            await conn.close()
             raise HTTPException(status_code=404, detail="Therapy item not found")
         
         # Get all scheduled sessions
@@ -5181,8 +4770,6 @@ async def create_all_appointments_for_therapy(item_id: int, current_user: dict =
             )
             appointments_created += 1
         
-        await conn.close()
-        
         return {
             "success": True,
             "message": f"{appointments_created} appointments created successfully",
@@ -5207,7 +4794,7 @@ import base64
 import os
 
 @app.post("/api/v1/therapies/{therapy_code}/upload-diagram")
-async def upload_therapy_diagram(therapy_code: str, file: UploadFile = File(...), current_user: dict = Depends(get_current_user)):
+async def upload_therapy_diagram(therapy_code: str, file: UploadFile = File(...), current_user: dict = Depends(get_current_user), conn: asyncpg.Connection = Depends(get_db)):
     """Upload a diagram image for a therapy"""
     try:
         # Validate file type
@@ -5231,9 +4818,6 @@ async def upload_therapy_diagram(therapy_code: str, file: UploadFile = File(...)
             f.write(content)
         
         # Update database with image path
-        conn = await asyncpg.connect(
-            host=DB_HOST, port=int(DB_PORT), user=DB_USER, password=DB_PASSWORD, database=DB_NAME
-        )
         
         image_url = f"/uploads/therapy_diagrams/{filename}"
         
@@ -5242,8 +4826,6 @@ async def upload_therapy_diagram(therapy_code: str, file: UploadFile = File(...)
             WHERE therapy_code = $2
         """, image_url, therapy_code)
         
-        await conn.close()
-        
         return {
             "success": True,
             "message": "Diagram uploaded successfully",
@@ -5261,13 +4843,9 @@ async def upload_therapy_diagram(therapy_code: str, file: UploadFile = File(...)
 
 
 @app.delete("/api/v1/therapies/{therapy_code}/diagram")
-async def delete_therapy_diagram(therapy_code: str, current_user: dict = Depends(get_current_user)):
+async def delete_therapy_diagram(therapy_code: str, current_user: dict = Depends(get_current_user), conn: asyncpg.Connection = Depends(get_db)):
     """Delete the diagram for a therapy"""
     try:
-        conn = await asyncpg.connect(
-            host=DB_HOST, port=int(DB_PORT), user=DB_USER, password=DB_PASSWORD, database=DB_NAME
-        )
-        
         # Get current image path
         current_image = await conn.fetchval(
             "SELECT diagram_image FROM therapies WHERE therapy_code = $1",
@@ -5286,8 +4864,6 @@ async def delete_therapy_diagram(therapy_code: str, current_user: dict = Depends
             WHERE therapy_code = $1
         """, therapy_code)
         
-        await conn.close()
-        
         return {
             "success": True,
             "message": "Diagram deleted successfully"
@@ -5304,17 +4880,13 @@ async def delete_therapy_diagram(therapy_code: str, current_user: dict = Depends
 # ============================================
 
 @app.get("/api/v1/clinic/settings")
-async def get_clinic_settings(current_user: dict = Depends(get_current_user)):
+async def get_clinic_settings(current_user: dict = Depends(get_current_user), conn: asyncpg.Connection = Depends(get_db)):
     """Get clinic settings"""
     try:
         clinic_id = current_user.get('clinic_id')
-        conn = await asyncpg.connect(
-            host=DB_HOST, port=int(DB_PORT), user=DB_USER, password=DB_PASSWORD, database=DB_NAME
-        )
         clinic = await conn.fetchrow(
             "SELECT * FROM clinics WHERE id = $1", clinic_id
         )
-        await conn.close()
         
         if not clinic:
             return {"success": True, "settings": {}}
@@ -5349,13 +4921,10 @@ async def get_clinic_settings(current_user: dict = Depends(get_current_user)):
 
 
 @app.patch("/api/v1/clinic/settings/profile")
-async def update_clinic_profile(data: dict, current_user: dict = Depends(get_current_user)):
+async def update_clinic_profile(data: dict, current_user: dict = Depends(get_current_user), conn: asyncpg.Connection = Depends(get_db)):
     """Update clinic profile"""
     try:
         clinic_id = current_user.get('clinic_id')
-        conn = await asyncpg.connect(
-            host=DB_HOST, port=int(DB_PORT), user=DB_USER, password=DB_PASSWORD, database=DB_NAME
-        )
         
         await conn.execute("""
             UPDATE clinics SET
@@ -5380,7 +4949,6 @@ async def update_clinic_profile(data: dict, current_user: dict = Depends(get_cur
             data.get('website'),
             clinic_id
         )
-        await conn.close()
         
         return {"success": True, "message": "Profile updated successfully"}
     except Exception as e:
@@ -5389,13 +4957,10 @@ async def update_clinic_profile(data: dict, current_user: dict = Depends(get_cur
 
 
 @app.patch("/api/v1/clinic/settings/hours")
-async def update_clinic_hours(data: dict, current_user: dict = Depends(get_current_user)):
+async def update_clinic_hours(data: dict, current_user: dict = Depends(get_current_user), conn: asyncpg.Connection = Depends(get_db)):
     """Update clinic opening hours"""
     try:
         clinic_id = current_user.get('clinic_id')
-        conn = await asyncpg.connect(
-            host=DB_HOST, port=int(DB_PORT), user=DB_USER, password=DB_PASSWORD, database=DB_NAME
-        )
         
         hours_list = data.get('hours', [])
         
@@ -5413,8 +4978,6 @@ async def update_clinic_hours(data: dict, current_user: dict = Depends(get_curre
                 DO UPDATE SET is_open = $3, open_time = $4::time, close_time = $5::time, updated_at = NOW()
             """, clinic_id, day, is_open, open_time, close_time)
         
-        await conn.close()
-        
         return {"success": True, "message": "Opening hours updated successfully"}
     except Exception as e:
         print(f"❌ ERROR updating clinic hours: {str(e)}")
@@ -5424,28 +4987,24 @@ async def update_clinic_hours(data: dict, current_user: dict = Depends(get_curre
 
 
 @app.patch("/api/v1/clinic/settings/password")
-async def update_user_password(data: dict, current_user: dict = Depends(get_current_user)):
+async def update_user_password(data: dict, current_user: dict = Depends(get_current_user), conn: asyncpg.Connection = Depends(get_db)):
     """Update user password"""
     try:
         user_id = current_user.get('sub') or current_user.get('user_id')
-        conn = await asyncpg.connect(
-            host=DB_HOST, port=int(DB_PORT), user=DB_USER, password=DB_PASSWORD, database=DB_NAME
-        )
         
         # Verify current password
         user = await conn.fetchrow("SELECT password_hash FROM users WHERE id = $1", int(user_id))
-        if not user or not bcrypt.checkpw(data.get('current_password', '').encode(), user['password_hash'].encode()):
-            await conn.close()
+        if not user or not (await verify_password(data.get('current_password', ''), user['password_hash']))[0]:
             raise HTTPException(status_code=400, detail="Current password is incorrect")
         
         # Hash new password
-        new_hash = bcrypt.hashpw(data.get('new_password', '').encode(), bcrypt.gensalt()).decode()
+        new_hash = await hash_password(data.get('new_password', ''))
         
         await conn.execute(
             "UPDATE users SET password_hash = $1, updated_at = NOW() WHERE id = $2",
             new_hash, int(user_id)
         )
-        await conn.close()
+        auth_cache.invalidate_user(user_id=int(user_id))
         
         return {"success": True, "message": "Password updated successfully"}
     except HTTPException:
@@ -5456,13 +5015,10 @@ async def update_user_password(data: dict, current_user: dict = Depends(get_curr
 
 
 @app.patch("/api/v1/clinic/settings/notifications")
-async def update_notification_settings(data: dict, current_user: dict = Depends(get_current_user)):
+async def update_notification_settings(data: dict, current_user: dict = Depends(get_current_user), conn: asyncpg.Connection = Depends(get_db)):
     """Update notification settings"""
     try:
         clinic_id = current_user.get('clinic_id')
-        conn = await asyncpg.connect(
-            host=DB_HOST, port=int(DB_PORT), user=DB_USER, password=DB_PASSWORD, database=DB_NAME
-        )
         
         notifications = data.get('notifications', {})
         
@@ -5483,7 +5039,6 @@ async def update_notification_settings(data: dict, current_user: dict = Depends(
             notifications.get('marketing'),
             clinic_id
         )
-        await conn.close()
         
         return {"success": True, "message": "Notification settings updated successfully"}
     except Exception as e:
@@ -5498,15 +5053,24 @@ async def update_notification_settings(data: dict, current_user: dict = Depends(
 # ============================================
 
 @app.get("/api/v1/clinic/patient-invoices/v2")
-async def get_patient_invoices_v2(current_user: dict = Depends(get_current_user)):
-    """Get all patient invoices for the clinic (v2)"""
+async def get_patient_invoices_v2(
+    limit: int = None,
+    cursor: str = None,
+    current_user: dict = Depends(get_current_user),
+    conn: asyncpg.Connection = Depends(get_db)
+):
+    """Patient invoices for the clinic (v2), newest first, one page at a time"""
+    limit = clamp_limit(limit)
+    after = decode_cursor(cursor, 2)
     try:
         clinic_id = current_user.get('clinic_id')
-        conn = await asyncpg.connect(
-            host=DB_HOST, port=int(DB_PORT), user=DB_USER, password=DB_PASSWORD, database=DB_NAME
-        )
+        params = [clinic_id]
+        keyset = ""
+        if after:
+            keyset = "AND " + keyset_condition(["i.created_at", "i.id"], 2)
+            params.extend(after)
         
-        invoices = await conn.fetch("""
+        invoices = await conn.fetch(f"""
             SELECT 
                 i.id,
                 i.invoice_number,
@@ -5527,13 +5091,16 @@ async def get_patient_invoices_v2(current_user: dict = Depends(get_current_user)
                 p.email as patient_email
             FROM patient_invoices i
             JOIN patients p ON i.patient_id = p.id
-            WHERE i.clinic_id = $1
-            ORDER BY i.created_at DESC
-        """, clinic_id)
-        await conn.close()
+            WHERE i.clinic_id = $1 {keyset}
+            ORDER BY i.created_at DESC, i.id DESC
+            LIMIT ${len(params) + 1}
+        """, *params, limit + 1)
+        invoices, next_cursor = split_page(invoices, limit, ("created_at", "id"))
+        total = await count_metric(conn, clinic_id, "invoices_by_status")
         
         return {
             "success": True,
+            **page_info(next_cursor, total, estimated=False),
             "invoices": [
                 {
                     "id": inv['id'],
@@ -5562,3 +5129,29 @@ async def get_patient_invoices_v2(current_user: dict = Depends(get_current_user)
         traceback.print_exc()
         raise HTTPException(status_code=500, detail=str(e))
 
+
+# ============================================
+# CLINIC DATA EXPORTS
+# ============================================
+
+@app.get("/api/v1/clinic/export/{dataset}")
+async def export_clinic_data(
+    dataset: str,
+    format: str = "csv",
+    current_user: dict = Depends(get_current_user)
+):
+    """Stream a clinic dataset as CSV or NDJSON (see exports.py)"""
+    if dataset not in EXPORTS:
+        raise HTTPException(status_code=404, detail=f"Unknown export '{dataset}'. Available: {', '.join(EXPORTS)}")
+    if format not in EXPORT_FORMATS:
+        raise HTTPException(status_code=400, detail="format must be 'csv' or 'ndjson'")
+    clinic_id = current_user.get('clinic_id')
+    if not clinic_id:
+        raise HTTPException(status_code=400, detail="No clinic associated with this user")
+
+    filename = f"{dataset}-clinic{clinic_id}-{datetime.now().strftime('%Y%m%d')}.{format}"
+    return StreamingResponse(
+        iter_export(dataset, clinic_id, format),
+        media_type=EXPORT_FORMATS[format],
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'}
+    )
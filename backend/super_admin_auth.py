@@ -1,8 +1,8 @@
 from fastapi import HTTPException, Depends
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 import jwt
-import bcrypt
 from datetime import datetime, timedelta
+from passwords import verify_password_sync
 
 # JWT Configuration
 SECRET_KEY = "celloxen-super-admin-secret-key-change-in-production-2025"
@@ -11,12 +11,9 @@ ACCESS_TOKEN_EXPIRE_HOURS = 24
 
 security = HTTPBearer()
 
-def verify_super_admin_password(plain_password: str, hashed_password: str) -> bool:
-    """Verify super admin password"""
-    return bcrypt.checkpw(
-        plain_password.encode('utf-8'),
-        hashed_password.encode('utf-8')
-    )
+def verify_super_admin_password(plain_password: str, hashed_password: str):
+    """Verify super admin password -> (matches, rehash or None)"""
+    return verify_password_sync(plain_password, hashed_password)
 
 def create_super_admin_token(super_admin_id: int, email: str) -> str:
     """Create JWT token for super admin"""
@@ -1,7 +1,10 @@
-from email_config import send_email, create_welcome_email_html
-from fastapi import APIRouter, HTTPException, Depends
+from email_config import send_email, create_welcome_email
+from fastapi import APIRouter, HTTPException, Depends, Query
 from pydantic import BaseModel
-import psycopg2
+from db_pool import get_sync_connection, release_sync_connection
+from response_cache import get_or_load_sync, cache_stats
+from auth_cache import invalidate_user
+from pagination import clamp_limit, decode_cursor, keyset_condition, split_page, page_info, estimate_count_sync
 from super_admin_auth import (
     verify_super_admin_password, 
     create_super_admin_token,
@@ -10,14 +13,9 @@ from super_admin_auth import (
 
 router = APIRouter(prefix="/api/v1/super-admin", tags=["Super Admin"])
 
-# Database connection
+# Database connection - borrowed from the shared psycopg2 pool
 def get_db_connection():
-    return psycopg2.connect(
-        host="localhost",
-        database="celloxen_portal",
-        user="celloxen_user",
-        password="CelloxenSecure2025"
-    )
+    return get_sync_connection()
 
 # ============================================================================
 # AUTHENTICATION
@@ -51,8 +49,11 @@ def super_admin_login(credentials: SuperAdminLogin):
         if not is_active:
             raise HTTPException(status_code=403, detail="Account inactive")
         
-        if not verify_super_admin_password(credentials.password, password_hash):
+        valid, new_hash = verify_super_admin_password(credentials.password, password_hash)
+        if not valid:
             raise HTTPException(status_code=401, detail="Invalid credentials")
+        if new_hash:
+            cursor.execute("UPDATE super_admins SET password_hash = %s WHERE id = %s", (new_hash, admin_id))
         
         token = create_super_admin_token(admin_id, email)
         
@@ -83,7 +84,7 @@ def super_admin_login(credentials: SuperAdminLogin):
         
     finally:
         cursor.close()
-        conn.close()
+        release_sync_connection(conn)
 
 # ============================================================================
 # CLINIC MANAGEMENT (GDPR-COMPLIANT)
@@ -153,7 +154,7 @@ def list_clinics(token_data = Depends(verify_super_admin_token)):
         
     finally:
         cursor.close()
-        conn.close()
+        release_sync_connection(conn)
 
 @router.get("/clinics/{clinic_id}")
 def get_clinic_details(clinic_id: int, token_data = Depends(verify_super_admin_token)):
@@ -245,7 +246,7 @@ def get_clinic_details(clinic_id: int, token_data = Depends(verify_super_admin_t
         
     finally:
         cursor.close()
-        conn.close()
+        release_sync_connection(conn)
 
 # ============================================================================
 # SYSTEM STATISTICS
@@ -294,7 +295,7 @@ def get_system_stats(token_data = Depends(verify_super_admin_token)):
         
     finally:
         cursor.close()
-        conn.close()
+        release_sync_connection(conn)
 
 # ============================================================================
 # CLINIC MANAGEMENT - CREATE NEW CLINIC
@@ -381,7 +382,7 @@ def create_clinic(clinic: CreateClinicRequest, token_data = Depends(verify_super
         raise HTTPException(status_code=500, detail=str(e))
     finally:
         cursor.close()
-        conn.close()
+        release_sync_connection(conn)
 
 
 # ============================================================================
@@ -451,7 +452,7 @@ def get_audit_logs(
         
     finally:
         cursor.close()
-        conn.close()
+        release_sync_connection(conn)
 
 @router.get("/audit-logs/summary")
 def get_audit_summary(token_data = Depends(verify_super_admin_token)):
@@ -486,7 +487,7 @@ def get_audit_summary(token_data = Depends(verify_super_admin_token)):
         
     finally:
         cursor.close()
-        conn.close()
+        release_sync_connection(conn)
 
 
 # ============================================================================
@@ -574,7 +575,7 @@ def update_clinic(clinic_id: int, clinic: UpdateClinicRequest, token_data = Depe
         raise HTTPException(status_code=500, detail=str(e))
     finally:
         cursor.close()
-        conn.close()
+        release_sync_connection(conn)
 
 
 # ============================================================================
@@ -644,7 +645,7 @@ def update_clinic_status(clinic_id: int, request: ClinicStatusRequest, token_dat
         raise HTTPException(status_code=500, detail=str(e))
     finally:
         cursor.close()
-        conn.close()
+        release_sync_connection(conn)
 
 
 # ============================================================================
@@ -701,7 +702,7 @@ def delete_clinic(clinic_id: int, token_data = Depends(verify_super_admin_token)
         raise HTTPException(status_code=500, detail=str(e))
     finally:
         cursor.close()
-        conn.close()
+        release_sync_connection(conn)
 
 
 # ============================================================================
@@ -781,7 +782,7 @@ def create_invoice(invoice: CreateInvoiceRequest, token_data = Depends(verify_su
         raise HTTPException(status_code=500, detail=str(e))
     finally:
         cursor.close()
-        conn.close()
+        release_sync_connection(conn)
 
 
 # ============================================================================
@@ -793,9 +794,13 @@ def get_invoices(
     status: str = None,
     clinic_id: int = None,
     period: str = None,
+    limit: int = None,
+    page_cursor: str = Query(None, alias="cursor"),
     token_data = Depends(verify_super_admin_token)
 ):
-    """Get all invoices with optional filters"""
+    """Invoices with optional filters, newest first, one page at a time"""
+    limit = clamp_limit(limit)
+    after = decode_cursor(page_cursor, 2)
     
     conn = get_db_connection()
     cursor = conn.cursor()
@@ -842,10 +847,16 @@ def get_invoices(
             elif period == 'this_year':
                 query += " AND EXTRACT(YEAR FROM i.issue_date) = EXTRACT(YEAR FROM CURRENT_DATE)"
         
-        query += " ORDER BY i.issue_date DESC, i.id DESC"
+        filtered_query, filtered_params = query, list(params)
+        if after:
+            query += " AND " + keyset_condition(["i.issue_date", "i.id"], 0, placeholder="%s")
+            params.extend(after)
+        
+        query += " ORDER BY i.issue_date DESC, i.id DESC LIMIT %s"
+        params.append(limit + 1)
         
         cursor.execute(query, params)
-        rows = cursor.fetchall()
+        rows, next_cursor = split_page(cursor.fetchall(), limit, (10, 0))
         
         invoices = []
         for row in rows:
@@ -866,12 +877,14 @@ def get_invoices(
         return {
             "success": True,
             "invoices": invoices,
-            "total": len(invoices)
+            **page_info(
+                next_cursor, estimate_count_sync(cursor, filtered_query, filtered_params), estimated=True
+            )
         }
         
     finally:
         cursor.close()
-        conn.close()
+        release_sync_connection(conn)
 
 
 # ============================================================================
@@ -932,7 +945,7 @@ def get_invoice_stats(token_data = Depends(verify_super_admin_token)):
         
     finally:
         cursor.close()
-        conn.close()
+        release_sync_connection(conn)
 
 
 # ============================================================================
@@ -999,7 +1012,7 @@ def mark_invoice_paid(invoice_id: int, token_data = Depends(verify_super_admin_t
         raise HTTPException(status_code=500, detail=str(e))
     finally:
         cursor.close()
-        conn.close()
+        release_sync_connection(conn)
 
 
 # ============================================================================
@@ -1072,7 +1085,7 @@ def get_invoice(invoice_id: int, token_data = Depends(verify_super_admin_token))
         
     finally:
         cursor.close()
-        conn.close()
+        release_sync_connection(conn)
 
 
 # ============================================================================
@@ -1159,7 +1172,7 @@ def get_reports_summary(token_data = Depends(verify_super_admin_token)):
         
     finally:
         cursor.close()
-        conn.close()
+        release_sync_connection(conn)
 
 
 # ============================================================================
@@ -1169,7 +1182,10 @@ def get_reports_summary(token_data = Depends(verify_super_admin_token)):
 @router.get("/reports/charts")
 def get_charts_data(token_data = Depends(verify_super_admin_token)):
     """Get data for charts"""
-    
+    return get_or_load_sync("super_admin_charts", _load_charts_data, ttl=300)
+
+
+def _load_charts_data():
     conn = get_db_connection()
     cursor = conn.cursor()
     
@@ -1253,7 +1269,7 @@ def get_charts_data(token_data = Depends(verify_super_admin_token)):
         
     finally:
         cursor.close()
-        conn.close()
+        release_sync_connection(conn)
 
 
 # ============================================================================
@@ -1263,7 +1279,10 @@ def get_charts_data(token_data = Depends(verify_super_admin_token)):
 @router.get("/reports/top-clinics")
 def get_top_clinics(token_data = Depends(verify_super_admin_token)):
     """Get top performing clinics"""
-    
+    return get_or_load_sync("super_admin_top_clinics", _load_top_clinics, ttl=300)
+
+
+def _load_top_clinics():
     conn = get_db_connection()
     cursor = conn.cursor()
     
@@ -1303,7 +1322,20 @@ def get_top_clinics(token_data = Depends(verify_super_admin_token)):
         
     finally:
         cursor.close()
-        conn.close()
+        release_sync_connection(conn)
+
+
+# ============================================================================
+# REPORTS - RESPONSE CACHE METRICS
+# ============================================================================
+
+@router.get("/reports/cache-stats")
+def get_response_cache_stats(token_data = Depends(verify_super_admin_token)):
+    """Hit/miss counters of the dashboard response cache (this worker only)"""
+    return {
+        "success": True,
+        "cache": cache_stats()
+    }
 
 
 # ============================================================================
@@ -1312,9 +1344,7 @@ def get_top_clinics(token_data = Depends(verify_super_admin_token)):
 
 import secrets
 import string
-from passlib.context import CryptContext
-
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+from passwords import hash_password_sync
 
 def generate_temp_password(length=10):
     """Generate a secure temporary password (max 10 chars for bcrypt)"""
@@ -1355,7 +1385,7 @@ def send_clinic_welcome_email(clinic_id: int, token_data = Depends(verify_super_
         
         # Generate temporary password
         temp_password = generate_temp_password()
-        password_hash = pwd_context.hash(temp_password)
+        password_hash = hash_password_sync(temp_password)
         
         # Store credentials
         cursor.execute("""
@@ -1426,7 +1456,7 @@ This is an automated message. Please do not reply to this email.
         
         # In production, send actual email here via SMTP/SendGrid
         # Send the actual email
-        html_body = create_welcome_email_html(
+        welcome = create_welcome_email(
             clinic_name, 
             "https://celloxen.com/", 
             clinic_email, 
@@ -1436,7 +1466,8 @@ This is an automated message. Please do not reply to this email.
         email_result = send_email(
             to_email=clinic_email,
             subject=email_subject,
-            html_body=html_body
+            html_body=welcome["html"],
+            text_body=welcome["text"]
         )
         
         if email_result["success"]:
@@ -1471,7 +1502,7 @@ This is an automated message. Please do not reply to this email.
         raise HTTPException(status_code=500, detail=str(e))
     finally:
         cursor.close()
-        conn.close()
+        release_sync_connection(conn)
 
 
 # ============================================================================
@@ -1542,7 +1573,7 @@ def get_email_log(
         
     finally:
         cursor.close()
-        conn.close()
+        release_sync_connection(conn)
 
 
 # ============================================================================
@@ -1580,7 +1611,7 @@ def get_super_admins(token_data = Depends(verify_super_admin_token)):
         
     finally:
         cursor.close()
-        conn.close()
+        release_sync_connection(conn)
 
 
 # ============================================================================
@@ -1625,7 +1656,7 @@ def get_clinic_admins(token_data = Depends(verify_super_admin_token)):
         
     finally:
         cursor.close()
-        conn.close()
+        release_sync_connection(conn)
 
 
 # ============================================================================
@@ -1648,7 +1679,7 @@ def create_user(request: CreateUserRequest, token_data = Depends(verify_super_ad
     try:
         # Generate temporary password
         temp_password = generate_temp_password()
-        password_hash = pwd_context.hash(temp_password)
+        password_hash = hash_password_sync(temp_password)
         
         if request.user_type == 'super_admin':
             # Check if email already exists
@@ -1807,7 +1838,7 @@ Celloxen Team
             clinic_name = cursor.fetchone()[0]
             
             email_subject = "Welcome to Celloxen Health Portal"
-            html_body = create_welcome_email_html(
+            welcome = create_welcome_email(
                 clinic_name,
                 "https://celloxen.com/",
                 request.email,
@@ -1818,7 +1849,8 @@ Celloxen Team
             email_result = send_email(
                 to_email=request.email,
                 subject=email_subject,
-                html_body=html_body
+                html_body=welcome["html"],
+                text_body=welcome["text"]
             )
             
             # Log email
@@ -1847,7 +1879,7 @@ Celloxen Team
         raise HTTPException(status_code=500, detail=str(e))
     finally:
         cursor.close()
-        conn.close()
+        release_sync_connection(conn)
 
 
 # ============================================================================
@@ -1868,7 +1900,7 @@ def reset_user_password(
     try:
         # Generate new temporary password
         new_password = generate_temp_password()
-        password_hash = pwd_context.hash(new_password)
+        password_hash = hash_password_sync(new_password)
         
         if user_type == 'super_admin':
             cursor.execute("""
@@ -1905,6 +1937,7 @@ def reset_user_password(
         """, (token_data.get("super_admin_id", 1), f"Reset password for {user_type}: {user_email}"))
         
         conn.commit()
+        invalidate_user(email=user_email)
         
         return {
             "success": True,
@@ -1922,7 +1955,7 @@ def reset_user_password(
         raise HTTPException(status_code=500, detail=str(e))
     finally:
         cursor.close()
-        conn.close()
+        release_sync_connection(conn)
 
 
 # ============================================================================
@@ -1976,6 +2009,7 @@ def delete_user(
         """, (token_data.get("super_admin_id", 1), f"Deleted {user_type}: {user_email}"))
         
         conn.commit()
+        invalidate_user(email=user_email)
         
         return {
             "success": True,
@@ -1992,4 +2026,4 @@ def delete_user(
         raise HTTPException(status_code=500, detail=str(e))
     finally:
         cursor.close()
-        conn.close()
+        release_sync_connection(conn)